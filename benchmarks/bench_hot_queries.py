@@ -0,0 +1,160 @@
+"""
+Бенчмарк горячих запросов CRUD: процессорное время на вызов до и после
+перехода на готовые запросы (database/hot_queries.py).
+
+"До" - запрос собирается заново на каждый вызов и загружает ORM-объекты
+(как было в database/crud.py). "После" - готовый запрос, для списков и
+карточек - строки из нужных колонок.
+
+Запуск (из корня проекта):
+    python -m benchmarks.bench_hot_queries --calls 2000
+"""
+import argparse
+import asyncio
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import selectinload
+
+from database import crud
+from database.hot_queries import warm_hot_queries
+from database.models import Base, User, Shift, ShiftAssignment, Settings
+
+
+# ==================== ЗАПРОСЫ "ДО" (как в исходном crud.py) ====================
+
+async def legacy_get_user_by_telegram_id(db: AsyncSession, telegram_id: int):
+    result = await db.execute(select(User).where(User.telegram_id == telegram_id))
+    return result.scalar_one_or_none()
+
+
+async def legacy_get_setting(db: AsyncSession, key: str):
+    result = await db.execute(select(Settings).where(Settings.key == key))
+    setting = result.scalar_one_or_none()
+    return setting.value if setting else None
+
+
+async def legacy_get_shift_by_id(db: AsyncSession, shift_id: int):
+    result = await db.execute(
+        select(Shift)
+        .where(Shift.id == shift_id)
+        .options(selectinload(Shift.assignments).selectinload(ShiftAssignment.user))
+    )
+    return result.scalar_one_or_none()
+
+
+async def legacy_get_active_shifts(db: AsyncSession, from_date: datetime):
+    query = select(Shift).where(Shift.is_active == True)
+    query = query.where(Shift.date >= from_date)
+    query = query.order_by(Shift.date)
+    result = await db.execute(query.options(selectinload(Shift.assignments)))
+    return list(result.scalars().all())
+
+
+# ==================== ПОДГОТОВКА ДАННЫХ ====================
+
+async def seed(session_factory: async_sessionmaker, users: int, shifts: int):
+    now = datetime.utcnow()
+    async with session_factory() as db:
+        db.add_all(
+            User(
+                telegram_id=1000 + i, full_name=f"User {i}", skills="Сборка", course=1 + i % 5,
+                phone=f"+7999{i:07d}", preferred_days=["Пн", "Ср"], is_registered=True,
+            )
+            for i in range(users)
+        )
+        db.add_all(Shift(date=now + timedelta(days=1 + i), description=f"Смена {i}") for i in range(shifts))
+        db.add(Settings(key="work_group_id", value="-100123"))
+        await db.flush()
+        db.add_all(
+            ShiftAssignment(user_id=1 + (i * 7) % users, shift_id=1 + i % shifts)
+            for i in range(shifts * 5)
+        )
+        await db.commit()
+
+
+async def measure(session_factory: async_sessionmaker, call, calls: int) -> float:
+    """Процессорное время на один вызов, мкс"""
+    async with session_factory() as db:
+        for i in range(50):  # Разогрев
+            await call(db, i)
+        started = time.process_time()
+        for i in range(calls):
+            await call(db, i)
+        elapsed = time.process_time() - started
+        await db.rollback()
+    return elapsed / calls * 1_000_000
+
+
+async def run(calls: int, users: int, shifts: int):
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+    session_factory = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    await seed(session_factory, users, shifts)
+    await warm_hot_queries(session_factory)
+
+    from_date = datetime.utcnow()
+    cases = [
+        (
+            "get_user_by_telegram_id",
+            lambda db, i: legacy_get_user_by_telegram_id(db, 1000 + i % users),
+            lambda db, i: crud.get_user_by_telegram_id(db, 1000 + i % users),
+        ),
+        (
+            "  -> get_user_status (строка)",
+            lambda db, i: legacy_get_user_by_telegram_id(db, 1000 + i % users),
+            lambda db, i: crud.get_user_status(db, 1000 + i % users),
+        ),
+        (
+            "get_setting",
+            lambda db, i: legacy_get_setting(db, "work_group_id"),
+            lambda db, i: crud.get_setting(db, "work_group_id"),
+        ),
+        (
+            "get_shift_by_id",
+            lambda db, i: legacy_get_shift_by_id(db, 1 + i % shifts),
+            lambda db, i: crud.get_shift_by_id(db, 1 + i % shifts),
+        ),
+        (
+            "  -> get_shift_card (строка)",
+            lambda db, i: legacy_get_shift_by_id(db, 1 + i % shifts),
+            lambda db, i: crud.get_shift_card(db, 1 + i % shifts),
+        ),
+        (
+            "get_active_shifts",
+            lambda db, i: legacy_get_active_shifts(db, from_date),
+            lambda db, i: crud.get_active_shifts(db, from_date=from_date),
+        ),
+        (
+            "  -> get_active_shift_rows (строки)",
+            lambda db, i: legacy_get_active_shifts(db, from_date),
+            lambda db, i: crud.get_active_shift_rows(db, from_date=from_date),
+        ),
+    ]
+
+    print(f"Пользователей: {users}, смен: {shifts}, вызовов на случай: {calls}\n")
+    print(f"{'Запрос':<38}{'до, мкс':>12}{'после, мкс':>14}{'ускорение':>12}")
+    for name, before, after in cases:
+        # Списки смен дороже - меньше вызовов, чтобы прогон занимал разумное время
+        n = max(calls // 10, 50) if "active" in name else calls
+        before_us = await measure(session_factory, before, n)
+        after_us = await measure(session_factory, after, n)
+        print(f"{name:<38}{before_us:>12.1f}{after_us:>14.1f}{before_us / after_us:>11.2f}x")
+
+    await engine.dispose()
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Бенчмарк горячих запросов CRUD")
+    parser.add_argument("--calls", type=int, default=2000, help="Вызовов на каждый случай")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--shifts", type=int, default=30)
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    asyncio.run(run(args.calls, args.users, args.shifts))
@@ -11,6 +11,9 @@ class Config:
     # Токен бота
     BOT_TOKEN: str = os.getenv("BOT_TOKEN", "").strip()
     
+    # Дополнительные боты в том же процессе: токены через запятую, "токен@код" - бот команды (см. runtime/bots.py)
+    BOT_TOKENS: str = os.getenv("BOT_TOKENS", "").strip()
+    
     # URL базы данных
     # Для Docker используйте абсолютный путь в .env: sqlite+aiosqlite:////app/data/staff_bot.db
     DATABASE_URL: str = os.getenv("DATABASE_URL", "sqlite+aiosqlite:///./staff_bot.db")
@@ -27,7 +30,46 @@ class Config:
     
     # ID канала уведомлений
     NOTIFICATION_CHANNEL_ID: int = int(os.getenv("NOTIFICATION_CHANNEL_ID", "0")) if os.getenv("NOTIFICATION_CHANNEL_ID", "0").isdigit() else 0
-    
+
+    # Базовый URL Bot API (пусто - официальный api.telegram.org)
+    # Для нагрузочного тестирования: http://127.0.0.1:8081 (см. loadtest/mock_bot_api.py)
+    TELEGRAM_API_URL: str = os.getenv("TELEGRAM_API_URL", "").strip()
+
+    # Режим webhook (если WEBHOOK_URL пуст - используется polling)
+    WEBHOOK_URL: str = os.getenv("WEBHOOK_URL", "").strip().rstrip("/")
+    WEBHOOK_PATH: str = os.getenv("WEBHOOK_PATH", "/webhook").strip()
+    WEBHOOK_SECRET: str = os.getenv("WEBHOOK_SECRET", "").strip()
+    WEBAPP_HOST: str = os.getenv("WEBAPP_HOST", "0.0.0.0").strip()
+    WEBAPP_PORT: int = int(os.getenv("WEBAPP_PORT", "8080")) if os.getenv("WEBAPP_PORT", "8080").isdigit() else 8080
+
+    # Перенос в архив смен старше N дней вместе с записями (0 - не архивировать)
+    ARCHIVE_AFTER_DAYS: int = int(os.getenv("ARCHIVE_AFTER_DAYS", "180")) if os.getenv("ARCHIVE_AFTER_DAYS", "180").isdigit() else 180
+
+    # Смены по шаблонам: на сколько недель вперёд создавать ежедневно (0 - только кнопкой в меню шаблонов, на 4 недели)
+    SHIFT_TEMPLATE_WEEKS: int = int(os.getenv("SHIFT_TEMPLATE_WEEKS", "4")) if os.getenv("SHIFT_TEMPLATE_WEEKS", "4").isdigit() else 4
+
+    # Резервные копии SQLite: каталог (пусто - backups/ рядом с файлом БД) и сколько копий хранить (0 - без ежедневных копий)
+    BACKUP_DIR: str = os.getenv("BACKUP_DIR", "").strip()
+    BACKUP_KEEP: int = int(os.getenv("BACKUP_KEEP", "7")) if os.getenv("BACKUP_KEEP", "7").isdigit() else 7
+
+    # Лимит отправки сообщений каждого бота (сообщений в секунду, см. messaging/gateway.py)
+    TELEGRAM_RATE_PER_SECOND: float = float(os.getenv("TELEGRAM_RATE_PER_SECOND", "30"))
+
+    # Массовая отправка личных сообщений (анонсы смен, рассылки): параллельных отправок (скорость - TELEGRAM_RATE_PER_SECOND)
+    SEND_CONCURRENCY: int = int(os.getenv("SEND_CONCURRENCY", "10")) if os.getenv("SEND_CONCURRENCY", "10").isdigit() else 10
+
+    # Логирование: уровень, формат (json или text) и каталог файла bot.log (пусто - только stdout)
+    LOG_LEVEL: str = os.getenv("LOG_LEVEL", "INFO").strip().upper()
+    LOG_FORMAT: str = os.getenv("LOG_FORMAT", "json").strip().lower()
+    LOG_DIR: str = os.getenv("LOG_DIR", "logs").strip()
+
+    # HTTP-проверки состояния /health/live и /health/ready (0 - выключены, см. runtime/health.py)
+    HEALTH_HOST: str = os.getenv("HEALTH_HOST", "127.0.0.1").strip()
+    HEALTH_PORT: int = int(os.getenv("HEALTH_PORT", "8090")) if os.getenv("HEALTH_PORT", "8090").isdigit() else 8090
+
+    # Сколько секунд при остановке ждать начатых обработчиков, рассылок и фоновых отправок
+    SHUTDOWN_TIMEOUT: int = int(os.getenv("SHUTDOWN_TIMEOUT", "25")) if os.getenv("SHUTDOWN_TIMEOUT", "25").isdigit() else 25
+
     @staticmethod
     def is_admin(user_id: int) -> bool:
         """Проверка, является ли пользователь администратором"""
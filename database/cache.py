@@ -0,0 +1,93 @@
+"""
+Кэш готовых представлений, зависящих от таблицы смен.
+
+Каждая запись кэша помечена поколением смен (generation). Поколение
+увеличивается после COMMIT транзакции, в которой менялись смены
+(create_shift, update_shift, archive_shift помечают сессию через
+mark_shifts_changed), поэтому все ранее сохранённые представления сразу
+становятся устаревшими. Дополнительно запись живёт не дольше expires_at -
+например, до начала ближайшей смены в списке, после которого список меняется
+без всяких изменений в БД.
+
+Кэш хранится в памяти процесса: бот работает в одном процессе, а при
+перезапуске кэш просто собирается заново.
+"""
+from datetime import datetime
+from typing import Any, Dict, Hashable, NamedTuple, Optional
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+
+_SHIFTS_CHANGED = "shifts_changed"
+
+_generation = 0
+
+
+def shifts_generation() -> int:
+    """Текущее поколение данных о сменах"""
+    return _generation
+
+
+def bump_shifts_generation():
+    """Сброс всех представлений, построенных по сменам"""
+    global _generation
+    _generation += 1
+
+
+def mark_shifts_changed(db: AsyncSession):
+    """Пометка транзакции: после её COMMIT поколение смен увеличится"""
+    db.info[_SHIFTS_CHANGED] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _bump_on_commit(session: Session):
+    if session.info.pop(_SHIFTS_CHANGED, False):
+        bump_shifts_generation()
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_on_rollback(session: Session):
+    session.info.pop(_SHIFTS_CHANGED, None)
+
+
+class _Entry(NamedTuple):
+    generation: int
+    expires_at: Optional[datetime]
+    value: Any
+
+
+class ViewCache:
+    """Кэш представлений с привязкой к поколению смен и сроком жизни"""
+
+    def __init__(self):
+        self._entries: Dict[Hashable, _Entry] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Представление из кэша (None, если его нет или оно устарело)"""
+        entry = self._entries.get(key)
+        if (
+            entry is None
+            or entry.generation != _generation
+            or (entry.expires_at is not None and datetime.utcnow() >= entry.expires_at)
+        ):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry.value
+
+    def set(self, key: Hashable, value: Any, generation: int, expires_at: Optional[datetime] = None):
+        """
+        Сохранение представления.
+
+        generation нужно взять через shifts_generation() ДО чтения данных из
+        БД: если смены изменятся во время построения, запись сразу окажется
+        устаревшей и не будет отдана.
+        """
+        self._entries[key] = _Entry(generation, expires_at, value)
+
+    def clear(self):
+        self._entries.clear()
@@ -1,77 +1,400 @@
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, update, delete, func
+from sqlalchemy import select, insert, update, delete, func, null, case, literal, union_all
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import Row
 from sqlalchemy.orm import selectinload
-from datetime import datetime
-from typing import List, Optional
-from database.models import User, Shift, ShiftAssignment, Settings
+from datetime import datetime, time, timedelta
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+from database.models import (
+    User, Shift, ShiftAssignment, Settings, UserStats, UserDay, Broadcast, BroadcastDelivery,
+    ShiftArchive, ShiftAssignmentArchive, ShiftTemplate, Tenant, DEFAULT_TENANT_ID
+)
+from database import hot_queries
+from database.search import RANKED_SEARCH_LIMIT, fts_match, fts_match_query, query_terms, users_fts
+from database.cache import mark_shifts_changed
+from database.tenants import tenant_settings
+
+
+# Колонки, которые возвращают операции записи (INSERT/UPDATE ... RETURNING)
+USER_REF_COLUMNS = (User.id, User.telegram_id, User.full_name)
+SHIFT_REF_COLUMNS = (Shift.id, Shift.date, Shift.description)
+
+
+def _upsert_insert(db: AsyncSession, model):
+    """INSERT с поддержкой ON CONFLICT для диалекта текущей БД"""
+    if db.bind.dialect.name == "postgresql":
+        return postgresql.insert(model)
+    return sqlite.insert(model)
 
 
 # ==================== USER CRUD ====================
 
-async def create_user(db: AsyncSession, telegram_id: int, **kwargs) -> User:
-    """Создание нового пользователя"""
-    user = User(telegram_id=telegram_id, **kwargs)
-    db.add(user)
+async def create_user(db: AsyncSession, telegram_id: int, **kwargs) -> Row:
+    """Создание нового пользователя (INSERT ... RETURNING id, telegram_id, full_name); команда - kwargs["tenant_id"]"""
+    result = await db.execute(
+        insert(User).values(telegram_id=telegram_id, **kwargs).returning(*USER_REF_COLUMNS)
+    )
+    user = result.one()
+    if kwargs.get("preferred_days"):
+        await _replace_user_days(db, {user.id: kwargs["preferred_days"]})
     await db.commit()
-    await db.refresh(user)
     return user
 
 
 async def get_user_by_telegram_id(db: AsyncSession, telegram_id: int) -> Optional[User]:
     """Получение пользователя по Telegram ID"""
-    result = await db.execute(select(User).where(User.telegram_id == telegram_id))
+    result = await db.execute(hot_queries.USER_BY_TELEGRAM_ID, {"telegram_id": telegram_id})
     return result.scalar_one_or_none()
 
 
-async def update_user(db: AsyncSession, telegram_id: int, **kwargs) -> Optional[User]:
-    """Обновление данных пользователя"""
-    user = await get_user_by_telegram_id(db, telegram_id)
-    if user:
-        for key, value in kwargs.items():
-            setattr(user, key, value)
-        user.updated_at = datetime.utcnow()
-        await db.commit()
-        await db.refresh(user)
+async def get_user_status(db: AsyncSession, telegram_id: int) -> Optional[Row]:
+    """Лёгкая проверка пользователя: строка (id, is_registered, is_blocked, tenant_id) без загрузки ORM-объекта"""
+    result = await db.execute(hot_queries.USER_STATUS_ROW, {"telegram_id": telegram_id})
+    return result.one_or_none()
+
+
+async def get_user_id(db: AsyncSession, telegram_id: int) -> Optional[int]:
+    """Внутренний ID пользователя по Telegram ID"""
+    status = await get_user_status(db, telegram_id)
+    return status.id if status else None
+
+
+async def update_user(db: AsyncSession, telegram_id: int, **kwargs) -> Optional[Row]:
+    """Обновление данных пользователя (UPDATE ... RETURNING id, telegram_id, full_name)"""
+    result = await db.execute(
+        update(User)
+        .where(User.telegram_id == telegram_id)
+        .values(**kwargs, updated_at=datetime.utcnow())
+        .returning(*USER_REF_COLUMNS)
+    )
+    user = result.one_or_none()
+    if user and "preferred_days" in kwargs:
+        await _replace_user_days(db, {user.id: kwargs["preferred_days"]})
+    await db.commit()
     return user
 
 
-async def get_all_users(db: AsyncSession, is_registered: Optional[bool] = None) -> List[User]:
-    """Получение всех пользователей"""
+async def _replace_user_days(db: AsyncSession, days_by_user: Dict[int, Optional[List[str]]]):
+    """Синхронизация user_days с preferred_days (в транзакции вызывающей операции)"""
+    await db.execute(delete(UserDay).where(UserDay.user_id.in_(list(days_by_user))))
+    values = [
+        {"user_id": user_id, "day": day}
+        for user_id, days in days_by_user.items()
+        for day in set(days or [])
+    ]
+    if values:
+        await db.execute(insert(UserDay).values(values))
+
+
+async def get_user_ids_by_day(db: AsyncSession, day: str, tenant_id: int = DEFAULT_TENANT_ID) -> List[int]:
+    """Telegram ID зарегистрированных пользователей команды, у которых день day среди предпочитаемых"""
+    result = await db.execute(hot_queries.REGISTERED_TELEGRAM_IDS_BY_DAY, {"day": day, "tenant_id": tenant_id})
+    return list(result.scalars().all())
+
+
+async def get_all_users(
+    db: AsyncSession, is_registered: Optional[bool] = None, tenant_id: Optional[int] = DEFAULT_TENANT_ID
+) -> List[User]:
+    """Получение всех пользователей команды (tenant_id=None - всех команд)"""
     query = select(User)
+    if tenant_id is not None:
+        query = query.where(User.tenant_id == tenant_id)
     if is_registered is not None:
         query = query.where(User.is_registered == is_registered)
     result = await db.execute(query)
     return list(result.scalars().all())
 
 
-async def update_user_rating(db: AsyncSession, telegram_id: int, rating: int) -> Optional[User]:
+async def get_all_users_with_stats(
+    db: AsyncSession, is_registered: Optional[bool] = None, tenant_id: int = DEFAULT_TENANT_ID
+) -> List[Row]:
+    """Пользователи команды вместе со статистикой: строки (User, UserStats или None)"""
+    query = (
+        select(User, UserStats).outerjoin(UserStats, UserStats.user_id == User.id)
+        .where(User.tenant_id == tenant_id)
+        .order_by(User.id)
+    )
+    if is_registered is not None:
+        query = query.where(User.is_registered == is_registered)
+    result = await db.execute(query)
+    return list(result.all())
+
+
+async def update_user_rating(db: AsyncSession, telegram_id: int, rating: int) -> Optional[Row]:
     """Обновление рейтинга пользователя"""
     if not 1 <= rating <= 5:
         raise ValueError("Рейтинг должен быть от 1 до 5")
     return await update_user(db, telegram_id, rating=rating)
 
 
+async def get_user_with_stats(db: AsyncSession, user_id: int, tenant_id: int = DEFAULT_TENANT_ID) -> Optional[Row]:
+    """Пользователь команды по users.id вместе со статистикой: строка (User, UserStats или None)"""
+    result = await db.execute(
+        select(User, UserStats).outerjoin(UserStats, UserStats.user_id == User.id)
+        .where(User.id == user_id, User.tenant_id == tenant_id)
+    )
+    return result.first()
+
+
+# ==================== PHONES ====================
+# Телефоны сравниваются по users.phone_e164 (уникальный индекс); нормализация
+# номера - database.phones.normalize_phone. Номер уникален во всей БД, но
+# данные владельца из другой команды администратору не показываются.
+
+async def get_user_by_phone(db: AsyncSession, phone_e164: str, tenant_id: Optional[int] = None) -> Optional[User]:
+    """
+    Пользователь по нормализованному телефону.
+
+    Номер уникален во всей БД, поэтому проверка занятости ищет во всех
+    командах (tenant_id=None); вызывающий код не показывает администратору
+    данные владельца из другой команды.
+    """
+    query = select(User).where(User.phone_e164 == phone_e164)
+    if tenant_id is not None:
+        query = query.where(User.tenant_id == tenant_id)
+    result = await db.execute(query)
+    return result.scalar_one_or_none()
+
+
+async def get_users_without_e164(db: AsyncSession, tenant_id: int = DEFAULT_TENANT_ID) -> List[Row]:
+    """Пользователи команды без нормализованного телефона (повторы и нераспознанные номера)"""
+    result = await db.execute(
+        select(User.id, User.telegram_id, User.full_name, User.phone)
+        .where(User.tenant_id == tenant_id, User.phone_e164.is_(None))
+        .order_by(User.id)
+    )
+    return list(result.all())
+
+
+async def get_users_by_phones(
+    db: AsyncSession, phones: List[str], tenant_id: Optional[int] = None
+) -> Dict[str, Row]:
+    """
+    Владельцы уже занятых номеров: {phone_e164: (id, telegram_id, full_name, phone, tenant_id)}.
+
+    tenant_id=None - во всех командах (проверка занятости номера).
+    """
+    owners = {}
+    for start in range(0, len(phones), BULK_CHUNK_SIZE):
+        query = (
+            select(User.phone_e164, User.id, User.telegram_id, User.full_name, User.phone, User.tenant_id)
+            .where(User.phone_e164.in_(phones[start:start + BULK_CHUNK_SIZE]))
+        )
+        if tenant_id is not None:
+            query = query.where(User.tenant_id == tenant_id)
+        result = await db.execute(query)
+        owners.update({row.phone_e164: row for row in result})
+    return owners
+
+
+# ==================== USER SEARCH ====================
+
+async def _search_user_ids(
+    db: AsyncSession, terms: List[str], limit: int, offset: int, tenant_id: int
+) -> Tuple[int, List[int]]:
+    if db.bind.dialect.name == "sqlite":
+        # Индекс общий для всех команд: совпадения отбираются по users.tenant_id
+        matches = users_fts.join(User, User.id == users_fts.c.rowid)
+        conditions = [fts_match(fts_match_query(terms)), User.tenant_id == tenant_id]
+        total = (await db.execute(select(func.count()).select_from(matches).where(*conditions))).scalar()
+        order = users_fts.c.rank if total <= RANKED_SEARCH_LIMIT else users_fts.c.rowid
+        ids = (await db.execute(
+            select(users_fts.c.rowid).select_from(matches).where(*conditions).order_by(order).limit(limit).offset(offset)
+        )).scalars().all()
+        return total, list(ids)
+
+    # Без FTS5: каждое слово - подстрока ФИО, телефона или навыков
+    conditions = [User.tenant_id == tenant_id] + [
+        User.full_name.ilike(f"%{term}%") | User.phone.ilike(f"%{term}%") | User.skills.ilike(f"%{term}%")
+        for term in terms
+    ]
+    total = (await db.execute(select(func.count()).select_from(User).where(*conditions))).scalar()
+    ids = (await db.execute(
+        select(User.id).where(*conditions).order_by(User.full_name, User.id).limit(limit).offset(offset)
+    )).scalars().all()
+    return total, list(ids)
+
+
+async def search_users(
+    db: AsyncSession,
+    query: str,
+    limit: int = 10,
+    offset: int = 0,
+    phone_e164: Optional[str] = None,
+    tenant_id: int = DEFAULT_TENANT_ID,
+) -> Tuple[int, List[Row]]:
+    """
+    Поиск пользователей команды по ФИО, телефону и навыкам (по префиксам слов).
+
+    Возвращает (число найденных, страница строк (User, UserStats или None)),
+    самые релевантные - первыми (см. RANKED_SEARCH_LIMIT). Если запрос - полный
+    телефон (phone_e164), владелец номера находится по индексу без полнотекстового поиска.
+    """
+    if phone_e164:
+        row = (await db.execute(
+            select(User, UserStats).outerjoin(UserStats, UserStats.user_id == User.id)
+            .where(User.phone_e164 == phone_e164, User.tenant_id == tenant_id)
+        )).first()
+        if row:
+            return 1, [row] if offset == 0 else []
+    terms = query_terms(query)
+    if not terms:
+        return 0, []
+    total, ids = await _search_user_ids(db, terms, limit, offset, tenant_id)
+    if not ids:
+        return total, []
+    result = await db.execute(
+        select(User, UserStats).outerjoin(UserStats, UserStats.user_id == User.id).where(User.id.in_(ids))
+    )
+    rows = {row[0].id: row for row in result}
+    return total, [rows[user_id] for user_id in ids if user_id in rows]
+
+
+# ==================== BULK USERS ====================
+
+BULK_CHUNK_SIZE = 500
+
+# Колонки выгрузки пользователей (совпадают с форматом импорта)
+USER_EXPORT_COLUMNS = (
+    User.telegram_id, User.full_name, User.skills, User.experience_shifts,
+    User.course, User.phone, User.preferred_days, User.rating,
+)
+
+
+# Поля строки импорта, которые записываются в users (остальные ключи, например
+# номер строки файла, игнорируются)
+_UPSERT_USER_FIELDS = [column.key for column in USER_EXPORT_COLUMNS] + ["phone_e164"]
+
+
+async def _upsert_users_chunk(db: AsyncSession, rows: List[dict], with_rating: bool, tenant_id: int):
+    now = datetime.utcnow()
+    values = [
+        {**{key: row[key] for key in _UPSERT_USER_FIELDS}, "tenant_id": tenant_id, "rating": row["rating"] if with_rating else 3,
+         # SQL NULL, а не JSON null - иначе COALESCE ниже не сработает
+         "preferred_days": row["preferred_days"] if row["preferred_days"] is not None else null(),
+         "is_registered": True, "created_at": now, "updated_at": now}
+        for row in rows
+    ]
+    statement = _upsert_insert(db, User).values(values)
+    update_columns = ["full_name", "experience_shifts", "course", "phone", "phone_e164", "is_registered", "updated_at"]
+    if with_rating:
+        update_columns.append("rating")
+    set_ = {column: statement.excluded[column] for column in update_columns}
+    # Пустые необязательные поля не затирают уже сохранённые значения
+    set_["skills"] = func.coalesce(statement.excluded.skills, User.skills)
+    set_["preferred_days"] = func.coalesce(statement.excluded.preferred_days, User.preferred_days)
+    await db.execute(statement.on_conflict_do_update(
+        index_elements=[User.telegram_id],
+        set_=set_,
+        # Сотрудники других команд не перезаписываются
+        where=User.tenant_id == statement.excluded.tenant_id
+    ))
+
+
+async def bulk_upsert_users(
+    db: AsyncSession, rows: List[dict], chunk_size: int = BULK_CHUNK_SIZE, tenant_id: int = DEFAULT_TENANT_ID
+) -> int:
+    """
+    Массовое добавление/обновление пользователей команды по telegram_id.
+
+    Строки записываются пакетами по chunk_size, каждый пакет - отдельная
+    транзакция. Пустые навыки, дни и рейтинг (None) у существующего
+    пользователя не меняются; новому ставится начальный рейтинг (3).
+    Пользователи из других команд пропускаются. Возвращает число
+    обработанных строк.
+    """
+    written = 0
+    for start in range(0, len(rows), chunk_size):
+        chunk = rows[start:start + chunk_size]
+        rated = [row for row in chunk if row["rating"] is not None]
+        unrated = [row for row in chunk if row["rating"] is None]
+        if rated:
+            await _upsert_users_chunk(db, rated, with_rating=True, tenant_id=tenant_id)
+        if unrated:
+            await _upsert_users_chunk(db, unrated, with_rating=False, tenant_id=tenant_id)
+        with_days = {row["telegram_id"]: row["preferred_days"] for row in chunk if row["preferred_days"] is not None}
+        if with_days:
+            ids = await db.execute(
+                select(User.telegram_id, User.id)
+                .where(User.telegram_id.in_(list(with_days)), User.tenant_id == tenant_id)
+            )
+            await _replace_user_days(db, {user_id: with_days[telegram_id] for telegram_id, user_id in ids})
+        await db.commit()
+        written += len(chunk)
+    return written
+
+
+async def stream_users(
+    db: AsyncSession, chunk_size: int = BULK_CHUNK_SIZE, tenant_id: int = DEFAULT_TENANT_ID
+) -> AsyncIterator[List[Row]]:
+    """Потоковая выгрузка пользователей команды пакетами строк (без загрузки всей таблицы в память)"""
+    result = await db.stream(
+        select(*USER_EXPORT_COLUMNS)
+        .where(User.tenant_id == tenant_id)
+        .order_by(User.id)
+        .execution_options(yield_per=chunk_size)
+    )
+    async for partition in result.partitions():
+        yield partition
+
+
 # ==================== SHIFT CRUD ====================
 
-async def create_shift(db: AsyncSession, date: datetime, description: Optional[str] = None) -> Shift:
-    """Создание новой смены"""
-    shift = Shift(date=date, description=description)
-    db.add(shift)
+async def create_shift(
+    db: AsyncSession, date: datetime, description: Optional[str] = None, tenant_id: int = DEFAULT_TENANT_ID
+) -> Row:
+    """Создание новой смены команды (INSERT ... RETURNING id, date, description)"""
+    result = await db.execute(
+        insert(Shift).values(tenant_id=tenant_id, date=date, description=description).returning(*SHIFT_REF_COLUMNS)
+    )
+    shift = result.one()
+    mark_shifts_changed(db)
     await db.commit()
-    await db.refresh(shift)
     return shift
 
 
-async def get_shift_by_id(db: AsyncSession, shift_id: int) -> Optional[Shift]:
-    """Получение смены по ID"""
-    result = await db.execute(
-        select(Shift)
-        .where(Shift.id == shift_id)
-        .options(selectinload(Shift.assignments).selectinload(ShiftAssignment.user))
-    )
+async def get_existing_shift_dates(
+    db: AsyncSession, dates: List[datetime], tenant_id: int = DEFAULT_TENANT_ID
+) -> set:
+    """Какие из дат уже заняты сменами команды (один запрос на BULK_CHUNK_SIZE дат)"""
+    existing = set()
+    for start in range(0, len(dates), BULK_CHUNK_SIZE):
+        result = await db.execute(
+            select(Shift.date).where(Shift.tenant_id == tenant_id, Shift.date.in_(dates[start:start + BULK_CHUNK_SIZE]))
+        )
+        existing.update(result.scalars())
+    return existing
+
+
+async def create_shifts(
+    db: AsyncSession, shifts: List[Tuple[datetime, Optional[str]]], tenant_id: int = DEFAULT_TENANT_ID
+) -> int:
+    """Создание смен команды из списка (дата, описание) одной транзакцией; возвращает число смен"""
+    created_at = datetime.utcnow()
+    rows = [
+        {"tenant_id": tenant_id, "date": date, "description": description, "is_active": True, "created_at": created_at}
+        for date, description in shifts
+    ]
+    for start in range(0, len(rows), BULK_CHUNK_SIZE):
+        await db.execute(insert(Shift), rows[start:start + BULK_CHUNK_SIZE])
+    if rows:
+        mark_shifts_changed(db)
+    await db.commit()
+    return len(rows)
+
+
+async def get_shift_by_id(db: AsyncSession, shift_id: int, tenant_id: int = DEFAULT_TENANT_ID) -> Optional[Shift]:
+    """Смена команды по ID (None - смены нет или она другой команды)"""
+    result = await db.execute(hot_queries.SHIFT_BY_ID, {"shift_id": shift_id, "tenant_id": tenant_id})
     return result.scalar_one_or_none()
 
 
+async def get_shift_card(db: AsyncSession, shift_id: int, tenant_id: int = DEFAULT_TENANT_ID) -> Optional[Row]:
+    """Карточка смены команды: строка (id, date, description, completed_info, capacity) без участников"""
+    result = await db.execute(hot_queries.SHIFT_CARD_ROW, {"shift_id": shift_id, "tenant_id": tenant_id})
+    return result.one_or_none()
+
+
 async def get_shift_participants(db: AsyncSession, shift_id: int) -> List[User]:
     """Получение списка участников смены (не отмененные записи)"""
     result = await db.execute(
@@ -85,68 +408,500 @@ async def get_shift_participants(db: AsyncSession, shift_id: int) -> List[User]:
     return list(result.scalars().all())
 
 
-async def get_active_shifts(db: AsyncSession, from_date: Optional[datetime] = None) -> List[Shift]:
-    """Получение активных смен"""
-    query = select(Shift).where(Shift.is_active == True)
+async def get_shift_participants_with_stats(db: AsyncSession, shift_id: int) -> List[Row]:
+    """Участники смены вместе со статистикой: строки (User, UserStats или None)"""
+    result = await db.execute(
+        select(User, UserStats)
+        .join(ShiftAssignment)
+        .outerjoin(UserStats, UserStats.user_id == User.id)
+        .where(
+            ShiftAssignment.shift_id == shift_id,
+            ShiftAssignment.is_cancelled == False
+        )
+    )
+    return list(result.all())
+
+
+async def get_active_shifts(
+    db: AsyncSession, from_date: Optional[datetime] = None, tenant_id: int = DEFAULT_TENANT_ID
+) -> List[Shift]:
+    """Получение активных смен команды"""
     if from_date:
-        query = query.where(Shift.date >= from_date)
-    query = query.order_by(Shift.date)
-    result = await db.execute(query.options(selectinload(Shift.assignments)))
+        result = await db.execute(hot_queries.ACTIVE_SHIFTS_FROM, {"tenant_id": tenant_id, "from_date": from_date})
+    else:
+        result = await db.execute(hot_queries.ACTIVE_SHIFTS, {"tenant_id": tenant_id})
     return list(result.scalars().all())
 
 
-async def update_shift(db: AsyncSession, shift_id: int, **kwargs) -> Optional[Shift]:
-    """Обновление смены"""
-    shift = await get_shift_by_id(db, shift_id)
+async def get_active_shift_rows(
+    db: AsyncSession, from_date: Optional[datetime] = None, tenant_id: int = DEFAULT_TENANT_ID
+) -> List[Row]:
+    """Активные смены команды для списков: строки (id, date) без загрузки записей"""
+    if from_date:
+        result = await db.execute(hot_queries.ACTIVE_SHIFT_ROWS_FROM, {"tenant_id": tenant_id, "from_date": from_date})
+    else:
+        result = await db.execute(hot_queries.ACTIVE_SHIFT_ROWS, {"tenant_id": tenant_id})
+    return list(result.all())
+
+
+async def update_shift(db: AsyncSession, shift_id: int, tenant_id: int = DEFAULT_TENANT_ID, **kwargs) -> Optional[Row]:
+    """
+    Обновление смены команды (UPDATE ... RETURNING id, date, description).
+
+    None - смены нет или она другой команды. Если completed_info появляется
+    или удаляется, в той же транзакции меняется счётчик отработанных смен у
+    участников (user_stats).
+    """
+    was_completed = None
+    if "completed_info" in kwargs:
+        was_completed = await db.scalar(
+            select(Shift.completed_info.isnot(None)).where(Shift.id == shift_id, Shift.tenant_id == tenant_id)
+        )
+    result = await db.execute(
+        update(Shift)
+        .where(Shift.id == shift_id, Shift.tenant_id == tenant_id)
+        .values(**kwargs)
+        .returning(*SHIFT_REF_COLUMNS)
+    )
+    shift = result.one_or_none()
     if shift:
-        for key, value in kwargs.items():
-            setattr(shift, key, value)
-        await db.commit()
-        await db.refresh(shift)
+        mark_shifts_changed(db)
+    if shift and was_completed is not None:
+        is_completed = kwargs["completed_info"] is not None
+        if is_completed != was_completed:
+            user_ids = await db.scalars(
+                select(ShiftAssignment.user_id).where(
+                    ShiftAssignment.shift_id == shift_id,
+                    ShiftAssignment.is_cancelled == False
+                )
+            )
+            await _bump_user_stats(
+                db, list(user_ids),
+                shifts_worked=1 if is_completed else -1,
+                worked_at=shift.date
+            )
+    await db.commit()
     return shift
 
 
-async def archive_shift(db: AsyncSession, shift_id: int) -> Optional[Shift]:
-    """Архивирование смены"""
-    return await update_shift(db, shift_id, is_active=False)
+async def archive_shift(db: AsyncSession, shift_id: int, tenant_id: int = DEFAULT_TENANT_ID) -> Optional[Row]:
+    """Архивирование смены команды (None - смены нет или она другой команды)"""
+    return await update_shift(db, shift_id, tenant_id, is_active=False)
+
+
+# ==================== SHIFT TEMPLATES ====================
+
+WEEKDAY_NAMES = ("Пн", "Вт", "Ср", "Чт", "Пт", "Сб", "Вс")
+
+
+async def create_shift_template(
+    db: AsyncSession, weekdays: List[str], start_time: time, description: Optional[str] = None,
+    capacity: Optional[int] = None, tenant_id: int = DEFAULT_TENANT_ID
+) -> Row:
+    """Создание шаблона смены команды (INSERT ... RETURNING id)"""
+    result = await db.execute(
+        insert(ShiftTemplate)
+        .values(tenant_id=tenant_id, weekdays=weekdays, start_time=start_time, description=description, capacity=capacity)
+        .returning(ShiftTemplate.id)
+    )
+    template = result.one()
+    await db.commit()
+    return template
+
+
+async def get_shift_templates(db: AsyncSession, tenant_id: Optional[int] = DEFAULT_TENANT_ID) -> List[ShiftTemplate]:
+    """Действующие шаблоны смен команды (tenant_id=None - всех команд)"""
+    query = select(ShiftTemplate).where(ShiftTemplate.is_active == True).order_by(ShiftTemplate.start_time, ShiftTemplate.id)
+    if tenant_id is not None:
+        query = query.where(ShiftTemplate.tenant_id == tenant_id)
+    result = await db.execute(query)
+    return list(result.scalars().all())
+
+
+async def deactivate_shift_template(db: AsyncSession, template_id: int, tenant_id: int = DEFAULT_TENANT_ID) -> bool:
+    """Отключение шаблона (созданные по нему смены остаются)"""
+    result = await db.execute(
+        update(ShiftTemplate)
+        .where(ShiftTemplate.id == template_id, ShiftTemplate.tenant_id == tenant_id, ShiftTemplate.is_active == True)
+        .values(is_active=False)
+        .returning(ShiftTemplate.id)
+    )
+    found = result.first() is not None
+    await db.commit()
+    return found
+
+
+def template_shift_dates(template: ShiftTemplate, start: datetime, weeks: int) -> List[datetime]:
+    """Даты смен шаблона после start на weeks недель вперёд"""
+    days = {WEEKDAY_NAMES.index(day) for day in template.weekdays if day in WEEKDAY_NAMES}
+    dates = []
+    for offset in range(weeks * 7 + 1):
+        day = start.date() + timedelta(days=offset)
+        if day.weekday() in days:
+            shift_date = datetime.combine(day, template.start_time)
+            if start < shift_date <= start + timedelta(weeks=weeks):
+                dates.append(shift_date)
+    return dates
+
+
+async def generate_template_shifts(
+    db: AsyncSession, weeks: int, tenant_id: Optional[int] = DEFAULT_TENANT_ID, now: Optional[datetime] = None
+) -> Tuple[int, int]:
+    """
+    Создание смен по действующим шаблонам на weeks недель вперёд одной транзакцией.
+
+    Смены вставляются пачками INSERT ... ON CONFLICT (template_id, date) DO
+    NOTHING: уже созданные (в том числе архивированные) смены шаблона
+    пропускаются, поэтому повторный запуск не создаёт дублей.
+    tenant_id=None - шаблоны всех команд. Возвращает (создано, пропущено).
+    """
+    now = now or datetime.now()
+    created_at = datetime.utcnow()
+    rows = [
+        {
+            "tenant_id": template.tenant_id, "template_id": template.id, "date": shift_date,
+            "description": template.description, "capacity": template.capacity,
+            "is_active": True, "created_at": created_at,
+        }
+        for template in await get_shift_templates(db, tenant_id)
+        for shift_date in template_shift_dates(template, now, weeks)
+    ]
+    created = 0
+    for start in range(0, len(rows), BULK_CHUNK_SIZE):
+        stmt = _upsert_insert(db, Shift).values(rows[start:start + BULK_CHUNK_SIZE])
+        result = await db.execute(
+            stmt.on_conflict_do_nothing(index_elements=[Shift.template_id, Shift.date]).returning(Shift.id)
+        )
+        created += len(result.all())
+    if created:
+        mark_shifts_changed(db)
+    await db.commit()
+    return created, len(rows) - created
+
+
+# ==================== USER STATS ====================
+
+def _last_worked_at(user_id_column):
+    """Подзапрос: дата последней отработанной смены пользователя"""
+    return (
+        select(func.max(Shift.date))
+        .select_from(ShiftAssignment)
+        .join(Shift, Shift.id == ShiftAssignment.shift_id)
+        .where(
+            ShiftAssignment.user_id == user_id_column,
+            ShiftAssignment.is_cancelled == False,
+            Shift.completed_info.isnot(None)
+        )
+        .scalar_subquery()
+    )
+
+
+async def _completed_shift_date(db: AsyncSession, shift_id: int) -> Optional[datetime]:
+    """Дата смены, если по ней уже внесён completed_info (иначе None)"""
+    return await db.scalar(
+        select(Shift.date).where(Shift.id == shift_id, Shift.completed_info.isnot(None))
+    )
+
+
+async def _bump_user_stats(
+    db: AsyncSession,
+    user_ids: List[int],
+    signups: int = 0,
+    cancellations: int = 0,
+    shifts_worked: int = 0,
+    worked_at: Optional[datetime] = None,
+):
+    """
+    Изменение счётчиков user_stats на заданные приращения одним UPSERT.
+
+    Вызывается внутри транзакции операции записи, до её commit.
+    """
+    if not user_ids:
+        return
+    now = datetime.utcnow()
+    statement = _upsert_insert(db, UserStats).values([
+        {
+            "user_id": user_id,
+            "signups": max(signups, 0),
+            "cancellations": max(cancellations, 0),
+            "shifts_worked": max(shifts_worked, 0),
+            "last_worked_at": worked_at if shifts_worked > 0 else None,
+            "updated_at": now,
+        }
+        for user_id in user_ids
+    ])
+    set_ = {
+        "signups": UserStats.signups + signups,
+        "cancellations": UserStats.cancellations + cancellations,
+        "shifts_worked": UserStats.shifts_worked + shifts_worked,
+        "updated_at": now,
+    }
+    if shifts_worked > 0:
+        set_["last_worked_at"] = case(
+            (UserStats.last_worked_at > statement.excluded.last_worked_at, UserStats.last_worked_at),
+            else_=statement.excluded.last_worked_at
+        )
+    await db.execute(statement.on_conflict_do_update(index_elements=[UserStats.user_id], set_=set_))
+    if shifts_worked < 0:
+        # Последнюю отработанную смену пересчитываем заново
+        await db.execute(
+            update(UserStats)
+            .where(UserStats.user_id.in_(user_ids))
+            .values(last_worked_at=_last_worked_at(UserStats.user_id))
+        )
+
+
+async def get_user_stats(db: AsyncSession, user_id: int) -> Optional[UserStats]:
+    """Статистика пользователя по внутреннему ID"""
+    return await db.get(UserStats, user_id)
+
+
+async def rebuild_user_stats(db: AsyncSession) -> int:
+    """
+    Полный пересчёт user_stats по записям на смены, включая архив (разовая операция).
+
+    Возвращает число пользователей со статистикой.
+    """
+    assignments = _all_assignment_rows().subquery()
+    worked = (assignments.c.is_cancelled == False) & assignments.c.completed_info.isnot(None)
+    aggregate = (
+        select(
+            assignments.c.user_id,
+            func.count(),
+            func.sum(case((assignments.c.is_cancelled == True, 1), else_=0)),
+            func.sum(case((worked, 1), else_=0)),
+            func.max(case((worked, assignments.c.date))),
+            literal(datetime.utcnow()),
+        )
+        .group_by(assignments.c.user_id)
+    )
+    await db.execute(delete(UserStats))
+    result = await db.execute(
+        insert(UserStats).from_select(
+            ["user_id", "signups", "cancellations", "shifts_worked", "last_worked_at", "updated_at"],
+            aggregate
+        )
+    )
+    await db.commit()
+    return result.rowcount
+
+
+# ==================== ОБЩЕЕ ЧТЕНИЕ РАБОЧИХ И АРХИВНЫХ ТАБЛИЦ ====================
+# Смены и записи из shifts/shift_assignments и из архива объединяются через
+# UNION ALL. Записи соединяются со сменами внутри своей пары таблиц, поэтому
+# совпадение ID в рабочей и архивной таблице не смешивает данные.
+
+def _all_assignment_rows():
+    """Записи на смены с датой смены и completed_info (рабочие + архив)"""
+    hot = (
+        select(
+            ShiftAssignment.user_id, ShiftAssignment.is_cancelled,
+            Shift.date, Shift.completed_info
+        )
+        .join(Shift, Shift.id == ShiftAssignment.shift_id)
+    )
+    archived = (
+        select(
+            ShiftAssignmentArchive.user_id, ShiftAssignmentArchive.is_cancelled,
+            ShiftArchive.date, ShiftArchive.completed_info
+        )
+        .join(ShiftArchive, ShiftArchive.archive_id == ShiftAssignmentArchive.shift_archive_id)
+    )
+    return union_all(hot, archived)
+
+
+def _history_rows(date_from: datetime, date_to: datetime, tenant_id: int):
+    """Строки выгрузки истории команды за период (рабочие + архив)"""
+    def rows(shift, assignment, join_condition):
+        return (
+            select(
+                shift.id.label("shift_id"), shift.date.label("shift_date"), shift.description,
+                shift.is_active, shift.completed_info,
+                User.telegram_id, User.full_name, User.phone,
+                assignment.id.label("assignment_id"), assignment.created_at.label("signed_up_at"),
+                assignment.is_cancelled, assignment.cancelled_at,
+            )
+            .select_from(shift)
+            .outerjoin(assignment, join_condition)
+            .outerjoin(User, User.id == assignment.user_id)
+            .where(shift.tenant_id == tenant_id, shift.date >= date_from, shift.date < date_to)
+        )
+
+    return union_all(
+        rows(Shift, ShiftAssignment, ShiftAssignment.shift_id == Shift.id),
+        rows(ShiftArchive, ShiftAssignmentArchive, ShiftAssignmentArchive.shift_archive_id == ShiftArchive.archive_id),
+    ).subquery()
+
+
+# ==================== SHIFT HISTORY EXPORT ====================
+
+# Колонки выгрузки истории: смена x участник x статус записи
+HISTORY_EXPORT_COLUMNS = (
+    "shift_id", "shift_date", "description", "is_active", "completed_info",
+    "telegram_id", "full_name", "phone", "signed_up_at", "is_cancelled", "cancelled_at",
+)
+
+
+async def count_shift_history(
+    db: AsyncSession, date_from: datetime, date_to: datetime, tenant_id: int = DEFAULT_TENANT_ID
+) -> int:
+    """Число строк выгрузки истории команды за период [date_from, date_to)"""
+    result = await db.execute(select(func.count()).select_from(_history_rows(date_from, date_to, tenant_id)))
+    return result.scalar()
+
+
+async def stream_shift_history(
+    db: AsyncSession,
+    date_from: datetime,
+    date_to: datetime,
+    chunk_size: int = BULK_CHUNK_SIZE,
+    tenant_id: int = DEFAULT_TENANT_ID,
+) -> AsyncIterator[List[Row]]:
+    """
+    Потоковая выгрузка истории смен команды за период [date_from, date_to) пакетами строк.
+
+    Одна строка - одна запись на смену (включая отменённые); смены без
+    участников попадают в выгрузку одной строкой с пустыми полями участника.
+    Архивные смены выгружаются наравне с рабочими.
+    """
+    history = _history_rows(date_from, date_to, tenant_id)
+    result = await db.stream(
+        select(*(history.c[name] for name in HISTORY_EXPORT_COLUMNS))
+        .order_by(history.c.shift_date, history.c.shift_id, history.c.assignment_id)
+        .execution_options(yield_per=chunk_size)
+    )
+    async for partition in result.partitions():
+        yield partition
+
+
+# ==================== ARCHIVE ====================
+
+ARCHIVE_BATCH_SIZE = 50
+
+
+async def archive_shifts_batch(db: AsyncSession, older_than: datetime, batch_size: int = ARCHIVE_BATCH_SIZE) -> Tuple[int, int]:
+    """
+    Перенос одной пачки смен с датой до older_than (вместе с записями) в архив.
+
+    Пачка переносится одной короткой транзакцией. Возвращает (число смен,
+    число записей); (0, 0) - переносить больше нечего.
+    """
+    shifts = (await db.execute(
+        select(
+            Shift.id, Shift.tenant_id, Shift.date, Shift.description, Shift.completed_info,
+            Shift.capacity, Shift.template_id, Shift.is_active, Shift.created_at
+        )
+        .where(Shift.date < older_than)
+        .order_by(Shift.id)
+        .limit(batch_size)
+    )).all()
+    if not shifts:
+        return 0, 0
+    shift_ids = [shift.id for shift in shifts]
+    now = datetime.utcnow()
+
+    archived = await db.execute(
+        insert(ShiftArchive)
+        .values([{**shift._asdict(), "archived_at": now} for shift in shifts])
+        .returning(ShiftArchive.archive_id, ShiftArchive.id)
+    )
+    archive_ids = {shift_id: archive_id for archive_id, shift_id in archived}
+
+    assignments = (await db.execute(
+        select(
+            ShiftAssignment.id, ShiftAssignment.shift_id, ShiftAssignment.user_id,
+            ShiftAssignment.created_at, ShiftAssignment.is_cancelled, ShiftAssignment.cancelled_at
+        )
+        .where(ShiftAssignment.shift_id.in_(shift_ids))
+    )).all()
+    if assignments:
+        await db.execute(insert(ShiftAssignmentArchive).values([
+            {**assignment._asdict(), "shift_archive_id": archive_ids[assignment.shift_id]}
+            for assignment in assignments
+        ]))
+        await db.execute(delete(ShiftAssignment).where(ShiftAssignment.shift_id.in_(shift_ids)))
+    await db.execute(delete(Shift).where(Shift.id.in_(shift_ids)))
+    mark_shifts_changed(db)
+    await db.commit()
+    return len(shifts), len(assignments)
 
 
 # ==================== SHIFT ASSIGNMENT CRUD ====================
 
 async def assign_user_to_shift(db: AsyncSession, telegram_id: int, shift_id: int) -> Optional[ShiftAssignment]:
-    """Запись пользователя на смену"""
-    user = await get_user_by_telegram_id(db, telegram_id)
+    """
+    Запись пользователя на смену своей команды.
+
+    Проверка мест и повторной записи выполняется в том же INSERT ... SELECT,
+    что и вставка: две одновременные записи не переполнят смену. Строка смены
+    блокируется до конца транзакции (в PostgreSQL; SQLite и так выполняет
+    записи по одной).
+    """
+    user = await get_user_status(db, telegram_id)
     if not user:
         return None
-    
-    # Проверка, не записан ли уже
-    existing = await db.execute(
-        select(ShiftAssignment).where(
-            ShiftAssignment.user_id == user.id,
-            ShiftAssignment.shift_id == shift_id,
+    user_id = user.id
+    await db.execute(
+        select(Shift.id).where(Shift.id == shift_id, Shift.tenant_id == user.tenant_id).with_for_update()
+    )
+    signups = (
+        select(func.count(ShiftAssignment.id))
+        .where(ShiftAssignment.shift_id == Shift.id, ShiftAssignment.is_cancelled == False)
+        .scalar_subquery()
+    )
+    already_signed_up = (
+        select(ShiftAssignment.id)
+        .where(
+            ShiftAssignment.user_id == user_id,
+            ShiftAssignment.shift_id == Shift.id,
             ShiftAssignment.is_cancelled == False
         )
+        .exists()
+    )
+    source = select(literal(user_id), Shift.id, literal(datetime.utcnow()), literal(False)).where(
+        Shift.id == shift_id,
+        Shift.tenant_id == user.tenant_id,  # Смена другой команды не подходит
+        ~already_signed_up,
+        (Shift.capacity == None) | (signups < Shift.capacity)  # Места остались
     )
-    if existing.scalar_one_or_none():
-        return None  # Уже записан
+    assignment = (await db.scalars(
+        insert(ShiftAssignment)
+        .from_select(["user_id", "shift_id", "created_at", "is_cancelled"], source)
+        .returning(ShiftAssignment)
+    )).one_or_none()
+    if assignment is None:
+        await db.commit()  # Снятие блокировки строки смены
+        return None  # Смены нет, уже записан или мест не осталось
     
-    assignment = ShiftAssignment(user_id=user.id, shift_id=shift_id)
-    db.add(assignment)
+    completed_at = await _completed_shift_date(db, shift_id)
+    await _bump_user_stats(
+        db, [user_id], signups=1,
+        shifts_worked=1 if completed_at else 0, worked_at=completed_at
+    )
     await db.commit()
     await db.refresh(assignment)
-    await db.refresh(user)
     return assignment
 
 
+async def count_shift_signups(db: AsyncSession, shift_id: int) -> int:
+    """Число действующих записей на смену"""
+    return await db.scalar(
+        select(func.count(ShiftAssignment.id)).where(
+            ShiftAssignment.shift_id == shift_id,
+            ShiftAssignment.is_cancelled == False
+        )
+    )
+
+
 async def cancel_shift_assignment(db: AsyncSession, telegram_id: int, shift_id: int) -> bool:
     """Отмена записи на смену"""
-    user = await get_user_by_telegram_id(db, telegram_id)
-    if not user:
+    user_id = await get_user_id(db, telegram_id)
+    if not user_id:
         return False
     
     result = await db.execute(
         select(ShiftAssignment).where(
-            ShiftAssignment.user_id == user.id,
+            ShiftAssignment.user_id == user_id,
             ShiftAssignment.shift_id == shift_id,
             ShiftAssignment.is_cancelled == False
         )
@@ -155,6 +910,11 @@ async def cancel_shift_assignment(db: AsyncSession, telegram_id: int, shift_id:
     if assignment:
         assignment.is_cancelled = True
         assignment.cancelled_at = datetime.utcnow()
+        completed_at = await _completed_shift_date(db, shift_id)
+        await _bump_user_stats(
+            db, [user_id], cancellations=1,
+            shifts_worked=-1 if completed_at else 0, worked_at=completed_at
+        )
         await db.commit()
         return True
     return False
@@ -162,8 +922,8 @@ async def cancel_shift_assignment(db: AsyncSession, telegram_id: int, shift_id:
 
 async def get_user_shifts(db: AsyncSession, telegram_id: int, only_future: bool = True) -> List[Shift]:
     """Получение смен пользователя"""
-    user = await get_user_by_telegram_id(db, telegram_id)
-    if not user:
+    user_id = await get_user_id(db, telegram_id)
+    if not user_id:
         return []
     
     # Используем подзапрос для получения ID смен, на которые записан пользователь
@@ -172,7 +932,7 @@ async def get_user_shifts(db: AsyncSession, telegram_id: int, only_future: bool
     assignment_query = (
         select(ShiftAssignment.shift_id)
         .where(
-            ShiftAssignment.user_id == user.id,
+            ShiftAssignment.user_id == user_id,
             ShiftAssignment.is_cancelled == False
         )
     )
@@ -190,31 +950,165 @@ async def get_user_shifts(db: AsyncSession, telegram_id: int, only_future: bool
 
 # ==================== SETTINGS CRUD ====================
 
-async def get_setting(db: AsyncSession, key: str) -> Optional[str]:
-    """Получение настройки"""
-    result = await db.execute(select(Settings).where(Settings.key == key))
-    setting = result.scalar_one_or_none()
-    return setting.value if setting else None
+async def get_setting(db: AsyncSession, key: str, tenant_id: int = DEFAULT_TENANT_ID) -> Optional[str]:
+    """Получение настройки команды (из кэша настроек, см. database/tenants.py)"""
+    return await tenant_settings.get(db, tenant_id, key)
 
 
-async def set_setting(db: AsyncSession, key: str, value: str) -> Settings:
-    """Установка настройки"""
-    result = await db.execute(select(Settings).where(Settings.key == key))
-    setting = result.scalar_one_or_none()
-    
-    if setting:
-        setting.value = value
-        setting.updated_at = datetime.utcnow()
-    else:
-        setting = Settings(key=key, value=value)
-        db.add(setting)
-    
+async def set_setting(db: AsyncSession, key: str, value: str, tenant_id: int = DEFAULT_TENANT_ID) -> Row:
+    """Установка настройки команды (INSERT ... ON CONFLICT DO UPDATE ... RETURNING key, value)"""
+    statement = _upsert_insert(db, Settings).values(
+        tenant_id=tenant_id, key=key, value=value, updated_at=datetime.utcnow()
+    )
+    statement = statement.on_conflict_do_update(
+        index_elements=[Settings.tenant_id, Settings.key],
+        set_={"value": statement.excluded.value, "updated_at": statement.excluded.updated_at}
+    ).returning(Settings.key, Settings.value)
+    result = await db.execute(statement)
+    setting = result.one()
     await db.commit()
-    await db.refresh(setting)
+    tenant_settings.invalidate()
     return setting
 
 
+# ==================== TENANTS ====================
+
+async def create_tenant(db: AsyncSession, slug: str, name: str) -> Row:
+    """Создание команды (INSERT ... RETURNING id, slug, name)"""
+    result = await db.execute(insert(Tenant).values(slug=slug, name=name).returning(Tenant.id, Tenant.slug, Tenant.name))
+    tenant = result.one()
+    await db.commit()
+    return tenant
+
+
+async def get_tenant(db: AsyncSession, tenant_id: int) -> Optional[Tenant]:
+    """Команда по ID"""
+    return await db.get(Tenant, tenant_id)
+
+
+async def get_tenant_by_slug(db: AsyncSession, slug: str) -> Optional[Tenant]:
+    """Команда по коду из пригласительной ссылки"""
+    result = await db.execute(select(Tenant).where(Tenant.slug == slug))
+    return result.scalar_one_or_none()
+
+
+async def get_tenants_with_counts(db: AsyncSession) -> List[Row]:
+    """Все команды с числом зарегистрированных сотрудников: строки (Tenant, users)"""
+    users = (
+        select(func.count(User.id))
+        .where(User.tenant_id == Tenant.id, User.is_registered == True)
+        .scalar_subquery()
+    )
+    result = await db.execute(select(Tenant, users).order_by(Tenant.id))
+    return list(result.all())
+
+
 async def get_all_registered_users_for_broadcast(db: AsyncSession) -> List[User]:
-    """Получение всех зарегистрированных пользователей для рассылки"""
-    return await get_all_users(db, is_registered=True)
+    """Получение всех зарегистрированных пользователей всех команд для рассылки"""
+    return await get_all_users(db, is_registered=True, tenant_id=None)
+
 
+# ==================== BROADCASTS ====================
+
+BROADCAST_PAGE_SIZE = 500
+
+# Получатели рассылок: зарегистрированные и не заблокировавшие бота
+_BROADCAST_RECIPIENT = (User.is_registered == True) & (User.is_blocked == False)
+
+
+async def count_broadcast_recipients(db: AsyncSession, tenant_id: int = DEFAULT_TENANT_ID) -> int:
+    """Число получателей рассылки команды в личные сообщения"""
+    result = await db.execute(select(func.count(User.id)).where(_BROADCAST_RECIPIENT, User.tenant_id == tenant_id))
+    return result.scalar()
+
+
+async def get_broadcast_recipients_page(
+    db: AsyncSession, after_user_id: int = 0, limit: int = BROADCAST_PAGE_SIZE, tenant_id: int = DEFAULT_TENANT_ID
+) -> List[Row]:
+    """Страница получателей рассылки команды после users.id = after_user_id: строки (id, telegram_id)"""
+    result = await db.execute(
+        select(User.id, User.telegram_id)
+        .where(_BROADCAST_RECIPIENT, User.tenant_id == tenant_id, User.id > after_user_id)
+        .order_by(User.id)
+        .limit(limit)
+    )
+    return list(result.all())
+
+
+async def create_broadcast(
+    db: AsyncSession, created_by: int, from_chat_id: int, message_id: int, total: int
+) -> Row:
+    """Создание записи о рассылке (INSERT ... RETURNING id)"""
+    result = await db.execute(
+        insert(Broadcast)
+        .values(created_by=created_by, from_chat_id=from_chat_id, message_id=message_id, total=total)
+        .returning(Broadcast.id)
+    )
+    broadcast = result.one()
+    await db.commit()
+    return broadcast
+
+
+async def record_broadcast_page(
+    db: AsyncSession, broadcast_id: int, outcomes: Dict[int, str], last_user_id: int
+):
+    """
+    Запись результатов страницы рассылки одной транзакцией.
+
+    outcomes - {users.id: "sent" | "blocked" | "failed"}. Заблокировавшие
+    бота помечаются is_blocked и в следующие рассылки не попадают. Счётчики
+    рассылки увеличиваются только по новым записям журнала: повторная запись
+    той же страницы (после сбоя) не учитывает пользователей дважды.
+    """
+    inserted: List[Row] = []
+    if outcomes:
+        statement = _upsert_insert(db, BroadcastDelivery).values([
+            {"broadcast_id": broadcast_id, "user_id": user_id, "status": status, "created_at": datetime.utcnow()}
+            for user_id, status in outcomes.items()
+        ])
+        inserted = (await db.execute(
+            statement.on_conflict_do_nothing().returning(BroadcastDelivery.user_id, BroadcastDelivery.status)
+        )).all()
+    blocked = [user_id for user_id, status in inserted if status == "blocked"]
+    if blocked:
+        await db.execute(update(User).where(User.id.in_(blocked)).values(is_blocked=True))
+    counts = {status: sum(1 for _, value in inserted if value == status) for status in ("sent", "blocked", "failed")}
+    await db.execute(
+        update(Broadcast)
+        .where(Broadcast.id == broadcast_id)
+        .values(
+            sent=Broadcast.sent + counts["sent"],
+            blocked=Broadcast.blocked + counts["blocked"],
+            failed=Broadcast.failed + counts["failed"],
+            last_user_id=last_user_id,
+        )
+    )
+    await db.commit()
+
+
+async def set_broadcast_status(db: AsyncSession, broadcast_id: int, status: str):
+    """Изменение статуса рассылки (для завершённых фиксируется время окончания)"""
+    values = {"status": status}
+    if status in ("finished", "cancelled", "interrupted"):
+        values["finished_at"] = datetime.utcnow()
+    await db.execute(update(Broadcast).where(Broadcast.id == broadcast_id).values(**values))
+    await db.commit()
+
+
+async def interrupt_unfinished_broadcasts(db: AsyncSession) -> int:
+    """Пометка рассылок, прерванных перезапуском бота. Возвращает их число"""
+    result = await db.execute(
+        update(Broadcast)
+        .where(Broadcast.status.in_(("running", "paused")))
+        .values(status="interrupted", finished_at=datetime.utcnow())
+    )
+    await db.commit()
+    return result.rowcount
+
+
+async def mark_users_blocked(db: AsyncSession, telegram_ids: List[int]):
+    """Пометка пользователей, заблокировавших бота"""
+    if not telegram_ids:
+        return
+    await db.execute(update(User).where(User.telegram_id.in_(telegram_ids)).values(is_blocked=True))
+    await db.commit()
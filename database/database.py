@@ -1,12 +1,24 @@
 from contextlib import asynccontextmanager
 
+from sqlalchemy import event
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
-from sqlalchemy.orm import declarative_base
+from sqlalchemy.orm import declarative_base, Session, ORMExecuteState
 from config import Config
 
 # Создание движка базы данных
 engine = create_async_engine(Config.DATABASE_URL, echo=False, future=True)
 
+if engine.dialect.name == "sqlite":
+    @event.listens_for(engine.sync_engine, "connect")
+    def _sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        # Для новой БД действует сразу; существующую переводит миграция 6
+        cursor.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        # WAL: чтение (в том числе резервное копирование) не блокирует запись
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.close()
+
 # Создание сессии
 AsyncSessionLocal = async_sessionmaker(
     engine, class_=AsyncSession, expire_on_commit=False
@@ -14,26 +26,37 @@ AsyncSessionLocal = async_sessionmaker(
 
 
 async def init_db():
-    """Инициализация базы данных (создание таблиц и обновление схемы)"""
-    from database.models import Base
-    from sqlalchemy import text
-
-    async with engine.begin() as conn:
-        # Создаем все таблицы
-        await conn.run_sync(Base.metadata.create_all)
-        
-        # Пытаемся добавить поле completed_info, если его нет (для существующих БД)
-        # Игнорируем ошибку, если поле уже существует
-        try:
-            await conn.execute(text('ALTER TABLE shifts ADD COLUMN completed_info TEXT'))
-            print("✅ Поле completed_info добавлено в таблицу shifts")
-        except Exception as e:
-            # Ошибка ожидаема, если поле уже существует или таблицы нет
-            error_msg = str(e).lower()
-            if 'duplicate column' in error_msg or 'already exists' in error_msg or 'no such table' in error_msg:
-                pass  # Поле уже существует или таблица не создана (будет создана выше)
-            else:
-                print(f"⚠️ Предупреждение при обновлении схемы БД: {e}")
+    """Инициализация базы данных (создание таблиц и обновление схемы по версиям)"""
+    from database.migrations import upgrade_schema
+
+    await upgrade_schema(engine)
+
+# ==================== ОТСЛЕЖИВАНИЕ ЗАПИСИ ====================
+# Сессия помечается флагом has_writes, когда в ней появились незафиксированные
+# изменения (flush ORM-объектов или INSERT/UPDATE/DELETE). Флаг сбрасывается
+# после COMMIT/ROLLBACK, поэтому сессии только для чтения не выполняют COMMIT.
+
+@event.listens_for(Session, "after_flush")
+def _mark_flush(session: Session, flush_context):
+    session.info["has_writes"] = True
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _mark_dml(orm_execute_state: ORMExecuteState):
+    if not orm_execute_state.is_select:
+        orm_execute_state.session.info["has_writes"] = True
+
+
+@event.listens_for(Session, "after_commit")
+@event.listens_for(Session, "after_rollback")
+def _reset_writes(session: Session):
+    session.info["has_writes"] = False
+
+
+def has_pending_writes(session: AsyncSession) -> bool:
+    """Есть ли в сессии незафиксированные изменения"""
+    return bool(session.info.get("has_writes")) or bool(session.new or session.dirty or session.deleted)
+
 
 @asynccontextmanager
 async def get_session() -> AsyncSession:
@@ -41,7 +64,8 @@ async def get_session() -> AsyncSession:
     async with AsyncSessionLocal() as session:
         try:
             yield session
-            await session.commit()
+            if has_pending_writes(session):
+                await session.commit()
         except Exception:
             await session.rollback()
             raise
@@ -0,0 +1,128 @@
+"""
+Готовые запросы для горячих путей CRUD.
+
+Конструкции select(...) собираются один раз при импорте модуля и
+переиспользуются с параметрами через bindparam, поэтому на каждый вызов не
+строится новое дерево выражений, а скомпилированный SQL берётся из кэша
+движка по стабильному ключу.
+
+Запросы с суффиксом _ROW(S) возвращают кортежи из нескольких колонок вместо
+ORM-объектов: без identity map, без загрузки связей и без лишних полей.
+Их стоит использовать, когда вызывающему коду нужны только эти колонки.
+
+Выборки списков ограничены командой (параметр tenant_id, см. database/tenants.py).
+"""
+import logging
+from datetime import datetime
+
+from sqlalchemy import bindparam, select
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from sqlalchemy.orm import selectinload
+
+from database.models import User, Shift, ShiftAssignment, Settings, UserDay
+
+
+logger = logging.getLogger(__name__)
+
+
+# ==================== ПОЛЬЗОВАТЕЛИ ====================
+
+USER_BY_TELEGRAM_ID = select(User).where(User.telegram_id == bindparam("telegram_id"))
+
+# (id, is_registered, is_blocked, tenant_id) - для проверки регистрации и поиска внутреннего ID
+USER_STATUS_ROW = (
+    select(User.id, User.is_registered, User.is_blocked, User.tenant_id)
+    .where(User.telegram_id == bindparam("telegram_id"))
+)
+
+# Команда пользователя
+USER_TENANT = select(User.tenant_id).where(User.telegram_id == bindparam("telegram_id"))
+
+# Telegram ID зарегистрированных пользователей команды с заданным предпочитаемым днём (кроме заблокировавших бота)
+REGISTERED_TELEGRAM_IDS_BY_DAY = (
+    select(User.telegram_id)
+    .join(UserDay, UserDay.user_id == User.id)
+    .where(
+        UserDay.day == bindparam("day"), User.tenant_id == bindparam("tenant_id"),
+        User.is_registered == True, User.is_blocked == False
+    )
+)
+
+
+# ==================== СМЕНЫ ====================
+
+SHIFT_BY_ID = (
+    select(Shift)
+    .where(Shift.id == bindparam("shift_id"), Shift.tenant_id == bindparam("tenant_id"))
+    .options(selectinload(Shift.assignments).selectinload(ShiftAssignment.user))
+)
+
+# (id, date, description, completed_info) - карточка смены команды без участников
+SHIFT_CARD_ROW = (
+    select(Shift.id, Shift.date, Shift.description, Shift.completed_info, Shift.capacity)
+    .where(Shift.id == bindparam("shift_id"), Shift.tenant_id == bindparam("tenant_id"))
+)
+
+ACTIVE_SHIFTS = (
+    select(Shift)
+    .where(Shift.tenant_id == bindparam("tenant_id"), Shift.is_active == True)
+    .order_by(Shift.date)
+    .options(selectinload(Shift.assignments))
+)
+
+ACTIVE_SHIFTS_FROM = (
+    select(Shift)
+    .where(Shift.tenant_id == bindparam("tenant_id"), Shift.is_active == True, Shift.date >= bindparam("from_date"))
+    .order_by(Shift.date)
+    .options(selectinload(Shift.assignments))
+)
+
+# (id, date) - для списков смен и клавиатур
+ACTIVE_SHIFT_ROWS = (
+    select(Shift.id, Shift.date)
+    .where(Shift.tenant_id == bindparam("tenant_id"), Shift.is_active == True)
+    .order_by(Shift.date)
+)
+
+ACTIVE_SHIFT_ROWS_FROM = (
+    select(Shift.id, Shift.date)
+    .where(Shift.tenant_id == bindparam("tenant_id"), Shift.is_active == True, Shift.date >= bindparam("from_date"))
+    .order_by(Shift.date)
+)
+
+
+# ==================== НАСТРОЙКИ ====================
+
+# (key, value) - все настройки команды (кэш настроек, см. database/tenants.py)
+TENANT_SETTING_ROWS = select(Settings.key, Settings.value).where(Settings.tenant_id == bindparam("tenant_id"))
+
+# (tenant_id, key, value) - настройки со списками ID чатов и администраторов всех команд
+ID_SETTING_ROWS = (
+    select(Settings.tenant_id, Settings.key, Settings.value)
+    .where(Settings.key.in_(bindparam("keys", expanding=True)))
+)
+
+
+# Запросы и параметры для прогрева кэша компиляции при запуске
+WARMUP_QUERIES = [
+    (USER_BY_TELEGRAM_ID, {"telegram_id": 0}),
+    (USER_STATUS_ROW, {"telegram_id": 0}),
+    (USER_TENANT, {"telegram_id": 0}),
+    (REGISTERED_TELEGRAM_IDS_BY_DAY, {"day": "", "tenant_id": 0}),
+    (SHIFT_BY_ID, {"shift_id": 0, "tenant_id": 0}),
+    (SHIFT_CARD_ROW, {"shift_id": 0, "tenant_id": 0}),
+    (ACTIVE_SHIFTS, {"tenant_id": 0}),
+    (ACTIVE_SHIFTS_FROM, {"tenant_id": 0, "from_date": datetime.max}),
+    (ACTIVE_SHIFT_ROWS, {"tenant_id": 0}),
+    (ACTIVE_SHIFT_ROWS_FROM, {"tenant_id": 0, "from_date": datetime.max}),
+    (TENANT_SETTING_ROWS, {"tenant_id": 0}),
+    (ID_SETTING_ROWS, {"keys": [""]}),
+]
+
+
+async def warm_hot_queries(session_factory: async_sessionmaker):
+    """Прогрев кэша скомпилированных запросов (выполняется один раз при запуске)"""
+    async with session_factory() as session:
+        for statement, params in WARMUP_QUERIES:
+            await session.execute(statement, params)
+    logger.info(f"Прогрето запросов: {len(WARMUP_QUERIES)}")
@@ -0,0 +1,200 @@
+"""
+Обслуживание БД: онлайн-резервные копии, статистика планировщика, освобождение места.
+
+Все операции рассчитаны на работу при запущенном боте:
+
+- резервная копия снимается через SQLite backup API по BACKUP_STEP_PAGES
+  страниц за шаг в отдельном потоке. Шаг читает исходную БД (в режиме WAL
+  чтение не мешает записи), блокировка записи на исходную БД не берётся;
+  копия пишется во временный файл и переименовывается только после проверки;
+- ANALYZE выполняется с ограничением PRAGMA analysis_limit, поэтому
+  транзакция записи статистики короткая; PRAGMA optimize сам решает, каким
+  таблицам нужен пересчёт;
+- место после удаления строк (перенос в архив) возвращается через
+  PRAGMA incremental_vacuum по VACUUM_STEP_PAGES страниц за транзакцию с
+  паузой между шагами.
+
+Резервные копии и incremental vacuum поддерживаются только для SQLite; для
+PostgreSQL выполняется только ANALYZE (копии - средствами pg_dump).
+"""
+import asyncio
+import logging
+import os
+import sqlite3
+import time
+from datetime import datetime
+from typing import List, NamedTuple, Optional
+
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from config import Config
+
+
+logger = logging.getLogger(__name__)
+
+# Страниц за один шаг резервного копирования и пауза между шагами, секунд
+BACKUP_STEP_PAGES = 256
+BACKUP_STEP_PAUSE = 0.005
+
+# Строк на индекс при ANALYZE (0 - без ограничения)
+ANALYSIS_LIMIT = 1000
+
+# Страниц за одну транзакцию incremental vacuum и пауза между транзакциями, секунд
+VACUUM_STEP_PAGES = 128
+VACUUM_STEP_PAUSE = 0.05
+
+BACKUP_PREFIX = "staff_bot_"
+BACKUP_SUFFIX = ".db"
+
+
+class BackupResult(NamedTuple):
+    path: str
+    size: int
+    pages: int
+    seconds: float
+
+
+class VacuumResult(NamedTuple):
+    pages: int
+    steps: int
+    max_step_ms: float
+
+
+def is_sqlite(engine: AsyncEngine) -> bool:
+    return engine.dialect.name == "sqlite"
+
+
+def sqlite_path(engine: AsyncEngine) -> Optional[str]:
+    """Путь к файлу SQLite (None для других СУБД и БД в памяти)"""
+    if not is_sqlite(engine):
+        return None
+    database = engine.url.database
+    if not database or database == ":memory:":
+        return None
+    return os.path.abspath(database)
+
+
+def backup_dir(engine: AsyncEngine) -> str:
+    """Каталог резервных копий: BACKUP_DIR или backups/ рядом с файлом БД"""
+    if Config.BACKUP_DIR:
+        return Config.BACKUP_DIR
+    return os.path.join(os.path.dirname(sqlite_path(engine) or os.path.abspath(".")), "backups")
+
+
+# ==================== РЕЗЕРВНЫЕ КОПИИ ====================
+
+def _copy_database(source_path: str, target_path: str) -> int:
+    """Постраничное копирование БД (выполняется в отдельном потоке)"""
+    pages = 0
+
+    def progress(status, remaining, total):
+        nonlocal pages
+        pages = total
+
+    source = sqlite3.connect(source_path)
+    target = sqlite3.connect(target_path)
+    try:
+        source.backup(target, pages=BACKUP_STEP_PAGES, progress=progress, sleep=BACKUP_STEP_PAUSE)
+        if target.execute("PRAGMA quick_check").fetchone()[0] != "ok":
+            raise sqlite3.DatabaseError("Резервная копия не прошла PRAGMA quick_check")
+    finally:
+        target.close()
+        source.close()
+    return pages
+
+
+async def backup_database(engine: AsyncEngine, keep: int = Config.BACKUP_KEEP) -> BackupResult:
+    """
+    Онлайн-копия SQLite в каталог резервных копий.
+
+    После успешной копии удаляются старые копии сверх keep (0 - не удалять).
+    """
+    source_path = sqlite_path(engine)
+    if source_path is None:
+        raise RuntimeError("Резервное копирование поддерживается только для файла SQLite")
+
+    directory = backup_dir(engine)
+    os.makedirs(directory, exist_ok=True)
+    name = f"{BACKUP_PREFIX}{datetime.now().strftime('%Y%m%d_%H%M%S')}{BACKUP_SUFFIX}"
+    path = os.path.join(directory, name)
+    temp_path = path + ".part"
+
+    started = time.monotonic()
+    try:
+        pages = await asyncio.to_thread(_copy_database, source_path, temp_path)
+        os.replace(temp_path, path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+    result = BackupResult(path, os.path.getsize(path), pages, time.monotonic() - started)
+    logger.info(f"Резервная копия БД: {path} ({result.size} байт, {result.seconds:.1f} с)")
+
+    if keep:
+        for old_path in list_backups(engine)[keep:]:
+            os.remove(old_path)
+            logger.info(f"Удалена старая резервная копия: {old_path}")
+    return result
+
+
+def list_backups(engine: AsyncEngine) -> List[str]:
+    """Резервные копии, от новых к старым"""
+    directory = backup_dir(engine)
+    if not os.path.isdir(directory):
+        return []
+    names = [
+        name for name in os.listdir(directory)
+        if name.startswith(BACKUP_PREFIX) and name.endswith(BACKUP_SUFFIX)
+    ]
+    return [os.path.join(directory, name) for name in sorted(names, reverse=True)]
+
+
+# ==================== СТАТИСТИКА И МЕСТО ====================
+
+async def analyze_database(engine: AsyncEngine, full: bool = False):
+    """
+    Обновление статистики планировщика запросов.
+
+    full=True - ANALYZE всех таблиц (после добавления индексов), иначе
+    PRAGMA optimize пересчитывает статистику только там, где она устарела.
+    """
+    async with engine.connect() as conn:
+        if not is_sqlite(engine):
+            await conn.exec_driver_sql("ANALYZE")
+            await conn.commit()
+            return
+        await conn.exec_driver_sql(f"PRAGMA analysis_limit={ANALYSIS_LIMIT}")
+        await conn.exec_driver_sql("ANALYZE" if full else "PRAGMA optimize")
+        await conn.commit()
+
+
+async def incremental_vacuum(engine: AsyncEngine) -> VacuumResult:
+    """
+    Возврат свободных страниц файлу БД короткими транзакциями.
+
+    Работает, если БД в режиме auto_vacuum=INCREMENTAL (см. миграцию 6).
+    """
+    if not is_sqlite(engine):
+        return VacuumResult(0, 0, 0.0)
+
+    pages = steps = 0
+    max_step = 0.0
+    async with engine.connect() as conn:
+        # Прагма освобождает по странице на каждый шаг выполнения запроса, а
+        # execute() делает только один шаг; executescript выполняет её целиком
+        driver_connection = (await conn.get_raw_connection()).driver_connection
+        while True:
+            free_pages = (await conn.exec_driver_sql("PRAGMA freelist_count")).scalar()
+            if not free_pages:
+                break
+            started = time.monotonic()
+            await driver_connection.executescript(f"PRAGMA incremental_vacuum({VACUUM_STEP_PAGES});")
+            max_step = max(max_step, time.monotonic() - started)
+            left = (await conn.exec_driver_sql("PRAGMA freelist_count")).scalar()
+            if left >= free_pages:
+                break  # auto_vacuum выключен: страницы не освобождаются
+            pages += free_pages - left
+            steps += 1
+            await asyncio.sleep(VACUUM_STEP_PAUSE)
+    if pages:
+        logger.info(f"Incremental vacuum: освобождено страниц {pages} за {steps} шаг(ов)")
+    return VacuumResult(pages, steps, round(max_step * 1000, 1))
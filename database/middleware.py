@@ -0,0 +1,65 @@
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from database.database import has_pending_writes
+from database.models import DEFAULT_TENANT_ID
+from database.tenants import resolve_tenant
+from runtime.logs import log_context
+
+
+class DbSessionMiddleware(BaseMiddleware):
+    """
+    Одна сессия БД на обновление.
+
+    Сессия передаётся обработчикам в аргументе db. Она ленивая: соединение
+    берётся из пула только при первом запросе, поэтому обновления, которым
+    БД не нужна, к ней не обращаются. После обработчика изменения фиксируются
+    только если что-то было записано; сессии только для чтения закрываются
+    без COMMIT.
+    """
+
+    def __init__(self, session_factory: async_sessionmaker):
+        self.session_factory = session_factory
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        async with self.session_factory() as session:
+            data["db"] = session
+            result = await handler(event, data)
+            if has_pending_writes(session):
+                await session.commit()
+            return result
+
+
+class TenantMiddleware(BaseMiddleware):
+    """
+    Команда обновления (см. database/tenants.py).
+
+    Передаётся обработчикам в аргументе tenant_id и попадает в поля лога.
+    Регистрируется после DbSessionMiddleware (если команды нет в кэше, она
+    читается в сессии обновления) и BotProfileMiddleware (команда бота).
+    """
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        profile = data.get("bot_profile")
+        tenant_id = await resolve_tenant(
+            data["db"], data.get("event_chat"), data.get("event_from_user"),
+            profile.tenant_id if profile else DEFAULT_TENANT_ID
+        )
+        data["tenant_id"] = tenant_id
+        context = log_context.get()
+        if context is not None:
+            context["tenant_id"] = tenant_id
+        return await handler(event, data)
@@ -0,0 +1,369 @@
+"""
+Версионированные обновления схемы БД.
+
+Каждая миграция - пронумерованная асинхронная функция, которая получает движок
+и приводит схему к своей версии. Применённые версии записываются в таблицу
+schema_version. При совпадении версии запуск бота ограничивается одним запросом
+SELECT max(version).
+
+Миграции должны быть идемпотентными: версия фиксируется только после успешного
+завершения, поэтому прерванная миграция будет выполнена повторно целиком.
+Заполнение данных (backfill) выполняется пакетами в отдельных транзакциях через
+backfill_in_batches, чтобы не блокировать запись надолго.
+
+Новая миграция добавляется в конец файла:
+
+    @migration(2, "Описание изменения")
+    async def _add_something(engine: AsyncEngine):
+        async with engine.begin() as conn:
+            await add_column_if_missing(conn, "users", "something", "TEXT")
+"""
+import asyncio
+import logging
+from typing import Awaitable, Callable, List, NamedTuple, Optional
+
+from sqlalchemy import Index, bindparam, func, inspect, select, text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine
+
+from database.models import Base, SchemaVersion
+from database.phones import normalize_phone
+from database.search import USERS_FTS_BACKFILL, USERS_FTS_DDL, USERS_FTS_TABLE
+
+
+logger = logging.getLogger(__name__)
+
+BACKFILL_BATCH_SIZE = 1000
+
+
+class Migration(NamedTuple):
+    version: int
+    description: str
+    upgrade: Callable[[AsyncEngine], Awaitable[None]]
+
+
+MIGRATIONS: List[Migration] = []
+
+
+def migration(version: int, description: str):
+    """Регистрация миграции (версии должны идти строго по возрастанию)"""
+    def decorator(func: Callable[[AsyncEngine], Awaitable[None]]):
+        if MIGRATIONS and version <= MIGRATIONS[-1].version:
+            raise ValueError(f"Версия миграции {version} должна быть больше {MIGRATIONS[-1].version}")
+        MIGRATIONS.append(Migration(version, description, func))
+        return func
+    return decorator
+
+
+def latest_version() -> int:
+    """Версия схемы, которую ожидает текущий код"""
+    return MIGRATIONS[-1].version if MIGRATIONS else 0
+
+
+# ==================== ВСПОМОГАТЕЛЬНЫЕ ФУНКЦИИ ====================
+
+async def _table_names(conn: AsyncConnection) -> List[str]:
+    return await conn.run_sync(lambda sync_conn: inspect(sync_conn).get_table_names())
+
+
+async def _column_names(conn: AsyncConnection, table: str) -> List[str]:
+    return await conn.run_sync(
+        lambda sync_conn: [column["name"] for column in inspect(sync_conn).get_columns(table)]
+    )
+
+
+async def add_column_if_missing(conn: AsyncConnection, table: str, column: str, ddl: str) -> bool:
+    """Добавление колонки, если её ещё нет. Возвращает True, если колонка добавлена"""
+    if column in await _column_names(conn, table):
+        return False
+    await conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}"))
+    logger.info(f"Колонка {table}.{column} добавлена")
+    return True
+
+
+async def create_table_if_missing(conn: AsyncConnection, table_name: str):
+    """Создание таблицы из моделей (вместе с её индексами), если её ещё нет"""
+    await conn.run_sync(lambda sync_conn: Base.metadata.tables[table_name].create(sync_conn, checkfirst=True))
+
+
+async def create_index_if_missing(conn: AsyncConnection, index: Index):
+    """Создание индекса, если его ещё нет"""
+    await conn.run_sync(lambda sync_conn: index.create(sync_conn, checkfirst=True))
+
+
+async def backfill_in_batches(
+    engine: AsyncEngine,
+    table: str,
+    set_clause: str,
+    where_clause: str,
+    batch_size: int = BACKFILL_BATCH_SIZE,
+    params: Optional[dict] = None,
+) -> int:
+    """
+    Пакетное заполнение данных: UPDATE ... WHERE id IN (... LIMIT batch_size).
+
+    where_clause должен отбирать только ещё не заполненные строки, иначе цикл
+    не завершится. Каждый пакет выполняется в своей короткой транзакции.
+    Возвращает общее число обновлённых строк.
+    """
+    statement = text(
+        f"UPDATE {table} SET {set_clause} "
+        f"WHERE id IN (SELECT id FROM {table} WHERE {where_clause} LIMIT :batch_size)"
+    )
+    total = 0
+    while True:
+        async with engine.begin() as conn:
+            result = await conn.execute(statement, {**(params or {}), "batch_size": batch_size})
+        total += result.rowcount
+        if result.rowcount < batch_size:
+            break
+        await asyncio.sleep(0)  # Даём поработать обработчикам между пакетами
+    if total:
+        logger.info(f"Заполнено строк в {table}: {total}")
+    return total
+
+
+# ==================== ЗАПУСК МИГРАЦИЙ ====================
+
+async def get_schema_version(engine: AsyncEngine) -> Optional[int]:
+    """Текущая версия схемы (None - таблица версий отсутствует)"""
+    try:
+        async with engine.connect() as conn:
+            result = await conn.execute(select(func.max(SchemaVersion.version)))
+            return result.scalar() or 0
+    except DBAPIError:
+        return None
+
+
+async def _stamp(conn: AsyncConnection, version: int, description: str):
+    await conn.execute(
+        SchemaVersion.__table__.insert().values(version=version, description=description)
+    )
+
+
+async def upgrade_schema(engine: AsyncEngine):
+    """Приведение схемы БД к последней версии"""
+    target = latest_version()
+    current = await get_schema_version(engine)
+    if current == target:
+        return
+
+    if current is None:
+        async with engine.begin() as conn:
+            existing_tables = await _table_names(conn)
+            if "users" not in existing_tables:
+                # Новая БД: создаём схему целиком и сразу помечаем последней версией
+                await conn.run_sync(Base.metadata.create_all)
+                await _stamp(conn, target, "Начальная схема")
+                logger.info(f"Создана новая схема БД (версия {target})")
+                return
+            # БД создана до появления версий: догоняем все миграции по порядку
+            await create_table_if_missing(conn, SchemaVersion.__tablename__)
+        current = 0
+
+    if current > target:
+        logger.warning(f"Версия схемы БД ({current}) новее, чем ожидает код ({target})")
+        return
+
+    for item in MIGRATIONS:
+        if item.version <= current:
+            continue
+        logger.info(f"Миграция {item.version}: {item.description}")
+        await item.upgrade(engine)
+        async with engine.begin() as conn:
+            await _stamp(conn, item.version, item.description)
+    logger.info(f"Схема БД обновлена до версии {target}")
+
+
+# ==================== МИГРАЦИИ ====================
+
+@migration(1, "Поле shifts.completed_info")
+async def _add_shift_completed_info(engine: AsyncEngine):
+    async with engine.begin() as conn:
+        await add_column_if_missing(conn, "shifts", "completed_info", "TEXT")
+
+
+@migration(2, "Таблица user_stats со статистикой пользователей")
+async def _add_user_stats(engine: AsyncEngine):
+    # Собственный запрос, а не rebuild_user_stats из crud: тот читает и архивные
+    # таблицы, которых на этой версии схемы ещё нет (они появятся в миграции 5)
+    async with engine.begin() as conn:
+        await create_table_if_missing(conn, "user_stats")
+        await conn.execute(text("DELETE FROM user_stats"))
+        await conn.execute(text(
+            "INSERT INTO user_stats (user_id, signups, cancellations, shifts_worked, last_worked_at, updated_at) "
+            "SELECT a.user_id, count(*), "
+            "sum(CASE WHEN a.is_cancelled THEN 1 ELSE 0 END), "
+            "sum(CASE WHEN NOT a.is_cancelled AND s.completed_info IS NOT NULL THEN 1 ELSE 0 END), "
+            "max(CASE WHEN NOT a.is_cancelled AND s.completed_info IS NOT NULL THEN s.date END), "
+            "CURRENT_TIMESTAMP "
+            "FROM shift_assignments a JOIN shifts s ON s.id = a.shift_id "
+            "GROUP BY a.user_id"
+        ))
+
+
+@migration(3, "Таблица user_days для выборки пользователей по дню недели")
+async def _add_user_days(engine: AsyncEngine):
+    async with engine.begin() as conn:
+        await create_table_if_missing(conn, "user_days")
+        # Прерванное заполнение начинается заново
+        await conn.execute(text("DELETE FROM user_days"))
+    
+    users = Base.metadata.tables["users"]
+    user_days = Base.metadata.tables["user_days"]
+    last_id = 0
+    while True:
+        async with engine.begin() as conn:
+            result = await conn.execute(
+                select(users.c.id, users.c.preferred_days)
+                .where(users.c.id > last_id)
+                .order_by(users.c.id)
+                .limit(BACKFILL_BATCH_SIZE)
+            )
+            batch = result.all()
+            values = [
+                {"user_id": user_id, "day": day}
+                for user_id, days in batch
+                for day in set(days or [])
+            ]
+            if values:
+                await conn.execute(user_days.insert(), values)
+        if len(batch) < BACKFILL_BATCH_SIZE:
+            break
+        last_id = batch[-1].id
+        await asyncio.sleep(0)
+
+
+@migration(4, "Рассылки в личные сообщения: users.is_blocked, broadcasts, broadcast_deliveries")
+async def _add_broadcasts(engine: AsyncEngine):
+    async with engine.begin() as conn:
+        await add_column_if_missing(conn, "users", "is_blocked", "BOOLEAN NOT NULL DEFAULT FALSE")
+        await create_table_if_missing(conn, "broadcasts")
+        await create_table_if_missing(conn, "broadcast_deliveries")
+
+
+@migration(5, "Архивные таблицы shifts_archive и shift_assignments_archive")
+async def _add_archive_tables(engine: AsyncEngine):
+    async with engine.begin() as conn:
+        await create_table_if_missing(conn, "shifts_archive")
+        await create_table_if_missing(conn, "shift_assignments_archive")
+
+
+@migration(6, "SQLite: auto_vacuum=INCREMENTAL для освобождения места после архивации")
+async def _enable_incremental_vacuum(engine: AsyncEngine):
+    if engine.dialect.name != "sqlite":
+        return
+    async with engine.connect() as conn:
+        mode = (await conn.exec_driver_sql("PRAGMA auto_vacuum")).scalar()
+        if mode == 2:
+            return
+        # Режим меняется только полным VACUUM (разово, при запуске до начала работы бота)
+        await conn.exec_driver_sql("PRAGMA auto_vacuum=INCREMENTAL")
+        await conn.exec_driver_sql("VACUUM")
+        await conn.commit()
+    logger.info("Включён auto_vacuum=INCREMENTAL")
+
+
+@migration(7, "SQLite: полнотекстовый индекс users_fts для поиска сотрудников")
+async def _add_users_fts(engine: AsyncEngine):
+    if engine.dialect.name != "sqlite":
+        return
+    async with engine.begin() as conn:
+        exists = USERS_FTS_TABLE in await _table_names(conn)
+        for statement in USERS_FTS_DDL:
+            await conn.exec_driver_sql(statement)
+        if not exists:
+            await conn.exec_driver_sql(USERS_FTS_BACKFILL)
+
+
+@migration(8, "Нормализованный телефон users.phone_e164 с уникальным индексом")
+async def _add_phone_e164(engine: AsyncEngine):
+    users = Base.metadata.tables["users"]
+    async with engine.begin() as conn:
+        await add_column_if_missing(conn, "users", "phone_e164", "VARCHAR(16)")
+    
+    # Номер получает первый по id пользователь; у повторов phone_e164 остаётся
+    # пустым, они попадают в отчёт /phone_duplicates
+    set_phone = (
+        users.update()
+        .where(users.c.id == bindparam("user_id"))
+        .values(phone_e164=bindparam("e164"), updated_at=users.c.updated_at)
+    )
+    last_id = 0
+    filled = 0
+    while True:
+        async with engine.begin() as conn:
+            batch = (await conn.execute(
+                select(users.c.id, users.c.phone)
+                .where(users.c.id > last_id, users.c.phone_e164.is_(None))
+                .order_by(users.c.id)
+                .limit(BACKFILL_BATCH_SIZE)
+            )).all()
+            normalized = {}
+            for user_id, phone in batch:
+                e164 = normalize_phone(phone or "")
+                if e164 and e164 not in normalized:
+                    normalized[e164] = user_id
+            if normalized:
+                taken = set((await conn.execute(
+                    select(users.c.phone_e164).where(users.c.phone_e164.in_(list(normalized)))
+                )).scalars())
+                values = [
+                    {"user_id": user_id, "e164": e164}
+                    for e164, user_id in normalized.items() if e164 not in taken
+                ]
+                if values:
+                    await conn.execute(set_phone, values)
+                    filled += len(values)
+        if len(batch) < BACKFILL_BATCH_SIZE:
+            break
+        last_id = batch[-1].id
+        await asyncio.sleep(0)
+    if filled:
+        logger.info(f"Заполнено users.phone_e164: {filled}")
+    
+    async with engine.begin() as conn:
+        await create_index_if_missing(conn, next(index for index in users.indexes if index.name == "ix_users_phone_e164"))
+
+
+@migration(9, "Команды: таблица tenants, tenant_id у пользователей, смен и настроек")
+async def _add_tenants(engine: AsyncEngine):
+    from database.models import DEFAULT_TENANT_ID
+    
+    # Существующие данные относятся к основной команде (создаётся вместе с таблицей)
+    column = f"INTEGER NOT NULL DEFAULT {DEFAULT_TENANT_ID}"
+    if engine.dialect.name == "postgresql":
+        column += " REFERENCES tenants (id)"
+    async with engine.begin() as conn:
+        await create_table_if_missing(conn, "tenants")
+        for table in ("users", "shifts", "shifts_archive", "settings"):
+            await add_column_if_missing(conn, table, "tenant_id", column)
+        # Ключ настройки уникален в пределах команды, а не во всей таблице
+        await conn.execute(text("DROP INDEX IF EXISTS ix_settings_key"))
+        for table, name in (
+            ("settings", "ix_settings_tenant_key"),
+            ("users", "ix_users_tenant_id"),
+            ("shifts", "ix_shifts_tenant_date"),
+        ):
+            index = next(index for index in Base.metadata.tables[table].indexes if index.name == name)
+            await create_index_if_missing(conn, index)
+
+
+@migration(10, "Шаблоны смен: таблица shift_templates, shifts.capacity и shifts.template_id")
+async def _add_shift_templates(engine: AsyncEngine):
+    template_column = "INTEGER"
+    if engine.dialect.name == "postgresql":
+        template_column += " REFERENCES shift_templates (id)"
+    async with engine.begin() as conn:
+        await create_table_if_missing(conn, "shift_templates")
+        await add_column_if_missing(conn, "shifts", "capacity", "INTEGER")
+        await add_column_if_missing(conn, "shifts", "template_id", template_column)
+        shifts = Base.metadata.tables["shifts"]
+        await create_index_if_missing(conn, next(index for index in shifts.indexes if index.name == "ux_shifts_template_date"))
+
+
+@migration(11, "Архив смен: shifts_archive.capacity и shifts_archive.template_id")
+async def _add_archive_shift_template(engine: AsyncEngine):
+    async with engine.begin() as conn:
+        await add_column_if_missing(conn, "shifts_archive", "capacity", "INTEGER")
+        await add_column_if_missing(conn, "shifts_archive", "template_id", "INTEGER")
@@ -1,25 +1,54 @@
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, Text, JSON
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, Time, ForeignKey, Text, JSON, Index, DDL, event
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 from datetime import datetime
 
 Base = declarative_base()
 
+# Основная команда: существовала до появления команд и получает пользователей без пригласительной ссылки
+DEFAULT_TENANT_ID = 1
+
+
+def _tenant_column(index: bool = False) -> Column:
+    return Column(
+        Integer, ForeignKey("tenants.id"), nullable=False,
+        default=DEFAULT_TENANT_ID, server_default=str(DEFAULT_TENANT_ID), index=index
+    )
+
+
+class Tenant(Base):
+    """Команда (площадка): свои сотрудники, смены, настройки и рабочие чаты (см. database/tenants.py)"""
+    __tablename__ = "tenants"
+    
+    id = Column(Integer, primary_key=True)
+    slug = Column(String(32), unique=True, nullable=False, index=True)  # Для ссылки приглашения ?start=t_<slug>
+    name = Column(String(255), nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+
+# Основная команда создаётся вместе с таблицей (новая БД или миграция 9) и получает id = 1
+event.listen(Tenant.__table__, "after_create", DDL(
+    "INSERT INTO tenants (slug, name, created_at) VALUES ('main', 'Основная команда', CURRENT_TIMESTAMP)"
+))
+
 
 class User(Base):
     """Модель пользователя"""
     __tablename__ = "users"
     
     id = Column(Integer, primary_key=True, index=True)
-    telegram_id = Column(Integer, unique=True, nullable=False, index=True)
+    tenant_id = _tenant_column(index=True)
+    telegram_id = Column(Integer, unique=True, nullable=False, index=True)  # Один аккаунт Telegram - одна команда
     full_name = Column(String(255), nullable=False)
     skills = Column(Text, nullable=True)
     experience_shifts = Column(Integer, default=0, nullable=False)
     course = Column(Integer, nullable=False)  # 1-5
-    phone = Column(String(20), nullable=False)
+    phone = Column(String(20), nullable=False)  # Как ввёл пользователь
+    phone_e164 = Column(String(16), nullable=True, unique=True, index=True)  # Нормализованный (+79991234567), для поиска и проверки повторов
     preferred_days = Column(JSON, nullable=True)  # Список дней недели ["Пн", "Вт", ...]
     rating = Column(Integer, default=3, nullable=False)  # 1-5
     is_registered = Column(Boolean, default=False, nullable=False)
+    is_blocked = Column(Boolean, default=False, nullable=False)  # Заблокировал бота (пропускается в рассылках)
     created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
     
@@ -27,14 +56,36 @@ class User(Base):
     shifts = relationship("ShiftAssignment", back_populates="user", cascade="all, delete-orphan")
 
 
+class ShiftTemplate(Base):
+    """Шаблон повторяющейся смены: по дням недели в одно время (смены создаёт generate_template_shifts)"""
+    __tablename__ = "shift_templates"
+    
+    id = Column(Integer, primary_key=True)
+    tenant_id = _tenant_column(index=True)
+    weekdays = Column(JSON, nullable=False)  # Дни недели ["Пн", "Ср", "Пт"]
+    start_time = Column(Time, nullable=False)
+    description = Column(Text, nullable=True)
+    capacity = Column(Integer, nullable=True)  # Мест на смене (None - без ограничения)
+    is_active = Column(Boolean, default=True, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+
 class Shift(Base):
     """Модель смены"""
     __tablename__ = "shifts"
+    __table_args__ = (
+        Index("ix_shifts_tenant_date", "tenant_id", "date"),
+        # Смена шаблона на дату создаётся один раз, сколько бы раз ни запускалась генерация
+        Index("ux_shifts_template_date", "template_id", "date", unique=True),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
+    tenant_id = _tenant_column()
     date = Column(DateTime, nullable=False, index=True)
     description = Column(Text, nullable=True)
     completed_info = Column(Text, nullable=True)  # Информация о выполненной работе на смене
+    capacity = Column(Integer, nullable=True)  # Мест на смене (None - без ограничения)
+    template_id = Column(Integer, ForeignKey("shift_templates.id"), nullable=True)  # Шаблон, по которому создана смена
     is_active = Column(Boolean, default=True, nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
     
@@ -58,12 +109,101 @@ class ShiftAssignment(Base):
     shift = relationship("Shift", back_populates="assignments")
 
 
+class ShiftArchive(Base):
+    """Архив старых смен (переносятся из shifts, см. scheduler/archive.py)"""
+    __tablename__ = "shifts_archive"
+    
+    archive_id = Column(Integer, primary_key=True)
+    id = Column(Integer, nullable=False, index=True)  # ID смены в таблице shifts
+    tenant_id = _tenant_column()
+    date = Column(DateTime, nullable=False, index=True)
+    description = Column(Text, nullable=True)
+    completed_info = Column(Text, nullable=True)
+    capacity = Column(Integer, nullable=True)
+    template_id = Column(Integer, nullable=True)  # ID шаблона в shift_templates
+    is_active = Column(Boolean, nullable=False)
+    created_at = Column(DateTime, nullable=False)
+    archived_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+
+class ShiftAssignmentArchive(Base):
+    """Архив записей на смены (переносятся вместе со сменой)"""
+    __tablename__ = "shift_assignments_archive"
+    
+    archive_id = Column(Integer, primary_key=True)
+    id = Column(Integer, nullable=False)  # ID записи в таблице shift_assignments
+    shift_archive_id = Column(Integer, ForeignKey("shifts_archive.archive_id"), nullable=False, index=True)
+    shift_id = Column(Integer, nullable=False)  # ID смены в таблице shifts
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    created_at = Column(DateTime, nullable=False)
+    is_cancelled = Column(Boolean, nullable=False)
+    cancelled_at = Column(DateTime, nullable=True)
+
+
+class UserDay(Base):
+    """Предпочитаемый день недели пользователя (копия users.preferred_days для выборки по индексу)"""
+    __tablename__ = "user_days"
+    
+    day = Column(String(2), primary_key=True)  # "Пн", "Вт", ...
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True, index=True)
+
+
+class UserStats(Base):
+    """Статистика пользователя по сменам (обновляется вместе с записями, см. database/crud.py)"""
+    __tablename__ = "user_stats"
+    
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    signups = Column(Integer, default=0, nullable=False)  # Всего записей на смены
+    cancellations = Column(Integer, default=0, nullable=False)  # Из них отменено
+    shifts_worked = Column(Integer, default=0, nullable=False)  # Отработано (смены с completed_info)
+    last_worked_at = Column(DateTime, nullable=True)  # Дата последней отработанной смены
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
+
+
+class Broadcast(Base):
+    """Рассылка в личные сообщения (копия сообщения администратора)"""
+    __tablename__ = "broadcasts"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    created_by = Column(Integer, nullable=False)  # Telegram ID администратора
+    from_chat_id = Column(Integer, nullable=False)  # Откуда копируется сообщение
+    message_id = Column(Integer, nullable=False)
+    status = Column(String(20), default="running", nullable=False)  # running, paused, cancelled, finished, interrupted
+    total = Column(Integer, default=0, nullable=False)
+    sent = Column(Integer, default=0, nullable=False)
+    blocked = Column(Integer, default=0, nullable=False)
+    failed = Column(Integer, default=0, nullable=False)
+    last_user_id = Column(Integer, default=0, nullable=False)  # Последний обработанный users.id (продолжение по ключу)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    finished_at = Column(DateTime, nullable=True)
+
+
+class BroadcastDelivery(Base):
+    """Результат отправки рассылки конкретному пользователю"""
+    __tablename__ = "broadcast_deliveries"
+    
+    broadcast_id = Column(Integer, ForeignKey("broadcasts.id"), primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    status = Column(String(20), nullable=False)  # sent, blocked, failed
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+
 class Settings(Base):
-    """Модель настроек системы"""
+    """Настройки команды (ключ уникален в пределах команды)"""
     __tablename__ = "settings"
+    __table_args__ = (Index("ix_settings_tenant_key", "tenant_id", "key", unique=True),)
     
     id = Column(Integer, primary_key=True, index=True)
-    key = Column(String(100), unique=True, nullable=False, index=True)
+    tenant_id = _tenant_column()
+    key = Column(String(100), nullable=False)
     value = Column(Text, nullable=True)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
 
+
+class SchemaVersion(Base):
+    """Применённые версии схемы БД (см. database/migrations.py)"""
+    __tablename__ = "schema_version"
+    
+    version = Column(Integer, primary_key=True)
+    description = Column(String(255), nullable=True)
+    applied_at = Column(DateTime, default=datetime.utcnow, nullable=False)
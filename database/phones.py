@@ -0,0 +1,33 @@
+"""
+Нормализация телефонов сотрудников.
+
+Номер хранится как введён (users.phone) и в формате E.164 (users.phone_e164,
+уникальный индекс) - по нему ищутся владельцы номеров. Модуль не зависит от
+обработчиков: его используют и миграции БД, и проверка ввода (handlers.validators).
+"""
+import re
+from typing import Optional
+
+
+def normalize_phone(phone: str) -> Optional[str]:
+    """
+    Приведение телефона к формату E.164 (+79991234567).
+
+    Российские номера принимаются в виде 8XXXXXXXXXX, 7XXXXXXXXXX, +7XXXXXXXXXX
+    и 9XXXXXXXXX (без кода страны), иностранные - с "+" и кодом страны.
+    Разделители (пробелы, скобки, дефисы, точки) игнорируются. Возвращает None,
+    если номер не распознан.
+    """
+    phone = phone.strip()
+    if not phone or re.search(r'[^\d\s()+\-.]', phone):
+        return None
+    digits = re.sub(r'\D', '', phone)
+    if phone.startswith('+'):
+        if digits.startswith('7') and len(digits) != 11:
+            return None
+        return f"+{digits}" if 8 <= len(digits) <= 15 else None
+    if len(digits) == 11 and digits[0] in '78':
+        return f"+7{digits[1:]}"
+    if len(digits) == 10 and digits[0] == '9':
+        return f"+7{digits}"
+    return None
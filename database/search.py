@@ -0,0 +1,116 @@
+"""
+Полнотекстовый поиск сотрудников по ФИО, телефону и навыкам.
+
+В SQLite используется виртуальная таблица FTS5 users_fts без собственной
+копии текста (content=''): в ней хранится только индекс, а строки берутся из
+users по rowid = users.id. Индекс поддерживается триггерами на users, поэтому
+его обновляют все пути записи (регистрация, правка в админке, импорт).
+Телефон индексируется дважды - как введён и только цифрами, чтобы находились
+и "+7 (999) 123", и "7999123".
+
+Запрос разбивается на слова, каждое ищется по префиксу ("иван петр" найдёт
+"Иванов Пётр"), слова объединяются через AND; "ё" приравнивается к "е".
+Для других СУБД поиск выполняется через ILIKE (см. database/crud.py).
+"""
+import re
+from typing import List
+
+from sqlalchemy import DDL, column, event, literal_column, table
+
+from database.models import User
+
+
+USERS_FTS_TABLE = "users_fts"
+
+# Сколько слов запроса учитывать
+MAX_QUERY_TERMS = 5
+
+# Сортировка по релевантности (bm25) считает ранг каждого совпадения, поэтому
+# применяется, только если совпадений не больше этого числа; для широких
+# запросов ("и", "7") результаты идут в порядке добавления пользователей
+RANKED_SEARCH_LIMIT = 500
+
+_PHONE_DIGITS = (
+    "replace(replace(replace(replace(replace({phone}, '+', ''), ' ', ''), '-', ''), '(', ''), ')', '')"
+)
+
+
+def _indexed_phone(prefix: str) -> str:
+    phone = f"{prefix}.phone"
+    return f"{phone} || ' ' || {_PHONE_DIGITS.format(phone=phone)}"
+
+
+def _fold_yo(expression: str) -> str:
+    # unicode61 не приравнивает "ё" к "е": "Пётр" должен находиться по "петр"
+    return f"replace(replace({expression}, 'ё', 'е'), 'Ё', 'Е')"
+
+
+def _fts_values(prefix: str) -> str:
+    full_name = _fold_yo(f"{prefix}.full_name")
+    skills = _fold_yo(f"coalesce({prefix}.skills, '')")
+    return f"{prefix}.id, {full_name}, {_indexed_phone(prefix)}, {skills}"
+
+
+USERS_FTS_DDL = [
+    f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS {USERS_FTS_TABLE} USING fts5(
+        full_name, phone, skills,
+        content='', prefix='2 3', tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS users_fts_insert AFTER INSERT ON users BEGIN
+        INSERT INTO {USERS_FTS_TABLE}(rowid, full_name, phone, skills) VALUES ({_fts_values('new')});
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS users_fts_delete AFTER DELETE ON users BEGIN
+        INSERT INTO {USERS_FTS_TABLE}({USERS_FTS_TABLE}, rowid, full_name, phone, skills)
+        VALUES ('delete', {_fts_values('old')});
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS users_fts_update AFTER UPDATE OF full_name, phone, skills ON users BEGIN
+        INSERT INTO {USERS_FTS_TABLE}({USERS_FTS_TABLE}, rowid, full_name, phone, skills)
+        VALUES ('delete', {_fts_values('old')});
+        INSERT INTO {USERS_FTS_TABLE}(rowid, full_name, phone, skills) VALUES ({_fts_values('new')});
+    END
+    """,
+]
+
+# Таблица индекса для запросов select(): rowid = users.id, rank - релевантность (bm25).
+# Запросы через select(), а не text(): сессия считает их чтением и не выполняет COMMIT
+users_fts = table(USERS_FTS_TABLE, column("rowid"), column("rank"))
+
+# Заполнение индекса по уже существующим пользователям
+USERS_FTS_BACKFILL = (
+    f"INSERT INTO {USERS_FTS_TABLE}(rowid, full_name, phone, skills) SELECT {_fts_values('users')} FROM users"
+)
+
+# Новая БД (create_all): индекс и триггеры создаются сразу после таблицы users
+for _statement in USERS_FTS_DDL:
+    event.listen(User.__table__, "after_create", DDL(_statement).execute_if(dialect="sqlite"))
+
+
+def query_terms(text: str) -> List[str]:
+    """
+    Слова запроса (буквы и цифры), не больше MAX_QUERY_TERMS.
+
+    Однобуквенные слова отбрасываются, если есть более длинные: префикс из
+    одного символа ("+7" в телефоне, инициал) совпадает почти со всеми
+    строками и только замедляет поиск.
+    """
+    terms = re.findall(r"\w+", text.lower().replace("ё", "е"))
+    if any(len(term) > 1 for term in terms):
+        terms = [term for term in terms if len(term) > 1]
+    return terms[:MAX_QUERY_TERMS]
+
+
+def fts_match_query(terms: List[str]) -> str:
+    """Выражение MATCH: все слова по префиксу. Слова в кавычках - без операторов FTS5"""
+    return " ".join(f'"{term}"*' for term in terms)
+
+
+def fts_match(match: str):
+    """Условие users_fts MATCH :match для select()"""
+    return literal_column(USERS_FTS_TABLE).op("MATCH")(match)
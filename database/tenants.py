@@ -0,0 +1,156 @@
+"""
+Несколько команд (площадок) в одном процессе бота.
+
+Сотрудники, смены и настройки принадлежат команде (колонка tenant_id), все
+выборки списков в database/crud.py ограничены командой. Telegram ID и
+телефон уникальны во всей БД: один аккаунт Telegram состоит в одной команде.
+
+Команда обновления определяется TenantMiddleware (database/middleware.py)
+и передаётся обработчикам в аргументе tenant_id:
+
+- в группе или канале - по чату: рабочий чат или канал уведомлений из
+  настроек команды;
+- в личных сообщениях - команда пользователя, а если он ещё не
+  зарегистрирован - команда, в настройках которой он указан администратором;
+- иначе - команда бота, получившего обновление (см. runtime/bots.py; у
+  основного бота - DEFAULT_TENANT_ID). Новый сотрудник попадает в другую
+  команду по пригласительной ссылке t.me/<бот>?start=t_<slug> (см.
+  cmd_start в handlers/user_handlers.py).
+
+Настройки команд хранятся в памяти процесса (TenantSettingsCache): чтение
+настройки в обработчике не обращается к БД, а set_setting сбрасывает кэш
+после COMMIT. Чаты из .env (WORK_GROUP_ID, NOTIFICATION_CHANNEL_ID)
+относятся к основной команде, если в её настройках не задано другое.
+"""
+from collections import OrderedDict
+from typing import Dict, Optional, Set, Tuple
+
+from aiogram.enums import ChatType
+from aiogram.types import Chat, User as TelegramUser
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from config import Config
+from database import hot_queries
+from database.models import DEFAULT_TENANT_ID
+
+
+# Настройки, значения которых - ID чатов или пользователей (через запятую)
+CHAT_SETTING_KEYS = ("work_group_id", "notification_channel_id")
+ID_SETTING_KEYS = CHAT_SETTING_KEYS + ("admin_chat_ids",)
+
+# Параметр /start пригласительной ссылки команды: t_<slug>
+INVITE_PREFIX = "t_"
+
+# Сколько пользователей держать в кэше "Telegram ID -> команда"
+USER_TENANT_CACHE_SIZE = 50_000
+
+
+def _parse_ids(value: Optional[str]) -> Set[int]:
+    ids = set()
+    for item in (value or "").split(","):
+        item = item.strip()
+        if item.lstrip("-").isdigit():
+            ids.add(int(item))
+    return ids
+
+
+class TenantSettingsCache:
+    """Настройки команд в памяти: значения по команде и команда по ID чата или администратора"""
+
+    def __init__(self):
+        self._values: Dict[int, Dict[str, Optional[str]]] = {}
+        self._owners: Optional[Dict[Tuple[str, int], int]] = None
+        # Увеличивается при сбросе: прочитанное до сброса не сохраняется
+        self._generation = 0
+
+    async def get(self, db: AsyncSession, tenant_id: int, key: str) -> Optional[str]:
+        """Значение настройки команды (все настройки команды читаются одним запросом)"""
+        values = self._values.get(tenant_id)
+        if values is None:
+            generation = self._generation
+            result = await db.execute(hot_queries.TENANT_SETTING_ROWS, {"tenant_id": tenant_id})
+            values = dict(result.all())
+            if generation == self._generation:
+                self._values[tenant_id] = values
+        return values.get(key)
+
+    async def owner(self, db: AsyncSession, key: str, item_id: int) -> Optional[int]:
+        """Команда, в настройке key которой указан ID item_id (None - ни в одной)"""
+        owners = self._owners
+        if owners is None:
+            generation = self._generation
+            owners = await self._load_owners(db)
+            if generation == self._generation:
+                self._owners = owners
+        return owners.get((key, item_id))
+
+    async def tenant_for_chat(self, db: AsyncSession, chat_id: int) -> Optional[int]:
+        """Команда, у которой чат chat_id - рабочий чат или канал уведомлений"""
+        for key in CHAT_SETTING_KEYS:
+            tenant_id = await self.owner(db, key, chat_id)
+            if tenant_id is not None:
+                return tenant_id
+        return None
+
+    @staticmethod
+    async def _load_owners(db: AsyncSession) -> Dict[Tuple[str, int], int]:
+        owners: Dict[Tuple[str, int], int] = {}
+        configured = set()
+        result = await db.execute(hot_queries.ID_SETTING_ROWS, {"keys": list(ID_SETTING_KEYS)})
+        for tenant_id, key, value in result:
+            if value:
+                configured.add((tenant_id, key))
+            for item_id in _parse_ids(value):
+                owners.setdefault((key, item_id), tenant_id)
+        for key, chat_id in (("work_group_id", Config.WORK_GROUP_ID), ("notification_channel_id", Config.NOTIFICATION_CHANNEL_ID)):
+            if chat_id and (DEFAULT_TENANT_ID, key) not in configured:
+                owners.setdefault((key, chat_id), DEFAULT_TENANT_ID)
+        return owners
+
+    def invalidate(self):
+        """Сброс после изменения настроек (вызывается после COMMIT)"""
+        self._generation += 1
+        self._values.clear()
+        self._owners = None
+
+
+class UserTenantCache:
+    """Команда пользователя по Telegram ID (пользователь не переходит между командами)"""
+
+    def __init__(self, size: int = USER_TENANT_CACHE_SIZE):
+        self.size = size
+        self._tenants: "OrderedDict[int, int]" = OrderedDict()
+
+    async def get(self, db: AsyncSession, telegram_id: int) -> Optional[int]:
+        """Команда пользователя (None - пользователя нет в БД; такой ответ не кэшируется)"""
+        tenant_id = self._tenants.get(telegram_id)
+        if tenant_id is not None:
+            self._tenants.move_to_end(telegram_id)
+            return tenant_id
+        tenant_id = await db.scalar(hot_queries.USER_TENANT, {"telegram_id": telegram_id})
+        if tenant_id is not None:
+            self._tenants[telegram_id] = tenant_id
+            if len(self._tenants) > self.size:
+                self._tenants.popitem(last=False)
+        return tenant_id
+
+
+tenant_settings = TenantSettingsCache()
+user_tenants = UserTenantCache()
+
+
+async def resolve_tenant(
+    db: AsyncSession, chat: Optional[Chat], user: Optional[TelegramUser], default: int = DEFAULT_TENANT_ID
+) -> int:
+    """Команда обновления по чату и отправителю (default - команда бота)"""
+    if chat is not None and chat.type != ChatType.PRIVATE:
+        tenant_id = await tenant_settings.tenant_for_chat(db, chat.id)
+        if tenant_id is not None:
+            return tenant_id
+    if user is not None:
+        tenant_id = await user_tenants.get(db, user.id)
+        if tenant_id is None:
+            tenant_id = await tenant_settings.owner(db, "admin_chat_ids", user.id)
+        if tenant_id is not None:
+            return tenant_id
+    return default
@@ -1,60 +1,130 @@
 from aiogram import Router, F
-from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton
-from aiogram.filters import Command
+from aiogram.types import (
+    Message, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton,
+    BufferedInputFile, FSInputFile
+)
+from aiogram.filters import Command, CommandObject
 from aiogram.fsm.context import FSMContext
-from datetime import datetime
-
+from datetime import datetime, timedelta
+from sqlalchemy.ext.asyncio import AsyncSession
+import asyncio
+import csv
+import html
+import io
+import logging
+import os
+
+from handlers.callbacks import CallbackRoutes, pack
 from handlers.states import AdminStates
 from database.crud import (
-    get_all_users, get_active_shifts, create_shift, update_shift, archive_shift,
-    get_user_by_telegram_id, update_user_rating, get_all_registered_users_for_broadcast,
-    get_setting, set_setting
+    get_all_users, get_all_users_with_stats, get_shift_participants_with_stats,
+    get_user_stats, rebuild_user_stats, get_active_shift_rows, get_shift_card,
+    create_shift, create_shifts, get_existing_shift_dates, update_shift, archive_shift,
+    get_user_by_telegram_id, get_user_with_stats, search_users, update_user,
+    get_user_by_phone, get_users_by_phones, get_users_without_e164, update_user_rating, get_all_registered_users_for_broadcast,
+    get_setting, set_setting, bulk_upsert_users, stream_users,
+    count_shift_history, stream_shift_history,
+    count_broadcast_recipients, create_broadcast,
+    create_shift_template, get_shift_templates, deactivate_shift_template, generate_template_shifts,
+    create_tenant, get_tenant, get_tenant_by_slug, get_tenants_with_counts
 )
-from database.database import get_session
+from handlers.exports import write_csv, make_temp_path, CSV_DELIMITER
+from handlers.roster import parse_roster, exclude_taken_phones, ROSTER_COLUMNS
+from handlers.validators import (
+    parse_date_range, parse_shift_lines, parse_shift_template, validate_tenant_slug
+)
+from messaging.announcements import announce_shift, get_announcement_recipients, shift_weekday
+from messaging.sender import SendStats
+from messaging.broadcast import BroadcastJob, active_broadcasts, start_broadcast
+from messaging.onboarding import get_group_chat_ids
+from messaging.gateway import gateway
+from runtime.bots import bots
+from runtime.supervisor import run_in_background
+from scheduler.archive import archive_old_shifts
+from database.database import engine, AsyncSessionLocal
+from database.models import DEFAULT_TENANT_ID
+from database.phones import normalize_phone
+from database.tenants import INVITE_PREFIX
+from database.maintenance import analyze_database, backup_database, incremental_vacuum, list_backups, sqlite_path
 from config import Config
 from handlers.user_handlers import get_main_menu_keyboard
 
 router = Router()
+callbacks = CallbackRoutes(router)
+logger = logging.getLogger(__name__)
+
+# Лимит размера файла для импорта (Bot API отдаёт боту файлы до 20 МБ)
+MAX_ROSTER_FILE_SIZE = 20 * 1024 * 1024
+# Сколько ошибок импорта показывать в сообщении (остальные - файлом)
+IMPORT_ERRORS_IN_MESSAGE = 10
+# Сколько смен можно добавить одним сообщением и сколько строк показать в предпросмотре
+MAX_SHIFT_BATCH = 200
+SHIFT_BATCH_PREVIEW = 30
+# На сколько недель создавать смены по шаблонам кнопкой, если SHIFT_TEMPLATE_WEEKS=0
+TEMPLATE_WEEKS_MANUAL = 4
+# Как часто обновлять сообщение о ходе выгрузки, секунд
+EXPORT_PROGRESS_INTERVAL = 3
+
+# Пользователей на странице результатов поиска
+SEARCH_PAGE_SIZE = 10
+
+HISTORY_EXPORT_HEADER = [
+    "shift_id", "shift_date", "description", "is_active", "completed_info",
+    "telegram_id", "full_name", "phone", "signed_up_at", "is_cancelled", "cancelled_at",
+]
+
+
+# Ответ на команды обслуживания всего процесса (БД, очередь запросов) от администратора команды
+PROCESS_ADMIN_ONLY = "❌ Команда действует на все команды бота и доступна только администраторам из ADMIN_CHAT_IDS."
 
 
 def is_admin_sync(user_id: int) -> bool:
-    """Синхронная проверка прав администратора (только .env)"""
+    """Синхронная проверка прав администратора (только .env; администраторы всех команд)"""
     return user_id in Config.ADMIN_CHAT_IDS
 
 
-async def is_admin(user_id: int) -> bool:
-    """Асинхронная проверка прав администратора (проверяет .env и БД)"""
+async def is_admin(user_id: int, db: AsyncSession, tenant_id: int = DEFAULT_TENANT_ID) -> bool:
+    """Асинхронная проверка прав администратора команды (проверяет .env и настройки команды в БД)"""
     # Проверяем в Config (из .env)
     if user_id in Config.ADMIN_CHAT_IDS:
         return True
     
-    # Проверяем в БД
+    # Проверяем в БД (в сессии текущего обновления)
     try:
-        from database.crud import get_setting
-        async with get_session() as db:
-            admin_ids_str = await get_setting(db, "admin_chat_ids")
-            if admin_ids_str:
-                admin_ids_db = [int(x.strip()) for x in admin_ids_str.split(",")]
-                if user_id in admin_ids_db:
-                    return True
-    except:
+        admin_ids_str = await get_setting(db, "admin_chat_ids", tenant_id)
+        if admin_ids_str:
+            admin_ids_db = [int(x.strip()) for x in admin_ids_str.split(",")]
+            if user_id in admin_ids_db:
+                return True
+    except Exception:
         pass
     
     return False
 
 
+def format_user_stats(stats) -> str:
+    """Строка со статистикой пользователя по сменам (user_stats)"""
+    if not stats or not stats.signups:
+        return "Записей на смены ещё не было"
+    cancel_rate = round(stats.cancellations * 100 / stats.signups)
+    text = f"Отработано: {stats.shifts_worked} | Отмены: {stats.cancellations} из {stats.signups} ({cancel_rate}%)"
+    if stats.last_worked_at:
+        text += f" | Последняя: {stats.last_worked_at.strftime('%d.%m.%Y')}"
+    return text
+
+
 @router.message(Command("admin"))
-async def admin_menu(message: Message):
+async def admin_menu(message: Message, db: AsyncSession, tenant_id: int):
     """Главное меню администратора"""
-    if not await is_admin(message.from_user.id):
+    if not await is_admin(message.from_user.id, db, tenant_id):
         await message.answer("❌ У вас нет прав администратора.")
         return
     
     keyboard = [
-        [InlineKeyboardButton(text="📋 Управление сменами", callback_data="admin_shifts")],
-        [InlineKeyboardButton(text="👥 Управление пользователями", callback_data="admin_users")],
-        [InlineKeyboardButton(text="⚙️ Настройки системы", callback_data="admin_settings")],
-        [InlineKeyboardButton(text="📢 Рассылка", callback_data="admin_broadcast")]
+        [InlineKeyboardButton(text="📋 Управление сменами", callback_data=pack("admin_shifts"))],
+        [InlineKeyboardButton(text="👥 Управление пользователями", callback_data=pack("admin_users"))],
+        [InlineKeyboardButton(text="⚙️ Настройки системы", callback_data=pack("admin_settings"))],
+        [InlineKeyboardButton(text="📢 Рассылка", callback_data=pack("admin_broadcast"))]
     ]
     
     await message.answer(
@@ -65,45 +135,50 @@ async def admin_menu(message: Message):
 
 # ==================== УПРАВЛЕНИЕ СМЕНАМИ ====================
 
-@router.callback_query(F.data == "admin_shifts")
-async def admin_shifts_menu(callback: CallbackQuery):
-    """Меню управления сменами"""
-    if not await is_admin(callback.from_user.id):
+@callbacks("admin_shifts")
+async def admin_shifts_menu(callback: CallbackQuery, db: AsyncSession, tenant_id: int, state: FSMContext = None):
+    """Меню управления сменами (прерывает начатый ввод, например списка смен)"""
+    if not await is_admin(callback.from_user.id, db, tenant_id):
         await callback.answer("❌ У вас нет прав администратора.", show_alert=True)
         return
     
-    async with get_session() as db:
-        shifts = await get_active_shifts(db, from_date=datetime.utcnow())
-        
-        text = "📋 Управление сменами\n\n"
-        text += f"Активных смен: {len(shifts)}\n\n"
-        
-        keyboard = [
-            [InlineKeyboardButton(text="➕ Добавить смену", callback_data="admin_add_shift")],
-            [InlineKeyboardButton(text="📝 Редактировать смену", callback_data="admin_edit_shift_list")],
-            [InlineKeyboardButton(text="👥 Участники смены", callback_data="admin_shift_participants_list")],
-            [InlineKeyboardButton(text="✅ Информация о выполненной работе", callback_data="admin_shift_completed_list")],
-            [InlineKeyboardButton(text="🗄️ Архивировать смену", callback_data="admin_archive_shift_list")]
-        ]
-        
-        if shifts:
-            text += "Ближайшие смены:\n"
-            for shift in shifts[:5]:
-                date_str = shift.date.strftime("%d.%m.%Y %H:%M")
-                text += f"• {date_str}\n"
-        
-        keyboard.append([InlineKeyboardButton(text="◀️ Назад", callback_data="admin_back")])
-        
-        await callback.message.edit_text(
-            text,
-            reply_markup=InlineKeyboardMarkup(inline_keyboard=keyboard)
-        )
+    if state is not None:
+        await state.clear()
+    
+    shifts = await get_active_shift_rows(db, from_date=datetime.utcnow(), tenant_id=tenant_id)
+    
+    text = "📋 Управление сменами\n\n"
+    text += f"Активных смен: {len(shifts)}\n\n"
+    
+    keyboard = [
+        [InlineKeyboardButton(text="➕ Добавить смену", callback_data=pack("admin_add_shift"))],
+        [InlineKeyboardButton(text="📋 Добавить несколько смен", callback_data=pack("admin_add_shifts_bulk"))],
+        [InlineKeyboardButton(text="🔁 Шаблоны смен", callback_data=pack("admin_templates"))],
+        [InlineKeyboardButton(text="📝 Редактировать смену", callback_data=pack("admin_edit_shift_list"))],
+        [InlineKeyboardButton(text="👥 Участники смены", callback_data=pack("admin_shift_participants_list"))],
+        [InlineKeyboardButton(text="✅ Информация о выполненной работе", callback_data=pack("admin_shift_completed_list"))],
+        [InlineKeyboardButton(text="🗄️ Архивировать смену", callback_data=pack("admin_archive_shift_list"))],
+        [InlineKeyboardButton(text="📊 Выгрузка истории смен", callback_data=pack("admin_export_history"))]
+    ]
+    
+    if shifts:
+        text += "Ближайшие смены:\n"
+        for shift in shifts[:5]:
+            date_str = shift.date.strftime("%d.%m.%Y %H:%M")
+            text += f"• {date_str}\n"
+    
+    keyboard.append([InlineKeyboardButton(text="◀️ Назад", callback_data=pack("admin_back"))])
+    
+    await callback.message.edit_text(
+        text,
+        reply_markup=InlineKeyboardMarkup(inline_keyboard=keyboard)
+    )
 
 
-@router.callback_query(F.data == "admin_add_shift")
-async def admin_add_shift_start(callback: CallbackQuery, state: FSMContext):
+@callbacks("admin_add_shift")
+async def admin_add_shift_start(callback: CallbackQuery, state: FSMContext, db: AsyncSession, tenant_id: int):
     """Начало добавления смены"""
-    if not await is_admin(callback.from_user.id):
+    if not await is_admin(callback.from_user.id, db, tenant_id):
         await callback.answer("❌ У вас нет прав администратора.", show_alert=True)
         return
     
@@ -117,9 +192,9 @@ async def admin_add_shift_start(callback: CallbackQuery, state: FSMContext):
 
 
 @router.message(AdminStates.waiting_shift_date)
-async def admin_add_shift_date(message: Message, state: FSMContext):
+async def admin_add_shift_date(message: Message, state: FSMContext, db: AsyncSession, tenant_id: int):
     """Обработка даты смены"""
-    if not await is_admin(message.from_user.id):
+    if not await is_admin(message.from_user.id, db, tenant_id):
         await message.answer("❌ У вас нет прав администратора.")
         await state.clear()
         return
@@ -138,15 +213,14 @@ async def admin_add_shift_date(message: Message, state: FSMContext):
         
         if edit_shift_id:
             # Редактирование существующей смены
-            async with get_session() as db:
-                shift = await update_shift(db, edit_shift_id, date=shift_date)
-                if shift:
-                    date_formatted = shift_date.strftime("%d.%m.%Y %H:%M")
-                    await message.answer(f"✅ Дата смены успешно изменена на {date_formatted}")
-                    await state.clear()
-                else:
-                    await message.answer("❌ Смена не найдена!")
-                    await state.clear()
+            shift = await update_shift(db, edit_shift_id, tenant_id, date=shift_date)
+            if shift:
+                date_formatted = shift_date.strftime("%d.%m.%Y %H:%M")
+                await message.answer(f"✅ Дата смены успешно изменена на {date_formatted}")
+                await state.clear()
+            else:
+                await message.answer("❌ Смена не найдена!")
+                await state.clear()
         else:
             # Добавление новой смены
             await state.update_data(shift_date=shift_date)
@@ -157,9 +231,9 @@ async def admin_add_shift_date(message: Message, state: FSMContext):
 
 
 @router.message(AdminStates.waiting_shift_description)
-async def admin_add_shift_description(message: Message, state: FSMContext):
+async def admin_add_shift_description(message: Message, state: FSMContext, db: AsyncSession, tenant_id: int):
     """Завершение добавления или редактирования смены"""
-    if not await is_admin(message.from_user.id):
+    if not await is_admin(message.from_user.id, db, tenant_id):
         await message.answer("❌ У вас нет прав администратора.")
         await state.clear()
         return
@@ -170,103 +244,354 @@ async def admin_add_shift_description(message: Message, state: FSMContext):
     
     if edit_shift_id:
         # Редактирование описания существующей смены
-        async with get_session() as db:
-            shift = await update_shift(db, edit_shift_id, description=description)
-            if shift:
-                await message.answer(f"✅ Описание смены успешно изменено!")
-                await state.clear()
-            else:
-                await message.answer("❌ Смена не найдена!")
-                await state.clear()
+        shift = await update_shift(db, edit_shift_id, tenant_id, description=description)
+        if shift:
+            await message.answer(f"✅ Описание смены успешно изменено!")
+            await state.clear()
+        else:
+            await message.answer("❌ Смена не найдена!")
+            await state.clear()
     else:
         # Добавление новой смены
         shift_date = data["shift_date"]
-        async with get_session() as db:
-            shift = await create_shift(db, shift_date, description)
+        shift = await create_shift(db, shift_date, description, tenant_id)
         
         date_str = shift_date.strftime("%d.%m.%Y %H:%M")
         await message.answer(f"✅ Смена успешно добавлена!\n\nДата: {date_str}\nОписание: {description or 'Отсутствует'}")
         await state.clear()
+        
+        recipients = await get_announcement_recipients(db, shift, tenant_id)
+        if not recipients:
+            await message.answer(f"📣 Анонс не отправлен: ни у кого из сотрудников нет дня «{shift_weekday(shift)}» в предпочтениях.")
+            return
+        status_message = await message.answer(f"📣 Анонс смены: 0 из {len(recipients)}")
+        # Анонс отправляет бот команды - тот же, что и рассылки (см. start_users_broadcast)
+        run_in_background(
+            send_shift_announcement(bots.for_tenant(tenant_id), status_message, shift, recipients),
+            name=f"announcement:{shift.id}",
+        )
 
 
-@router.callback_query(F.data == "admin_edit_shift_list")
-async def admin_edit_shift_list(callback: CallbackQuery, state: FSMContext):
-    """Список смен для редактирования"""
-    if not await is_admin(callback.from_user.id):
+async def send_shift_announcement(bot, status_message: Message, shift, recipients: list):
+    """Рассылка анонса смены с обновлением сообщения о ходе отправки"""
+    async def on_progress(stats: SendStats):
+        await status_message.edit_text(f"📣 Анонс смены: {stats.done} из {stats.total}")
+    
+    stats = await announce_shift(bot, shift, recipients, on_progress, AsyncSessionLocal)
+    await status_message.edit_text(
+        f"📣 Анонс смены отправлен\n\n"
+        f"✅ Доставлено: {stats.sent}\n"
+        f"🚫 Заблокировали бота: {stats.blocked}\n"
+        f"❌ Ошибок: {stats.failed}\n"
+        f"📊 Всего получателей: {stats.total}"
+    )
+
+
+# ==================== НЕСКОЛЬКО СМЕН ОДНИМ СООБЩЕНИЕМ ====================
+
+@callbacks("admin_add_shifts_bulk")
+async def admin_add_shifts_bulk_start(callback: CallbackQuery, state: FSMContext, db: AsyncSession, tenant_id: int):
+    """Начало добавления списка смен"""
+    if not await is_admin(callback.from_user.id, db, tenant_id):
         await callback.answer("❌ У вас нет прав администратора.", show_alert=True)
         return
     
-    async with get_session() as db:
-        shifts = await get_active_shifts(db, from_date=datetime.utcnow())
-        
-        if not shifts:
-            await callback.answer("❌ Нет активных смен для редактирования!", show_alert=True)
-            return
-        
-        keyboard = []
-        for shift in shifts[:10]:  # Показываем первые 10
-            date_str = shift.date.strftime("%d.%m.%Y %H:%M")
-            keyboard.append([
-                InlineKeyboardButton(
-                    text=f"📅 {date_str}",
-                    callback_data=f"admin_edit_shift_{shift.id}"
-                )
-            ])
-        
-        keyboard.append([InlineKeyboardButton(text="◀️ Назад", callback_data="admin_shifts")])
-        
-        await callback.message.edit_text(
-            "📝 Выберите смену для редактирования:",
-            reply_markup=InlineKeyboardMarkup(inline_keyboard=keyboard)
+    await callback.message.edit_text(
+        "📋 Добавление нескольких смен\n\n"
+        "Отправьте список смен, по одной на строку:\n"
+        "ДД.ММ.ГГГГ ЧЧ:ММ — описание\n\n"
+        "Например:\n"
+        "25.12.2024 09:00 — Сборка\n"
+        "27.12.2024 14:30 — Упаковка\n\n"
+        f"Описание необязательно. Не больше {MAX_SHIFT_BATCH} смен за раз."
+    )
+    await state.set_state(AdminStates.waiting_shift_batch)
+
+
+@router.message(AdminStates.waiting_shift_batch)
+async def admin_add_shifts_bulk_preview(message: Message, state: FSMContext, db: AsyncSession, tenant_id: int):
+    """Разбор списка смен и предпросмотр перед созданием"""
+    if not await is_admin(message.from_user.id, db, tenant_id):
+        await message.answer("❌ У вас нет прав администратора.")
+        await state.clear()
+        return
+    
+    shifts, errors = parse_shift_lines(message.text or "", datetime.now())
+    if len(shifts) > MAX_SHIFT_BATCH:
+        await message.answer(f"❌ В списке {len(shifts)} смен, за раз можно добавить не больше {MAX_SHIFT_BATCH}. Разделите список:")
+        return
+    
+    # Повторы уже созданных смен - одним запросом
+    existing = await get_existing_shift_dates(db, [date for date, _ in shifts], tenant_id)
+    new_shifts = [(date, description) for date, description in shifts if date not in existing]
+    
+    text = "📋 Предпросмотр\n\n"
+    if new_shifts:
+        text += f"Будет создано смен: {len(new_shifts)}\n"
+        for date, description in new_shifts[:SHIFT_BATCH_PREVIEW]:
+            text += f"• {date.strftime('%d.%m.%Y %H:%M')}"
+            text += f" — {html.escape(description)}\n" if description else "\n"
+        if len(new_shifts) > SHIFT_BATCH_PREVIEW:
+            text += f"... и ещё {len(new_shifts) - SHIFT_BATCH_PREVIEW}\n"
+    if existing:
+        text += f"\n⏭ Уже есть смены на это время (пропущены): {len(existing)}\n"
+        text += ", ".join(date.strftime("%d.%m.%Y %H:%M") for date in sorted(existing)[:SHIFT_BATCH_PREVIEW]) + "\n"
+    if errors:
+        text += f"\n❌ Ошибки ({len(errors)}):\n"
+        text += "\n".join(html.escape(error) for error in errors[:IMPORT_ERRORS_IN_MESSAGE]) + "\n"
+        if len(errors) > IMPORT_ERRORS_IN_MESSAGE:
+            text += f"... и ещё {len(errors) - IMPORT_ERRORS_IN_MESSAGE}\n"
+    
+    if not new_shifts:
+        text += "\nНет смен для создания. Исправьте список и отправьте снова:"
+        await message.answer(text)
+        return
+    
+    await state.update_data(shift_batch=[[date.isoformat(), description] for date, description in new_shifts])
+    keyboard = [
+        [InlineKeyboardButton(text=f"✅ Создать {len(new_shifts)}", callback_data=pack("admin_shifts_bulk_confirm"))],
+        [InlineKeyboardButton(text="❌ Отмена", callback_data=pack("admin_shifts"))],
+    ]
+    text += "\nМожно отправить исправленный список заново."
+    await message.answer(text, reply_markup=InlineKeyboardMarkup(inline_keyboard=keyboard))
+
+
+@callbacks("admin_shifts_bulk_confirm", AdminStates.waiting_shift_batch)
+async def admin_add_shifts_bulk_confirm(callback: CallbackQuery, state: FSMContext, db: AsyncSession, tenant_id: int):
+    """Создание смен из предпросмотра одной транзакцией"""
+    if not await is_admin(callback.from_user.id, db, tenant_id):
+        await callback.answer("❌ У вас нет прав администратора.", show_alert=True)
+        return
+    
+    data = await state.get_data()
+    shifts = [(datetime.fromisoformat(date), description) for date, description in data.get("shift_batch", [])]
+    if not shifts:
+        await callback.answer("❌ Список смен не найден, отправьте его заново.", show_alert=True)
+        return
+    
+    # Смены могли появиться, пока список ждал подтверждения
+    existing = await get_existing_shift_dates(db, [date for date, _ in shifts], tenant_id)
+    created = await create_shifts(db, [(date, description) for date, description in shifts if date not in existing], tenant_id)
+    await state.clear()
+    
+    text = f"✅ Создано смен: {created}"
+    if existing:
+        text += f"\n⏭ Пропущено (уже есть): {len(existing)}"
+    await callback.message.edit_text(
+        text,
+        reply_markup=InlineKeyboardMarkup(inline_keyboard=[
+            [InlineKeyboardButton(text="◀️ К управлению сменами", callback_data=pack("admin_shifts"))]
+        ])
+    )
+
+
+@callbacks("admin_shifts_bulk_confirm")
+async def admin_add_shifts_bulk_expired(callback: CallbackQuery):
+    """Подтверждение списка смен, который уже создан или отменён"""
+    await callback.answer("Список уже обработан. Чтобы добавить смены, отправьте список заново.", show_alert=True)
+
+
+# ==================== ШАБЛОНЫ СМЕН ====================
+
+def format_shift_template(template) -> str:
+    """Строка шаблона: дни, время, места и описание"""
+    text = f"{', '.join(template.weekdays)} {template.start_time.strftime('%H:%M')}"
+    if template.capacity:
+        text += f", мест: {template.capacity}"
+    if template.description:
+        text += f" - {template.description}"
+    return text
+
+
+async def show_shift_templates(message: Message, db: AsyncSession, tenant_id: int, edit: bool = False):
+    """Список шаблонов смен команды с кнопками управления"""
+    templates = await get_shift_templates(db, tenant_id)
+    weeks = Config.SHIFT_TEMPLATE_WEEKS or TEMPLATE_WEEKS_MANUAL
+    
+    text = "🔁 Шаблоны смен\n\n"
+    if templates:
+        for i, template in enumerate(templates, 1):
+            text += f"{i}. {format_shift_template(template)}\n"
+        if Config.SHIFT_TEMPLATE_WEEKS:
+            text += f"\nСмены по шаблонам создаются автоматически на {weeks} нед. вперёд.\n"
+    else:
+        text += "Шаблонов пока нет.\n"
+    
+    keyboard = [[InlineKeyboardButton(text="➕ Новый шаблон", callback_data=pack("admin_template_add"))]]
+    if templates:
+        keyboard.append([InlineKeyboardButton(
+            text=f"⚡ Создать смены на {weeks} нед.", callback_data=pack("admin_templates_generate")
+        )])
+        for i, template in enumerate(templates, 1):
+            keyboard.append([InlineKeyboardButton(
+                text=f"🗑 {i}. {', '.join(template.weekdays)} {template.start_time.strftime('%H:%M')}",
+                callback_data=pack("admin_template_delete", template.id)
+            )])
+    keyboard.append([InlineKeyboardButton(text="◀️ Назад", callback_data=pack("admin_shifts"))])
+    
+    markup = InlineKeyboardMarkup(inline_keyboard=keyboard)
+    if edit:
+        await message.edit_text(text, reply_markup=markup)
+    else:
+        await message.answer(text, reply_markup=markup)
+
+
+@callbacks("admin_templates")
+async def admin_templates_menu(callback: CallbackQuery, state: FSMContext, db: AsyncSession, tenant_id: int):
+    """Меню шаблонов смен"""
+    if not await is_admin(callback.from_user.id, db, tenant_id):
+        await callback.answer("❌ У вас нет прав администратора.", show_alert=True)
+        return
+    
+    await state.clear()
+    await show_shift_templates(callback.message, db, tenant_id, edit=True)
+
+
+@callbacks("admin_template_add")
+async def admin_template_add_start(callback: CallbackQuery, state: FSMContext, db: AsyncSession, tenant_id: int):
+    """Начало добавления шаблона смены"""
+    if not await is_admin(callback.from_user.id, db, tenant_id):
+        await callback.answer("❌ У вас нет прав администратора.", show_alert=True)
+        return
+    
+    await callback.message.edit_text(
+        "🔁 Новый шаблон смены\n\n"
+        "Введите дни недели, время, число мест (необязательно) и описание:\n"
+        "ДНИ ЧЧ:ММ [мест] [описание]\n\n"
+        "Например: Пн, Ср, Пт 09:00 8 Сборка заказов"
+    )
+    await state.set_state(AdminStates.waiting_shift_template)
+
+
+@router.message(AdminStates.waiting_shift_template)
+async def admin_template_add_save(message: Message, state: FSMContext, db: AsyncSession, tenant_id: int):
+    """Сохранение шаблона смены"""
+    if not await is_admin(message.from_user.id, db, tenant_id):
+        await message.answer("❌ У вас нет прав администратора.")
+        await state.clear()
+        return
+    
+    parsed = parse_shift_template(message.text or "")
+    if parsed is None:
+        await message.answer(
+            "❌ Не удалось разобрать шаблон. Формат: ДНИ ЧЧ:ММ [мест] [описание]\n"
+            "Например: Пн, Ср, Пт 09:00 8 Сборка заказов\nПопробуйте снова:"
         )
+        return
+    
+    weekdays, start_time, capacity, description = parsed
+    await create_shift_template(db, weekdays, start_time, description, capacity, tenant_id)
+    await state.clear()
+    await message.answer("✅ Шаблон добавлен. Смены по нему можно создать кнопкой «Создать смены».")
+    await show_shift_templates(message, db, tenant_id)
 
 
-@router.callback_query(F.data.startswith("admin_edit_shift_"))
-async def admin_edit_shift(callback: CallbackQuery, state: FSMContext):
-    """Редактирование смены"""
-    if not await is_admin(callback.from_user.id):
+@callbacks("admin_template_delete")
+async def admin_template_delete(callback: CallbackQuery, template_id: int, db: AsyncSession, tenant_id: int):
+    """Отключение шаблона смены (созданные смены остаются)"""
+    if not await is_admin(callback.from_user.id, db, tenant_id):
         await callback.answer("❌ У вас нет прав администратора.", show_alert=True)
         return
     
-    shift_id = int(callback.data.replace("admin_edit_shift_", ""))
+    if await deactivate_shift_template(db, template_id, tenant_id):
+        await callback.answer("🗑 Шаблон удалён. Уже созданные смены остались.", show_alert=True)
+    else:
+        await callback.answer("❌ Шаблон не найден.", show_alert=True)
+    await show_shift_templates(callback.message, db, tenant_id, edit=True)
+
+
+@callbacks("admin_templates_generate")
+async def admin_templates_generate(callback: CallbackQuery, db: AsyncSession, tenant_id: int):
+    """Создание смен команды по шаблонам одной транзакцией"""
+    if not await is_admin(callback.from_user.id, db, tenant_id):
+        await callback.answer("❌ У вас нет прав администратора.", show_alert=True)
+        return
     
-    async with get_session() as db:
-        from database.crud import get_shift_by_id
-        shift = await get_shift_by_id(db, shift_id)
-        
-        if not shift:
-            await callback.answer("❌ Смена не найдена!", show_alert=True)
-            return
-        
+    weeks = Config.SHIFT_TEMPLATE_WEEKS or TEMPLATE_WEEKS_MANUAL
+    created, skipped = await generate_template_shifts(db, weeks, tenant_id)
+    await callback.answer(
+        f"✅ Создано смен: {created}\nУже были созданы ранее: {skipped}",
+        show_alert=True
+    )
+
+
+@callbacks("admin_edit_shift_list")
+async def admin_edit_shift_list(callback: CallbackQuery, state: FSMContext, db: AsyncSession, tenant_id: int):
+    """Список смен для редактирования"""
+    if not await is_admin(callback.from_user.id, db, tenant_id):
+        await callback.answer("❌ У вас нет прав администратора.", show_alert=True)
+        return
+    
+    shifts = await get_active_shift_rows(db, from_date=datetime.utcnow(), tenant_id=tenant_id)
+    
+    if not shifts:
+        await callback.answer("❌ Нет активных смен для редактирования!", show_alert=True)
+        return
+    
+    keyboard = []
+    for shift in shifts[:10]:  # Показываем первые 10
         date_str = shift.date.strftime("%d.%m.%Y %H:%M")
-        keyboard = [
-            [InlineKeyboardButton(text="📅 Изменить дату", callback_data=f"edit_date_{shift_id}")],
-            [InlineKeyboardButton(text="📝 Изменить описание", callback_data=f"edit_desc_{shift_id}")],
-            [InlineKeyboardButton(text="👥 Участники смены", callback_data=f"admin_participants_{shift_id}")],
-            [InlineKeyboardButton(text="✅ Информация о выполненной работе", callback_data=f"admin_completed_{shift_id}")],
-            [InlineKeyboardButton(text="◀️ Назад", callback_data="admin_edit_shift_list")]
-        ]
-        
-        completed_status = "✅ Добавлена" if shift.completed_info else "❌ Не добавлена"
-        await callback.message.edit_text(
-            f"📝 Редактирование смены\n\n"
-            f"ID: {shift.id}\n"
-            f"Дата: {date_str}\n"
-            f"Описание: {shift.description or 'Отсутствует'}\n"
-            f"Информация о работе: {completed_status}\n\n"
-            f"Что вы хотите изменить?",
-            reply_markup=InlineKeyboardMarkup(inline_keyboard=keyboard)
-        )
+        keyboard.append([
+            InlineKeyboardButton(
+                text=f"📅 {date_str}",
+                callback_data=pack("admin_edit_shift", shift.id)
+            )
+        ])
+    
+    keyboard.append([InlineKeyboardButton(text="◀️ Назад", callback_data=pack("admin_shifts"))])
+    
+    await callback.message.edit_text(
+        "📝 Выберите смену для редактирования:",
+        reply_markup=InlineKeyboardMarkup(inline_keyboard=keyboard)
+    )
+
+
+@callbacks("admin_edit_shift")
+async def admin_edit_shift(callback: CallbackQuery, shift_id: int, state: FSMContext, db: AsyncSession, tenant_id: int):
+    """Редактирование смены"""
+    if not await is_admin(callback.from_user.id, db, tenant_id):
+        await callback.answer("❌ У вас нет прав администратора.", show_alert=True)
+        return
+    
+    
+    shift = await get_shift_card(db, shift_id, tenant_id)
+    
+    if not shift:
+        await callback.answer("❌ Смена не найдена!", show_alert=True)
+        return
+    
+    date_str = shift.date.strftime("%d.%m.%Y %H:%M")
+    keyboard = [
+        [InlineKeyboardButton(text="📅 Изменить дату", callback_data=pack("edit_date", shift_id))],
+        [InlineKeyboardButton(text="📝 Изменить описание", callback_data=pack("edit_desc", shift_id))],
+        [InlineKeyboardButton(text="👥 Участники смены", callback_data=pack("admin_participants", shift_id))],
+        [InlineKeyboardButton(text="✅ Информация о выполненной работе", callback_data=pack("admin_completed", shift_id))],
+        [InlineKeyboardButton(text="◀️ Назад", callback_data=pack("admin_edit_shift_list"))]
+    ]
+    
+    completed_status = "✅ Добавлена" if shift.completed_info else "❌ Не добавлена"
+    await callback.message.edit_text(
+        f"📝 Редактирование смены\n\n"
+        f"ID: {shift.id}\n"
+        f"Дата: {date_str}\n"
+        f"Описание: {shift.description or 'Отсутствует'}\n"
+        f"Информация о работе: {completed_status}\n\n"
+        f"Что вы хотите изменить?",
+        reply_markup=InlineKeyboardMarkup(inline_keyboard=keyboard)
+    )
 
 
-@router.callback_query(F.data.startswith("edit_date_"))
-async def admin_edit_shift_date_start(callback: CallbackQuery, state: FSMContext):
+@callbacks("edit_date")
+async def admin_edit_shift_date_start(callback: CallbackQuery, shift_id: int, state: FSMContext, db: AsyncSession, tenant_id: int):
     """Начало редактирования даты смены"""
-    if not await is_admin(callback.from_user.id):
+    if not await is_admin(callback.from_user.id, db, tenant_id):
         await callback.answer("❌ У вас нет прав администратора.", show_alert=True)
         return
     
-    shift_id = int(callback.data.replace("edit_date_", ""))
+    if not await get_shift_card(db, shift_id, tenant_id):
+        await callback.answer("❌ Смена не найдена!", show_alert=True)
+        return
+    
     await callback.message.edit_text(
         "📅 Изменение даты смены\n\n"
         "Введите новую дату и время в формате:\n"
@@ -277,14 +602,17 @@ async def admin_edit_shift_date_start(callback: CallbackQuery, state: FSMContext
     await state.update_data(edit_shift_id=shift_id)
 
 
-@router.callback_query(F.data.startswith("edit_desc_"))
-async def admin_edit_shift_desc_start(callback: CallbackQuery, state: FSMContext):
+@callbacks("edit_desc")
+async def admin_edit_shift_desc_start(callback: CallbackQuery, shift_id: int, state: FSMContext, db: AsyncSession, tenant_id: int):
     """Начало редактирования описания смены"""
-    if not await is_admin(callback.from_user.id):
+    if not await is_admin(callback.from_user.id, db, tenant_id):
         await callback.answer("❌ У вас нет прав администратора.", show_alert=True)
         return
     
-    shift_id = int(callback.data.replace("edit_desc_", ""))
+    if not await get_shift_card(db, shift_id, tenant_id):
+        await callback.answer("❌ Смена не найдена!", show_alert=True)
+        return
+    
     await callback.message.edit_text(
         "📝 Изменение описания смены\n\n"
         "Введите новое описание (или отправьте '-' чтобы удалить описание):"
@@ -293,229 +621,221 @@ async def admin_edit_shift_desc_start(callback: CallbackQuery, state: FSMContext
     await state.update_data(edit_shift_id=shift_id)
 
 
-@router.callback_query(F.data == "admin_archive_shift_list")
-async def admin_archive_shift_list(callback: CallbackQuery):
+@callbacks("admin_archive_shift_list")
+async def admin_archive_shift_list(callback: CallbackQuery, db: AsyncSession, tenant_id: int):
     """Список смен для архивирования"""
-    if not await is_admin(callback.from_user.id):
+    if not await is_admin(callback.from_user.id, db, tenant_id):
         await callback.answer("❌ У вас нет прав администратора.", show_alert=True)
         return
     
-    async with get_session() as db:
-        shifts = await get_active_shifts(db)
-        
-        if not shifts:
-            await callback.answer("❌ Нет активных смен для архивирования!", show_alert=True)
-            return
-        
-        keyboard = []
-        for shift in shifts[:10]:
-            date_str = shift.date.strftime("%d.%m.%Y %H:%M")
-            keyboard.append([
-                InlineKeyboardButton(
-                    text=f"📅 {date_str}",
-                    callback_data=f"admin_archive_shift_{shift.id}"
-                )
-            ])
-        
-        keyboard.append([InlineKeyboardButton(text="◀️ Назад", callback_data="admin_shifts")])
-        
-        await callback.message.edit_text(
-            "🗄️ Выберите смену для архивирования:",
-            reply_markup=InlineKeyboardMarkup(inline_keyboard=keyboard)
-        )
+    shifts = await get_active_shift_rows(db, tenant_id=tenant_id)
+    
+    if not shifts:
+        await callback.answer("❌ Нет активных смен для архивирования!", show_alert=True)
+        return
+    
+    keyboard = []
+    for shift in shifts[:10]:
+        date_str = shift.date.strftime("%d.%m.%Y %H:%M")
+        keyboard.append([
+            InlineKeyboardButton(
+                text=f"📅 {date_str}",
+                callback_data=pack("admin_archive_shift", shift.id)
+            )
+        ])
+    
+    keyboard.append([InlineKeyboardButton(text="◀️ Назад", callback_data=pack("admin_shifts"))])
+    
+    await callback.message.edit_text(
+        "🗄️ Выберите смену для архивирования:",
+        reply_markup=InlineKeyboardMarkup(inline_keyboard=keyboard)
+    )
 
 
-@router.callback_query(F.data.startswith("admin_archive_shift_"))
-async def admin_archive_shift(callback: CallbackQuery):
+@callbacks("admin_archive_shift")
+async def admin_archive_shift(callback: CallbackQuery, shift_id: int, db: AsyncSession, tenant_id: int):
     """Архивирование смены"""
-    if not await is_admin(callback.from_user.id):
+    if not await is_admin(callback.from_user.id, db, tenant_id):
         await callback.answer("❌ У вас нет прав администратора.", show_alert=True)
         return
     
-    shift_id = int(callback.data.replace("admin_archive_shift_", ""))
     
-    async with get_session() as db:
-        shift = await archive_shift(db, shift_id)
-        
-        if shift:
-            await callback.answer("✅ Смена успешно архивирована!", show_alert=True)
-            await admin_shifts_menu(callback)
-        else:
-            await callback.answer("❌ Смена не найдена!", show_alert=True)
+    shift = await archive_shift(db, shift_id, tenant_id)
+    
+    if shift:
+        await callback.answer("✅ Смена успешно архивирована!", show_alert=True)
+        await admin_shifts_menu(callback, db, tenant_id)
+    else:
+        await callback.answer("❌ Смена не найдена!", show_alert=True)
 
 
 # ==================== УЧАСТНИКИ СМЕНЫ ====================
 
-@router.callback_query(F.data == "admin_shift_participants_list")
-async def admin_shift_participants_list(callback: CallbackQuery):
+@callbacks("admin_shift_participants_list")
+async def admin_shift_participants_list(callback: CallbackQuery, db: AsyncSession, tenant_id: int):
     """Список смен для просмотра участников"""
-    if not await is_admin(callback.from_user.id):
+    if not await is_admin(callback.from_user.id, db, tenant_id):
         await callback.answer("❌ У вас нет прав администратора.", show_alert=True)
         return
     
-    async with get_session() as db:
-        # Получаем все смены (включая прошедшие) для просмотра участников
-        from sqlalchemy import select
-        from database.models import Shift
-        query = select(Shift).where(Shift.is_active == True).order_by(Shift.date.desc())
-        result = await db.execute(query)
-        shifts = list(result.scalars().all())
-        
-        if not shifts:
-            await callback.answer("❌ Нет активных смен!", show_alert=True)
-            return
-        
-        keyboard = []
-        for shift in shifts[:15]:  # Показываем последние 15 смен
-            date_str = shift.date.strftime("%d.%m.%Y %H:%M")
-            keyboard.append([
-                InlineKeyboardButton(
-                    text=f"📅 {date_str}",
-                    callback_data=f"admin_participants_{shift.id}"
-                )
-            ])
-        
-        keyboard.append([InlineKeyboardButton(text="◀️ Назад", callback_data="admin_shifts")])
-        
-        await callback.message.edit_text(
-            "👥 Выберите смену для просмотра участников:",
-            reply_markup=InlineKeyboardMarkup(inline_keyboard=keyboard)
-        )
+    # Получаем все смены (включая прошедшие) для просмотра участников
+    from sqlalchemy import select
+    from database.models import Shift
+    query = select(Shift).where(Shift.tenant_id == tenant_id, Shift.is_active == True).order_by(Shift.date.desc())
+    result = await db.execute(query)
+    shifts = list(result.scalars().all())
+    
+    if not shifts:
+        await callback.answer("❌ Нет активных смен!", show_alert=True)
+        return
+    
+    keyboard = []
+    for shift in shifts[:15]:  # Показываем последние 15 смен
+        date_str = shift.date.strftime("%d.%m.%Y %H:%M")
+        keyboard.append([
+            InlineKeyboardButton(
+                text=f"📅 {date_str}",
+                callback_data=pack("admin_participants", shift.id)
+            )
+        ])
+    
+    keyboard.append([InlineKeyboardButton(text="◀️ Назад", callback_data=pack("admin_shifts"))])
+    
+    await callback.message.edit_text(
+        "👥 Выберите смену для просмотра участников:",
+        reply_markup=InlineKeyboardMarkup(inline_keyboard=keyboard)
+    )
 
 
-@router.callback_query(F.data.startswith("admin_participants_"))
-async def admin_shift_participants(callback: CallbackQuery):
+@callbacks("admin_participants")
+async def admin_shift_participants(callback: CallbackQuery, shift_id: int, db: AsyncSession, tenant_id: int):
     """Просмотр участников смены"""
-    if not await is_admin(callback.from_user.id):
+    if not await is_admin(callback.from_user.id, db, tenant_id):
         await callback.answer("❌ У вас нет прав администратора.", show_alert=True)
         return
     
-    shift_id = int(callback.data.replace("admin_participants_", ""))
     
-    async with get_session() as db:
-        from database.crud import get_shift_by_id, get_shift_participants
-        shift = await get_shift_by_id(db, shift_id)
-        
-        if not shift:
-            await callback.answer("❌ Смена не найдена!", show_alert=True)
-            return
-        
-        participants = await get_shift_participants(db, shift_id)
-        date_str = shift.date.strftime("%d.%m.%Y %H:%M")
-        
-        text = f"👥 Участники смены\n\n"
-        text += f"📅 Дата: {date_str}\n"
-        text += f"📝 Описание: {shift.description or 'Отсутствует'}\n\n"
-        
-        if not participants:
-            text += "❌ На эту смену нет записанных участников."
-        else:
-            text += f"Всего участников: {len(participants)}\n\n"
-            for i, user in enumerate(participants, 1):
-                stars = "⭐" * user.rating
-                text += f"{i}. {user.full_name}\n"
-                text += f"   📞 Телефон: {user.phone}\n"
-                text += f"   ID: {user.telegram_id} | Рейтинг: {stars}\n"
-                text += f"   Курс: {user.course} | Опыт: {user.experience_shifts} смен\n\n"
-        
-        keyboard = [
-            [InlineKeyboardButton(text="◀️ Назад к списку", callback_data="admin_shift_participants_list")]
-        ]
-        
-        await callback.message.edit_text(
-            text,
-            reply_markup=InlineKeyboardMarkup(inline_keyboard=keyboard)
-        )
+    shift = await get_shift_card(db, shift_id, tenant_id)
+    
+    if not shift:
+        await callback.answer("❌ Смена не найдена!", show_alert=True)
+        return
+    
+    participants = await get_shift_participants_with_stats(db, shift_id)
+    date_str = shift.date.strftime("%d.%m.%Y %H:%M")
+    
+    text = f"👥 Участники смены\n\n"
+    text += f"📅 Дата: {date_str}\n"
+    text += f"📝 Описание: {shift.description or 'Отсутствует'}\n\n"
+    
+    if not participants:
+        text += "❌ На эту смену нет записанных участников."
+    else:
+        capacity = f" из {shift.capacity} мест" if shift.capacity is not None else ""
+        text += f"Всего участников: {len(participants)}{capacity}\n\n"
+        for i, (user, stats) in enumerate(participants, 1):
+            stars = "⭐" * user.rating
+            text += f"{i}. {user.full_name}\n"
+            text += f"   📞 Телефон: {user.phone}\n"
+            text += f"   ID: {user.telegram_id} | Рейтинг: {stars}\n"
+            text += f"   Курс: {user.course} | Опыт до бота: {user.experience_shifts} смен\n"
+            text += f"   📊 {format_user_stats(stats)}\n\n"
+    
+    keyboard = [
+        [InlineKeyboardButton(text="◀️ Назад к списку", callback_data=pack("admin_shift_participants_list"))]
+    ]
+    
+    await callback.message.edit_text(
+        text,
+        reply_markup=InlineKeyboardMarkup(inline_keyboard=keyboard)
+    )
 
 
 # ==================== ИНФОРМАЦИЯ О ВЫПОЛНЕННОЙ РАБОТЕ ====================
 
-@router.callback_query(F.data == "admin_shift_completed_list")
-async def admin_shift_completed_list(callback: CallbackQuery):
+@callbacks("admin_shift_completed_list")
+async def admin_shift_completed_list(callback: CallbackQuery, db: AsyncSession, tenant_id: int):
     """Список смен для добавления информации о выполненной работе"""
-    if not await is_admin(callback.from_user.id):
+    if not await is_admin(callback.from_user.id, db, tenant_id):
         await callback.answer("❌ У вас нет прав администратора.", show_alert=True)
         return
     
-    async with get_session() as db:
-        # Получаем все смены (включая прошедшие)
-        from sqlalchemy import select
-        from database.models import Shift
-        query = select(Shift).where(Shift.is_active == True).order_by(Shift.date.desc())
-        result = await db.execute(query)
-        shifts = list(result.scalars().all())
-        
-        if not shifts:
-            await callback.answer("❌ Нет активных смен!", show_alert=True)
-            return
-        
-        keyboard = []
-        for shift in shifts[:15]:  # Показываем последние 15 смен
-            date_str = shift.date.strftime("%d.%m.%Y %H:%M")
-            has_info = "✅" if shift.completed_info else "❌"
-            keyboard.append([
-                InlineKeyboardButton(
-                    text=f"{has_info} {date_str}",
-                    callback_data=f"admin_completed_{shift.id}"
-                )
-            ])
-        
-        keyboard.append([InlineKeyboardButton(text="◀️ Назад", callback_data="admin_shifts")])
-        
-        await callback.message.edit_text(
-            "✅ Информация о выполненной работе\n\n"
-            "Выберите смену для добавления/просмотра информации:\n"
-            "(✅ - информация добавлена, ❌ - не добавлена)",
-            reply_markup=InlineKeyboardMarkup(inline_keyboard=keyboard)
-        )
+    # Получаем все смены (включая прошедшие)
+    from sqlalchemy import select
+    from database.models import Shift
+    query = select(Shift).where(Shift.tenant_id == tenant_id, Shift.is_active == True).order_by(Shift.date.desc())
+    result = await db.execute(query)
+    shifts = list(result.scalars().all())
+    
+    if not shifts:
+        await callback.answer("❌ Нет активных смен!", show_alert=True)
+        return
+    
+    keyboard = []
+    for shift in shifts[:15]:  # Показываем последние 15 смен
+        date_str = shift.date.strftime("%d.%m.%Y %H:%M")
+        has_info = "✅" if shift.completed_info else "❌"
+        keyboard.append([
+            InlineKeyboardButton(
+                text=f"{has_info} {date_str}",
+                callback_data=pack("admin_completed", shift.id)
+            )
+        ])
+    
+    keyboard.append([InlineKeyboardButton(text="◀️ Назад", callback_data=pack("admin_shifts"))])
+    
+    await callback.message.edit_text(
+        "✅ Информация о выполненной работе\n\n"
+        "Выберите смену для добавления/просмотра информации:\n"
+        "(✅ - информация добавлена, ❌ - не добавлена)",
+        reply_markup=InlineKeyboardMarkup(inline_keyboard=keyboard)
+    )
 
 
-@router.callback_query(F.data.startswith("admin_completed_"))
-async def admin_shift_completed(callback: CallbackQuery, state: FSMContext):
+@callbacks("admin_completed")
+async def admin_shift_completed(callback: CallbackQuery, shift_id: int, state: FSMContext, db: AsyncSession, tenant_id: int):
     """Просмотр/редактирование информации о выполненной работе"""
-    if not await is_admin(callback.from_user.id):
+    if not await is_admin(callback.from_user.id, db, tenant_id):
         await callback.answer("❌ У вас нет прав администратора.", show_alert=True)
         return
     
-    shift_id = int(callback.data.replace("admin_completed_", ""))
     
-    async with get_session() as db:
-        from database.crud import get_shift_by_id, get_shift_participants
-        shift = await get_shift_by_id(db, shift_id)
-        
-        if not shift:
-            await callback.answer("❌ Смена не найдена!", show_alert=True)
-            return
-        
-        participants = await get_shift_participants(db, shift_id)
-        date_str = shift.date.strftime("%d.%m.%Y %H:%M")
-        
-        text = f"✅ Информация о выполненной работе\n\n"
-        text += f"📅 Дата: {date_str}\n"
-        
-        if participants:
-            text += f"👥 Участники ({len(participants)}):\n"
-            for user in participants:
-                text += f"• {user.full_name} ({user.phone})\n"
-            text += "\n"
-        
-        if shift.completed_info:
-            text += f"📝 Текущая информация:\n{shift.completed_info}\n\n"
-            text += "Введите новую информацию о выполненной работе\n(или отправьте '-' чтобы удалить):"
-        else:
-            text += "❌ Информация о выполненной работе не добавлена.\n\n"
-            text += "Введите информацию о выполненной работе:\n"
-            text += "(что было сделано, какие задачи выполнены и т.д.)"
-        
-        await callback.message.edit_text(text)
-        await state.set_state(AdminStates.waiting_completed_info)
-        await state.update_data(shift_id=shift_id)
+    from database.crud import get_shift_participants
+    shift = await get_shift_card(db, shift_id, tenant_id)
+    
+    if not shift:
+        await callback.answer("❌ Смена не найдена!", show_alert=True)
+        return
+    
+    participants = await get_shift_participants(db, shift_id)
+    date_str = shift.date.strftime("%d.%m.%Y %H:%M")
+    
+    text = f"✅ Информация о выполненной работе\n\n"
+    text += f"📅 Дата: {date_str}\n"
+    
+    if participants:
+        text += f"👥 Участники ({len(participants)}):\n"
+        for user in participants:
+            text += f"• {user.full_name} ({user.phone})\n"
+        text += "\n"
+    
+    if shift.completed_info:
+        text += f"📝 Текущая информация:\n{shift.completed_info}\n\n"
+        text += "Введите новую информацию о выполненной работе\n(или отправьте '-' чтобы удалить):"
+    else:
+        text += "❌ Информация о выполненной работе не добавлена.\n\n"
+        text += "Введите информацию о выполненной работе:\n"
+        text += "(что было сделано, какие задачи выполнены и т.д.)"
+    
+    await callback.message.edit_text(text)
+    await state.set_state(AdminStates.waiting_completed_info)
+    await state.update_data(shift_id=shift_id)
 
 
 @router.message(AdminStates.waiting_completed_info)
-async def admin_shift_completed_info_save(message: Message, state: FSMContext):
+async def admin_shift_completed_info_save(message: Message, state: FSMContext, db: AsyncSession, tenant_id: int):
     """Сохранение информации о выполненной работе"""
-    if not await is_admin(message.from_user.id):
+    if not await is_admin(message.from_user.id, db, tenant_id):
         await message.answer("❌ У вас нет прав администратора.")
         await state.clear()
         return
@@ -523,109 +843,501 @@ async def admin_shift_completed_info_save(message: Message, state: FSMContext):
     data = await state.get_data()
     shift_id = data["shift_id"]
     
-    completed_info = None if message.text == "-" else message.text
+    completed_info = None if message.text == "-" else message.text
+    
+    shift = await update_shift(db, shift_id, tenant_id, completed_info=completed_info)
+    
+    if shift:
+        if completed_info:
+            await message.answer("✅ Информация о выполненной работе успешно сохранена!")
+        else:
+            await message.answer("✅ Информация о выполненной работе удалена!")
+    else:
+        await message.answer("❌ Смена не найдена!")
+    
+    await state.clear()
+
+
+async def send_history_export(message: Message, db: AsyncSession, tenant_id: int, date_from: datetime, date_to: datetime):
+    """Формирование и отправка CSV с историей смен команды за период"""
+    period = f"{date_from.strftime('%d.%m.%Y')}-{(date_to - timedelta(days=1)).strftime('%d.%m.%Y')}"
+    total = await count_shift_history(db, date_from, date_to, tenant_id)
+    if not total:
+        await message.answer(f"📊 За период {period} смен нет.")
+        return
+    
+    status_message = await message.answer(f"⏳ Выгрузка истории за {period}: 0 из {total}")
+    loop = asyncio.get_running_loop()
+    last_update = loop.time()
+    
+    async def on_progress(written: int):
+        nonlocal last_update
+        if loop.time() - last_update < EXPORT_PROGRESS_INTERVAL:
+            return
+        last_update = loop.time()
+        try:
+            await status_message.edit_text(f"⏳ Выгрузка истории за {period}: {written} из {total}")
+        except Exception:
+            pass  # Прогресс не важнее самой выгрузки
+    
+    path = make_temp_path("history_")
+    try:
+        count = await write_csv(
+            path, HISTORY_EXPORT_HEADER, stream_shift_history(db, date_from, date_to, tenant_id=tenant_id), on_progress
+        )
+        file_name = f"history_{date_from.strftime('%Y%m%d')}_{(date_to - timedelta(days=1)).strftime('%Y%m%d')}.csv"
+        await message.answer_document(
+            FSInputFile(path, filename=file_name),
+            caption=f"📊 История смен за {period}: строк {count}"
+        )
+        await status_message.edit_text(f"✅ Выгрузка истории за {period} готова: строк {count}")
+    finally:
+        os.remove(path)
+
+
+@callbacks("admin_export_history")
+async def admin_export_history_start(callback: CallbackQuery, state: FSMContext, db: AsyncSession, tenant_id: int):
+    """Начало выгрузки истории смен"""
+    if not await is_admin(callback.from_user.id, db, tenant_id):
+        await callback.answer("❌ У вас нет прав администратора.", show_alert=True)
+        return
+    
+    await callback.message.edit_text(
+        "📊 Выгрузка истории смен\n\n"
+        "Введите период в формате:\n"
+        "ДД.ММ.ГГГГ ДД.ММ.ГГГГ\n\n"
+        "Например: 01.09.2024 31.12.2024\n\n"
+        "В файле - все смены периода с участниками и статусом записи (включая отменённые).\n"
+        "То же самое делает команда /export_history ДД.ММ.ГГГГ ДД.ММ.ГГГГ"
+    )
+    await state.set_state(AdminStates.waiting_history_range)
+
+
+@router.message(AdminStates.waiting_history_range)
+async def admin_export_history_range(message: Message, state: FSMContext, db: AsyncSession, tenant_id: int):
+    """Обработка периода выгрузки истории"""
+    if not await is_admin(message.from_user.id, db, tenant_id):
+        await message.answer("❌ У вас нет прав администратора.")
+        await state.clear()
+        return
+    
+    date_range = parse_date_range(message.text or "")
+    if not date_range:
+        await message.answer("❌ Неверный период. Используйте формат ДД.ММ.ГГГГ ДД.ММ.ГГГГ\nПопробуйте снова:")
+        return
+    
+    await state.clear()
+    await send_history_export(message, db, tenant_id, *date_range)
+
+
+@router.message(Command("export_history"))
+async def cmd_export_history(message: Message, command: CommandObject, db: AsyncSession, tenant_id: int):
+    """Команда выгрузки истории смен: /export_history ДД.ММ.ГГГГ ДД.ММ.ГГГГ"""
+    if not await is_admin(message.from_user.id, db, tenant_id):
+        await message.answer("❌ У вас нет прав администратора.")
+        return
+    
+    date_range = parse_date_range(command.args or "")
+    if not date_range:
+        await message.answer("Использование: /export_history ДД.ММ.ГГГГ ДД.ММ.ГГГГ")
+        return
+    
+    await send_history_export(message, db, tenant_id, *date_range)
+
+
+# ==================== УПРАВЛЕНИЕ ПОЛЬЗОВАТЕЛЯМИ ====================
+
+@callbacks("admin_users")
+async def admin_users_menu(callback: CallbackQuery, db: AsyncSession, tenant_id: int):
+    """Меню управления пользователями"""
+    if not await is_admin(callback.from_user.id, db, tenant_id):
+        await callback.answer("❌ У вас нет прав администратора.", show_alert=True)
+        return
+    
+    users = await get_all_users(db, is_registered=True, tenant_id=tenant_id)
+    
+    text = f"👥 Управление пользователями\n\nВсего зарегистрированных: {len(users)}\n\n"
+    
+    keyboard = [
+        [InlineKeyboardButton(text="🔍 Поиск сотрудника", callback_data=pack("admin_user_search"))],
+        [InlineKeyboardButton(text="📋 Список пользователей", callback_data=pack("admin_users_list"))],
+        [InlineKeyboardButton(text="⭐ Изменить рейтинг", callback_data=pack("admin_change_user_field", "rating"))],
+        [InlineKeyboardButton(text="📞 Изменить телефон", callback_data=pack("admin_change_user_field", "phone"))],
+        [InlineKeyboardButton(text="🛠️ Изменить навыки", callback_data=pack("admin_change_user_field", "skills"))],
+        [InlineKeyboardButton(text="📥 Импорт из файла", callback_data=pack("admin_import_users"))],
+        [InlineKeyboardButton(text="📤 Экспорт в CSV", callback_data=pack("admin_export_users"))]
+    ]
+    
+    keyboard.append([InlineKeyboardButton(text="◀️ Назад", callback_data=pack("admin_back"))])
+    
+    await callback.message.edit_text(
+        text,
+        reply_markup=InlineKeyboardMarkup(inline_keyboard=keyboard)
+    )
+
+
+@callbacks("admin_users_list")
+async def admin_users_list(callback: CallbackQuery, db: AsyncSession, tenant_id: int):
+    """Список всех пользователей"""
+    if not await is_admin(callback.from_user.id, db, tenant_id):
+        await callback.answer("❌ У вас нет прав администратора.", show_alert=True)
+        return
+    
+    users = await get_all_users_with_stats(db, is_registered=True, tenant_id=tenant_id)
+    
+    if not users:
+        await callback.message.edit_text(
+            "👥 Нет зарегистрированных пользователей.",
+            reply_markup=InlineKeyboardMarkup(inline_keyboard=[
+                [InlineKeyboardButton(text="◀️ Назад", callback_data=pack("admin_users"))]
+            ])
+        )
+        return
+    
+    text = f"👥 Список пользователей (всего: {len(users)})\n\n"
+    
+    # Показываем первые 20 пользователей
+    for i, (user, stats) in enumerate(users[:20], 1):
+        stars = "⭐" * user.rating
+        text += f"{i}. {user.full_name}\n"
+        text += f"   📞 Телефон: {user.phone}\n"
+        text += f"   ID: {user.telegram_id} | Рейтинг: {stars} ({user.rating}/5)\n"
+        text += f"   Курс: {user.course} | Опыт до бота: {user.experience_shifts} смен\n"
+        text += f"   📊 {format_user_stats(stats)}\n\n"
+    
+    if len(users) > 20:
+        text += f"\n... и ещё {len(users) - 20} пользователей"
+    
+    await callback.message.edit_text(
+        text,
+        reply_markup=InlineKeyboardMarkup(inline_keyboard=[
+            [InlineKeyboardButton(text="◀️ Назад", callback_data=pack("admin_users"))]
+        ])
+    )
+
+
+# ---------- Поиск и карточка сотрудника ----------
+
+def render_search_results(query: str, total: int, rows, page: int) -> tuple:
+    """Текст и клавиатура страницы результатов поиска"""
+    pages = max((total + SEARCH_PAGE_SIZE - 1) // SEARCH_PAGE_SIZE, 1)
+    query = html.escape(query)  # Сообщения отправляются с разметкой HTML
+    if not total:
+        text = f"🔍 По запросу «{query}» никого не найдено.\n\nОтправьте другой запрос:"
+    else:
+        text = f"🔍 Найдено по запросу «{query}»: {total}\n\nВыберите сотрудника или отправьте другой запрос:"
+    
+    keyboard = [
+        [InlineKeyboardButton(text=f"{user.full_name} · {user.phone}", callback_data=pack("admin_user", user.id))]
+        for user, _ in rows
+    ]
+    if pages > 1:
+        navigation = []
+        if page > 0:
+            navigation.append(InlineKeyboardButton(text="◀️", callback_data=pack("admin_search_page", page - 1)))
+        navigation.append(InlineKeyboardButton(text=f"{page + 1}/{pages}", callback_data=pack("admin_search_page", page)))
+        if page + 1 < pages:
+            navigation.append(InlineKeyboardButton(text="▶️", callback_data=pack("admin_search_page", page + 1)))
+        keyboard.append(navigation)
+    keyboard.append([InlineKeyboardButton(text="◀️ Назад", callback_data=pack("admin_users"))])
+    return text, InlineKeyboardMarkup(inline_keyboard=keyboard)
+
+
+async def show_search_results(
+    message: Message, state: FSMContext, db: AsyncSession, tenant_id: int, query: str, page: int = 0, edit: bool = False
+):
+    """Поиск и вывод страницы результатов; запрос сохраняется для листания и возврата из карточки"""
+    total, rows = await search_users(
+        db, query, limit=SEARCH_PAGE_SIZE, offset=page * SEARCH_PAGE_SIZE,
+        phone_e164=normalize_phone(query), tenant_id=tenant_id
+    )
+    await state.update_data(search_query=query, search_page=page)
+    await state.set_state(AdminStates.waiting_user_search)
+    text, keyboard = render_search_results(query, total, rows, page)
+    if edit:
+        await message.edit_text(text, reply_markup=keyboard)
+    else:
+        await message.answer(text, reply_markup=keyboard)
+
+
+@callbacks("admin_user_search")
+async def admin_user_search_start(callback: CallbackQuery, state: FSMContext, db: AsyncSession, tenant_id: int):
+    """Начало поиска сотрудника"""
+    if not await is_admin(callback.from_user.id, db, tenant_id):
+        await callback.answer("❌ У вас нет прав администратора.", show_alert=True)
+        return
+    
+    await callback.message.edit_text(
+        "🔍 Поиск сотрудника\n\n"
+        "Введите ФИО, телефон или навык (можно начало слова, например: «иван петр» или «999 12»):",
+        reply_markup=InlineKeyboardMarkup(inline_keyboard=[
+            [InlineKeyboardButton(text="◀️ Назад", callback_data=pack("admin_users"))]
+        ])
+    )
+    await state.set_state(AdminStates.waiting_user_search)
+
+
+@router.message(Command("find"))
+async def cmd_find(message: Message, state: FSMContext, db: AsyncSession, command: CommandObject, tenant_id: int):
+    """Поиск сотрудника: /find ФИО, телефон или навык"""
+    if not await is_admin(message.from_user.id, db, tenant_id):
+        await message.answer("❌ У вас нет прав администратора.")
+        return
+    
+    if not command.args or not command.args.strip():
+        await message.answer("❌ Использование: /find ФИО, телефон или навык")
+        return
+    await show_search_results(message, state, db, tenant_id, command.args.strip())
+
+
+@router.message(AdminStates.waiting_user_search, F.text, ~F.text.startswith("/"))
+async def admin_user_search_query(message: Message, state: FSMContext, db: AsyncSession, tenant_id: int):
+    """Поиск по введённому запросу"""
+    if not await is_admin(message.from_user.id, db, tenant_id):
+        await message.answer("❌ У вас нет прав администратора.")
+        await state.clear()
+        return
+    
+    await show_search_results(message, state, db, tenant_id, message.text.strip())
+
+
+@callbacks("admin_search_page")
+async def admin_search_page(callback: CallbackQuery, page: int, state: FSMContext, db: AsyncSession, tenant_id: int):
+    """Листание результатов поиска"""
+    if not await is_admin(callback.from_user.id, db, tenant_id):
+        await callback.answer("❌ У вас нет прав администратора.", show_alert=True)
+        return
+    
+    data = await state.get_data()
+    query = data.get("search_query")
+    if not query:
+        await callback.answer("Поиск устарел, введите запрос заново.", show_alert=True)
+        return
+    await show_search_results(callback.message, state, db, tenant_id, query, page, edit=True)
+    await callback.answer()
+
+
+@callbacks("admin_user")
+async def admin_user_card(callback: CallbackQuery, user_id: int, state: FSMContext, db: AsyncSession, tenant_id: int):
+    """Карточка сотрудника"""
+    if not await is_admin(callback.from_user.id, db, tenant_id):
+        await callback.answer("❌ У вас нет прав администратора.", show_alert=True)
+        return
+    
+    row = await get_user_with_stats(db, user_id, tenant_id)
+    if not row:
+        await callback.answer("❌ Пользователь не найден.", show_alert=True)
+        return
+    user, stats = row
+    
+    status = "зарегистрирован" if user.is_registered else "не завершил регистрацию"
+    if user.is_blocked:
+        status += ", заблокировал бота"
+    # Поля введены пользователем, а сообщения отправляются с разметкой HTML
+    text = (
+        f"👤 {html.escape(user.full_name)}\n\n"
+        f"ID: {user.telegram_id}\n"
+        f"📞 Телефон: {html.escape(user.phone)}\n"
+        f"🎓 Курс: {user.course}\n"
+        f"🛠️ Навыки: {html.escape(user.skills or 'Не указаны')}\n"
+        f"📅 Дни: {', '.join(user.preferred_days) if user.preferred_days else 'Не указаны'}\n"
+        f"Опыт до бота: {user.experience_shifts} смен\n"
+        f"Рейтинг: {'⭐' * user.rating} ({user.rating}/5)\n"
+        f"Статус: {status}\n\n"
+        f"📊 {format_user_stats(stats)}"
+    )
+    keyboard = [
+        [InlineKeyboardButton(text="⭐ Изменить рейтинг", callback_data=pack("admin_user_edit", "rating", user.id))],
+        [InlineKeyboardButton(text="📞 Изменить телефон", callback_data=pack("admin_user_edit", "phone", user.id))],
+        [InlineKeyboardButton(text="🛠️ Изменить навыки", callback_data=pack("admin_user_edit", "skills", user.id))],
+    ]
+    data = await state.get_data()
+    if data.get("search_query"):
+        keyboard.append([InlineKeyboardButton(
+            text="◀️ К результатам поиска", callback_data=pack("admin_search_page", data.get("search_page", 0))
+        )])
+    keyboard.append([InlineKeyboardButton(text="◀️ Назад", callback_data=pack("admin_users"))])
+    await callback.message.edit_text(text, reply_markup=InlineKeyboardMarkup(inline_keyboard=keyboard))
+
+
+@callbacks("admin_user_edit")
+async def admin_user_edit(callback: CallbackQuery, field: str, user_id: int, state: FSMContext, db: AsyncSession, tenant_id: int):
+    """Изменение рейтинга, телефона или навыков из карточки сотрудника"""
+    if not await is_admin(callback.from_user.id, db, tenant_id):
+        await callback.answer("❌ У вас нет прав администратора.", show_alert=True)
+        return
+    
+    row = await get_user_with_stats(db, user_id, tenant_id)
+    if not row:
+        await callback.answer("❌ Пользователь не найден.", show_alert=True)
+        return
+    await ask_user_field(callback.message, state, db, row[0], f"change_{field}")
+    await callback.answer()
+
+
+@callbacks("admin_import_users")
+async def admin_import_users_start(callback: CallbackQuery, state: FSMContext, db: AsyncSession, tenant_id: int):
+    """Начало массового импорта пользователей"""
+    if not await is_admin(callback.from_user.id, db, tenant_id):
+        await callback.answer("❌ У вас нет прав администратора.", show_alert=True)
+        return
+    
+    await callback.message.edit_text(
+        "📥 Импорт пользователей\n\n"
+        "Отправьте файл CSV или XLSX. Первая строка - заголовок с колонками:\n"
+        f"{', '.join(ROSTER_COLUMNS)}\n\n"
+        "Обязательные: telegram_id, full_name, course, phone.\n"
+        "Дни указываются через запятую (Пн,Ср,Пт). Пустые навыки, дни и рейтинг у существующих "
+        "пользователей не меняются, новым ставится рейтинг 3.\n\n"
+        "Пользователи с уже известным telegram_id будут обновлены.\n"
+        "Подойдёт и файл, полученный через «Экспорт в CSV»."
+    )
+    await state.set_state(AdminStates.waiting_roster_file)
+
+
+@router.message(AdminStates.waiting_roster_file, F.document)
+async def admin_import_users_file(message: Message, state: FSMContext, db: AsyncSession, tenant_id: int):
+    """Обработка файла импорта пользователей"""
+    if not await is_admin(message.from_user.id, db, tenant_id):
+        await message.answer("❌ У вас нет прав администратора.")
+        await state.clear()
+        return
+    
+    document = message.document
+    file_name = document.file_name or ""
+    if not file_name.lower().endswith((".csv", ".xlsx")):
+        await message.answer("❌ Поддерживаются только файлы CSV и XLSX. Попробуйте снова:")
+        return
+    if document.file_size and document.file_size > MAX_ROSTER_FILE_SIZE:
+        await message.answer("❌ Файл слишком большой (максимум 20 МБ).")
+        return
+    
+    status_message = await message.answer("⏳ Обработка файла...")
     
-    async with get_session() as db:
-        shift = await update_shift(db, shift_id, completed_info=completed_info)
-        
-        if shift:
-            if completed_info:
-                await message.answer("✅ Информация о выполненной работе успешно сохранена!")
-            else:
-                await message.answer("✅ Информация о выполненной работе удалена!")
-        else:
-            await message.answer("❌ Смена не найдена!")
+    content = io.BytesIO()
+    await message.bot.download(document, destination=content)
+    rows, errors = await asyncio.to_thread(parse_roster, content.getvalue(), file_name)
+    if rows:
+        owners = await get_users_by_phones(db, [row["phone_e164"] for row in rows])
+        rows, phone_errors = exclude_taken_phones(rows, owners, tenant_id)
+        errors = sorted(errors + phone_errors)
+    written = await bulk_upsert_users(db, rows, tenant_id=tenant_id) if rows else 0
     
     await state.clear()
+    
+    text = (
+        f"✅ Импорт завершён\n\n"
+        f"Записано пользователей: {written}\n"
+        f"Строк с ошибками: {len(errors)}"
+    )
+    if errors:
+        text += "\n\n"
+        for line_no, error in errors[:IMPORT_ERRORS_IN_MESSAGE]:
+            text += f"• Строка {line_no}: {error}\n"
+        if len(errors) > IMPORT_ERRORS_IN_MESSAGE:
+            text += "... полный список ошибок - в файле ниже"
+    await status_message.edit_text(text)
+    
+    if len(errors) > IMPORT_ERRORS_IN_MESSAGE:
+        report = io.StringIO()
+        writer = csv.writer(report, delimiter=CSV_DELIMITER)
+        writer.writerow(["line", "error"])
+        writer.writerows(errors)
+        await message.answer_document(
+            BufferedInputFile(report.getvalue().encode("utf-8-sig"), filename="import_errors.csv"),
+            caption="📄 Ошибки импорта"
+        )
 
 
-# ==================== УПРАВЛЕНИЕ ПОЛЬЗОВАТЕЛЯМИ ====================
-
-@router.callback_query(F.data == "admin_users")
-async def admin_users_menu(callback: CallbackQuery):
-    """Меню управления пользователями"""
-    if not await is_admin(callback.from_user.id):
-        await callback.answer("❌ У вас нет прав администратора.", show_alert=True)
+@router.message(AdminStates.waiting_roster_file)
+async def admin_import_users_not_file(message: Message, state: FSMContext, db: AsyncSession, tenant_id: int):
+    """Ожидание файла импорта"""
+    if not await is_admin(message.from_user.id, db, tenant_id):
+        await message.answer("❌ У вас нет прав администратора.")
+        await state.clear()
         return
     
-    async with get_session() as db:
-        users = await get_all_users(db, is_registered=True)
-        
-        text = f"👥 Управление пользователями\n\nВсего зарегистрированных: {len(users)}\n\n"
-        
-        keyboard = [
-            [InlineKeyboardButton(text="📋 Список пользователей", callback_data="admin_users_list")],
-            [InlineKeyboardButton(text="⭐ Изменить рейтинг", callback_data="admin_change_rating")],
-            [InlineKeyboardButton(text="📞 Изменить телефон", callback_data="admin_change_phone")],
-            [InlineKeyboardButton(text="🛠️ Изменить навыки", callback_data="admin_change_skills")]
-        ]
-        
-        keyboard.append([InlineKeyboardButton(text="◀️ Назад", callback_data="admin_back")])
-        
-        await callback.message.edit_text(
-            text,
-            reply_markup=InlineKeyboardMarkup(inline_keyboard=keyboard)
-        )
+    await message.answer("❌ Отправьте файл CSV или XLSX (или /admin для отмены):")
 
 
-@router.callback_query(F.data == "admin_users_list")
-async def admin_users_list(callback: CallbackQuery):
-    """Список всех пользователей"""
-    if not await is_admin(callback.from_user.id):
+@callbacks("admin_export_users")
+async def admin_export_users(callback: CallbackQuery, db: AsyncSession, tenant_id: int):
+    """Выгрузка всех пользователей в CSV"""
+    if not await is_admin(callback.from_user.id, db, tenant_id):
         await callback.answer("❌ У вас нет прав администратора.", show_alert=True)
         return
     
-    async with get_session() as db:
-        users = await get_all_users(db, is_registered=True)
-        
-        if not users:
-            await callback.message.edit_text(
-                "👥 Нет зарегистрированных пользователей.",
-                reply_markup=InlineKeyboardMarkup(inline_keyboard=[
-                    [InlineKeyboardButton(text="◀️ Назад", callback_data="admin_users")]
-                ])
-            )
-            return
-        
-        text = f"👥 Список пользователей (всего: {len(users)})\n\n"
-        
-        # Показываем первые 20 пользователей
-        for i, user in enumerate(users[:20], 1):
-            stars = "⭐" * user.rating
-            text += f"{i}. {user.full_name}\n"
-            text += f"   📞 Телефон: {user.phone}\n"
-            text += f"   ID: {user.telegram_id} | Рейтинг: {stars} ({user.rating}/5)\n"
-            text += f"   Курс: {user.course} | Смен: {user.experience_shifts}\n\n"
-        
-        if len(users) > 20:
-            text += f"\n... и ещё {len(users) - 20} пользователей"
-        
-        await callback.message.edit_text(
-            text,
-            reply_markup=InlineKeyboardMarkup(inline_keyboard=[
-                [InlineKeyboardButton(text="◀️ Назад", callback_data="admin_users")]
-            ])
+    await callback.answer("⏳ Формирование файла...")
+    
+    path = make_temp_path("users_")
+    try:
+        count = await write_csv(path, ROSTER_COLUMNS, stream_users(db, tenant_id=tenant_id))
+        file_name = f"users_{datetime.now().strftime('%Y%m%d_%H%M')}.csv"
+        await callback.message.answer_document(
+            FSInputFile(path, filename=file_name),
+            caption=f"📤 Выгрузка пользователей: {count}"
         )
+    finally:
+        os.remove(path)
+
 
+USER_FIELD_TITLES = {
+    "change_rating": "⭐ Изменение рейтинга пользователя",
+    "change_phone": "📞 Изменение телефона пользователя",
+    "change_skills": "🛠️ Изменение навыков пользователя",
+}
 
-@router.callback_query(F.data == "admin_change_rating")
-async def admin_change_rating_start(callback: CallbackQuery, state: FSMContext):
-    """Начало изменения рейтинга"""
-    if not await is_admin(callback.from_user.id):
+
+@callbacks("admin_change_user_field")
+async def admin_change_user_field_start(callback: CallbackQuery, field: str, state: FSMContext, db: AsyncSession, tenant_id: int):
+    """Начало изменения рейтинга, телефона или навыков пользователя по Telegram ID"""
+    if not await is_admin(callback.from_user.id, db, tenant_id):
         await callback.answer("❌ У вас нет прав администратора.", show_alert=True)
         return
     
+    action = f"change_{field}"
     await callback.message.edit_text(
-        "⭐ Изменение рейтинга пользователя\n\n"
-        "Введите Telegram ID пользователя:"
+        f"{USER_FIELD_TITLES[action]}\n\n"
+        "Введите Telegram ID пользователя\n"
+        "(или найдите его через «🔍 Поиск сотрудника» в меню пользователей):"
     )
+    await state.update_data(action=action)
     await state.set_state(AdminStates.waiting_user_telegram_id)
 
 
+async def ask_user_field(message: Message, state: FSMContext, db: AsyncSession, user, action: str):
+    """Запрос нового значения рейтинга, телефона или навыков выбранного пользователя"""
+    await state.update_data(telegram_id=user.telegram_id, action=action)
+    
+    if action == "change_phone":
+        await message.answer(
+            f"👤 Пользователь: {html.escape(user.full_name)}\n"
+            f"Текущий телефон: {html.escape(user.phone)}\n\n"
+            f"Введите новый телефон:"
+        )
+        await state.set_state(AdminStates.waiting_user_phone)
+    elif action == "change_skills":
+        await message.answer(
+            f"👤 Пользователь: {html.escape(user.full_name)}\n"
+            f"Текущие навыки: {html.escape(user.skills or 'Не указаны')}\n\n"
+            f"Введите новые навыки:"
+        )
+        await state.set_state(AdminStates.waiting_user_skills)
+    else:  # change_rating
+        stats = await get_user_stats(db, user.id)
+        await message.answer(
+            f"👤 Пользователь: {html.escape(user.full_name)}\n"
+            f"Текущий рейтинг: {user.rating}/5\n"
+            f"📊 {format_user_stats(stats)}\n\n"
+            f"Введите новый рейтинг (от 1 до 5):"
+        )
+        await state.set_state(AdminStates.waiting_rating)
+
+
 @router.message(AdminStates.waiting_user_telegram_id)
-async def admin_change_rating_user(message: Message, state: FSMContext):
+async def admin_change_rating_user(message: Message, state: FSMContext, db: AsyncSession, tenant_id: int):
     """Обработка Telegram ID для изменения данных пользователя"""
-    if not await is_admin(message.from_user.id):
+    if not await is_admin(message.from_user.id, db, tenant_id):
         await message.answer("❌ У вас нет прав администратора.")
         await state.clear()
         return
@@ -636,44 +1348,20 @@ async def admin_change_rating_user(message: Message, state: FSMContext):
         await message.answer("❌ Введите корректный Telegram ID (число). Попробуйте снова:")
         return
     
-    async with get_session() as db:
-        user = await get_user_by_telegram_id(db, telegram_id)
-        
-        if not user:
-            await message.answer(f"❌ Пользователь с ID {telegram_id} не найден. Попробуйте снова:")
-            return
-        
-        data = await state.get_data()
-        action = data.get("action", "change_rating")
-        await state.update_data(telegram_id=telegram_id)
-        
-        if action == "change_phone":
-            await message.answer(
-                f"👤 Пользователь: {user.full_name}\n"
-                f"Текущий телефон: {user.phone}\n\n"
-                f"Введите новый телефон:"
-            )
-            await state.set_state(AdminStates.waiting_user_phone)
-        elif action == "change_skills":
-            await message.answer(
-                f"👤 Пользователь: {user.full_name}\n"
-                f"Текущие навыки: {user.skills or 'Не указаны'}\n\n"
-                f"Введите новые навыки:"
-            )
-            await state.set_state(AdminStates.waiting_user_skills)
-        else:  # change_rating
-            await message.answer(
-                f"👤 Пользователь: {user.full_name}\n"
-                f"Текущий рейтинг: {user.rating}/5\n\n"
-                f"Введите новый рейтинг (от 1 до 5):"
-            )
-            await state.set_state(AdminStates.waiting_rating)
+    user = await get_user_by_telegram_id(db, telegram_id)
+    
+    if not user or user.tenant_id != tenant_id:
+        await message.answer(f"❌ Пользователь с ID {telegram_id} не найден. Попробуйте снова:")
+        return
+    
+    data = await state.get_data()
+    await ask_user_field(message, state, db, user, data.get("action", "change_rating"))
 
 
 @router.message(AdminStates.waiting_rating)
-async def admin_change_rating_value(message: Message, state: FSMContext):
+async def admin_change_rating_value(message: Message, state: FSMContext, db: AsyncSession, tenant_id: int):
     """Завершение изменения рейтинга"""
-    if not await is_admin(message.from_user.id):
+    if not await is_admin(message.from_user.id, db, tenant_id):
         await message.answer("❌ У вас нет прав администратора.")
         await state.clear()
         return
@@ -690,56 +1378,65 @@ async def admin_change_rating_value(message: Message, state: FSMContext):
     data = await state.get_data()
     telegram_id = data["telegram_id"]
     
-    async with get_session() as db:
-        user = await update_user_rating(db, telegram_id, rating)
-        
-        if user:
-            await message.answer(
-                f"✅ Рейтинг пользователя {user.full_name} успешно изменён!\n"
-                f"Новый рейтинг: {rating}/5 ⭐"
-            )
-        else:
-            await message.answer("❌ Не удалось обновить рейтинг.")
+    user = await update_user_rating(db, telegram_id, rating)
+    
+    if user:
+        await message.answer(
+            f"✅ Рейтинг пользователя {user.full_name} успешно изменён!\n"
+            f"Новый рейтинг: {rating}/5 ⭐"
+        )
+    else:
+        await message.answer("❌ Не удалось обновить рейтинг.")
     
     await state.clear()
 
 
 @router.message(AdminStates.waiting_user_phone)
-async def admin_change_phone_value(message: Message, state: FSMContext):
+async def admin_change_phone_value(message: Message, state: FSMContext, db: AsyncSession, tenant_id: int):
     """Завершение изменения телефона"""
-    if not await is_admin(message.from_user.id):
+    if not await is_admin(message.from_user.id, db, tenant_id):
         await message.answer("❌ У вас нет прав администратора.")
         await state.clear()
         return
     
-    from handlers.validators import validate_phone
-    
     phone = message.text.strip()
-    if not validate_phone(phone):
+    phone_e164 = normalize_phone(phone)
+    if phone_e164 is None:
         await message.answer("❌ Некорректный формат телефона. Попробуйте снова:")
         return
     
     data = await state.get_data()
     telegram_id = data["telegram_id"]
     
-    async with get_session() as db:
-        user = await update_user(db, telegram_id, phone=phone)
-        
-        if user:
+    owner = await get_user_by_phone(db, phone_e164)
+    if owner and owner.telegram_id != telegram_id:
+        if owner.tenant_id == tenant_id:
             await message.answer(
-                f"✅ Телефон пользователя {user.full_name} успешно изменён!\n"
-                f"Новый телефон: {phone}"
+                f"❌ Этот номер уже указан у пользователя {html.escape(owner.full_name)} (ID {owner.telegram_id}). "
+                f"Введите другой телефон:"
             )
         else:
-            await message.answer("❌ Не удалось обновить телефон.")
+            # Номер уникален во всей БД, но сотрудник другой команды не называется
+            await message.answer("❌ Этот номер уже используется. Введите другой телефон:")
+        return
+    
+    user = await update_user(db, telegram_id, phone=phone, phone_e164=phone_e164)
+    
+    if user:
+        await message.answer(
+            f"✅ Телефон пользователя {user.full_name} успешно изменён!\n"
+            f"Новый телефон: {phone}"
+        )
+    else:
+        await message.answer("❌ Не удалось обновить телефон.")
     
     await state.clear()
 
 
 @router.message(AdminStates.waiting_user_skills)
-async def admin_change_skills_value(message: Message, state: FSMContext):
+async def admin_change_skills_value(message: Message, state: FSMContext, db: AsyncSession, tenant_id: int):
     """Завершение изменения навыков"""
-    if not await is_admin(message.from_user.id):
+    if not await is_admin(message.from_user.id, db, tenant_id):
         await message.answer("❌ У вас нет прав администратора.")
         await state.clear()
         return
@@ -752,62 +1449,314 @@ async def admin_change_skills_value(message: Message, state: FSMContext):
     data = await state.get_data()
     telegram_id = data["telegram_id"]
     
-    async with get_session() as db:
-        user = await update_user(db, telegram_id, skills=skills)
-        
-        if user:
-            await message.answer(
-                f"✅ Навыки пользователя {user.full_name} успешно изменены!\n"
-                f"Новые навыки: {skills}"
-            )
-        else:
-            await message.answer("❌ Не удалось обновить навыки.")
+    user = await update_user(db, telegram_id, skills=skills)
+    
+    if user:
+        await message.answer(
+            f"✅ Навыки пользователя {user.full_name} успешно изменены!\n"
+            f"Новые навыки: {skills}"
+        )
+    else:
+        await message.answer("❌ Не удалось обновить навыки.")
     
     await state.clear()
 
 
+@router.message(Command("gateway_stats"))
+async def cmd_gateway_stats(message: Message, db: AsyncSession):
+    """Метрики очереди исходящих запросов к Bot API по полосам"""
+    if not is_admin_sync(message.from_user.id):
+        await message.answer(PROCESS_ADMIN_ONLY)
+        return
+    
+    lane_titles = {"interactive": "Ответы пользователям", "bulk": "Массовые отправки"}
+    text = "📡 Очередь запросов к Bot API\n\n"
+    for lane, data in gateway.snapshot().items():
+        text += (
+            f"{lane_titles.get(lane, lane)}:\n"
+            f"   В очереди: {data['queue_depth']} | Запросов: {data['requests']}\n"
+            f"   Ожидание: ср. {data['wait_avg_ms']} мс, макс. {data['wait_max_ms']} мс | 429: {data['retry_after']}\n\n"
+        )
+    await message.answer(text)
+
+
+@router.message(Command("rebuild_stats"))
+async def cmd_rebuild_stats(message: Message, db: AsyncSession):
+    """Полный пересчёт статистики пользователей по истории записей"""
+    if not is_admin_sync(message.from_user.id):
+        await message.answer(PROCESS_ADMIN_ONLY)
+        return
+    
+    status_message = await message.answer("⏳ Пересчёт статистики...")
+    count = await rebuild_user_stats(db)
+    await status_message.edit_text(f"✅ Статистика пересчитана. Пользователей со статистикой: {count}")
+
+
+@router.message(Command("archive"))
+async def cmd_archive(message: Message, db: AsyncSession, command: CommandObject):
+    """Перенос старых смен в архив сейчас: /archive [дней] (по умолчанию ARCHIVE_AFTER_DAYS)"""
+    if not is_admin_sync(message.from_user.id):
+        await message.answer(PROCESS_ADMIN_ONLY)
+        return
+    
+    days = Config.ARCHIVE_AFTER_DAYS
+    if command.args:
+        if not command.args.strip().isdigit():
+            await message.answer("❌ Использование: /archive [число дней]")
+            return
+        days = int(command.args.strip())
+    if not days:
+        await message.answer("❌ Архивирование отключено (ARCHIVE_AFTER_DAYS=0). Укажите число дней: /archive 180")
+        return
+    
+    status_message = await message.answer(f"⏳ Перенос в архив смен старше {days} дн...")
+    shifts, assignments = await archive_old_shifts(AsyncSessionLocal, days)
+    vacuum = await incremental_vacuum(engine)
+    await status_message.edit_text(
+        f"✅ Перенесено в архив смен: {shifts}, записей: {assignments}\n"
+        f"Освобождено страниц БД: {vacuum.pages}"
+    )
+
+
+@router.message(Command("backup"))
+async def cmd_backup(message: Message, db: AsyncSession):
+    """Онлайн-копия БД без остановки бота"""
+    if not is_admin_sync(message.from_user.id):
+        await message.answer(PROCESS_ADMIN_ONLY)
+        return
+    
+    if sqlite_path(engine) is None:
+        await message.answer("❌ Резервное копирование доступно только для SQLite (для PostgreSQL используйте pg_dump).")
+        return
+    
+    status_message = await message.answer("⏳ Создание резервной копии...")
+    try:
+        result = await backup_database(engine)
+    except Exception as e:
+        await status_message.edit_text(f"❌ Ошибка резервного копирования: {e}")
+        return
+    await status_message.edit_text(
+        f"✅ Резервная копия создана\n\n"
+        f"Файл: {result.path}\n"
+        f"Размер: {result.size / 1024 / 1024:.1f} МБ ({result.pages} стр.)\n"
+        f"Время: {result.seconds:.1f} с\n"
+        f"Хранится копий: {len(list_backups(engine))}"
+    )
+
+
+@router.message(Command("maintenance"))
+async def cmd_maintenance(message: Message, db: AsyncSession):
+    """Обслуживание БД сейчас: ANALYZE и освобождение места"""
+    if not is_admin_sync(message.from_user.id):
+        await message.answer(PROCESS_ADMIN_ONLY)
+        return
+    
+    status_message = await message.answer("⏳ Обслуживание БД...")
+    await analyze_database(engine, full=True)
+    vacuum = await incremental_vacuum(engine)
+    await status_message.edit_text(
+        f"✅ Обслуживание БД завершено\n\n"
+        f"Статистика планировщика обновлена (ANALYZE)\n"
+        f"Освобождено страниц: {vacuum.pages} за {vacuum.steps} шаг(ов), "
+        f"самый долгий шаг: {vacuum.max_step_ms} мс"
+    )
+
+
+async def tenant_invite_link(bot, slug: str) -> str:
+    """Пригласительная ссылка команды: /start с параметром t_<slug>"""
+    me = await bot.me()
+    return f"https://t.me/{me.username}?start={INVITE_PREFIX}{slug}"
+
+
+@router.message(Command("tenants"))
+async def cmd_tenants(message: Message, db: AsyncSession):
+    """Список команд с числом сотрудников и пригласительными ссылками"""
+    if not is_admin_sync(message.from_user.id):
+        await message.answer(PROCESS_ADMIN_ONLY)
+        return
+    
+    text = "🏢 Команды\n\n"
+    for tenant, users in await get_tenants_with_counts(db):
+        text += f"{tenant.id}. {tenant.name} ({tenant.slug}) - сотрудников: {users}\n"
+        text += f"   {await tenant_invite_link(message.bot, tenant.slug)}\n"
+    text += (
+        "\nНовая команда: /tenant_add код название\n"
+        "Администратор команды: /tenant_admin код telegram_id"
+    )
+    await message.answer(text, disable_web_page_preview=True)
+
+
+@router.message(Command("tenant_add"))
+async def cmd_tenant_add(message: Message, command: CommandObject, db: AsyncSession):
+    """Создание команды: /tenant_add <код> <название>"""
+    if not is_admin_sync(message.from_user.id):
+        await message.answer(PROCESS_ADMIN_ONLY)
+        return
+    
+    slug, _, name = (command.args or "").strip().partition(" ")
+    slug = validate_tenant_slug(slug)
+    name = " ".join(name.split())
+    if not slug or not name:
+        await message.answer(
+            "❌ Использование: /tenant_add код название\n"
+            "Код - 2-32 символа: латинские буквы, цифры и _ (например, /tenant_add north Северный склад)"
+        )
+        return
+    if await get_tenant_by_slug(db, slug):
+        await message.answer(f"❌ Команда с кодом {slug} уже есть.")
+        return
+    
+    tenant = await create_tenant(db, slug, name)
+    await message.answer(
+        f"✅ Команда «{tenant.name}» создана (ID {tenant.id}).\n\n"
+        f"Пригласительная ссылка для сотрудников:\n{await tenant_invite_link(message.bot, tenant.slug)}\n\n"
+        f"Назначьте администратора: /tenant_admin {tenant.slug} telegram_id",
+        disable_web_page_preview=True
+    )
+
+
+@router.message(Command("tenant_admin"))
+async def cmd_tenant_admin(message: Message, command: CommandObject, db: AsyncSession):
+    """Назначение администратора команды: /tenant_admin <код> <Telegram ID>"""
+    if not is_admin_sync(message.from_user.id):
+        await message.answer(PROCESS_ADMIN_ONLY)
+        return
+    
+    args = (command.args or "").split()
+    if len(args) != 2 or not args[1].isdigit():
+        await message.answer("❌ Использование: /tenant_admin код telegram_id")
+        return
+    tenant = await get_tenant_by_slug(db, args[0].lower())
+    if not tenant:
+        await message.answer(f"❌ Команда {args[0]} не найдена. Список команд: /tenants")
+        return
+    
+    admin_id = int(args[1])
+    admin_ids_str = await get_setting(db, "admin_chat_ids", tenant.id)
+    admin_ids = [x.strip() for x in admin_ids_str.split(",") if x.strip()] if admin_ids_str else []
+    if str(admin_id) not in admin_ids:
+        admin_ids.append(str(admin_id))
+        await set_setting(db, "admin_chat_ids", ",".join(admin_ids), tenant.id)
+    await message.answer(f"✅ Пользователь {admin_id} - администратор команды «{tenant.name}».")
+
+
+PHONE_REPORT_HEADER = ["phone_e164", "telegram_id", "full_name", "phone", "status"]
+
+
+async def build_phone_report(db: AsyncSession, tenant_id: int) -> tuple:
+    """
+    Отчёт о телефонах команды без нормализованного номера.
+
+    Возвращает (группы повторов [(phone_e164, [строки пользователей], номер
+    у другой команды)], пользователи с нераспознанным номером). В группе
+    первым идёт владелец номера из этой команды (у кого phone_e164 заполнен),
+    если он есть; владелец из другой команды не называется.
+    """
+    groups = {}
+    unparsed = []
+    for user in await get_users_without_e164(db, tenant_id):
+        phone_e164 = normalize_phone(user.phone or "")
+        if phone_e164 is None:
+            unparsed.append(user)
+        else:
+            groups.setdefault(phone_e164, []).append(user)
+    owners = await get_users_by_phones(db, list(groups), tenant_id)
+    # Номер уникален во всей БД: остальные номера могут быть заняты в другой команде
+    taken = await get_users_by_phones(db, [phone for phone in groups if phone not in owners])
+    duplicates = []
+    for phone_e164, users in groups.items():
+        if phone_e164 in taken:
+            duplicates.append((phone_e164, users, True))
+            continue
+        members = ([owners[phone_e164]] if phone_e164 in owners else []) + users
+        if len(members) > 1:
+            duplicates.append((phone_e164, members, False))
+    return duplicates, unparsed
+
+
+@router.message(Command("phone_duplicates"))
+async def cmd_phone_duplicates(message: Message, db: AsyncSession, tenant_id: int):
+    """Отчёт о повторяющихся и нераспознанных телефонах"""
+    if not await is_admin(message.from_user.id, db, tenant_id):
+        await message.answer("❌ У вас нет прав администратора.")
+        return
+    
+    duplicates, unparsed = await build_phone_report(db, tenant_id)
+    if not duplicates and not unparsed:
+        await message.answer("✅ Повторяющихся и нераспознанных телефонов нет.")
+        return
+    
+    text = (
+        f"📞 Проверка телефонов\n\n"
+        f"Номеров с повторами: {len(duplicates)}\n"
+        f"Нераспознанных номеров: {len(unparsed)}\n"
+    )
+    for phone_e164, members, foreign in duplicates[:IMPORT_ERRORS_IN_MESSAGE]:
+        text += f"\n{phone_e164}:" + (" номер уже используется в другой команде\n" if foreign else "\n")
+        for member in members:
+            text += f"   • {html.escape(member.full_name)} (ID {member.telegram_id}), указан как {html.escape(member.phone)}\n"
+    if len(duplicates) > IMPORT_ERRORS_IN_MESSAGE:
+        text += "\n... полный список - в файле ниже"
+    text += "\nЧтобы исправить, измените телефон лишней записи в карточке сотрудника (/find)."
+    await message.answer(text)
+    
+    if len(duplicates) > IMPORT_ERRORS_IN_MESSAGE or unparsed:
+        report = io.StringIO()
+        writer = csv.writer(report, delimiter=CSV_DELIMITER)
+        writer.writerow(PHONE_REPORT_HEADER)
+        for phone_e164, members, foreign in duplicates:
+            for index, member in enumerate(members):
+                status = "номер уже используется" if foreign else ("повтор" if index else "первый")
+                writer.writerow([phone_e164, member.telegram_id, member.full_name, member.phone, status])
+        for user in unparsed:
+            writer.writerow(["", user.telegram_id, user.full_name, user.phone, "не распознан"])
+        await message.answer_document(
+            BufferedInputFile(report.getvalue().encode("utf-8-sig"), filename="phone_report.csv"),
+            caption="📄 Повторяющиеся и нераспознанные телефоны"
+        )
+
+
 # ==================== УПРАВЛЕНИЕ АДМИНИСТРАТОРАМИ ====================
 
-@router.callback_query(F.data == "admin_manage_admins")
-async def admin_manage_admins_menu(callback: CallbackQuery):
+@callbacks("admin_manage_admins")
+async def admin_manage_admins_menu(callback: CallbackQuery, db: AsyncSession, tenant_id: int):
     """Меню управления администраторами"""
-    if not await is_admin(callback.from_user.id):
+    if not await is_admin(callback.from_user.id, db, tenant_id):
         await callback.answer("❌ У вас нет прав администратора.", show_alert=True)
         return
     
-    async with get_session() as db:
-        # Получаем админов из .env и БД
-        admin_ids_env = Config.ADMIN_CHAT_IDS
-        admin_ids_db_str = await get_setting(db, "admin_chat_ids")
-        admin_ids_db = [int(x.strip()) for x in admin_ids_db_str.split(",")] if admin_ids_db_str else []
-        
-        # Объединяем и убираем дубликаты
-        all_admin_ids = list(set(admin_ids_env + admin_ids_db))
-        
-        text = "👤 Управление администраторами\n\n"
-        text += f"Всего администраторов: {len(all_admin_ids)}\n\n"
-        
-        for admin_id in all_admin_ids:
-            text += f"• {admin_id}\n"
-        
-        text += "\nВыберите действие:"
-        
-        keyboard = [
-            [InlineKeyboardButton(text="➕ Добавить администратора", callback_data="admin_add_admin")],
-            [InlineKeyboardButton(text="➖ Удалить администратора", callback_data="admin_remove_admin")]
-        ]
-        keyboard.append([InlineKeyboardButton(text="◀️ Назад", callback_data="admin_settings")])
-        
-        await callback.message.edit_text(
-            text,
-            reply_markup=InlineKeyboardMarkup(inline_keyboard=keyboard)
-        )
+    # Получаем админов из .env и БД
+    admin_ids_env = Config.ADMIN_CHAT_IDS
+    admin_ids_db_str = await get_setting(db, "admin_chat_ids", tenant_id)
+    admin_ids_db = [int(x.strip()) for x in admin_ids_db_str.split(",")] if admin_ids_db_str else []
+    
+    # Объединяем и убираем дубликаты
+    all_admin_ids = list(set(admin_ids_env + admin_ids_db))
+    
+    text = "👤 Управление администраторами\n\n"
+    text += f"Всего администраторов: {len(all_admin_ids)}\n\n"
+    
+    for admin_id in all_admin_ids:
+        text += f"• {admin_id}\n"
+    
+    text += "\nВыберите действие:"
+    
+    keyboard = [
+        [InlineKeyboardButton(text="➕ Добавить администратора", callback_data=pack("admin_add_admin"))],
+        [InlineKeyboardButton(text="➖ Удалить администратора", callback_data=pack("admin_remove_admin"))]
+    ]
+    keyboard.append([InlineKeyboardButton(text="◀️ Назад", callback_data=pack("admin_settings"))])
+    
+    await callback.message.edit_text(
+        text,
+        reply_markup=InlineKeyboardMarkup(inline_keyboard=keyboard)
+    )
 
 
-@router.callback_query(F.data == "admin_add_admin")
-async def admin_add_admin_start(callback: CallbackQuery, state: FSMContext):
+@callbacks("admin_add_admin")
+async def admin_add_admin_start(callback: CallbackQuery, state: FSMContext, db: AsyncSession, tenant_id: int):
     """Начало добавления администратора"""
-    if not await is_admin(callback.from_user.id):
+    if not await is_admin(callback.from_user.id, db, tenant_id):
         await callback.answer("❌ У вас нет прав администратора.", show_alert=True)
         return
     
@@ -819,35 +1768,34 @@ async def admin_add_admin_start(callback: CallbackQuery, state: FSMContext):
     await state.update_data(action="add")
 
 
-@router.callback_query(F.data == "admin_remove_admin")
-async def admin_remove_admin_start(callback: CallbackQuery, state: FSMContext):
+@callbacks("admin_remove_admin")
+async def admin_remove_admin_start(callback: CallbackQuery, state: FSMContext, db: AsyncSession, tenant_id: int):
     """Начало удаления администратора"""
-    if not await is_admin(callback.from_user.id):
+    if not await is_admin(callback.from_user.id, db, tenant_id):
         await callback.answer("❌ У вас нет прав администратора.", show_alert=True)
         return
     
-    async with get_session() as db:
-        admin_ids_env = Config.ADMIN_CHAT_IDS
-        admin_ids_db_str = await get_setting(db, "admin_chat_ids")
-        admin_ids_db = [int(x.strip()) for x in admin_ids_db_str.split(",")] if admin_ids_db_str else []
-        all_admin_ids = list(set(admin_ids_env + admin_ids_db))
-        
-        if len(all_admin_ids) <= 1:
-            await callback.answer("❌ Нельзя удалить последнего администратора!", show_alert=True)
-            return
-        
-        await callback.message.edit_text(
-            "➖ Удаление администратора\n\n"
-            "Введите Telegram ID администратора для удаления:"
-        )
-        await state.set_state(AdminStates.waiting_new_admin_id)
-        await state.update_data(action="remove")
+    admin_ids_env = Config.ADMIN_CHAT_IDS
+    admin_ids_db_str = await get_setting(db, "admin_chat_ids", tenant_id)
+    admin_ids_db = [int(x.strip()) for x in admin_ids_db_str.split(",")] if admin_ids_db_str else []
+    all_admin_ids = list(set(admin_ids_env + admin_ids_db))
+    
+    if len(all_admin_ids) <= 1:
+        await callback.answer("❌ Нельзя удалить последнего администратора!", show_alert=True)
+        return
+    
+    await callback.message.edit_text(
+        "➖ Удаление администратора\n\n"
+        "Введите Telegram ID администратора для удаления:"
+    )
+    await state.set_state(AdminStates.waiting_new_admin_id)
+    await state.update_data(action="remove")
 
 
 @router.message(AdminStates.waiting_new_admin_id)
-async def admin_add_remove_admin_value(message: Message, state: FSMContext):
+async def admin_add_remove_admin_value(message: Message, state: FSMContext, db: AsyncSession, tenant_id: int):
     """Обработка добавления/удаления администратора"""
-    if not await is_admin(message.from_user.id):
+    if not await is_admin(message.from_user.id, db, tenant_id):
         await message.answer("❌ У вас нет прав администратора.")
         await state.clear()
         return
@@ -861,98 +1809,96 @@ async def admin_add_remove_admin_value(message: Message, state: FSMContext):
     data = await state.get_data()
     action = data.get("action", "add")
     
-    async with get_session() as db:
-        # Получаем текущий список админов из БД
-        admin_ids_db_str = await get_setting(db, "admin_chat_ids")
-        admin_ids_db = [int(x.strip()) for x in admin_ids_db_str.split(",")] if admin_ids_db_str else []
-        
-        if action == "add":
-            # Проверяем, не является ли уже админом
-            if new_admin_id in admin_ids_db or new_admin_id in Config.ADMIN_CHAT_IDS:
-                await message.answer(f"❌ Пользователь {new_admin_id} уже является администратором!")
-                await state.clear()
-                return
-            
-            # Добавляем админа
-            admin_ids_db.append(new_admin_id)
-            admin_ids_str = ",".join(map(str, admin_ids_db))
-            await set_setting(db, "admin_chat_ids", admin_ids_str)
-            
-            await message.answer(
-                f"✅ Администратор {new_admin_id} успешно добавлен!\n\n"
-                f"⚠️ Для применения изменений необходимо перезапустить бота или обновить Config.ADMIN_CHAT_IDS в .env"
-            )
-        else:  # remove
-            # Нельзя удалить себя
-            if new_admin_id == message.from_user.id:
-                await message.answer("❌ Вы не можете удалить сами себя!")
-                await state.clear()
-                return
-            
-            # Проверяем, существует ли админ
-            if new_admin_id not in admin_ids_db and new_admin_id not in Config.ADMIN_CHAT_IDS:
-                await message.answer(f"❌ Пользователь {new_admin_id} не является администратором!")
-                await state.clear()
-                return
-            
-            # Удаляем админа из списка в БД (если там был)
-            if new_admin_id in admin_ids_db:
-                admin_ids_db.remove(new_admin_id)
-                admin_ids_str = ",".join(map(str, admin_ids_db)) if admin_ids_db else ""
-                await set_setting(db, "admin_chat_ids", admin_ids_str)
-            
-            await message.answer(
-                f"✅ Администратор {new_admin_id} удалён из списка в БД!\n\n"
-                f"⚠️ Если он указан в .env файле, удалите его вручную из ADMIN_CHAT_IDS"
-            )
-    
-    await state.clear()
-
-@router.callback_query(F.data == "admin_settings")
-async def admin_settings_menu(callback: CallbackQuery):
-    """Меню настроек системы"""
-    if not await is_admin(callback.from_user.id):
-        await callback.answer("❌ У вас нет прав администратора.", show_alert=True)
-        return
+    # Получаем текущий список админов из БД
+    admin_ids_db_str = await get_setting(db, "admin_chat_ids", tenant_id)
+    admin_ids_db = [int(x.strip()) for x in admin_ids_db_str.split(",")] if admin_ids_db_str else []
     
-    async with get_session() as db:
-        work_group_id_setting = await get_setting(db, "work_group_id")
-        work_group_id = work_group_id_setting if work_group_id_setting else (Config.WORK_GROUP_ID if Config.WORK_GROUP_ID else "Не установлен")
-        
-        channel_id_setting = await get_setting(db, "notification_channel_id")
-        channel_id = channel_id_setting if channel_id_setting else (Config.NOTIFICATION_CHANNEL_ID if Config.NOTIFICATION_CHANNEL_ID else "Не установлен")
+    if action == "add":
+        # Проверяем, не является ли уже админом
+        if new_admin_id in admin_ids_db or new_admin_id in Config.ADMIN_CHAT_IDS:
+            await message.answer(f"❌ Пользователь {new_admin_id} уже является администратором!")
+            await state.clear()
+            return
         
-        admin_ids = ", ".join(map(str, Config.ADMIN_CHAT_IDS)) if Config.ADMIN_CHAT_IDS else "Не установлены"
+        # Добавляем админа
+        admin_ids_db.append(new_admin_id)
+        admin_ids_str = ",".join(map(str, admin_ids_db))
+        await set_setting(db, "admin_chat_ids", admin_ids_str, tenant_id)
         
-        text = (
-            "⚙️ Настройки системы\n\n"
-            f"🔹 Admin Chat IDs: {admin_ids}\n"
-            f"🔹 Work Group ID: {work_group_id}\n"
-            f"🔹 Notification Channel ID: {channel_id}\n\n"
-            "Выберите параметр для изменения:"
+        await message.answer(
+            f"✅ Администратор {new_admin_id} успешно добавлен!\n\n"
+            f"⚠️ Для применения изменений необходимо перезапустить бота или обновить Config.ADMIN_CHAT_IDS в .env"
         )
+    else:  # remove
+        # Нельзя удалить себя
+        if new_admin_id == message.from_user.id:
+            await message.answer("❌ Вы не можете удалить сами себя!")
+            await state.clear()
+            return
         
-        # Получаем список админов из БД
-        admin_ids_db = await get_setting(db, "admin_chat_ids")
-        admin_list_db = admin_ids_db.split(",") if admin_ids_db else []
+        # Проверяем, существует ли админ
+        if new_admin_id not in admin_ids_db and new_admin_id not in Config.ADMIN_CHAT_IDS:
+            await message.answer(f"❌ Пользователь {new_admin_id} не является администратором!")
+            await state.clear()
+            return
         
-        keyboard = [
-            [InlineKeyboardButton(text="👤 Управление администраторами", callback_data="admin_manage_admins")],
-            [InlineKeyboardButton(text="💬 Work Group ID", callback_data="admin_set_work_group")],
-            [InlineKeyboardButton(text="📢 Notification Channel ID", callback_data="admin_set_channel")]
-        ]
-        keyboard.append([InlineKeyboardButton(text="◀️ Назад", callback_data="admin_back")])
+        # Удаляем админа из списка в БД (если там был)
+        if new_admin_id in admin_ids_db:
+            admin_ids_db.remove(new_admin_id)
+            admin_ids_str = ",".join(map(str, admin_ids_db)) if admin_ids_db else ""
+            await set_setting(db, "admin_chat_ids", admin_ids_str, tenant_id)
         
-        await callback.message.edit_text(
-            text,
-            reply_markup=InlineKeyboardMarkup(inline_keyboard=keyboard)
+        await message.answer(
+            f"✅ Администратор {new_admin_id} удалён из списка в БД!\n\n"
+            f"⚠️ Если он указан в .env файле, удалите его вручную из ADMIN_CHAT_IDS"
         )
+    
+    await state.clear()
+
+@callbacks("admin_settings")
+async def admin_settings_menu(callback: CallbackQuery, db: AsyncSession, tenant_id: int):
+    """Меню настроек системы"""
+    if not await is_admin(callback.from_user.id, db, tenant_id):
+        await callback.answer("❌ У вас нет прав администратора.", show_alert=True)
+        return
+    
+    channel_id, work_group_id = await get_group_chat_ids(db, tenant_id)
+    work_group_id = work_group_id or "Не установлен"
+    channel_id = channel_id or "Не установлен"
+    
+    admin_ids = ", ".join(map(str, Config.ADMIN_CHAT_IDS)) if Config.ADMIN_CHAT_IDS else "Не установлены"
+    tenant = await get_tenant(db, tenant_id)
+    
+    text = (
+        "⚙️ Настройки системы\n\n"
+        f"🏢 Команда: {tenant.name if tenant else tenant_id}\n"
+        f"🔹 Admin Chat IDs: {admin_ids}\n"
+        f"🔹 Work Group ID: {work_group_id}\n"
+        f"🔹 Notification Channel ID: {channel_id}\n\n"
+        "Выберите параметр для изменения:"
+    )
+    
+    # Получаем список админов из БД
+    admin_ids_db = await get_setting(db, "admin_chat_ids", tenant_id)
+    admin_list_db = admin_ids_db.split(",") if admin_ids_db else []
+    
+    keyboard = [
+        [InlineKeyboardButton(text="👤 Управление администраторами", callback_data=pack("admin_manage_admins"))],
+        [InlineKeyboardButton(text="💬 Work Group ID", callback_data=pack("admin_set_work_group"))],
+        [InlineKeyboardButton(text="📢 Notification Channel ID", callback_data=pack("admin_set_channel"))]
+    ]
+    keyboard.append([InlineKeyboardButton(text="◀️ Назад", callback_data=pack("admin_back"))])
+    
+    await callback.message.edit_text(
+        text,
+        reply_markup=InlineKeyboardMarkup(inline_keyboard=keyboard)
+    )
 
 
-@router.callback_query(F.data == "admin_set_work_group")
-async def admin_set_work_group_start(callback: CallbackQuery, state: FSMContext):
+@callbacks("admin_set_work_group")
+async def admin_set_work_group_start(callback: CallbackQuery, state: FSMContext, db: AsyncSession, tenant_id: int):
     """Начало установки Work Group ID"""
-    if not await is_admin(callback.from_user.id):
+    if not await is_admin(callback.from_user.id, db, tenant_id):
         await callback.answer("❌ У вас нет прав администратора.", show_alert=True)
         return
     
@@ -964,10 +1910,10 @@ async def admin_set_work_group_start(callback: CallbackQuery, state: FSMContext)
     await state.update_data(setting_key="work_group_id")
 
 
-@router.callback_query(F.data == "admin_set_channel")
-async def admin_set_channel_start(callback: CallbackQuery, state: FSMContext):
+@callbacks("admin_set_channel")
+async def admin_set_channel_start(callback: CallbackQuery, state: FSMContext, db: AsyncSession, tenant_id: int):
     """Начало установки Notification Channel ID"""
-    if not await is_admin(callback.from_user.id):
+    if not await is_admin(callback.from_user.id, db, tenant_id):
         await callback.answer("❌ У вас нет прав администратора.", show_alert=True)
         return
     
@@ -980,9 +1926,9 @@ async def admin_set_channel_start(callback: CallbackQuery, state: FSMContext):
 
 
 @router.message(AdminStates.waiting_setting_value)
-async def admin_set_setting_value(message: Message, state: FSMContext):
+async def admin_set_setting_value(message: Message, state: FSMContext, db: AsyncSession, tenant_id: int):
     """Обработка значения настройки"""
-    if not await is_admin(message.from_user.id):
+    if not await is_admin(message.from_user.id, db, tenant_id):
         await message.answer("❌ У вас нет прав администратора.")
         await state.clear()
         return
@@ -996,8 +1942,7 @@ async def admin_set_setting_value(message: Message, state: FSMContext):
     data = await state.get_data()
     setting_key = data["setting_key"]
     
-    async with get_session() as db:
-        await set_setting(db, setting_key, str(setting_value))
+    await set_setting(db, setting_key, str(setting_value), tenant_id)
     
     setting_name = "Work Group ID" if setting_key == "work_group_id" else "Notification Channel ID"
     await message.answer(f"✅ {setting_name} успешно установлен: {setting_value}")
@@ -1006,21 +1951,50 @@ async def admin_set_setting_value(message: Message, state: FSMContext):
 
 # ==================== РАССЫЛКА ====================
 
-@router.callback_query(F.data == "admin_broadcast")
-async def admin_broadcast_start(callback: CallbackQuery, state: FSMContext):
-    """Начало рассылки"""
-    if not await is_admin(callback.from_user.id):
+@callbacks("admin_broadcast")
+async def admin_broadcast_menu(callback: CallbackQuery, state: FSMContext, db: AsyncSession, tenant_id: int):
+    """Выбор получателей рассылки"""
+    if not await is_admin(callback.from_user.id, db, tenant_id):
+        await callback.answer("❌ У вас нет прав администратора.", show_alert=True)
+        return
+    
+    recipients = await count_broadcast_recipients(db, tenant_id)
+    keyboard = [
+        [InlineKeyboardButton(text=f"👥 Всем сотрудникам в личные сообщения ({recipients})", callback_data=pack("admin_broadcast_users"))],
+        [InlineKeyboardButton(text="💬 В рабочий чат и канал", callback_data=pack("admin_broadcast_groups"))],
+        [InlineKeyboardButton(text="◀️ Назад", callback_data=pack("admin_back"))]
+    ]
+    await callback.message.edit_text(
+        "📢 Рассылка сообщения\n\nВыберите, кому отправить сообщение:",
+        reply_markup=InlineKeyboardMarkup(inline_keyboard=keyboard)
+    )
+
+
+@callbacks("admin_broadcast_users")
+async def admin_broadcast_users_start(callback: CallbackQuery, state: FSMContext, db: AsyncSession, tenant_id: int):
+    """Начало рассылки в личные сообщения"""
+    if not await is_admin(callback.from_user.id, db, tenant_id):
         await callback.answer("❌ У вас нет прав администратора.", show_alert=True)
         return
     
-    from database.crud import get_setting
+    await callback.message.edit_text(
+        "📢 Рассылка всем сотрудникам\n\n"
+        "Отправьте сообщение для рассылки (текст, фото, видео или документ с подписью).\n"
+        "Оно будет скопировано каждому зарегистрированному сотруднику. "
+        "Сотрудники, заблокировавшие бота, пропускаются."
+    )
+    await state.update_data(broadcast_target="users")
+    await state.set_state(AdminStates.waiting_broadcast_message)
+
+
+@callbacks("admin_broadcast_groups")
+async def admin_broadcast_start(callback: CallbackQuery, state: FSMContext, db: AsyncSession, tenant_id: int):
+    """Начало рассылки"""
+    if not await is_admin(callback.from_user.id, db, tenant_id):
+        await callback.answer("❌ У вас нет прав администратора.", show_alert=True)
+        return
     
-    async with get_session() as db:
-        work_group_id = await get_setting(db, "work_group_id")
-        work_group_id = int(work_group_id) if work_group_id else Config.WORK_GROUP_ID
-        
-        notification_channel_id = await get_setting(db, "notification_channel_id")
-        notification_channel_id = int(notification_channel_id) if notification_channel_id else Config.NOTIFICATION_CHANNEL_ID
+    notification_channel_id, work_group_id = await get_group_chat_ids(db, tenant_id)
     
     targets = []
     if work_group_id:
@@ -1037,13 +2011,14 @@ async def admin_broadcast_start(callback: CallbackQuery, state: FSMContext):
         f"Сообщение будет отправлено в:\n" + "\n".join(f"• {target}" for target in targets) + "\n\n"
         f"Введите текст сообщения для рассылки:"
     )
+    await state.update_data(broadcast_target="groups")
     await state.set_state(AdminStates.waiting_broadcast_message)
 
 
 @router.message(AdminStates.waiting_broadcast_message)
-async def admin_broadcast_send(message: Message, state: FSMContext):
+async def admin_broadcast_send(message: Message, state: FSMContext, db: AsyncSession, tenant_id: int):
     """Отправка рассылки"""
-    if not await is_admin(message.from_user.id):
+    if not await is_admin(message.from_user.id, db, tenant_id):
         await message.answer("❌ У вас нет прав администратора.")
         await state.clear()
         return
@@ -1053,14 +2028,13 @@ async def admin_broadcast_send(message: Message, state: FSMContext):
         await message.answer("❌ Сообщение не может быть пустым. Попробуйте снова:")
         return
     
-    from database.crud import get_setting
+    data = await state.get_data()
+    if data.get("broadcast_target") == "users":
+        await state.clear()
+        await start_users_broadcast(message, db, tenant_id)
+        return
     
-    async with get_session() as db:
-        work_group_id = await get_setting(db, "work_group_id")
-        work_group_id = int(work_group_id) if work_group_id else Config.WORK_GROUP_ID
-        
-        notification_channel_id = await get_setting(db, "notification_channel_id")
-        notification_channel_id = int(notification_channel_id) if notification_channel_id else Config.NOTIFICATION_CHANNEL_ID
+    notification_channel_id, work_group_id = await get_group_chat_ids(db, tenant_id)
     
     sent = 0
     failed = 0
@@ -1107,7 +2081,7 @@ async def admin_broadcast_send(message: Message, state: FSMContext):
             sent += 1
         except Exception as e:
             failed += 1
-            print(f"Ошибка отправки в {target_name} ({target_id}): {e}")
+            logger.warning(f"Ошибка отправки в {target_name} ({target_id}): {e}")
     
     await status_message.edit_text(
         f"✅ Рассылка завершена!\n\n"
@@ -1119,18 +2093,69 @@ async def admin_broadcast_send(message: Message, state: FSMContext):
     await state.clear()
 
 
-@router.callback_query(F.data == "admin_back")
-async def admin_back(callback: CallbackQuery):
+async def start_users_broadcast(message: Message, db: AsyncSession, tenant_id: int):
+    """Запуск рассылки копии сообщения всем сотрудникам команды"""
+    # Рассылку отправляет бот команды; копировать он может только сообщение из своего чата
+    bot = bots.for_tenant(tenant_id)
+    if bot.id != message.bot.id:
+        profile = bots.profile(bot.id)
+        await message.answer(
+            f"❌ Рассылки сотрудникам команды отправляет бот @{profile.username if profile else bot.id}. "
+            f"Запустите рассылку в нём."
+        )
+        return
+    
+    total = await count_broadcast_recipients(db, tenant_id)
+    if not total:
+        await message.answer("❌ Нет сотрудников для рассылки.")
+        return
+    
+    broadcast = await create_broadcast(
+        db, created_by=message.from_user.id, from_chat_id=message.chat.id,
+        message_id=message.message_id, total=total
+    )
+    status_message = await message.answer(f"📤 Рассылка запускается... Получателей: {total}")
+    start_broadcast(BroadcastJob(
+        bot, AsyncSessionLocal, broadcast.id, message.chat.id, message.message_id,
+        total, status_message, tenant_id
+    ))
+
+
+@callbacks("broadcast")
+async def admin_broadcast_control(callback: CallbackQuery, command: str, broadcast_id: int, db: AsyncSession, tenant_id: int):
+    """Пауза, продолжение и отмена рассылки"""
+    if not await is_admin(callback.from_user.id, db, tenant_id):
+        await callback.answer("❌ У вас нет прав администратора.", show_alert=True)
+        return
+    
+    job = active_broadcasts.get(broadcast_id)
+    if not job or job.tenant_id != tenant_id:
+        await callback.answer("Рассылка уже завершена.", show_alert=True)
+        return
+    
+    if command == "pause":
+        await job.pause()
+        await callback.answer("⏸ Рассылка приостановлена")
+    elif command == "resume":
+        await job.resume()
+        await callback.answer("▶️ Рассылка продолжена")
+    else:
+        job.cancel()
+        await callback.answer("⛔ Рассылка отменяется...")
+
+
+@callbacks("admin_back")
+async def admin_back(callback: CallbackQuery, db: AsyncSession, tenant_id: int):
     """Возврат в главное меню администратора"""
-    if not await is_admin(callback.from_user.id):
+    if not await is_admin(callback.from_user.id, db, tenant_id):
         await callback.answer("❌ У вас нет прав администратора.", show_alert=True)
         return
     
     keyboard = [
-        [InlineKeyboardButton(text="📋 Управление сменами", callback_data="admin_shifts")],
-        [InlineKeyboardButton(text="👥 Управление пользователями", callback_data="admin_users")],
-        [InlineKeyboardButton(text="⚙️ Настройки системы", callback_data="admin_settings")],
-        [InlineKeyboardButton(text="📢 Рассылка", callback_data="admin_broadcast")]
+        [InlineKeyboardButton(text="📋 Управление сменами", callback_data=pack("admin_shifts"))],
+        [InlineKeyboardButton(text="👥 Управление пользователями", callback_data=pack("admin_users"))],
+        [InlineKeyboardButton(text="⚙️ Настройки системы", callback_data=pack("admin_settings"))],
+        [InlineKeyboardButton(text="📢 Рассылка", callback_data=pack("admin_broadcast"))]
     ]
     
     await callback.message.edit_text(
@@ -0,0 +1,208 @@
+"""
+Данные inline-кнопок (callback_data): кодирование, проверка и маршрутизация.
+
+Формат: "<версия>:<действие>[:<аргумент>...]", например "1:book_shift:42".
+Все действия и типы их аргументов описаны в CALLBACK_ACTIONS. Кнопка
+создаётся только через pack(), который проверяет аргументы и лимит Telegram
+в 64 байта.
+
+CallbackDataMiddleware разбирает данные нажатия один раз, до всех
+обработчиков. Нажатие со старым форматом или версией (кнопка из сообщения,
+отправленного до обновления бота), с неизвестным действием или с
+неверными аргументами получает ответ "кнопка устарела" и до обработчиков
+не доходит.
+
+CallbackRoutes регистрирует в роутере один обработчик нажатий: действие
+находится поиском в словаре, а не перебором фильтров. Аргументы передаются
+обработчику позиционно после CallbackQuery, остальные параметры (db, state,
+...) - по имени, как в aiogram.
+"""
+import inspect
+from typing import Any, Awaitable, Callable, Dict, List, NamedTuple, Optional, Tuple, Union
+
+from aiogram import BaseMiddleware, Router
+from aiogram.fsm.state import State
+from aiogram.types import CallbackQuery
+
+
+CALLBACK_VERSION = "1"
+SEPARATOR = ":"
+MAX_CALLBACK_DATA = 64
+
+WEEKDAYS = ("Пн", "Вт", "Ср", "Чт", "Пт", "Сб", "Вс")
+USER_FIELDS = ("rating", "phone", "skills")
+BROADCAST_COMMANDS = ("pause", "resume", "cancel")
+
+# Тип аргумента: int или набор допустимых строк
+ArgSpec = Union[type, Tuple[str, ...]]
+
+CALLBACK_ACTIONS: Dict[str, Tuple[ArgSpec, ...]] = {
+    # Пользователь
+    "main_menu": (),
+    "view_shifts": (),
+    "shift_info": (int,),
+    "book_shift": (int,),
+    "my_shifts": (),
+    "cancel_shift": (int,),
+    "update_availability": (),
+    "day": (WEEKDAYS,),
+    "days_done": (),
+    "update_day": (WEEKDAYS,),
+    "update_days_done": (),
+    # Администратор: смены
+    "admin_back": (),
+    "admin_shifts": (),
+    "admin_add_shift": (),
+    "admin_add_shifts_bulk": (),
+    "admin_shifts_bulk_confirm": (),
+    "admin_edit_shift_list": (),
+    "admin_edit_shift": (int,),
+    "edit_date": (int,),
+    "edit_desc": (int,),
+    "admin_archive_shift_list": (),
+    "admin_archive_shift": (int,),
+    "admin_shift_participants_list": (),
+    "admin_participants": (int,),
+    "admin_shift_completed_list": (),
+    "admin_completed": (int,),
+    "admin_export_history": (),
+    "admin_templates": (),
+    "admin_template_add": (),
+    "admin_template_delete": (int,),
+    "admin_templates_generate": (),
+    # Администратор: пользователи
+    "admin_users": (),
+    "admin_users_list": (),
+    "admin_user_search": (),
+    "admin_search_page": (int,),
+    "admin_user": (int,),
+    "admin_user_edit": (USER_FIELDS, int),
+    "admin_change_user_field": (USER_FIELDS,),
+    "admin_import_users": (),
+    "admin_export_users": (),
+    # Администратор: настройки и рассылка
+    "admin_settings": (),
+    "admin_manage_admins": (),
+    "admin_add_admin": (),
+    "admin_remove_admin": (),
+    "admin_set_work_group": (),
+    "admin_set_channel": (),
+    "admin_broadcast": (),
+    "admin_broadcast_users": (),
+    "admin_broadcast_groups": (),
+    "broadcast": (BROADCAST_COMMANDS, int),
+}
+
+STALE_CALLBACK_TEXT = "⚠️ Эта кнопка устарела. Откройте меню заново: /start"
+
+
+class CallbackAction(NamedTuple):
+    """Разобранные данные кнопки"""
+    name: str
+    args: Tuple[Any, ...]
+
+
+def _format_arg(value: Any, spec: ArgSpec) -> str:
+    if spec is int:
+        if not isinstance(value, int):
+            raise ValueError(f"ожидается int, получено {value!r}")
+        return str(value)
+    if value not in spec:
+        raise ValueError(f"недопустимое значение {value!r}")
+    return value
+
+
+def _parse_arg(raw: str, spec: ArgSpec) -> Any:
+    if spec is int:
+        return int(raw)  # ValueError для нечисловых данных
+    if raw not in spec:
+        raise ValueError(raw)
+    return raw
+
+
+def pack(action: str, *args: Any) -> str:
+    """callback_data для кнопки действия action с аргументами args"""
+    specs = CALLBACK_ACTIONS[action]
+    if len(args) != len(specs):
+        raise ValueError(f"{action}: ожидается аргументов {len(specs)}, передано {len(args)}")
+    data = SEPARATOR.join([CALLBACK_VERSION, action, *(_format_arg(arg, spec) for arg, spec in zip(args, specs))])
+    if len(data.encode()) > MAX_CALLBACK_DATA:
+        raise ValueError(f"callback_data длиннее {MAX_CALLBACK_DATA} байт: {data}")
+    return data
+
+
+def unpack(data: str) -> Optional[CallbackAction]:
+    """Разбор callback_data; None - чужой/устаревший формат или неверные аргументы"""
+    parts = data.split(SEPARATOR)
+    if len(parts) < 2 or parts[0] != CALLBACK_VERSION:
+        return None
+    specs = CALLBACK_ACTIONS.get(parts[1])
+    if specs is None or len(parts) - 2 != len(specs):
+        return None
+    try:
+        args = tuple(_parse_arg(raw, spec) for raw, spec in zip(parts[2:], specs))
+    except ValueError:
+        return None
+    return CallbackAction(parts[1], args)
+
+
+class CallbackDataMiddleware(BaseMiddleware):
+    """Разбор данных нажатия до обработчиков; устаревшие и неверные данные отклоняются"""
+
+    async def __call__(
+        self,
+        handler: Callable[[CallbackQuery, Dict[str, Any]], Awaitable[Any]],
+        event: CallbackQuery,
+        data: Dict[str, Any],
+    ) -> Any:
+        action = unpack(event.data or "")
+        if action is None:
+            await event.answer(STALE_CALLBACK_TEXT, show_alert=True)
+            return None
+        data["callback_action"] = action
+        return await handler(event, data)
+
+
+class _Route(NamedTuple):
+    state: Optional[str]
+    handler: Callable[..., Awaitable[Any]]
+    params: Optional[frozenset]  # None - обработчик принимает **kwargs
+
+
+class CallbackRoutes:
+    """Обработчики нажатий роутера по имени действия"""
+
+    def __init__(self, router: Router):
+        self._routes: Dict[str, List[_Route]] = {}
+        router.callback_query.register(self._dispatch, self._match)
+
+    def __call__(self, action: str, state: Optional[State] = None):
+        """Декоратор обработчика действия (при state - только в этом состоянии FSM)"""
+        if action not in CALLBACK_ACTIONS:
+            raise KeyError(f"Неизвестное действие кнопки: {action}")
+
+        def decorator(handler):
+            parameters = inspect.signature(handler).parameters.values()
+            params = None
+            if not any(p.kind is inspect.Parameter.VAR_KEYWORD for p in parameters):
+                params = frozenset(p.name for p in parameters)
+            self._routes.setdefault(action, []).append(_Route(state.state if state else None, handler, params))
+            return handler
+
+        return decorator
+
+    def _match(self, callback: CallbackQuery, callback_action: CallbackAction, raw_state: Optional[str] = None):
+        # Обработчик для конкретного состояния важнее общего
+        fallback = None
+        for route in self._routes.get(callback_action.name, ()):
+            if route.state is None:
+                fallback = fallback or route
+            elif route.state == raw_state:
+                return {"callback_route": route}
+        return {"callback_route": fallback} if fallback else False
+
+    @staticmethod
+    async def _dispatch(callback: CallbackQuery, callback_action: CallbackAction, callback_route: _Route, **kwargs):
+        if callback_route.params is not None:
+            kwargs = {name: value for name, value in kwargs.items() if name in callback_route.params}
+        return await callback_route.handler(callback, *callback_action.args, **kwargs)
@@ -0,0 +1,68 @@
+"""
+Потоковая запись выгрузок в CSV.
+
+Строки поступают пакетами из асинхронного итератора и дописываются во
+временный файл через aiofiles, поэтому в памяти держится только текущий пакет.
+Файлы открываются в Excel без настройки: разделитель ";", кодировка UTF-8 с BOM.
+"""
+import csv
+import io
+import os
+import tempfile
+from typing import AsyncIterable, Awaitable, Callable, Iterable, Optional, Sequence
+
+import aiofiles
+
+
+CSV_DELIMITER = ";"
+
+
+def format_cell(value) -> str:
+    """Представление значения в ячейке CSV"""
+    if value is None:
+        return ""
+    if isinstance(value, list):
+        return ",".join(map(str, value))
+    if hasattr(value, "strftime"):
+        return value.strftime("%d.%m.%Y %H:%M")
+    if isinstance(value, bool):
+        return "да" if value else "нет"
+    return str(value)
+
+
+def make_temp_path(prefix: str, suffix: str = ".csv") -> str:
+    """Путь к новому временному файлу (удаляется вызывающим кодом)"""
+    fd, path = tempfile.mkstemp(prefix=prefix, suffix=suffix)
+    os.close(fd)
+    return path
+
+
+async def write_csv(
+    path: str,
+    header: Sequence[str],
+    batches: AsyncIterable[Iterable[Sequence]],
+    on_progress: Optional[Callable[[int], Awaitable[None]]] = None,
+) -> int:
+    """
+    Запись пакетов строк в CSV-файл.
+
+    on_progress вызывается после каждого пакета с числом записанных строк.
+    Возвращает общее число строк (без заголовка).
+    """
+    written = 0
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, delimiter=CSV_DELIMITER)
+
+    async with aiofiles.open(path, "w", encoding="utf-8-sig", newline="") as f:
+        writer.writerow(header)
+        async for batch in batches:
+            for row in batch:
+                writer.writerow([format_cell(value) for value in row])
+                written += 1
+            await f.write(buffer.getvalue())
+            buffer.seek(0)
+            buffer.truncate()
+            if on_progress:
+                await on_progress(written)
+        await f.write(buffer.getvalue())
+    return written
@@ -0,0 +1,178 @@
+"""
+Разбор файлов со списком сотрудников для массового импорта.
+
+Поддерживаются CSV (разделитель ";" или ",", UTF-8 или Windows-1251) и XLSX
+(если установлен openpyxl). Формат совпадает с экспортом пользователей,
+поэтому выгруженный файл можно отредактировать и загрузить обратно.
+"""
+import csv
+import io
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy.engine import Row
+
+from database.models import DEFAULT_TENANT_ID
+from database.phones import normalize_phone
+from handlers.validators import (
+    validate_full_name, validate_course,
+    validate_experience, validate_rating, parse_preferred_days
+)
+
+try:
+    import openpyxl
+except ImportError:  # XLSX необязателен
+    openpyxl = None
+
+
+ROSTER_COLUMNS = [
+    "telegram_id", "full_name", "skills", "experience_shifts",
+    "course", "phone", "preferred_days", "rating",
+]
+REQUIRED_COLUMNS = {"telegram_id", "full_name", "course", "phone"}
+
+# Ошибка строки: (номер строки в файле, описание)
+RowError = Tuple[int, str]
+
+
+def _read_csv(content: bytes) -> List[List[str]]:
+    try:
+        text = content.decode("utf-8-sig")
+    except UnicodeDecodeError:
+        text = content.decode("cp1251")
+    first_line = text.split("\n", 1)[0]
+    delimiter = ";" if first_line.count(";") >= first_line.count(",") else ","
+    return list(csv.reader(io.StringIO(text), delimiter=delimiter))
+
+
+def _read_xlsx(content: bytes) -> List[List[str]]:
+    workbook = openpyxl.load_workbook(io.BytesIO(content), read_only=True, data_only=True)
+    try:
+        sheet = workbook.active
+        return [
+            ["" if value is None else str(value) for value in row]
+            for row in sheet.iter_rows(values_only=True)
+        ]
+    finally:
+        workbook.close()
+
+
+def _validate_row(raw: Dict[str, str]) -> Tuple[Optional[dict], Optional[str]]:
+    """Проверка строки. Возвращает (данные пользователя, None) или (None, ошибка)"""
+    try:
+        telegram_id = int(raw.get("telegram_id", "").strip())
+    except ValueError:
+        return None, "telegram_id должен быть числом"
+
+    full_name = validate_full_name(raw.get("full_name", ""))
+    if full_name is None:
+        return None, "ФИО должно содержать хотя бы 3 символа"
+
+    course = validate_course(raw.get("course", "").strip())
+    if course is None:
+        return None, "курс должен быть числом от 1 до 5"
+
+    phone = raw.get("phone", "").strip()
+    phone_e164 = normalize_phone(phone)
+    if phone_e164 is None:
+        return None, f"некорректный телефон '{phone}'"
+
+    experience_raw = raw.get("experience_shifts", "").strip()
+    experience = validate_experience(experience_raw) if experience_raw else 0
+    if experience is None:
+        return None, "опыт должен быть целым числом 0 или больше"
+
+    rating_raw = raw.get("rating", "").strip()
+    rating = None
+    if rating_raw:
+        rating = validate_rating(rating_raw)
+        if rating is None:
+            return None, "рейтинг должен быть от 1 до 5"
+
+    days_raw = raw.get("preferred_days", "").strip()
+    preferred_days = parse_preferred_days(days_raw) if days_raw else None
+    if days_raw and preferred_days is None:
+        return None, f"не удалось разобрать дни '{days_raw}'"
+
+    return {
+        "telegram_id": telegram_id,
+        "full_name": full_name,
+        "skills": raw.get("skills", "").strip() or None,
+        "experience_shifts": experience,
+        "course": course,
+        "phone": phone,
+        "phone_e164": phone_e164,
+        "preferred_days": preferred_days,
+        "rating": rating,
+    }, None
+
+
+def parse_roster(content: bytes, filename: str) -> Tuple[List[dict], List[RowError]]:
+    """
+    Разбор файла со списком сотрудников.
+
+    Возвращает корректные строки (с номером строки файла в line_no) и список
+    ошибок по остальным. Повторы telegram_id и телефона внутри файла считаются
+    ошибкой (берётся первая строка).
+    """
+    if filename.lower().endswith(".xlsx"):
+        if openpyxl is None:
+            return [], [(0, "Для импорта XLSX установите openpyxl (или загрузите CSV)")]
+        table = _read_xlsx(content)
+    else:
+        table = _read_csv(content)
+
+    if not table:
+        return [], [(0, "Файл пуст")]
+
+    header = [cell.strip().lower() for cell in table[0]]
+    missing = REQUIRED_COLUMNS - set(header)
+    if missing:
+        return [], [(1, f"Нет обязательных колонок: {', '.join(sorted(missing))}")]
+
+    rows: List[dict] = []
+    errors: List[RowError] = []
+    seen_ids = set()
+    seen_phones = {}
+    for line_no, cells in enumerate(table[1:], start=2):
+        if not any(cell.strip() for cell in cells):
+            continue
+        raw = dict(zip(header, cells))
+        row, error = _validate_row(raw)
+        if error:
+            errors.append((line_no, error))
+            continue
+        if row["telegram_id"] in seen_ids:
+            errors.append((line_no, f"повтор telegram_id {row['telegram_id']}"))
+            continue
+        if row["phone_e164"] in seen_phones:
+            errors.append((line_no, f"телефон {row['phone']} уже указан в строке {seen_phones[row['phone_e164']]}"))
+            continue
+        seen_ids.add(row["telegram_id"])
+        seen_phones[row["phone_e164"]] = line_no
+        rows.append({**row, "line_no": line_no})
+    return rows, errors
+
+
+def exclude_taken_phones(
+    rows: List[dict], owners: Dict[str, Row], tenant_id: int = DEFAULT_TENANT_ID
+) -> Tuple[List[dict], List[RowError]]:
+    """
+    Отсев строк, телефон которых уже принадлежит другому пользователю.
+
+    owners - владельцы номеров из БД во всех командах ({phone_e164: строка с
+    telegram_id, full_name и tenant_id}); владелец из другой команды в
+    отчёте не называется.
+    """
+    accepted: List[dict] = []
+    errors: List[RowError] = []
+    for row in rows:
+        owner = owners.get(row["phone_e164"])
+        if owner is not None and owner.telegram_id != row["telegram_id"]:
+            if owner.tenant_id == tenant_id:
+                error = f"телефон {row['phone']} уже у пользователя {owner.full_name} (ID {owner.telegram_id})"
+            else:
+                error = f"телефон {row['phone']} уже используется"
+            errors.append((row["line_no"], error))
+            continue
+        accepted.append(row)
+    return accepted, errors
@@ -29,4 +29,9 @@ class AdminStates(StatesGroup):
     waiting_new_admin_id = State()
     waiting_user_phone = State()
     waiting_user_skills = State()
+    waiting_roster_file = State()
+    waiting_history_range = State()
+    waiting_user_search = State()
+    waiting_shift_template = State()
+    waiting_shift_batch = State()
 
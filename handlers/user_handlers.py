@@ -1,23 +1,32 @@
-from aiogram import Router, F
+from aiogram import Router
 from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton
-from aiogram.filters import Command, CommandStart
+from aiogram.filters import Command, CommandObject, CommandStart
 from aiogram.fsm.context import FSMContext
 from datetime import datetime
-from typing import Optional
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Optional, Tuple
 
+from handlers.callbacks import CallbackRoutes, pack
 from handlers.states import OnboardingStates, UpdateAvailabilityStates
-from handlers.validators import validate_phone, validate_course, validate_experience, parse_preferred_days
+from handlers.validators import validate_course, validate_experience, parse_preferred_days
 from database.crud import (
-    get_user_by_telegram_id, create_user, update_user,
+    get_user_by_telegram_id, get_user_by_phone, get_user_status, create_user, update_user,
     get_all_registered_users_for_broadcast, get_user_shifts,
-    get_active_shifts, assign_user_to_shift, cancel_shift_assignment,
-    update_user_rating
+    get_active_shift_rows, get_shift_card, get_tenant_by_slug,
+    assign_user_to_shift, cancel_shift_assignment, count_shift_signups, update_user_rating
 )
-from database.database import get_session
-from config import Config
+from database.cache import ViewCache, shifts_generation
+from database.models import DEFAULT_TENANT_ID
+from database.phones import normalize_phone
+from database.tenants import INVITE_PREFIX
+from messaging.onboarding import group_onboarding
 import asyncio
 
 router = Router()
+callbacks = CallbackRoutes(router)
+
+# Готовые представления списка смен (см. database/cache.py)
+shift_views = ViewCache()
 
 DAYS_OF_WEEK = ["Пн", "Вт", "Ср", "Чт", "Пт", "Сб", "Вс"]
 
@@ -25,9 +34,9 @@ DAYS_OF_WEEK = ["Пн", "Вт", "Ср", "Чт", "Пт", "Сб", "Вс"]
 def get_main_menu_keyboard() -> InlineKeyboardMarkup:
     """Клавиатура главного меню"""
     keyboard = [
-        [InlineKeyboardButton(text="📋 Просмотр доступных смен", callback_data="view_shifts")],
-        [InlineKeyboardButton(text="📝 Мои записи", callback_data="my_shifts")],
-        [InlineKeyboardButton(text="🔄 Обновить доступность", callback_data="update_availability")]
+        [InlineKeyboardButton(text="📋 Просмотр доступных смен", callback_data=pack("view_shifts"))],
+        [InlineKeyboardButton(text="📝 Мои записи", callback_data=pack("my_shifts"))],
+        [InlineKeyboardButton(text="🔄 Обновить доступность", callback_data=pack("update_availability"))]
     ]
     return InlineKeyboardMarkup(inline_keyboard=keyboard)
 
@@ -43,80 +52,51 @@ def get_days_keyboard(selected_days: list = None) -> InlineKeyboardMarkup:
         prefix = "✅" if day in selected_days else ""
         row.append(InlineKeyboardButton(
             text=f"{prefix} {day}",
-            callback_data=f"day_{day}"
+            callback_data=pack("day", day)
         ))
         if len(row) == 2:
             keyboard.append(row)
             row = []
     if row:
         keyboard.append(row)
-    keyboard.append([InlineKeyboardButton(text="✅ Готово", callback_data="days_done")])
+    keyboard.append([InlineKeyboardButton(text="✅ Готово", callback_data=pack("days_done"))])
     return InlineKeyboardMarkup(inline_keyboard=keyboard)
 
 
-async def add_user_to_groups(bot, telegram_id: int):
-    """Автоматическое добавление пользователя в группы после регистрации"""
-    try:
-        from database.crud import get_setting
-
-        async with get_session() as db:
-            # Получаем ID из настроек БД или из конфига
-            notification_channel_id = await get_setting(db, "notification_channel_id")
-            notification_channel_id = int(notification_channel_id) if notification_channel_id else Config.NOTIFICATION_CHANNEL_ID
-
-            work_group_id = await get_setting(db, "work_group_id")
-            work_group_id = int(work_group_id) if work_group_id else Config.WORK_GROUP_ID
-
-        # Добавление в канал уведомлений
-        if notification_channel_id:
-            try:
-                await bot.get_chat_member(notification_channel_id, telegram_id)
-            except:
-                # Если пользователь не в канале, попробуем добавить
-                try:
-                    await bot.ban_chat_member(notification_channel_id, telegram_id)
-                    await bot.unban_chat_member(notification_channel_id, telegram_id)
-                except Exception as e:
-                    print(f"Ошибка при добавлении в канал: {e}")
-
-        # Добавление в рабочий чат
-        if work_group_id:
-            try:
-                await bot.get_chat_member(work_group_id, telegram_id)
-            except:
-                # Если пользователь не в группе, приглашаем
-                try:
-                    invite_link = await bot.create_chat_invite_link(work_group_id, member_limit=1)
-                    await bot.send_message(
-                        chat_id=telegram_id,
-                        text=f"🎉 Добро пожаловать! Присоединяйтесь к рабочему чату:\n{invite_link.invite_link}"
-                    )
-                except Exception as e:
-                    print(f"Ошибка при добавлении в группу: {e}")
-    except Exception as e:
-        print(f"Ошибка при добавлении пользователя в группы: {e}")
-
-
 @router.message(CommandStart())
-async def cmd_start(message: Message, state: FSMContext):
-    """Обработка команды /start"""
+async def cmd_start(message: Message, command: CommandObject, state: FSMContext, db: AsyncSession, tenant_id: int):
+    """Обработка команды /start (в том числе по пригласительной ссылке команды ?start=t_<slug>)"""
     await state.clear()
-    async with get_session() as db:
-        user = await get_user_by_telegram_id(db, message.from_user.id)
-
-        if user and user.is_registered:
-            await message.answer(
-                "👋 Добро пожаловать обратно!\n\n"
-                "Выберите действие:",
-                reply_markup=get_main_menu_keyboard()
-            )
-        else:
-            await message.answer(
-                "👋 Добро пожаловать в бота управления сменами!\n\n"
-                "Для начала работы необходимо пройти регистрацию.\n"
-                "Пожалуйста, укажите ваше ФИО полностью:"
-            )
-            await state.set_state(OnboardingStates.full_name)
+    user = await get_user_status(db, message.from_user.id)
+
+    if user and user.is_blocked:
+        # Пользователь снова пишет боту - значит, разблокировал его
+        await update_user(db, message.from_user.id, is_blocked=False)
+
+    if user and user.is_registered:
+        await message.answer(
+            "👋 Добро пожаловать обратно!\n\n"
+            "Выберите действие:",
+            reply_markup=get_main_menu_keyboard()
+        )
+    else:
+        team = ""
+        if user is None and command.args and command.args.startswith(INVITE_PREFIX):
+            # Новый сотрудник регистрируется в команде из ссылки
+            tenant = await get_tenant_by_slug(db, command.args[len(INVITE_PREFIX):])
+            if tenant is None:
+                await message.answer("❌ Ссылка приглашения недействительна. Попросите у администратора новую.")
+                return
+            tenant_id = tenant.id
+            team = f"Команда: {tenant.name}\n\n"
+        await message.answer(
+            "👋 Добро пожаловать в бота управления сменами!\n\n"
+            f"{team}"
+            "Для начала работы необходимо пройти регистрацию.\n"
+            "Пожалуйста, укажите ваше ФИО полностью:"
+        )
+        await state.set_state(OnboardingStates.full_name)
+        await state.update_data(tenant_id=tenant_id)
 
 
 @router.message(OnboardingStates.full_name)
@@ -166,12 +146,21 @@ async def process_course(message: Message, state: FSMContext):
 
 
 @router.message(OnboardingStates.phone)
-async def process_phone(message: Message, state: FSMContext):
+async def process_phone(message: Message, state: FSMContext, db: AsyncSession):
     """Обработка телефона"""
-    if not validate_phone(message.text):
+    phone_e164 = normalize_phone(message.text or "")
+    if phone_e164 is None:
         await message.answer("❌ Некорректный формат телефона. Попробуйте снова:")
         return
 
+    owner = await get_user_by_phone(db, phone_e164)
+    if owner and owner.telegram_id != message.from_user.id:
+        await message.answer(
+            "❌ Этот номер уже зарегистрирован у другого сотрудника. "
+            "Укажите другой телефон или обратитесь к администратору:"
+        )
+        return
+
     await state.update_data(phone=message.text)
     await message.answer(
         "📅 Выберите предпочитаемые дни для работы:\n"
@@ -182,10 +171,9 @@ async def process_phone(message: Message, state: FSMContext):
     await state.update_data(selected_days=[])
 
 
-@router.callback_query(OnboardingStates.preferred_days, F.data.startswith("day_"))
-async def process_day_selection(callback: CallbackQuery, state: FSMContext):
+@callbacks("day", state=OnboardingStates.preferred_days)
+async def process_day_selection(callback: CallbackQuery, day: str, state: FSMContext):
     """Обработка выбора дня недели"""
-    day = callback.data.replace("day_", "")
     data = await state.get_data()
     selected_days = data.get("selected_days", [])
 
@@ -199,8 +187,8 @@ async def process_day_selection(callback: CallbackQuery, state: FSMContext):
     await callback.answer()
 
 
-@router.callback_query(OnboardingStates.preferred_days, F.data == "days_done")
-async def process_days_done(callback: CallbackQuery, state: FSMContext):
+@callbacks("days_done", state=OnboardingStates.preferred_days)
+async def process_days_done(callback: CallbackQuery, state: FSMContext, db: AsyncSession):
     """Завершение выбора дней"""
     data = await state.get_data()
     selected_days = data.get("selected_days", [])
@@ -212,44 +200,48 @@ async def process_days_done(callback: CallbackQuery, state: FSMContext):
     await state.update_data(preferred_days=selected_days)
 
     # Сохранение пользователя
-    async with get_session() as db:
-        user_data = await state.get_data()
-
-        # Проверяем, существует ли пользователь
-        user = await get_user_by_telegram_id(db, callback.from_user.id)
-
-        if user:
-            # Обновляем существующего пользователя
-            await update_user(
-                db,
-                callback.from_user.id,
-                full_name=user_data["full_name"],
-                skills=user_data["skills"],
-                experience_shifts=user_data["experience_shifts"],
-                course=user_data["course"],
-                phone=user_data["phone"],
-                preferred_days=user_data["preferred_days"],
-                is_registered=True
-            )
-        else:
-            # Создаем нового пользователя
-            user = await create_user(
-                db,
-                callback.from_user.id,
-                full_name=user_data["full_name"],
-                skills=user_data["skills"],
-                experience_shifts=user_data["experience_shifts"],
-                course=user_data["course"],
-                phone=user_data["phone"],
-                preferred_days=user_data["preferred_days"],
-                is_registered=True,
-                rating=3  # Начальный рейтинг
-            )
+    user_data = await state.get_data()
+
+    # Проверяем, существует ли пользователь
+    user = await get_user_status(db, callback.from_user.id)
+    # Команда: у существующего пользователя - его, у нового - из ссылки приглашения (см. cmd_start)
+    tenant_id = user.tenant_id if user else user_data.get("tenant_id", DEFAULT_TENANT_ID)
+
+    if user:
+        # Обновляем существующего пользователя
+        await update_user(
+            db,
+            callback.from_user.id,
+            full_name=user_data["full_name"],
+            skills=user_data["skills"],
+            experience_shifts=user_data["experience_shifts"],
+            course=user_data["course"],
+            phone=user_data["phone"],
+            phone_e164=normalize_phone(user_data["phone"]),
+            preferred_days=user_data["preferred_days"],
+            is_registered=True
+        )
+    else:
+        # Создаем нового пользователя
+        user = await create_user(
+            db,
+            callback.from_user.id,
+            full_name=user_data["full_name"],
+            skills=user_data["skills"],
+            experience_shifts=user_data["experience_shifts"],
+            course=user_data["course"],
+            phone=user_data["phone"],
+            phone_e164=normalize_phone(user_data["phone"]),
+            preferred_days=user_data["preferred_days"],
+            is_registered=True,
+            rating=3,  # Начальный рейтинг
+            tenant_id=tenant_id
+        )
 
     await state.clear()
 
-    # Добавление в группы
-    await add_user_to_groups(callback.bot, callback.from_user.id)
+    # Добавление в группы - в фоне, регистрация не ждёт запросов к Telegram
+    group_onboarding.enqueue(callback.from_user.id, tenant_id, callback.bot)
 
     await callback.message.edit_text(
         "✅ Регистрация завершена успешно!\n\n"
@@ -263,142 +255,152 @@ async def process_days_done(callback: CallbackQuery, state: FSMContext):
     )
 
 
-@router.callback_query(F.data == "view_shifts")
-async def view_shifts(callback: CallbackQuery):
-    """Просмотр доступных смен"""
-    async with get_session() as db:
-        shifts = await get_active_shifts(db, from_date=datetime.utcnow())
-
-        if not shifts:
-            await callback.message.edit_text(
-                "📋 На данный момент нет доступных смен.",
-                reply_markup=InlineKeyboardMarkup(inline_keyboard=[
-                    [InlineKeyboardButton(text="◀️ Назад", callback_data="main_menu")]
-                ])
+def render_shift_list(shifts) -> Tuple[str, InlineKeyboardMarkup]:
+    """Текст и клавиатура списка доступных смен"""
+    if not shifts:
+        return "📋 На данный момент нет доступных смен.", InlineKeyboardMarkup(inline_keyboard=[
+            [InlineKeyboardButton(text="◀️ Назад", callback_data=pack("main_menu"))]
+        ])
+
+    keyboard = []
+    for shift in shifts:
+        date_str = shift.date.strftime("%d.%m.%Y %H:%M")
+        keyboard.append([
+            InlineKeyboardButton(
+                text=f"📅 {date_str}",
+                callback_data=pack("shift_info", shift.id)
             )
-            return
-
-        keyboard = []
-        for shift in shifts:
-            date_str = shift.date.strftime("%d.%m.%Y %H:%M")
-            keyboard.append([
-                InlineKeyboardButton(
-                    text=f"📅 {date_str}",
-                    callback_data=f"shift_info_{shift.id}"
-                )
-            ])
+        ])
 
-        keyboard.append([InlineKeyboardButton(text="◀️ Назад", callback_data="main_menu")])
+    keyboard.append([InlineKeyboardButton(text="◀️ Назад", callback_data=pack("main_menu"))])
+
+    return "📋 Доступные смены:\n\nВыберите смену для записи:", InlineKeyboardMarkup(inline_keyboard=keyboard)
+
+
+async def get_shift_list_view(db: AsyncSession, tenant_id: int) -> Tuple[str, InlineKeyboardMarkup]:
+    """
+    Список доступных смен команды из кэша представлений.
+
+    Одинаковый для всех пользователей команды, поэтому строится один раз на
+    поколение смен и живёт до начала ближайшей смены в списке.
+    """
+    key = ("list", tenant_id)
+    view = shift_views.get(key)
+    if view is None:
+        generation = shifts_generation()
+        shifts = await get_active_shift_rows(db, from_date=datetime.utcnow(), tenant_id=tenant_id)
+        view = render_shift_list(shifts)
+        shift_views.set(key, view, generation, expires_at=shifts[0].date if shifts else None)
+    return view
 
-        await callback.message.edit_text(
-            "📋 Доступные смены:\n\nВыберите смену для записи:",
-            reply_markup=InlineKeyboardMarkup(inline_keyboard=keyboard)
-        )
+
+@callbacks("view_shifts")
+async def view_shifts(callback: CallbackQuery, db: AsyncSession, tenant_id: int):
+    """Просмотр доступных смен"""
+    text, reply_markup = await get_shift_list_view(db, tenant_id)
+    await callback.message.edit_text(text, reply_markup=reply_markup)
 
 
-@router.callback_query(F.data.startswith("shift_info_"))
-async def shift_info(callback: CallbackQuery):
+@callbacks("shift_info")
+async def shift_info(callback: CallbackQuery, shift_id: int, db: AsyncSession, tenant_id: int):
     """Информация о смене"""
-    shift_id = int(callback.data.replace("shift_info_", ""))
 
-    async with get_session() as db:
-        from database.crud import get_shift_by_id
-        shift = await get_shift_by_id(db, shift_id)
+    shift = await get_shift_card(db, shift_id, tenant_id)
 
-        if not shift:
-            await callback.answer("❌ Смена не найдена!", show_alert=True)
-            return
+    if not shift:
+        await callback.answer("❌ Смена не найдена!", show_alert=True)
+        return
 
-        date_str = shift.date.strftime("%d.%m.%Y %H:%M")
-        description = shift.description or "Описание отсутствует"
+    date_str = shift.date.strftime("%d.%m.%Y %H:%M")
+    description = shift.description or "Описание отсутствует"
+    places = ""
+    if shift.capacity is not None:
+        free = max(shift.capacity - await count_shift_signups(db, shift_id), 0)
+        places = f"\nСвободно мест: {free} из {shift.capacity}"
 
-        keyboard = [
-            [InlineKeyboardButton(text="✅ Записаться на смену", callback_data=f"book_shift_{shift_id}")],
-            [InlineKeyboardButton(text="◀️ Назад к сменам", callback_data="view_shifts")]
-        ]
+    keyboard = [
+        [InlineKeyboardButton(text="✅ Записаться на смену", callback_data=pack("book_shift", shift_id))],
+        [InlineKeyboardButton(text="◀️ Назад к сменам", callback_data=pack("view_shifts"))]
+    ]
 
-        await callback.message.edit_text(
-            f"📅 Смена\n\n"
-            f"Дата и время: {date_str}\n"
-            f"Описание: {description}",
-            reply_markup=InlineKeyboardMarkup(inline_keyboard=keyboard)
-        )
+    await callback.message.edit_text(
+        f"📅 Смена\n\n"
+        f"Дата и время: {date_str}\n"
+        f"Описание: {description}"
+        f"{places}",
+        reply_markup=InlineKeyboardMarkup(inline_keyboard=keyboard)
+    )
 
 
-@router.callback_query(F.data.startswith("book_shift_"))
-async def book_shift(callback: CallbackQuery):
+@callbacks("book_shift")
+async def book_shift(callback: CallbackQuery, shift_id: int, db: AsyncSession):
     """Запись на смену"""
-    shift_id = int(callback.data.replace("book_shift_", ""))
 
-    async with get_session() as db:
-        assignment = await assign_user_to_shift(db, callback.from_user.id, shift_id)
+    assignment = await assign_user_to_shift(db, callback.from_user.id, shift_id)
+
+    if assignment is None:
+        await callback.answer("❌ Не удалось записаться. Возможно, вы уже записаны на эту смену или мест не осталось.", show_alert=True)
+        return
+
+    await callback.answer("✅ Вы успешно записались на смену!", show_alert=True)
+    await callback.message.edit_text(
+        "✅ Вы успешно записались на смену!\n\nВыберите действие:",
+        reply_markup=get_main_menu_keyboard()
+    )
+
 
-        if assignment is None:
-            await callback.answer("❌ Не удалось записаться. Возможно, вы уже записаны на эту смену.", show_alert=True)
-            return
+@callbacks("my_shifts")
+async def my_shifts(callback: CallbackQuery, db: AsyncSession):
+    """Просмотр своих записей"""
+    shifts = await get_user_shifts(db, callback.from_user.id, only_future=True)
 
-        await callback.answer("✅ Вы успешно записались на смену!", show_alert=True)
+    if not shifts:
         await callback.message.edit_text(
-            "✅ Вы успешно записались на смену!\n\nВыберите действие:",
-            reply_markup=get_main_menu_keyboard()
+            "📝 У вас нет записей на предстоящие смены.",
+            reply_markup=InlineKeyboardMarkup(inline_keyboard=[
+                [InlineKeyboardButton(text="◀️ Назад", callback_data=pack("main_menu"))]
+            ])
         )
+        return
 
+    text = "📝 Ваши записи на смены:\n\n"
+    keyboard = []
 
-@router.callback_query(F.data == "my_shifts")
-async def my_shifts(callback: CallbackQuery):
-    """Просмотр своих записей"""
-    async with get_session() as db:
-        shifts = await get_user_shifts(db, callback.from_user.id, only_future=True)
-
-        if not shifts:
-            await callback.message.edit_text(
-                "📝 У вас нет записей на предстоящие смены.",
-                reply_markup=InlineKeyboardMarkup(inline_keyboard=[
-                    [InlineKeyboardButton(text="◀️ Назад", callback_data="main_menu")]
-                ])
+    for shift in shifts:
+        date_str = shift.date.strftime("%d.%m.%Y %H:%M")
+        text += f"📅 {date_str}\n"
+        if shift.description:
+            text += f"   {shift.description}\n"
+        text += "\n"
+        keyboard.append([
+            InlineKeyboardButton(
+                text=f"❌ Отменить {date_str}",
+                callback_data=pack("cancel_shift", shift.id)
             )
-            return
-
-        text = "📝 Ваши записи на смены:\n\n"
-        keyboard = []
-
-        for shift in shifts:
-            date_str = shift.date.strftime("%d.%m.%Y %H:%M")
-            text += f"📅 {date_str}\n"
-            if shift.description:
-                text += f"   {shift.description}\n"
-            text += "\n"
-            keyboard.append([
-                InlineKeyboardButton(
-                    text=f"❌ Отменить {date_str}",
-                    callback_data=f"cancel_shift_{shift.id}"
-                )
-            ])
+        ])
 
-        keyboard.append([InlineKeyboardButton(text="◀️ Назад", callback_data="main_menu")])
+    keyboard.append([InlineKeyboardButton(text="◀️ Назад", callback_data=pack("main_menu"))])
 
-        await callback.message.edit_text(
-            text,
-            reply_markup=InlineKeyboardMarkup(inline_keyboard=keyboard)
-        )
+    await callback.message.edit_text(
+        text,
+        reply_markup=InlineKeyboardMarkup(inline_keyboard=keyboard)
+    )
 
 
-@router.callback_query(F.data.startswith("cancel_shift_"))
-async def cancel_shift(callback: CallbackQuery):
+@callbacks("cancel_shift")
+async def cancel_shift(callback: CallbackQuery, shift_id: int, db: AsyncSession):
     """Отмена записи на смену"""
-    shift_id = int(callback.data.replace("cancel_shift_", ""))
 
-    async with get_session() as db:
-        success = await cancel_shift_assignment(db, callback.from_user.id, shift_id)
+    success = await cancel_shift_assignment(db, callback.from_user.id, shift_id)
 
-        if success:
-            await callback.answer("✅ Запись на смену отменена!", show_alert=True)
-            await my_shifts(callback)  # Обновляем список
-        else:
-            await callback.answer("❌ Не удалось отменить запись!", show_alert=True)
+    if success:
+        await callback.answer("✅ Запись на смену отменена!", show_alert=True)
+        await my_shifts(callback, db)  # Обновляем список
+    else:
+        await callback.answer("❌ Не удалось отменить запись!", show_alert=True)
 
 
-@router.callback_query(F.data == "update_availability")
+@callbacks("update_availability")
 async def update_availability_start(callback: CallbackQuery, state: FSMContext):
     """Начало обновления доступности"""
     await callback.message.edit_text(
@@ -410,10 +412,9 @@ async def update_availability_start(callback: CallbackQuery, state: FSMContext):
     await state.update_data(selected_days=[])
 
 
-@router.callback_query(UpdateAvailabilityStates.preferred_days, F.data.startswith("day_"))
-async def update_availability_day_selection(callback: CallbackQuery, state: FSMContext):
+@callbacks("day", state=UpdateAvailabilityStates.preferred_days)
+async def update_availability_day_selection(callback: CallbackQuery, day: str, state: FSMContext):
     """Обработка выбора дня при обновлении доступности"""
-    day = callback.data.replace("day_", "")
     data = await state.get_data()
     selected_days = data.get("selected_days", [])
 
@@ -427,8 +428,8 @@ async def update_availability_day_selection(callback: CallbackQuery, state: FSMC
     await callback.answer()
 
 
-@router.callback_query(UpdateAvailabilityStates.preferred_days, F.data == "days_done")
-async def update_availability_done(callback: CallbackQuery, state: FSMContext):
+@callbacks("days_done", state=UpdateAvailabilityStates.preferred_days)
+async def update_availability_done(callback: CallbackQuery, state: FSMContext, db: AsyncSession):
     """Завершение обновления доступности"""
     data = await state.get_data()
     selected_days = data.get("selected_days", [])
@@ -437,8 +438,7 @@ async def update_availability_done(callback: CallbackQuery, state: FSMContext):
         await callback.answer("❌ Выберите хотя бы один день!", show_alert=True)
         return
 
-    async with get_session() as db:
-        await update_user(db, callback.from_user.id, preferred_days=selected_days)
+    await update_user(db, callback.from_user.id, preferred_days=selected_days)
 
     await state.clear()
 
@@ -448,10 +448,9 @@ async def update_availability_done(callback: CallbackQuery, state: FSMContext):
     )
 
 
-@router.callback_query(F.data.startswith("update_day_"))
-async def weekly_update_day_selection(callback: CallbackQuery, state: FSMContext):
+@callbacks("update_day")
+async def weekly_update_day_selection(callback: CallbackQuery, day: str, state: FSMContext):
     """Обработка выбора дня из еженедельного обновления"""
-    day = callback.data.replace("update_day_", "")
 
     # Устанавливаем состояние, если его еще нет
     current_state = await state.get_state()
@@ -475,8 +474,8 @@ async def weekly_update_day_selection(callback: CallbackQuery, state: FSMContext
     await callback.answer()
 
 
-@router.callback_query(F.data == "update_days_done")
-async def weekly_update_days_done(callback: CallbackQuery, state: FSMContext):
+@callbacks("update_days_done")
+async def weekly_update_days_done(callback: CallbackQuery, state: FSMContext, db: AsyncSession):
     """Завершение еженедельного обновления доступности"""
     data = await state.get_data()
     selected_days = data.get("selected_days", [])
@@ -485,8 +484,7 @@ async def weekly_update_days_done(callback: CallbackQuery, state: FSMContext):
         await callback.answer("❌ Выберите хотя бы один день!", show_alert=True)
         return
 
-    async with get_session() as db:
-        await update_user(db, callback.from_user.id, preferred_days=selected_days)
+    await update_user(db, callback.from_user.id, preferred_days=selected_days)
 
     await state.clear()
 
@@ -496,7 +494,7 @@ async def weekly_update_days_done(callback: CallbackQuery, state: FSMContext):
     )
 
 
-@router.callback_query(F.data == "main_menu")
+@callbacks("main_menu")
 async def main_menu(callback: CallbackQuery):
     """Возврат в главное меню"""
     await callback.message.edit_text(
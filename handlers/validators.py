@@ -1,13 +1,36 @@
 import re
-from typing import Optional
+from datetime import datetime, time, timedelta
+from typing import List, Optional, Tuple
+
+from database.phones import normalize_phone
 
 
 def validate_phone(phone: str) -> bool:
-    """Базовая валидация телефона"""
-    # Удаляем все символы кроме цифр и +
-    cleaned = re.sub(r'[^\d+]', '', phone)
-    # Проверяем длину и формат
-    return len(cleaned) >= 10 and (cleaned.startswith('+') or cleaned.startswith('8') or cleaned.startswith('7'))
+    """Валидация телефона: номер должен приводиться к формату E.164"""
+    return normalize_phone(phone) is not None
+
+
+def validate_full_name(full_name: str) -> Optional[str]:
+    """Валидация ФИО (не короче 3 символов)"""
+    full_name = " ".join(full_name.split())
+    return full_name if len(full_name) >= 3 else None
+
+
+def validate_tenant_slug(slug: str) -> Optional[str]:
+    """Валидация кода команды для пригласительной ссылки (2-32 символа: a-z, 0-9, _)"""
+    slug = slug.strip().lower()
+    return slug if re.fullmatch(r'[a-z0-9_]{2,32}', slug) else None
+
+
+def validate_rating(rating: str) -> Optional[int]:
+    """Валидация рейтинга (1-5)"""
+    try:
+        rating_num = int(rating)
+        if 1 <= rating_num <= 5:
+            return rating_num
+    except ValueError:
+        pass
+    return None
 
 
 def validate_course(course: str) -> Optional[int]:
@@ -32,6 +55,81 @@ def validate_experience(experience: str) -> Optional[int]:
     return None
 
 
+def parse_date_range(text: str) -> Optional[Tuple[datetime, datetime]]:
+    """
+    Парсинг периода "ДД.ММ.ГГГГ ДД.ММ.ГГГГ" (обе даты включительно).
+
+    Возвращает (начало, конец), где конец - полночь дня после второй даты.
+    """
+    parts = text.replace("-", " ").split()
+    if len(parts) != 2:
+        return None
+    try:
+        date_from = datetime.strptime(parts[0], "%d.%m.%Y")
+        date_to = datetime.strptime(parts[1], "%d.%m.%Y") + timedelta(days=1)
+    except ValueError:
+        return None
+    if date_to <= date_from:
+        return None
+    return date_from, date_to
+
+
+SHIFT_LINE_RE = re.compile(r'^(\d{1,2}\.\d{1,2}\.\d{4})\s+(\d{1,2}:\d{2})(?:\s*[—–-]?\s*(.*))?$')
+
+
+def parse_shift_lines(text: str, now: datetime) -> Tuple[List[Tuple[datetime, Optional[str]]], List[str]]:
+    """
+    Разбор списка смен, по одной на строку: "ДД.ММ.ГГГГ ЧЧ:ММ — описание"
+    (описание и тире необязательны, пустые строки пропускаются).
+
+    Возвращает (смены (дата, описание) в порядке дат, ошибки "Строка N: ...").
+    Повтор даты внутри списка и дата не в будущем - ошибка строки.
+    """
+    shifts = {}
+    errors = []
+    for number, line in enumerate(text.splitlines(), 1):
+        line = line.strip()
+        if not line:
+            continue
+        match = SHIFT_LINE_RE.match(line)
+        if not match:
+            errors.append(f"Строка {number}: ожидается ДД.ММ.ГГГГ ЧЧ:ММ — описание")
+            continue
+        try:
+            shift_date = datetime.strptime(f"{match.group(1)} {match.group(2)}", "%d.%m.%Y %H:%M")
+        except ValueError:
+            errors.append(f"Строка {number}: несуществующая дата или время")
+            continue
+        if shift_date <= now:
+            errors.append(f"Строка {number}: дата должна быть в будущем")
+        elif shift_date in shifts:
+            errors.append(f"Строка {number}: {shift_date.strftime('%d.%m.%Y %H:%M')} уже есть в списке")
+        else:
+            shifts[shift_date] = (match.group(3) or "").strip() or None
+    return sorted(shifts.items()), errors
+
+
+def parse_shift_template(text: str) -> Optional[Tuple[list, time, Optional[int], Optional[str]]]:
+    """
+    Разбор шаблона смены "<дни> ЧЧ:ММ [мест] [описание]", например
+    "Пн, Ср, Пт 09:00 8 Сборка заказов". Возвращает (дни в порядке недели,
+    время, число мест или None, описание или None); None - строка не разобрана.
+    """
+    match = re.match(r'^\s*(.+?)\s+(\d{1,2}:\d{2})(?:\s+(\d+))?(?:\s+(.+?))?\s*$', text, re.S)
+    if not match:
+        return None
+    days = parse_preferred_days(match.group(1))
+    try:
+        start_time = datetime.strptime(match.group(2), "%H:%M").time()
+    except ValueError:
+        return None
+    capacity = int(match.group(3)) if match.group(3) else None
+    if not days or capacity == 0:
+        return None
+    week = ["Пн", "Вт", "Ср", "Чт", "Пт", "Сб", "Вс"]
+    return sorted(days, key=week.index), start_time, capacity, match.group(4)
+
+
 def parse_preferred_days(text: str) -> list:
     """Парсинг выбранных дней недели"""
     days_map = {
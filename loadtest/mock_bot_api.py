@@ -0,0 +1,467 @@
+"""
+Локальный заменитель Telegram Bot API для нагрузочного тестирования.
+
+Сервер отвечает на запросы бота по HTTP так же, как api.telegram.org:
+    - отдаёт синтетический поток обновлений через getUpdates (long polling)
+      или отправляет их POST-запросами на webhook после setWebhook;
+    - имитирует флуд-лимиты (на чат и на бота целиком) и ответы 429 с retry_after;
+    - записывает все исходящие вызовы бота.
+
+Запуск:
+    python -m loadtest.mock_bot_api --port 8081 --users 500 --rate 50
+
+Бот направляется на сервер через переменную окружения:
+    TELEGRAM_API_URL=http://127.0.0.1:8081
+
+Служебные эндпоинты:
+    GET  /_mock/stats  - счётчики вызовов по методам, число выданных 429
+    GET  /_mock/calls  - последние записанные вызовы (?since=<seq>)
+    POST /_mock/reset  - очистка журнала и счётчиков
+"""
+import argparse
+import asyncio
+import json
+import logging
+import math
+import random
+import time
+from collections import Counter, deque
+from typing import Any, Deque, Dict, List, Optional
+
+from aiohttp import ClientSession, ClientTimeout, web
+
+
+logger = logging.getLogger(__name__)
+
+BOT_ID = 100000001
+BOT_USERNAME = "mock_staff_bot"
+FIRST_USER_ID = 10_000_000
+
+# Методы, на которые распространяются флуд-лимиты Telegram
+SEND_METHODS = {
+    "sendmessage", "sendphoto", "sendvideo", "senddocument", "copymessage",
+    "forwardmessage", "editmessagetext", "editmessagereplymarkup", "editmessagecaption",
+}
+
+# Сценарии пользователей: (вес, тип, данные). Данные кнопок - в формате
+# handlers/callbacks.py ("<версия>:<действие>")
+SCENARIOS = [
+    (3, "message", "/start"),
+    (5, "callback", "1:view_shifts"),
+    (2, "callback", "1:my_shifts"),
+    (1, "callback", "1:main_menu"),
+]
+
+
+class TokenBucket:
+    """Простое ведро токенов для имитации лимитов Telegram"""
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.capacity = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def take(self) -> float:
+        """Забрать токен. Возвращает 0 при успехе или время ожидания в секундах"""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+class MockBotAPI:
+    """Состояние и обработчики заменителя Bot API"""
+
+    def __init__(
+        self,
+        users: int = 100,
+        rate: float = 10.0,
+        chat_rps: float = 1.0,
+        chat_burst: float = 3.0,
+        global_rps: float = 30.0,
+        error_rate: float = 0.0,
+        max_calls: int = 100_000,
+    ):
+        self.users = users
+        self.rate = rate
+        self.chat_rps = chat_rps
+        self.chat_burst = chat_burst
+        self.global_bucket = TokenBucket(global_rps, global_rps)
+        self.chat_buckets: Dict[int, TokenBucket] = {}
+        self.error_rate = error_rate
+
+        self.updates: Deque[dict] = deque()
+        self.next_update_id = 1
+        self.updates_event = asyncio.Event()
+        self.webhook_url: Optional[str] = None
+        self.webhook_secret: Optional[str] = None
+        self.http: Optional[ClientSession] = None
+
+        self.next_message_id = 1
+        self.last_message_ids: Dict[int, int] = {}
+
+        self.calls: Deque[dict] = deque(maxlen=max_calls)
+        self.call_seq = 0
+        self.method_counter: Counter = Counter()
+        self.flood_counter: Counter = Counter()
+        self.webhook_errors = 0
+        self.started_at = time.monotonic()
+
+    # ==================== СИНТЕТИЧЕСКИЕ ОБНОВЛЕНИЯ ====================
+
+    def _user(self, user_id: int) -> dict:
+        return {
+            "id": user_id,
+            "is_bot": False,
+            "first_name": f"User{user_id - FIRST_USER_ID}",
+            "language_code": "ru",
+        }
+
+    def _chat(self, user_id: int) -> dict:
+        return {"id": user_id, "type": "private", "first_name": f"User{user_id - FIRST_USER_ID}"}
+
+    def make_update(self) -> dict:
+        """Случайное обновление от случайного пользователя по весам сценариев"""
+        user_id = FIRST_USER_ID + random.randrange(self.users)
+        _, kind, payload = random.choices(SCENARIOS, weights=[s[0] for s in SCENARIOS])[0]
+        update_id = self.next_update_id
+        self.next_update_id += 1
+        now = int(time.time())
+
+        if kind == "message":
+            return {
+                "update_id": update_id,
+                "message": {
+                    "message_id": self._new_message_id(user_id),
+                    "date": now,
+                    "chat": self._chat(user_id),
+                    "from": self._user(user_id),
+                    "text": payload,
+                    "entities": [{"type": "bot_command", "offset": 0, "length": len(payload)}],
+                },
+            }
+
+        message_id = self.last_message_ids.get(user_id) or self._new_message_id(user_id)
+        return {
+            "update_id": update_id,
+            "callback_query": {
+                "id": str(update_id),
+                "from": self._user(user_id),
+                "chat_instance": str(user_id),
+                "data": payload,
+                "message": {
+                    "message_id": message_id,
+                    "date": now,
+                    "chat": self._chat(user_id),
+                    "from": {"id": BOT_ID, "is_bot": True, "first_name": "Mock", "username": BOT_USERNAME},
+                    "text": "👋 Главное меню",
+                },
+            },
+        }
+
+    async def generate_updates(self, total: int = 0):
+        """Генерация потока обновлений с заданной частотой (total=0 - бесконечно)"""
+        interval = 1.0 / self.rate if self.rate > 0 else 0
+        produced = 0
+        next_at = time.monotonic()
+        while not total or produced < total:
+            update = self.make_update()
+            if self.webhook_url:
+                asyncio.create_task(self._push_webhook(update))
+            else:
+                self.updates.append(update)
+                self.updates_event.set()
+            produced += 1
+
+            next_at += interval
+            delay = next_at - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            elif produced % 100 == 0:
+                await asyncio.sleep(0)
+        logger.info(f"Сгенерировано обновлений: {produced}")
+
+    async def _push_webhook(self, update: dict):
+        headers = {}
+        if self.webhook_secret:
+            headers["X-Telegram-Bot-Api-Secret-Token"] = self.webhook_secret
+        try:
+            async with self.http.post(self.webhook_url, json=update, headers=headers) as response:
+                if response.status >= 400:
+                    self.webhook_errors += 1
+        except Exception as e:
+            self.webhook_errors += 1
+            logger.debug(f"Ошибка доставки webhook: {e}")
+
+    # ==================== ОБРАБОТКА ЗАПРОСОВ БОТА ====================
+
+    def _new_message_id(self, chat_id: int) -> int:
+        message_id = self.next_message_id
+        self.next_message_id += 1
+        self.last_message_ids[chat_id] = message_id
+        return message_id
+
+    def _record(self, method: str, params: dict, status: int, started: float):
+        self.call_seq += 1
+        self.method_counter[method] += 1
+        self.calls.append({
+            "seq": self.call_seq,
+            "ts": time.time(),
+            "method": method,
+            "chat_id": params.get("chat_id"),
+            "status": status,
+            "duration_ms": round((time.monotonic() - started) * 1000, 3),
+        })
+
+    def _check_flood(self, method: str, params: dict) -> float:
+        """Проверка лимитов. Возвращает retry_after (0 - лимит не превышен)"""
+        if self.error_rate and random.random() < self.error_rate:
+            return 1.0
+        if method not in SEND_METHODS:
+            return 0.0
+        wait = self.global_bucket.take()
+        if wait:
+            return wait
+        try:
+            chat_id = int(params.get("chat_id", 0))
+        except (TypeError, ValueError):
+            chat_id = 0
+        bucket = self.chat_buckets.get(chat_id)
+        if bucket is None:
+            bucket = self.chat_buckets[chat_id] = TokenBucket(self.chat_rps, self.chat_burst)
+        return bucket.take()
+
+    async def handle_method(self, request: web.Request) -> web.Response:
+        started = time.monotonic()
+        method = request.match_info["method"].lower()
+        params = await self._read_params(request)
+
+        retry_after = self._check_flood(method, params)
+        if retry_after:
+            retry_after = max(1, math.ceil(retry_after))
+            self.flood_counter[method] += 1
+            self._record(method, params, 429, started)
+            return web.json_response({
+                "ok": False,
+                "error_code": 429,
+                "description": f"Too Many Requests: retry after {retry_after}",
+                "parameters": {"retry_after": retry_after},
+            }, status=429)
+
+        if method == "getupdates":
+            if self.webhook_url:
+                self._record(method, params, 409, started)
+                return web.json_response({
+                    "ok": False,
+                    "error_code": 409,
+                    "description": "Conflict: can't use getUpdates method while webhook is active",
+                }, status=409)
+            result = await self._get_updates(params)
+        else:
+            result = self._result_for(method, params)
+
+        self._record(method, params, 200, started)
+        return web.json_response({"ok": True, "result": result})
+
+    async def _read_params(self, request: web.Request) -> dict:
+        if request.content_type == "application/json":
+            data = await request.json()
+        else:
+            data = dict(await request.post())
+        params = {}
+        for key, value in data.items():
+            if isinstance(value, str) and value[:1] in "[{":
+                try:
+                    value = json.loads(value)
+                except ValueError:
+                    pass
+            elif not isinstance(value, (str, int, float, bool, list, dict)):
+                value = "<file>"
+            params[key] = value
+        return params
+
+    async def _get_updates(self, params: dict) -> List[dict]:
+        offset = int(params.get("offset") or 0)
+        limit = int(params.get("limit") or 100)
+        timeout = float(params.get("timeout") or 0)
+
+        while self.updates and self.updates[0]["update_id"] < offset:
+            self.updates.popleft()
+
+        if not self.updates and timeout:
+            self.updates_event.clear()
+            try:
+                await asyncio.wait_for(self.updates_event.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+        return [self.updates[i] for i in range(min(limit, len(self.updates)))]
+
+    def _message_result(self, params: dict) -> dict:
+        try:
+            chat_id = int(params.get("chat_id", 0))
+        except (TypeError, ValueError):
+            chat_id = 0
+        result = {
+            "message_id": self._new_message_id(chat_id),
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private" if chat_id > 0 else "supergroup"},
+            "from": {"id": BOT_ID, "is_bot": True, "first_name": "Mock", "username": BOT_USERNAME},
+        }
+        if "text" in params:
+            result["text"] = params["text"]
+        if "caption" in params:
+            result["caption"] = params["caption"]
+        if isinstance(params.get("reply_markup"), dict):
+            result["reply_markup"] = params["reply_markup"]
+        return result
+
+    def _result_for(self, method: str, params: dict) -> Any:
+        if method == "getme":
+            return {
+                "id": BOT_ID,
+                "is_bot": True,
+                "first_name": "Mock",
+                "username": BOT_USERNAME,
+                "can_join_groups": True,
+                "can_read_all_group_messages": False,
+                "supports_inline_queries": False,
+            }
+        if method == "setwebhook":
+            self.webhook_url = params.get("url") or None
+            self.webhook_secret = params.get("secret_token") or None
+            return True
+        if method == "deletewebhook":
+            self.webhook_url = None
+            self.webhook_secret = None
+            return True
+        if method == "copymessage":
+            return {"message_id": self._new_message_id(int(params.get("chat_id", 0)))}
+        if method.startswith("send") or method == "forwardmessage":
+            return self._message_result(params)
+        if method.startswith("editmessage"):
+            result = self._message_result(params)
+            result["message_id"] = int(params.get("message_id") or result["message_id"])
+            return result
+        if method == "getchatmember":
+            return {"status": "member", "user": self._user(int(params.get("user_id", 0)))}
+        if method == "createchatinvitelink":
+            return {
+                "invite_link": f"https://t.me/+mock{self.call_seq}",
+                "creator": {"id": BOT_ID, "is_bot": True, "first_name": "Mock"},
+                "creates_join_request": False,
+                "is_primary": False,
+                "is_revoked": False,
+                "member_limit": int(params.get("member_limit") or 0) or None,
+            }
+        if method == "getfile":
+            return {"file_id": params.get("file_id"), "file_unique_id": "mock", "file_path": "documents/mock.csv"}
+        return True
+
+    # ==================== СЛУЖЕБНЫЕ ЭНДПОИНТЫ ====================
+
+    async def handle_stats(self, request: web.Request) -> web.Response:
+        uptime = time.monotonic() - self.started_at
+        total = sum(self.method_counter.values())
+        return web.json_response({
+            "uptime_s": round(uptime, 1),
+            "calls_total": total,
+            "calls_per_s": round(total / uptime, 2) if uptime else 0,
+            "calls_by_method": dict(self.method_counter),
+            "flood_429_by_method": dict(self.flood_counter),
+            "pending_updates": len(self.updates),
+            "webhook_url": self.webhook_url,
+            "webhook_errors": self.webhook_errors,
+        })
+
+    async def handle_calls(self, request: web.Request) -> web.Response:
+        since = int(request.query.get("since", 0))
+        return web.json_response([call for call in self.calls if call["seq"] > since])
+
+    async def handle_reset(self, request: web.Request) -> web.Response:
+        self.calls.clear()
+        self.method_counter.clear()
+        self.flood_counter.clear()
+        self.webhook_errors = 0
+        self.started_at = time.monotonic()
+        return web.json_response({"ok": True})
+
+    def dump_calls(self, path: str):
+        """Сохранение журнала вызовов в JSONL"""
+        with open(path, "w", encoding="utf-8") as f:
+            for call in self.calls:
+                f.write(json.dumps(call, ensure_ascii=False) + "\n")
+        logger.info(f"Журнал вызовов сохранён: {path} ({len(self.calls)} записей)")
+
+    def build_app(self) -> web.Application:
+        app = web.Application(client_max_size=50 * 1024 * 1024)
+        app.router.add_get("/_mock/stats", self.handle_stats)
+        app.router.add_get("/_mock/calls", self.handle_calls)
+        app.router.add_post("/_mock/reset", self.handle_reset)
+        app.router.add_route("*", "/bot{token}/{method}", self.handle_method)
+        app.on_startup.append(self._on_startup)
+        app.on_cleanup.append(self._on_cleanup)
+        return app
+
+    async def _on_startup(self, app: web.Application):
+        self.http = ClientSession(timeout=ClientTimeout(total=30))
+
+    async def _on_cleanup(self, app: web.Application):
+        await self.http.close()
+
+
+async def run(args: argparse.Namespace):
+    mock = MockBotAPI(
+        users=args.users,
+        rate=args.rate,
+        chat_rps=args.chat_rps,
+        chat_burst=args.chat_burst,
+        global_rps=args.global_rps,
+        error_rate=args.error_rate,
+    )
+    runner = web.AppRunner(mock.build_app())
+    await runner.setup()
+    await web.TCPSite(runner, args.host, args.port).start()
+    logger.info(f"Mock Bot API слушает http://{args.host}:{args.port}")
+
+    try:
+        if args.warmup:
+            await asyncio.sleep(args.warmup)
+        if args.rate > 0:
+            await mock.generate_updates(total=args.total)
+        await asyncio.Event().wait()
+    finally:
+        if args.record:
+            mock.dump_calls(args.record)
+        await runner.cleanup()
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Заменитель Telegram Bot API для нагрузочного тестирования")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--users", type=int, default=100, help="Число синтетических пользователей")
+    parser.add_argument("--rate", type=float, default=10.0, help="Обновлений в секунду (0 - без генерации)")
+    parser.add_argument("--total", type=int, default=0, help="Всего обновлений (0 - бесконечно)")
+    parser.add_argument("--warmup", type=float, default=2.0, help="Пауза перед генерацией, сек")
+    parser.add_argument("--chat-rps", type=float, default=1.0, help="Лимит сообщений в секунду на чат")
+    parser.add_argument("--chat-burst", type=float, default=3.0, help="Допустимый всплеск на чат")
+    parser.add_argument("--global-rps", type=float, default=30.0, help="Лимит сообщений в секунду на бота")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Доля случайных ответов 429")
+    parser.add_argument("--record", default="", help="Файл JSONL для журнала вызовов при остановке")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+    try:
+        asyncio.run(run(parse_args()))
+    except KeyboardInterrupt:
+        logger.info("Mock Bot API остановлен")
@@ -1,22 +1,133 @@
 import asyncio
 import logging
 import os
+import signal
+from contextlib import suppress
+from typing import List, Optional
+
 from aiogram import Bot, Dispatcher
-from aiogram.enums import ParseMode
-from aiogram.client.default import DefaultBotProperties
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+from aiohttp import web
 
 from config import Config
-from database.database import init_db
+from database.database import init_db, engine, AsyncSessionLocal
+from database.hot_queries import warm_hot_queries
+from database.crud import interrupt_unfinished_broadcasts
+from messaging.gateway import gateway
+from messaging.onboarding import group_onboarding
+from messaging.broadcast import stop_broadcasts
+from runtime.supervisor import Deadline, Supervisor, UpdateTracker, drain_background_tasks
+from runtime.health import HealthState, start_health_server
+from runtime.logs import UpdateLogMiddleware, setup_logging
+from runtime.bots import BotProfileMiddleware, bots
+from database.middleware import DbSessionMiddleware, TenantMiddleware
 from handlers import user_handlers, admin_handlers
+from handlers.callbacks import CallbackDataMiddleware
 from scheduler.weekly_update import schedule_weekly_updates
+from scheduler.maintenance import schedule_maintenance
+from scheduler.shift_templates import schedule_shift_generation
 
 
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
+# Запись в stdout и файл - в отдельном потоке (см. runtime/logs.py)
+log_listener = setup_logging(Config.LOG_LEVEL, Config.LOG_FORMAT, Config.LOG_DIR)
 logger = logging.getLogger(__name__)
 
+# Долгоживущие фоновые задачи и учёт обновлений в обработке (см. runtime/supervisor.py)
+supervisor = Supervisor()
+update_tracker = UpdateTracker()
+
+
+def build_bot_session() -> AiohttpSession:
+    """Общая HTTP-сессия ботов (с нестандартным адресом Bot API, если он задан)"""
+    if not Config.TELEGRAM_API_URL:
+        return AiohttpSession()
+    logger.info(f"Используется Bot API: {Config.TELEGRAM_API_URL}")
+    return AiohttpSession(api=TelegramAPIServer.from_base(Config.TELEGRAM_API_URL))
+
+
+def install_signal_handlers(stop: asyncio.Event):
+    """SIGTERM/SIGINT запускают корректную остановку"""
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        with suppress(NotImplementedError):  # Windows
+            loop.add_signal_handler(sig, stop.set)
+
+
+async def run_polling(bot_list: List[Bot], dp: Dispatcher, stop: asyncio.Event):
+    """Запуск ботов в режиме polling до сигнала остановки"""
+    # Накопившиеся за время перезапуска обновления не сбрасываются
+    for bot in bot_list:
+        await bot.delete_webhook(drop_pending_updates=False)
+    logger.info(f"Бот запущен (ботов: {len(bot_list)})")
+    polling = asyncio.create_task(dp.start_polling(*bot_list, handle_signals=False, close_bot_session=False))
+    stopped = asyncio.create_task(stop.wait())
+    await asyncio.wait({polling, stopped}, return_when=asyncio.FIRST_COMPLETED)
+    stopped.cancel()
+    if not polling.done():
+        await dp.stop_polling()
+    await polling
+
+
+def webhook_path(bot: Bot) -> str:
+    """Путь webhook: основной бот - WEBHOOK_PATH, дополнительные - WEBHOOK_PATH/<ID бота>"""
+    return Config.WEBHOOK_PATH if bot is bots.primary else f"{Config.WEBHOOK_PATH.rstrip('/')}/{bot.id}"
+
+
+async def run_webhook(bot_list: List[Bot], dp: Dispatcher, stop: asyncio.Event):
+    """Запуск ботов в режиме webhook (один HTTP-сервер на всех) до сигнала остановки"""
+    app = web.Application()
+    for bot in bot_list:
+        SimpleRequestHandler(
+            dispatcher=dp,
+            bot=bot,
+            secret_token=Config.WEBHOOK_SECRET or None
+        ).register(app, path=webhook_path(bot))
+    setup_application(app, dp, bots=bot_list)
+
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, Config.WEBAPP_HOST, Config.WEBAPP_PORT)
+    await site.start()
+
+    for bot in bot_list:
+        await bot.set_webhook(
+            url=f"{Config.WEBHOOK_URL}{webhook_path(bot)}",
+            secret_token=Config.WEBHOOK_SECRET or None,
+            drop_pending_updates=False
+        )
+        logger.info(f"Бот {bot.id} запущен (webhook: {Config.WEBHOOK_URL}{webhook_path(bot)})")
+
+    try:
+        await stop.wait()
+    finally:
+        # Новые запросы больше не принимаются; начатые дорабатывают в shutdown()
+        await runner.cleanup()
+
+
+async def shutdown(session: AiohttpSession, health_runner: Optional[web.AppRunner] = None):
+    """
+    Корректная остановка: дождаться начатых обработчиков, рассылок, анонсов
+    смен и очереди добавления в группы (всё вместе - не дольше
+    SHUTDOWN_TIMEOUT), затем
+    остановить фоновые задачи и закрыть соединения.
+    """
+    deadline = Deadline(Config.SHUTDOWN_TIMEOUT)
+    logger.info(f"Остановка: ожидание обработчиков ({update_tracker.in_flight})")
+    if not await update_tracker.wait_idle(deadline.remaining()):
+        logger.warning(f"Остановка: не дождались обработчиков: {update_tracker.in_flight}")
+    await stop_broadcasts(deadline.remaining())
+    await drain_background_tasks(deadline.remaining())
+    await group_onboarding.drain(deadline.remaining())
+    await group_onboarding.stop()
+    await supervisor.stop()
+    if health_runner:
+        await health_runner.cleanup()
+    await session.close()
+    await engine.dispose()
+    logger.info("Бот остановлен")
+
 
 async def main():
     """Главная функция запуска бота"""
@@ -31,13 +142,28 @@ async def main():
         logger.error(f"Текущие переменные окружения: BOT_TOKEN={'установлен' if os.getenv('BOT_TOKEN') else 'НЕ установлен'}")
         return
     
-    # Инициализация бота и диспетчера
-    bot = Bot(
-        token=Config.BOT_TOKEN,
-        default=DefaultBotProperties(parse_mode=ParseMode.HTML)
-    )
+    # Инициализация ботов (основной и BOT_TOKENS) на одной HTTP-сессии и диспетчера
+    session = build_bot_session()
+    bot_list = bots.create(Config.BOT_TOKEN, Config.BOT_TOKENS, session)
+    # Общая очередь исходящих запросов: ответы пользователям вперёд массовых отправок, лимит - на каждого бота
+    session.middleware(gateway)
     dp = Dispatcher()
     
+    # Поля обновления в логе (update_id, user_id, handler, duration_ms)
+    update_log = UpdateLogMiddleware()
+    dp.update.outer_middleware(update_log)
+    dp.message.middleware(update_log)
+    dp.callback_query.middleware(update_log)
+    # Учёт обновлений в обработке (для остановки и проверки состояния)
+    dp.update.outer_middleware(update_tracker)
+    # Одна сессия БД на обновление
+    dp.update.outer_middleware(DbSessionMiddleware(AsyncSessionLocal))
+    # Бот обновления (bot_profile) и команда (площадка): по чату, пользователю или боту
+    dp.update.outer_middleware(BotProfileMiddleware(bots))
+    dp.update.outer_middleware(TenantMiddleware())
+    # Разбор данных inline-кнопок; устаревшие кнопки получают ответ и не доходят до обработчиков
+    dp.callback_query.outer_middleware(CallbackDataMiddleware())
+    
     # Регистрация роутеров
     dp.include_router(user_handlers.router)
     dp.include_router(admin_handlers.router)
@@ -45,23 +171,65 @@ async def main():
     # Инициализация базы данных
     try:
         await init_db()
+        await warm_hot_queries(AsyncSessionLocal)
+        async with AsyncSessionLocal() as db:
+            interrupted = await interrupt_unfinished_broadcasts(db)
+        if interrupted:
+            logger.warning(f"Рассылок, прерванных перезапуском: {interrupted}")
         logger.info("База данных инициализирована")
     except Exception as e:
         logger.error(f"Ошибка инициализации БД: {e}")
+        await session.close()
         return
     
+    try:
+        async with AsyncSessionLocal() as db:
+            await bots.load(db)
+    except Exception as e:
+        logger.error(f"Не удалось получить данные ботов (проверьте BOT_TOKEN и BOT_TOKENS): {e}")
+        await session.close()
+        await engine.dispose()
+        return
+    
+    supervisor.start("gateway_metrics", gateway.log_metrics)
+    
+    # Проверки состояния для Docker/оркестратора
+    health_runner = None
+    if Config.HEALTH_PORT:
+        health = HealthState(engine, update_tracker, gateway)
+        supervisor.start("loop_lag", health.loop_lag.run)
+        supervisor.start("db_probe", health.db.run)
+        try:
+            health_runner = await start_health_server(health, Config.HEALTH_HOST, Config.HEALTH_PORT)
+        except OSError as e:
+            logger.error(f"Не удалось запустить проверки состояния на порту {Config.HEALTH_PORT}: {e}")
+    
+    # Фоновое добавление новых пользователей в рабочий чат и канал
+    await group_onboarding.start(bots.primary, AsyncSessionLocal)
+    
     # Запуск планировщика еженедельных обновлений в фоне
-    asyncio.create_task(schedule_weekly_updates(bot))
+    supervisor.start("weekly_updates", lambda: schedule_weekly_updates(bots.for_tenant))
     logger.info("Планировщик еженедельных обновлений запущен")
     
+    # Ежедневное обслуживание БД: архив, освобождение места, статистика, резервная копия
+    supervisor.start("maintenance", lambda: schedule_maintenance(engine, AsyncSessionLocal))
+    logger.info("Планировщик обслуживания БД запущен")
+    
+    # Смены по шаблонам на SHIFT_TEMPLATE_WEEKS недель вперёд: при запуске и ежедневно
+    supervisor.start("shift_templates", lambda: schedule_shift_generation(AsyncSessionLocal))
+    
     # Запуск бота
+    stop = asyncio.Event()
+    install_signal_handlers(stop)
     try:
-        logger.info("Бот запущен")
-        await dp.start_polling(bot, skip_updates=True)
+        if Config.WEBHOOK_URL:
+            await run_webhook(bot_list, dp, stop)
+        else:
+            await run_polling(bot_list, dp, stop)
     except Exception as e:
         logger.error(f"Ошибка при работе бота: {e}")
     finally:
-        await bot.session.close()
+        await shutdown(session, health_runner)
 
 
 if __name__ == "__main__":
@@ -69,4 +237,6 @@ if __name__ == "__main__":
         asyncio.run(main())
     except KeyboardInterrupt:
         logger.info("Бот остановлен пользователем")
+    finally:
+        log_listener.stop()
 
@@ -0,0 +1,2 @@
+# Messaging package
+
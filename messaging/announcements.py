@@ -0,0 +1,76 @@
+"""
+Анонсы новых смен в личные сообщения.
+
+Анонс получают зарегистрированные пользователи команды, у которых день
+недели смены есть среди предпочитаемых дней (выборка по индексу таблицы
+user_days), кроме заблокировавших бота.
+"""
+from typing import Awaitable, Callable, List, Optional
+
+from aiogram import Bot
+from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup
+from sqlalchemy.engine import Row
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from database.crud import get_user_ids_by_day, mark_users_blocked
+from handlers.callbacks import pack
+from messaging.sender import BLOCKED, SendStats, send_to_many
+
+
+DAYS_OF_WEEK = ["Пн", "Вт", "Ср", "Чт", "Пт", "Сб", "Вс"]
+
+
+def shift_weekday(shift: Row) -> str:
+    """День недели смены в формате preferred_days ("Пн", "Вт", ...)"""
+    return DAYS_OF_WEEK[shift.date.weekday()]
+
+
+async def get_announcement_recipients(db: AsyncSession, shift: Row, tenant_id: int) -> List[int]:
+    """Telegram ID пользователей команды, которым подходит день смены"""
+    return await get_user_ids_by_day(db, shift_weekday(shift), tenant_id)
+
+
+def render_announcement(shift: Row) -> tuple:
+    """Текст и клавиатура анонса смены"""
+    date_str = shift.date.strftime("%d.%m.%Y %H:%M")
+    text = (
+        f"🆕 Новая смена ({shift_weekday(shift)})\n\n"
+        f"Дата и время: {date_str}\n"
+        f"Описание: {shift.description or 'Описание отсутствует'}"
+    )
+    keyboard = InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(text="✅ Записаться", callback_data=pack("book_shift", shift.id))]
+    ])
+    return text, keyboard
+
+
+async def announce_shift(
+    bot: Bot,
+    shift: Row,
+    chat_ids: List[int],
+    on_progress: Optional[Callable[[SendStats], Awaitable[None]]] = None,
+    session_factory: Optional[async_sessionmaker] = None,
+) -> SendStats:
+    """
+    Рассылка анонса смены по списку чатов.
+
+    Если передан session_factory, заблокировавшие бота пользователи
+    помечаются в БД и в следующие рассылки не попадают.
+    """
+    text, keyboard = render_announcement(shift)
+    blocked = []
+
+    def on_result(chat_id: int, outcome: str):
+        if outcome == BLOCKED:
+            blocked.append(chat_id)
+
+    stats = await send_to_many(
+        chat_ids,
+        lambda chat_id: bot.send_message(chat_id=chat_id, text=text, reply_markup=keyboard),
+        on_progress=on_progress,
+        on_result=on_result,
+    )
+    if blocked and session_factory:
+        async with session_factory() as db:
+            await mark_users_blocked(db, blocked)
+    return stats
@@ -0,0 +1,255 @@
+"""
+Рассылка сообщения администратора всем сотрудникам команды в личные сообщения.
+
+Сообщение не загружается заново, а копируется (copy_message), поэтому фото,
+видео и документы уходят по уже существующему file_id. Получатели читаются
+из БД страницами по ключу users.id в коротких сессиях, результаты каждой
+страницы записываются в журнал broadcast_deliveries одной транзакцией.
+Пользователи, заблокировавшие бота, помечаются и в следующие рассылки не
+попадают.
+
+Рассылку можно приостановить, продолжить и отменить кнопками под
+сообщением о ходе отправки. Рассылка живёт в памяти процесса: при остановке
+бот ждёт завершения рассылок (stop_broadcasts), а не успевшие завершиться
+помечаются как прерванные; уже отправленная часть остаётся в журнале.
+"""
+import asyncio
+import logging
+from typing import Dict, Optional
+
+from aiogram import Bot
+from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup, Message
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from database.crud import (
+    get_broadcast_recipients_page, record_broadcast_page, set_broadcast_status
+)
+from handlers.callbacks import pack
+from messaging.sender import SendStats, send_to_many
+
+
+logger = logging.getLogger(__name__)
+
+# Как часто обновлять сообщение о ходе рассылки, секунд
+PROGRESS_INTERVAL = 5
+
+STATUS_TITLES = {
+    "running": "📤 Рассылка идёт",
+    "paused": "⏸ Рассылка приостановлена",
+    "cancelled": "⛔ Рассылка отменена",
+    "finished": "✅ Рассылка завершена",
+    "interrupted": "⚠️ Рассылка прервана (ошибка или перезапуск бота)",
+}
+
+
+def _format_duration(seconds: float) -> str:
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    if hours:
+        return f"{hours} ч {minutes} мин"
+    if minutes:
+        return f"{minutes} мин {seconds} с"
+    return f"{seconds} с"
+
+
+class BroadcastJob:
+    """Одна рассылка: отправка, пауза, отмена и отображение прогресса"""
+
+    def __init__(
+        self,
+        bot: Bot,
+        session_factory: async_sessionmaker,
+        broadcast_id: int,
+        from_chat_id: int,
+        message_id: int,
+        total: int,
+        status_message: Message,
+        tenant_id: int,
+    ):
+        self.bot = bot
+        self.tenant_id = tenant_id
+        self.session_factory = session_factory
+        self.broadcast_id = broadcast_id
+        self.from_chat_id = from_chat_id
+        self.message_id = message_id
+        self.status_message = status_message
+        self.stats = SendStats(total=total)
+        self.status = "running"
+        self.task: Optional[asyncio.Task] = None
+        self._interrupted = False
+        self._resumed = asyncio.Event()
+        self._resumed.set()
+        self._active_time = 0.0  # Время отправки без пауз (для оценки оставшегося времени)
+        self._active_since: Optional[float] = None
+
+    # ---------- Управление ----------
+
+    async def pause(self):
+        if self.status != "running":
+            return
+        self._resumed.clear()
+        self._stop_clock()
+        self.status = "paused"
+        await self._save_status()
+        await self.update_status_message()
+
+    async def resume(self):
+        if self.status != "paused":
+            return
+        self._start_clock()
+        self.status = "running"
+        self._resumed.set()
+        await self._save_status()
+        await self.update_status_message()
+
+    def cancel(self):
+        if self.task and not self.task.done():
+            self.task.cancel()
+
+    def interrupt(self):
+        """Остановка при завершении работы бота (в отличие от cancel - статус interrupted)"""
+        self._interrupted = True
+        self.cancel()
+
+    # ---------- Отправка ----------
+
+    async def _send(self, chat_id: int):
+        await self._resumed.wait()
+        await self.bot.copy_message(chat_id=chat_id, from_chat_id=self.from_chat_id, message_id=self.message_id)
+
+    async def run(self):
+        """Отправка всем получателям страницами; завершение фиксируется в журнале"""
+        self._start_clock()
+        reporter = asyncio.create_task(self._report_progress())
+        last_user_id = 0
+        outcomes: Dict[int, str] = {}
+        try:
+            while True:
+                async with self.session_factory() as db:
+                    page = await get_broadcast_recipients_page(db, last_user_id, tenant_id=self.tenant_id)
+                if not page:
+                    break
+                user_ids = {row.telegram_id: row.id for row in page}
+
+                def on_result(chat_id: int, outcome: str):
+                    outcomes[user_ids[chat_id]] = outcome
+                    setattr(self.stats, outcome, getattr(self.stats, outcome) + 1)
+
+                await send_to_many(user_ids, self._send, on_result=on_result)
+                last_user_id = page[-1].id
+                await self._record(outcomes, last_user_id)
+                outcomes = {}
+            self.status = "finished"
+        except asyncio.CancelledError:
+            self.status = "interrupted" if self._interrupted else "cancelled"
+            # Результаты уже отправленной части страницы тоже попадают в журнал
+            if outcomes:
+                await self._record(outcomes, max(outcomes))
+            raise
+        except Exception:
+            self.status = "interrupted"
+            raise
+        finally:
+            reporter.cancel()
+            self._stop_clock()
+            await self._save_status()
+            await self.update_status_message()
+
+    async def _record(self, outcomes: Dict[int, str], last_user_id: int):
+        async with self.session_factory() as db:
+            await record_broadcast_page(db, self.broadcast_id, outcomes, last_user_id)
+
+    async def _save_status(self):
+        async with self.session_factory() as db:
+            await set_broadcast_status(db, self.broadcast_id, self.status)
+
+    # ---------- Прогресс ----------
+
+    def _start_clock(self):
+        self._active_since = asyncio.get_running_loop().time()
+
+    def _stop_clock(self):
+        if self._active_since is not None:
+            self._active_time += asyncio.get_running_loop().time() - self._active_since
+            self._active_since = None
+
+    def _elapsed(self) -> float:
+        elapsed = self._active_time
+        if self._active_since is not None:
+            elapsed += asyncio.get_running_loop().time() - self._active_since
+        return elapsed
+
+    def render_status(self) -> str:
+        stats = self.stats
+        text = (
+            f"{STATUS_TITLES.get(self.status, self.status)}\n\n"
+            f"Обработано: {stats.done} из {stats.total}\n"
+            f"✅ Доставлено: {stats.sent}\n"
+            f"🚫 Заблокировали бота: {stats.blocked}\n"
+            f"❌ Ошибок: {stats.failed}\n"
+        )
+        elapsed = self._elapsed()
+        if self.status == "running" and stats.done and elapsed > 0:
+            remaining = max(stats.total - stats.done, 0) / (stats.done / elapsed)
+            text += f"⏳ Осталось примерно: {_format_duration(remaining)}"
+        elif self.status in ("finished", "cancelled", "interrupted"):
+            text += f"⏱ Время отправки: {_format_duration(elapsed)}"
+        return text
+
+    def render_keyboard(self) -> Optional[InlineKeyboardMarkup]:
+        if self.status == "running":
+            toggle = InlineKeyboardButton(text="⏸ Пауза", callback_data=pack("broadcast", "pause", self.broadcast_id))
+        elif self.status == "paused":
+            toggle = InlineKeyboardButton(text="▶️ Продолжить", callback_data=pack("broadcast", "resume", self.broadcast_id))
+        else:
+            return None
+        return InlineKeyboardMarkup(inline_keyboard=[
+            [toggle, InlineKeyboardButton(text="⛔ Отменить", callback_data=pack("broadcast", "cancel", self.broadcast_id))]
+        ])
+
+    async def update_status_message(self):
+        try:
+            await self.status_message.edit_text(self.render_status(), reply_markup=self.render_keyboard())
+        except Exception as e:
+            # Прогресс не важнее самой рассылки (например, текст не изменился)
+            logger.debug(f"Не удалось обновить статус рассылки {self.broadcast_id}: {e}")
+
+    async def _report_progress(self):
+        while True:
+            await asyncio.sleep(PROGRESS_INTERVAL)
+            await self.update_status_message()
+
+
+# Рассылки, которые выполняются сейчас: {broadcast_id: BroadcastJob}
+active_broadcasts: Dict[int, BroadcastJob] = {}
+
+
+def start_broadcast(job: BroadcastJob) -> BroadcastJob:
+    """Запуск рассылки в фоне"""
+    job.task = asyncio.create_task(job.run())
+    active_broadcasts[job.broadcast_id] = job
+
+    def on_done(task: asyncio.Task):
+        active_broadcasts.pop(job.broadcast_id, None)
+        if not task.cancelled() and task.exception():
+            logger.error(f"Рассылка {job.broadcast_id} завершилась с ошибкой", exc_info=task.exception())
+
+    job.task.add_done_callback(on_done)
+    return job
+
+
+async def stop_broadcasts(timeout: float):
+    """Ожидание активных рассылок не дольше timeout; оставшиеся прерываются"""
+    jobs = list(active_broadcasts.values())
+    if not jobs:
+        return
+    logger.info(f"Ожидание завершения рассылок: {len(jobs)}")
+    tasks = [job.task for job in jobs]
+    _, pending = await asyncio.wait(tasks, timeout=timeout)
+    for job in jobs:
+        if job.task in pending:
+            logger.warning(f"Рассылка {job.broadcast_id} прервана остановкой бота")
+            job.interrupt()
+    if pending:
+        # Прерванная рассылка записывает итоги в журнал
+        await asyncio.wait(pending, timeout=5)
@@ -0,0 +1,209 @@
+"""
+Единая очередь исходящих запросов к Bot API с приоритетами.
+
+Все запросы ботов проходят через OutboundGateway (middleware общей
+HTTP-сессии aiogram). Отправка сообщений (send*, copy*, forward*) получает
+слот в лимите скорости своего бота (TELEGRAM_RATE_PER_SECOND): Telegram
+ограничивает каждый токен отдельно, поэтому у каждого бота процесса своя
+очередь слотов. Остальные методы (answerCallbackQuery, правка сообщений,
+getChatMember, createChatInviteLink, ...) лимитом сообщений не
+ограничиваются и идут без очереди, поэтому ответ на нажатие кнопки не
+ждёт массовой отправки. Отправки делятся на две полосы:
+
+- interactive - ответы пользователям (answer, edit_text, ...), по умолчанию;
+- bulk - массовые отправки (анонсы, рассылки, еженедельные запросы).
+
+Свободный слот всегда отдаётся interactive, bulk получает остаток лимита.
+Полоса задаётся контекстом: код массовой отправки оборачивается в
+bulk_lane(), и все запросы из него (включая запущенные внутри задачи)
+попадают в полосу bulk.
+
+При ответе 429 (TelegramRetryAfter) выдача слотов этому боту
+останавливается для обеих полос на указанное время, повтор запроса
+остаётся на вызывающем коде.
+"""
+import asyncio
+import logging
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Deque, Dict, Optional
+
+from aiogram import Bot
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import SendChatAction, TelegramMethod
+from aiogram.methods.base import Response, TelegramType
+
+from config import Config
+
+
+logger = logging.getLogger(__name__)
+
+INTERACTIVE = "interactive"
+BULK = "bulk"
+LANES = (INTERACTIVE, BULK)
+
+# Лимит скорости действует только на отправку сообщений (префиксы имён методов Bot API)
+LIMITED_METHOD_PREFIXES = ("send", "copy", "forward")
+# Действие в чате ("печатает...") сообщений не отправляет
+UNLIMITED_METHODS = (SendChatAction,)
+
+
+def is_limited(method: TelegramMethod) -> bool:
+    """Расходует ли запрос слот в лимите отправки сообщений"""
+    return method.__api_method__.startswith(LIMITED_METHOD_PREFIXES) and not isinstance(method, UNLIMITED_METHODS)
+
+current_lane: ContextVar[str] = ContextVar("telegram_lane", default=INTERACTIVE)
+
+
+@contextmanager
+def bulk_lane():
+    """Запросы внутри блока (и в созданных в нём задачах) идут в полосу bulk"""
+    token = current_lane.set(BULK)
+    try:
+        yield
+    finally:
+        current_lane.reset(token)
+
+
+class LaneMetrics:
+    """Счётчики одной полосы"""
+
+    def __init__(self):
+        self.requests = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.retry_after = 0
+
+    def observe(self, wait: float):
+        self.requests += 1
+        self.wait_total += wait
+        self.wait_max = max(self.wait_max, wait)
+
+    @property
+    def wait_avg(self) -> float:
+        return self.wait_total / self.requests if self.requests else 0.0
+
+
+class BotSlots:
+    """Очередь слотов одного бота"""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.queues: Dict[str, Deque[asyncio.Future]] = {lane: deque() for lane in LANES}
+        self.next_slot = 0.0
+        self._wakeup = asyncio.Event()
+        self._dispatcher: Optional[asyncio.Task] = None
+
+    async def acquire(self, lane: str):
+        future = asyncio.get_running_loop().create_future()
+        self.queues[lane].append(future)
+        if self._dispatcher is None or self._dispatcher.done():
+            self._dispatcher = asyncio.create_task(self._dispatch())
+        self._wakeup.set()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if not future.done():
+                self.queues[lane].remove(future)
+            raise
+
+    def _next_waiter(self) -> Optional[asyncio.Future]:
+        for lane in LANES:
+            queue = self.queues[lane]
+            while queue:
+                future = queue.popleft()
+                if not future.done():
+                    return future
+        return None
+
+    async def _dispatch(self):
+        """Выдача слотов по одному через interval, interactive - в первую очередь"""
+        loop = asyncio.get_running_loop()
+        while True:
+            if not any(self.queues.values()):
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            delay = self.next_slot - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+                continue  # За время ожидания мог прийти более приоритетный запрос
+            future = self._next_waiter()
+            if future is None:
+                continue
+            future.set_result(None)
+            self.next_slot = max(self.next_slot, loop.time()) + self.interval
+
+
+class OutboundGateway(BaseRequestMiddleware):
+    """Приоритетная выдача слотов отправкам сообщений (отдельный лимит на каждого бота)"""
+
+    def __init__(self, rate: float = Config.TELEGRAM_RATE_PER_SECOND):
+        self.interval = 1 / rate
+        self._bots: Dict[int, BotSlots] = {}
+        self.metrics: Dict[str, LaneMetrics] = {lane: LaneMetrics() for lane in LANES}
+
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType[TelegramType],
+        bot: Bot,
+        method: TelegramMethod[TelegramType],
+    ) -> Response[TelegramType]:
+        if not is_limited(method):
+            return await make_request(bot, method)
+
+        slots = self._bots.get(bot.id)
+        if slots is None:
+            slots = self._bots[bot.id] = BotSlots(self.interval)
+        lane = current_lane.get()
+        loop = asyncio.get_running_loop()
+        queued_at = loop.time()
+        await slots.acquire(lane)
+        self.metrics[lane].observe(loop.time() - queued_at)
+        try:
+            return await make_request(bot, method)
+        except TelegramRetryAfter as e:
+            # Лимит превышен для всего бота: не выдаём ему слоты, пока он не снимется
+            self.metrics[lane].retry_after += 1
+            slots.next_slot = max(slots.next_slot, loop.time() + e.retry_after)
+            raise
+
+    def queue_depth(self) -> Dict[str, int]:
+        """Число запросов всех ботов, ожидающих слот, по полосам"""
+        return {lane: sum(len(slots.queues[lane]) for slots in self._bots.values()) for lane in LANES}
+
+    def snapshot(self) -> Dict[str, dict]:
+        """Метрики по полосам: очередь, число запросов, ожидание (мс), ответы 429"""
+        depth = self.queue_depth()
+        return {
+            lane: {
+                "queue_depth": depth[lane],
+                "requests": metrics.requests,
+                "wait_avg_ms": round(metrics.wait_avg * 1000, 1),
+                "wait_max_ms": round(metrics.wait_max * 1000, 1),
+                "retry_after": metrics.retry_after,
+            }
+            for lane, metrics in self.metrics.items()
+        }
+
+    def format_snapshot(self) -> str:
+        return "; ".join(
+            f"{lane}: очередь {data['queue_depth']}, запросов {data['requests']}, "
+            f"ожидание ср. {data['wait_avg_ms']} мс / макс. {data['wait_max_ms']} мс, 429: {data['retry_after']}"
+            for lane, data in self.snapshot().items()
+        )
+
+    async def log_metrics(self, interval: float = 60):
+        """Периодическая запись метрик в лог (только если были запросы)"""
+        last_requests = 0
+        while True:
+            await asyncio.sleep(interval)
+            requests = sum(metrics.requests for metrics in self.metrics.values())
+            if requests != last_requests:
+                logger.info(f"Исходящие запросы Bot API - {self.format_snapshot()}")
+                last_requests = requests
+
+
+gateway = OutboundGateway()
@@ -0,0 +1,297 @@
+"""
+Добавление пользователей в рабочий чат и канал уведомлений своей команды после регистрации.
+
+Регистрация не ждёт запросов к Telegram: handler ставит пользователя в
+ограниченную очередь (enqueue), а задания выполняют фоновые воркеры. Для
+каждого чата воркер:
+
+- пропускает пользователя, если он уже известен как участник (кэш
+  членства, MEMBERSHIP_TTL) - get_chat_member для него не вызывается;
+- иначе проверяет членство и, если пользователь не в чате: в канале снимает
+  блокировку (если она была), в рабочий чат отправляет одноразовую
+  пригласительную ссылку.
+
+Ссылки (member_limit=1) берутся из пула, который заранее пополняется в
+полосе bulk (messaging/gateway.py), когда в нём остаётся меньше
+INVITE_POOL_LOW ссылок; создание ссылки на месте - только если пул пуст.
+
+Сетевые ошибки, ошибки сервера Telegram и 429 повторяются до MAX_ATTEMPTS
+раз с паузой; ошибки запроса (нет прав, пользователь заблокировал бота) не
+повторяются и пишутся в лог.
+"""
+import asyncio
+import logging
+import time
+from collections import deque
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Deque, Dict, List, NamedTuple, Optional, Tuple, TypeVar
+
+from aiogram import Bot
+from aiogram.enums import ChatMemberStatus
+from aiogram.exceptions import TelegramNetworkError, TelegramRetryAfter, TelegramServerError
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from config import Config
+from database.crud import get_setting
+from database.models import DEFAULT_TENANT_ID
+from messaging.gateway import bulk_lane
+
+
+logger = logging.getLogger(__name__)
+
+# Очередь заданий и число воркеров
+ONBOARDING_QUEUE_SIZE = 1000
+ONBOARDING_WORKERS = 2
+
+# Повторы запросов к Telegram: число попыток и пауза перед первым повтором (удваивается)
+MAX_ATTEMPTS = 4
+RETRY_DELAY = 2.0
+
+# Сколько секунд участник чата считается известным без повторной проверки
+MEMBERSHIP_TTL = 12 * 60 * 60
+
+# Пул одноразовых ссылок: целевой размер, порог пополнения, срок действия ссылки
+INVITE_POOL_SIZE = 10
+INVITE_POOL_LOW = 3
+INVITE_LINK_TTL = timedelta(days=7)
+
+T = TypeVar("T")
+
+
+async def get_group_chat_ids(db: AsyncSession, tenant_id: int = DEFAULT_TENANT_ID) -> Tuple[int, int]:
+    """
+    ID канала уведомлений и рабочего чата команды (0 - не задан): из настроек
+    БД, для основной команды - также из конфига.
+    """
+    default = tenant_id == DEFAULT_TENANT_ID
+    notification_channel_id = await get_setting(db, "notification_channel_id", tenant_id)
+    if notification_channel_id:
+        notification_channel_id = int(notification_channel_id)
+    else:
+        notification_channel_id = Config.NOTIFICATION_CHANNEL_ID if default else 0
+
+    work_group_id = await get_setting(db, "work_group_id", tenant_id)
+    if work_group_id:
+        work_group_id = int(work_group_id)
+    else:
+        work_group_id = Config.WORK_GROUP_ID if default else 0
+    return notification_channel_id, work_group_id
+
+
+async def call_with_retries(request: Callable[[], Awaitable[T]], description: str) -> T:
+    """Запрос к Telegram с повтором временных ошибок; остальные ошибки пробрасываются"""
+    delay = RETRY_DELAY
+    for attempt in range(1, MAX_ATTEMPTS + 1):
+        try:
+            return await request()
+        except TelegramRetryAfter as e:
+            if attempt == MAX_ATTEMPTS:
+                raise
+            await asyncio.sleep(e.retry_after)
+        except (TelegramNetworkError, TelegramServerError) as e:
+            if attempt == MAX_ATTEMPTS:
+                raise
+            logger.debug(f"{description}: {e}, повтор через {delay:.0f} с")
+            await asyncio.sleep(delay)
+            delay *= 2
+
+
+class MembershipCache:
+    """Известные участники чатов; запись живёт MEMBERSHIP_TTL секунд"""
+
+    def __init__(self, ttl: float = MEMBERSHIP_TTL):
+        self.ttl = ttl
+        self._expires: Dict[Tuple[int, int], float] = {}
+
+    def is_member(self, chat_id: int, telegram_id: int) -> bool:
+        expires = self._expires.get((chat_id, telegram_id))
+        if expires is None:
+            return False
+        if expires < time.monotonic():
+            del self._expires[(chat_id, telegram_id)]
+            return False
+        return True
+
+    def remember(self, chat_id: int, telegram_id: int):
+        self._expires[(chat_id, telegram_id)] = time.monotonic() + self.ttl
+
+    def forget(self, chat_id: int, telegram_id: int):
+        self._expires.pop((chat_id, telegram_id), None)
+
+
+class _Invite(NamedTuple):
+    link: str
+    expires_at: datetime
+
+
+class InvitePool:
+    """Заранее созданные одноразовые пригласительные ссылки по чатам"""
+
+    def __init__(self, size: int = INVITE_POOL_SIZE, low: int = INVITE_POOL_LOW):
+        self.size = size
+        self.low = low
+        self._links: Dict[int, Deque[_Invite]] = {}
+        self._refills: Dict[int, asyncio.Task] = {}
+
+    def available(self, chat_id: int) -> int:
+        return len(self._links.get(chat_id, ()))
+
+    async def take(self, bot: Bot, chat_id: int) -> str:
+        """Ссылка из пула (или новая, если пул пуст); при нехватке запускается пополнение"""
+        links = self._links.setdefault(chat_id, deque())
+        # Ссылке должно хватить времени, чтобы пользователь успел по ней перейти
+        fresh_until = datetime.now() + timedelta(days=1)
+        while links and links[0].expires_at < fresh_until:
+            links.popleft()
+        invite = links.popleft() if links else None
+        if len(links) < self.low:
+            self.refill(bot, chat_id)
+        if invite is None:
+            invite = await self._create(bot, chat_id)
+        return invite.link
+
+    def refill(self, bot: Bot, chat_id: int):
+        """Фоновое пополнение пула до size ссылок (не более одного пополнения на чат)"""
+        task = self._refills.get(chat_id)
+        if task is not None and not task.done():
+            return
+        with bulk_lane():
+            self._refills[chat_id] = asyncio.create_task(self._refill(bot, chat_id))
+
+    async def _refill(self, bot: Bot, chat_id: int):
+        links = self._links.setdefault(chat_id, deque())
+        try:
+            while len(links) < self.size:
+                links.append(await self._create(bot, chat_id))
+        except Exception as e:
+            logger.warning(f"Не удалось пополнить пул ссылок для чата {chat_id}: {e}")
+
+    @staticmethod
+    async def _create(bot: Bot, chat_id: int) -> _Invite:
+        expires_at = datetime.now() + INVITE_LINK_TTL
+        invite = await call_with_retries(
+            lambda: bot.create_chat_invite_link(chat_id, expire_date=expires_at, member_limit=1),
+            f"Создание ссылки для чата {chat_id}",
+        )
+        return _Invite(invite.invite_link, expires_at)
+
+
+class GroupOnboarding:
+    """Фоновая очередь добавления зарегистрированных пользователей в группы"""
+
+    def __init__(self, queue_size: int = ONBOARDING_QUEUE_SIZE, workers: int = ONBOARDING_WORKERS):
+        self.queue_size = queue_size
+        self.workers_count = workers
+        self.members = MembershipCache()
+        self.invites = InvitePool()
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+        self._bot: Optional[Bot] = None
+        self._session_factory: Optional[async_sessionmaker] = None
+
+    async def start(self, bot: Bot, session_factory: async_sessionmaker):
+        """Запуск воркеров и заполнение пула ссылок рабочего чата основной команды (других - при первом запросе)"""
+        self._bot = bot
+        self._session_factory = session_factory
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.workers_count)]
+        async with session_factory() as db:
+            _, work_group_id = await get_group_chat_ids(db)
+        if work_group_id:
+            self.invites.refill(bot, work_group_id)
+
+    async def drain(self, timeout: float) -> bool:
+        """Ожидание обработки очереди; False - не успели за timeout"""
+        if self._queue is None or not self._workers:
+            return True
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            logger.warning(f"Остановка: в очереди добавления в группы осталось {self._queue.qsize()}")
+            return False
+
+    async def stop(self):
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    def enqueue(self, telegram_id: int, tenant_id: int = DEFAULT_TENANT_ID, bot: Optional[Bot] = None) -> bool:
+        """
+        Постановка пользователя команды в очередь; приглашение отправит bot
+        (бот, в котором пользователь зарегистрировался; None - основной).
+        False - очередь не запущена или переполнена.
+        """
+        if self._queue is None:
+            logger.warning(f"Очередь добавления в группы не запущена, пользователь {telegram_id} пропущен")
+            return False
+        try:
+            self._queue.put_nowait((telegram_id, tenant_id, bot or self._bot))
+        except asyncio.QueueFull:
+            logger.warning(f"Очередь добавления в группы переполнена, пользователь {telegram_id} пропущен")
+            return False
+        return True
+
+    def pending(self) -> int:
+        return self._queue.qsize() if self._queue else 0
+
+    async def _worker(self):
+        while True:
+            telegram_id, tenant_id, bot = await self._queue.get()
+            try:
+                await self.add_user(telegram_id, tenant_id, bot)
+            except Exception as e:
+                logger.warning(f"Ошибка при добавлении пользователя {telegram_id} в группы: {e}")
+            finally:
+                self._queue.task_done()
+
+    async def add_user(self, telegram_id: int, tenant_id: int = DEFAULT_TENANT_ID, bot: Optional[Bot] = None):
+        """Добавление одного пользователя в канал уведомлений и рабочий чат его команды"""
+        bot = bot or self._bot
+        async with self._session_factory() as db:
+            notification_channel_id, work_group_id = await get_group_chat_ids(db, tenant_id)
+
+        if notification_channel_id and not await self._is_member(bot, notification_channel_id, telegram_id):
+            try:
+                # Снятие блокировки, если пользователя раньше исключили из канала
+                await call_with_retries(
+                    lambda: bot.unban_chat_member(notification_channel_id, telegram_id, only_if_banned=True),
+                    f"Разблокировка в канале {notification_channel_id}",
+                )
+            except Exception as e:
+                logger.warning(f"Ошибка при добавлении в канал: {e}")
+
+        if work_group_id and not await self._is_member(bot, work_group_id, telegram_id):
+            try:
+                link = await self.invites.take(bot, work_group_id)
+                await call_with_retries(
+                    lambda: bot.send_message(
+                        chat_id=telegram_id,
+                        text=f"🎉 Добро пожаловать! Присоединяйтесь к рабочему чату:\n{link}"
+                    ),
+                    f"Приглашение пользователю {telegram_id}",
+                )
+            except Exception as e:
+                logger.warning(f"Ошибка при добавлении в группу: {e}")
+
+    async def _is_member(self, bot: Bot, chat_id: int, telegram_id: int) -> bool:
+        if self.members.is_member(chat_id, telegram_id):
+            return True
+        try:
+            member = await call_with_retries(
+                lambda: bot.get_chat_member(chat_id, telegram_id),
+                f"Проверка участника чата {chat_id}",
+            )
+        except Exception as e:
+            logger.debug(f"Не удалось проверить участника {telegram_id} в чате {chat_id}: {e}")
+            return False
+        if member.status in (ChatMemberStatus.LEFT, ChatMemberStatus.KICKED):
+            return False
+        if member.status == ChatMemberStatus.RESTRICTED and not member.is_member:
+            return False
+        self.members.remember(chat_id, telegram_id)
+        return True
+
+
+group_onboarding = GroupOnboarding()
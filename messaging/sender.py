@@ -0,0 +1,125 @@
+"""
+Массовая отправка личных сообщений.
+
+Сообщения отправляются несколькими параллельными воркерами в полосе bulk
+общей очереди запросов: скорость ограничивает только лимит бота в
+messaging/gateway.py (TELEGRAM_RATE_PER_SECOND), ответы пользователям
+получают слот раньше массовых отправок.
+На TelegramRetryAfter воркер ждёт указанное время и повторяет отправку;
+пользователи, запретившие боту писать, учитываются отдельно и не повторяются.
+Пользователь, ни разу не открывавший этого бота ("bot can't initiate
+conversation"), бота не блокировал: такая отправка считается ошибкой.
+"""
+import asyncio
+import logging
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Iterable, Optional
+
+from aiogram.exceptions import TelegramForbiddenError, TelegramRetryAfter
+
+from config import Config
+from messaging.gateway import bulk_lane
+
+
+logger = logging.getLogger(__name__)
+
+# Сколько раз повторять отправку после TelegramRetryAfter
+MAX_RETRIES = 3
+
+# Результаты отправки одному получателю
+SENT = "sent"
+BLOCKED = "blocked"
+FAILED = "failed"
+
+# Текст TelegramForbiddenError, когда пользователь не начинал диалог с этим ботом
+NOT_STARTED_ERROR = "can't initiate conversation"
+
+
+@dataclass
+class SendStats:
+    """Итоги массовой отправки"""
+    total: int = 0
+    sent: int = 0
+    blocked: int = 0
+    failed: int = 0
+
+    @property
+    def done(self) -> int:
+        return self.sent + self.blocked + self.failed
+
+
+async def send_to_many(
+    chat_ids: Iterable[int],
+    send: Callable[[int], Awaitable[object]],
+    on_progress: Optional[Callable[[SendStats], Awaitable[None]]] = None,
+    on_result: Optional[Callable[[int, str], None]] = None,
+    concurrency: int = Config.SEND_CONCURRENCY,
+    progress_interval: float = 3.0,
+) -> SendStats:
+    """
+    Отправка сообщения каждому чату из chat_ids.
+
+    send(chat_id) выполняет саму отправку (send_message, copy_message, ...).
+    on_progress вызывается не чаще раза в progress_interval секунд и один
+    раз в конце. on_result(chat_id, SENT | BLOCKED | FAILED) - после каждой
+    отправки (например, для журнала доставки). Возвращает итоги отправки.
+    """
+    chat_ids = list(chat_ids)
+    stats = SendStats(total=len(chat_ids))
+    queue: asyncio.Queue = asyncio.Queue()
+    for chat_id in chat_ids:
+        queue.put_nowait(chat_id)
+
+    async def worker():
+        while True:
+            try:
+                chat_id = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            outcome = FAILED
+            for attempt in range(MAX_RETRIES + 1):
+                try:
+                    await send(chat_id)
+                    outcome = SENT
+                except TelegramRetryAfter as e:
+                    if attempt < MAX_RETRIES:
+                        await asyncio.sleep(e.retry_after)
+                        continue
+                except TelegramForbiddenError as e:
+                    if NOT_STARTED_ERROR in e.message:
+                        logger.warning(f"Пользователь {chat_id} не начинал диалог с ботом")
+                    else:
+                        outcome = BLOCKED
+                except Exception as e:
+                    logger.warning(f"Ошибка отправки пользователю {chat_id}: {e}")
+                break
+            setattr(stats, outcome, getattr(stats, outcome) + 1)
+            if on_result:
+                on_result(chat_id, outcome)
+
+    async def reporter():
+        while True:
+            await asyncio.sleep(progress_interval)
+            await _report(on_progress, stats)
+
+    # Отправки идут в полосе bulk и пропускают вперёд ответы пользователям
+    with bulk_lane():
+        workers = [asyncio.create_task(worker()) for _ in range(min(concurrency, len(chat_ids)))]
+    progress_task = asyncio.create_task(reporter()) if on_progress else None
+    try:
+        await asyncio.gather(*workers)
+    finally:
+        if progress_task:
+            progress_task.cancel()
+    await _report(on_progress, stats)
+    return stats
+
+
+async def _report(on_progress, stats: SendStats):
+    if on_progress is None:
+        return
+    try:
+        await on_progress(stats)
+    except Exception as e:
+        # Прогресс не важнее самой отправки
+        logger.debug(f"Не удалось обновить прогресс отправки: {e}")
@@ -0,0 +1,2 @@
+# Runtime package
+
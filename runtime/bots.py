@@ -0,0 +1,119 @@
+"""
+Несколько ботов в одном процессе.
+
+Кроме основного бота (BOT_TOKEN) процесс обслуживает дополнительных ботов
+из BOT_TOKENS: токены через запятую, "токен@код" привязывает бота к команде
+(см. database/tenants.py). Все боты работают на одном Dispatcher и одном
+цикле событий: общие роутеры, пул соединений с БД, HTTP-сессия Bot API и
+очередь исходящих запросов, а лимит скорости у каждого бота свой (см.
+messaging/gateway.py). N ботов занимают один процесс вместо N процессов со
+своими импортами, пулами и сессиями.
+
+Обработчики получают бота обновления в аргументе bot (aiogram), а его
+профиль - в аргументе bot_profile (BotProfile). Новый пользователь,
+написавший боту команды, регистрируется в этой команде (TenantMiddleware).
+"""
+import logging
+from typing import Any, Awaitable, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from aiogram import BaseMiddleware, Bot
+from aiogram.client.default import DefaultBotProperties
+from aiogram.client.session.base import BaseSession
+from aiogram.enums import ParseMode
+from aiogram.types import TelegramObject
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database.crud import get_tenant_by_slug
+from database.models import DEFAULT_TENANT_ID
+
+
+logger = logging.getLogger(__name__)
+
+
+class BotProfile(NamedTuple):
+    """Бот процесса: объект Bot, username и команда, к которой он привязан"""
+    bot: Bot
+    username: str
+    tenant_id: int
+
+
+def parse_bot_tokens(value: str) -> List[Tuple[str, str]]:
+    """BOT_TOKENS -> [(токен, код команды или "")]"""
+    tokens = []
+    for item in value.split(","):
+        token, _, slug = item.strip().partition("@")
+        if token:
+            tokens.append((token.strip(), slug.strip().lower()))
+    return tokens
+
+
+class BotRegistry:
+    """Боты процесса; первый - основной (BOT_TOKEN)"""
+
+    def __init__(self):
+        self._tokens: List[Tuple[str, str]] = []
+        self._bots: List[Bot] = []
+        self._profiles: Dict[int, BotProfile] = {}
+        self._by_tenant: Dict[int, Bot] = {}
+
+    def create(self, token: str, extra_tokens: str, session: BaseSession) -> List[Bot]:
+        """Создание ботов на общей HTTP-сессии (повторы токенов пропускаются)"""
+        seen = set()
+        for token, slug in [(token, "")] + parse_bot_tokens(extra_tokens):
+            bot = Bot(token=token, session=session, default=DefaultBotProperties(parse_mode=ParseMode.HTML))
+            if bot.id in seen:
+                logger.warning(f"Бот {bot.id} указан дважды, повтор пропущен")
+                continue
+            seen.add(bot.id)
+            self._tokens.append((token, slug))
+            self._bots.append(bot)
+        return self._bots
+
+    async def load(self, db: AsyncSession):
+        """Профили ботов: getMe и команда по коду из BOT_TOKENS"""
+        for bot, (_, slug) in zip(self._bots, self._tokens):
+            me = await bot.me()
+            tenant_id = DEFAULT_TENANT_ID
+            if slug:
+                tenant = await get_tenant_by_slug(db, slug)
+                if tenant is None:
+                    logger.error(f"Бот @{me.username}: команда {slug} не найдена, используется основная")
+                else:
+                    tenant_id = tenant.id
+                    self._by_tenant.setdefault(tenant_id, bot)
+            self._profiles[bot.id] = BotProfile(bot, me.username, tenant_id)
+            logger.info(f"Бот @{me.username} (ID {bot.id}), команда {tenant_id}")
+
+    @property
+    def primary(self) -> Bot:
+        return self._bots[0]
+
+    @property
+    def bots(self) -> List[Bot]:
+        return list(self._bots)
+
+    def profile(self, bot_id: int) -> Optional[BotProfile]:
+        return self._profiles.get(bot_id)
+
+    def for_tenant(self, tenant_id: int) -> Bot:
+        """Бот команды для отправок вне обработчиков (нет своего - основной)"""
+        return self._by_tenant.get(tenant_id, self.primary)
+
+
+class BotProfileMiddleware(BaseMiddleware):
+    """Профиль бота обновления в аргументе bot_profile"""
+
+    def __init__(self, registry: BotRegistry):
+        self.registry = registry
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        data["bot_profile"] = self.registry.profile(data["bot"].id)
+        return await handler(event, data)
+
+
+bots = BotRegistry()
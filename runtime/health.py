@@ -0,0 +1,171 @@
+"""
+HTTP-проверки состояния бота для Docker и оркестраторов.
+
+Сервер на HEALTH_HOST:HEALTH_PORT отвечает JSON со всеми показателями и
+кодом 200 (проверка пройдена) или 503:
+
+- GET /health/live - процесс не завис: цикл событий не заблокирован
+  надолго, БД отвечает (нет нескольких неудачных проверок подряд), начатые
+  обработчики не стоят без движения. Непрошедшую проверку оркестратор
+  исправляет перезапуском;
+- GET /health/ready - бот успевает обслуживать пользователей: задержка
+  цикла и БД в пределах нормы, очередь исходящих запросов не переполнена.
+
+Показатели собираются в фоне (задачи под Supervisor), поэтому ответ не
+ждёт БД: если цикл событий заблокирован, сервер не ответит вовсе, и это
+тоже считается непройденной проверкой.
+"""
+import asyncio
+import logging
+import time
+from typing import Any, Dict, Optional
+
+from aiohttp import web
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from messaging.gateway import OutboundGateway
+from runtime.supervisor import UpdateTracker
+
+
+logger = logging.getLogger(__name__)
+
+# Задержка цикла событий: период измерения и пороги готовности/жизни, секунд
+LOOP_LAG_INTERVAL = 0.5
+READY_LOOP_LAG = 0.5
+LIVE_LOOP_LAG = 5.0
+
+# Проверка БД (SELECT 1): период, таймаут, порог готовности, неудач подряд до "не жив"
+DB_PROBE_INTERVAL = 10.0
+DB_PROBE_TIMEOUT = 5.0
+READY_DB_LATENCY = 1.0
+LIVE_DB_FAILURES = 3
+
+# Запросов в очереди Bot API, при которых бот считается перегруженным
+READY_QUEUE_DEPTH = 500
+
+# Обработчики выполняются, но ни одно обновление не завершилось столько секунд
+STALLED_UPDATES = 120.0
+
+
+class LoopLagMonitor:
+    """Задержка цикла событий: насколько позже запланированного просыпается sleep"""
+
+    def __init__(self, interval: float = LOOP_LAG_INTERVAL):
+        self.interval = interval
+        self.lag = 0.0
+        self.max_lag = 0.0  # С последнего снимка (см. snapshot)
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            await asyncio.sleep(self.interval)
+            self.lag = max(loop.time() - started - self.interval, 0.0)
+            self.max_lag = max(self.max_lag, self.lag)
+
+
+class DbProbe:
+    """Периодический SELECT 1 с замером времени"""
+
+    def __init__(self, engine: AsyncEngine, interval: float = DB_PROBE_INTERVAL):
+        self.engine = engine
+        self.interval = interval
+        self.latency: Optional[float] = None
+        self.failures = 0
+        self.error: Optional[str] = None
+        self.checked_at: Optional[float] = None
+
+    async def check(self):
+        started = time.monotonic()
+        try:
+            async with asyncio.timeout(DB_PROBE_TIMEOUT):
+                async with self.engine.connect() as conn:
+                    await conn.execute(text("SELECT 1"))
+        except Exception as e:
+            self.failures += 1
+            self.latency = None
+            self.error = str(e) or type(e).__name__
+            logger.warning(f"Проверка БД не прошла ({self.failures} подряд): {self.error}")
+        else:
+            self.failures = 0
+            self.latency = time.monotonic() - started
+            self.error = None
+        self.checked_at = time.monotonic()
+
+    async def run(self):
+        while True:
+            await self.check()
+            await asyncio.sleep(self.interval)
+
+
+class HealthState:
+    """Показатели состояния и решения live/ready"""
+
+    def __init__(self, engine: AsyncEngine, updates: UpdateTracker, outbound: OutboundGateway):
+        self.loop_lag = LoopLagMonitor()
+        self.db = DbProbe(engine)
+        self.updates = updates
+        self.outbound = outbound
+        self.started_at = time.monotonic()
+
+    def metrics(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        last_update = self.updates.last_update_at
+        return {
+            "uptime_s": round(now - self.started_at, 1),
+            "loop_lag_ms": round(self.loop_lag.lag * 1000, 1),
+            "loop_lag_max_ms": round(self.loop_lag.max_lag * 1000, 1),
+            "db_latency_ms": round(self.db.latency * 1000, 1) if self.db.latency is not None else None,
+            "db_failures": self.db.failures,
+            "db_error": self.db.error,
+            "updates_in_flight": self.updates.in_flight,
+            "since_last_update_s": round(now - last_update, 1) if last_update is not None else None,
+            "outbound_queue": self.outbound.queue_depth(),
+        }
+
+    def live_problems(self) -> list:
+        problems = []
+        if self.loop_lag.lag > LIVE_LOOP_LAG:
+            problems.append("event loop blocked")
+        if self.db.failures >= LIVE_DB_FAILURES:
+            problems.append("database unavailable")
+        last_update = self.updates.last_update_at or self.started_at
+        if self.updates.in_flight and time.monotonic() - last_update > STALLED_UPDATES:
+            problems.append("update handlers stalled")
+        return problems
+
+    def ready_problems(self) -> list:
+        problems = self.live_problems()
+        if self.loop_lag.lag > READY_LOOP_LAG:
+            problems.append("event loop lagging")
+        if self.db.checked_at is None:
+            problems.append("database not checked yet")
+        elif self.db.latency is None or self.db.latency > READY_DB_LATENCY:
+            problems.append("database slow")
+        if sum(self.outbound.queue_depth().values()) > READY_QUEUE_DEPTH:
+            problems.append("outbound queue full")
+        return problems
+
+    def _response(self, problems: list) -> web.Response:
+        body = {"status": "fail" if problems else "ok", "problems": problems, **self.metrics()}
+        self.loop_lag.max_lag = self.loop_lag.lag
+        return web.json_response(body, status=503 if problems else 200)
+
+    async def live(self, request: web.Request) -> web.Response:
+        return self._response(self.live_problems())
+
+    async def ready(self, request: web.Request) -> web.Response:
+        return self._response(self.ready_problems())
+
+
+async def start_health_server(state: HealthState, host: str, port: int) -> web.AppRunner:
+    """Запуск HTTP-сервера проверок; остановка - runner.cleanup()"""
+    app = web.Application()
+    app.router.add_get("/health/live", state.live)
+    app.router.add_get("/health/ready", state.ready)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    logger.info(f"Проверки состояния: http://{host}:{port}/health/live, /health/ready")
+    return runner
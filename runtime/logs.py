@@ -0,0 +1,222 @@
+"""
+Логирование без блокирующих записей из цикла событий.
+
+setup_logging() подключает к корневому логгеру только QueueHandler: запись
+лога в обработчике - это постановка записи в очередь в памяти. Вывод в
+stdout и в файл (RotatingFileHandler в LOG_DIR) выполняет QueueListener в
+отдельном потоке.
+
+Записи выводятся в JSON (LOG_FORMAT=json) или обычным текстом (text). К
+каждой записи добавляются поля текущего обновления, если оно есть:
+update_id, user_id, tenant_id (команда, см. database/tenants.py) и handler. По окончании обработки обновления
+UpdateLogMiddleware пишет запись "update handled" с duration_ms.
+
+Повторяющиеся предупреждения и ошибки из одного места кода (например,
+ошибки отправки при рассылке) прореживаются: за SAMPLE_WINDOW секунд
+выводится не больше SAMPLE_LIMIT записей, число пропущенных указывается в
+поле suppressed следующей выведенной записи.
+"""
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import threading
+import time
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject, Update
+
+
+# Поля текущего обновления (update_id, user_id, tenant_id, handler)
+log_context: ContextVar[Optional[Dict[str, Any]]] = ContextVar("log_context", default=None)
+
+CONTEXT_FIELDS = ("update_id", "user_id", "tenant_id", "handler", "duration_ms")
+
+# Прореживание повторяющихся WARNING и выше: записей из одного места за окно
+SAMPLE_WINDOW = 60.0
+SAMPLE_LIMIT = 10
+
+# Файл лога: размер одного файла и число старых файлов
+LOG_FILE_NAME = "bot.log"
+LOG_FILE_MAX_BYTES = 10 * 1024 * 1024
+LOG_FILE_BACKUPS = 5
+
+TEXT_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+
+
+class ContextFilter(logging.Filter):
+    """Добавляет в запись поля текущего обновления (выполняется в потоке вызова)"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        context = log_context.get()
+        if context:
+            for key, value in context.items():
+                if not hasattr(record, key):
+                    setattr(record, key, value)
+        return True
+
+
+class ErrorSampler(logging.Filter):
+    """Не больше limit записей уровня WARNING и выше из одного места кода за window секунд"""
+
+    def __init__(self, window: float = SAMPLE_WINDOW, limit: int = SAMPLE_LIMIT):
+        super().__init__()
+        self.window = window
+        self.limit = limit
+        self._lock = threading.Lock()
+        # (логгер, файл, строка) -> [начало окна, записей в окне, пропущено]
+        self._sites: Dict[Tuple[str, str, int], list] = {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno < logging.WARNING:
+            return True
+        key = (record.name, record.pathname, record.lineno)
+        now = time.monotonic()
+        with self._lock:
+            site = self._sites.get(key)
+            if site is None or now - site[0] >= self.window:
+                suppressed = site[2] if site else 0
+                self._sites[key] = [now, 1, 0]
+            elif site[1] < self.limit:
+                site[1] += 1
+                suppressed = 0
+            else:
+                site[2] += 1
+                return False
+        if suppressed:
+            record.suppressed = suppressed
+        return True
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """Текст и трассировка готовятся в потоке вызова, поля записи сохраняются"""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+class JsonFormatter(logging.Formatter):
+    """Одна запись - одна строка JSON"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key in CONTEXT_FIELDS + ("suppressed",):
+            value = getattr(record, key, None)
+            if value is not None:
+                data[key] = value
+        if record.exc_text:
+            data["exc"] = record.exc_text
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """Обычный текст; поля обновления - в конце строки"""
+
+    def __init__(self):
+        super().__init__(TEXT_FORMAT)
+
+    def format(self, record: logging.LogRecord) -> str:
+        text = super().format(record)
+        extra = " ".join(
+            f"{key}={getattr(record, key)}" for key in CONTEXT_FIELDS + ("suppressed",)
+            if getattr(record, key, None) is not None
+        )
+        return f"{text} [{extra}]" if extra else text
+
+
+def setup_logging(level: str = "INFO", log_format: str = "json", log_dir: str = "") -> logging.handlers.QueueListener:
+    """
+    Настройка логирования: QueueHandler на корневом логгере, вывод в
+    stdout и (если задан log_dir) в ротируемый файл - в потоке QueueListener.
+
+    Возвращает запущенный QueueListener; при завершении вызовите stop(),
+    чтобы вывести оставшиеся записи.
+    """
+    formatter = JsonFormatter() if log_format == "json" else TextFormatter()
+    handlers = [logging.StreamHandler()]
+    if log_dir:
+        os.makedirs(log_dir, exist_ok=True)
+        handlers.append(logging.handlers.RotatingFileHandler(
+            os.path.join(log_dir, LOG_FILE_NAME),
+            maxBytes=LOG_FILE_MAX_BYTES, backupCount=LOG_FILE_BACKUPS, encoding="utf-8",
+        ))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    queue_handler = _QueueHandler(log_queue)
+    queue_handler.addFilter(ErrorSampler())
+    queue_handler.addFilter(ContextFilter())
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(level)
+    # Итог обработки каждого обновления пишет UpdateLogMiddleware
+    logging.getLogger("aiogram.event").setLevel(logging.WARNING)
+
+    listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    return listener
+
+
+def _handler_name(data: Dict[str, Any]) -> Optional[str]:
+    route = data.get("callback_route")  # Нажатия кнопок (handlers/callbacks.py)
+    if route is not None:
+        return route.handler.__qualname__
+    handler = data.get("handler")
+    callback = getattr(handler, "callback", None)
+    return getattr(callback, "__qualname__", None)
+
+
+class UpdateLogMiddleware(BaseMiddleware):
+    """
+    Поля обновления для всех записей лога во время его обработки.
+
+    Регистрируется как outer middleware на dp.update (update_id, user_id,
+    итоговая запись с duration_ms) и как middleware на типы событий (имя
+    обработчика известно только после выбора обработчика).
+    """
+
+    def __init__(self):
+        self.logger = logging.getLogger("bot.updates")
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        context = log_context.get()
+        if not isinstance(event, Update):
+            if context is not None:
+                context["handler"] = _handler_name(data)
+            return await handler(event, data)
+
+        user = data.get("event_from_user")
+        context = {"update_id": event.update_id, "user_id": user.id if user else None}
+        token = log_context.set(context)
+        started = time.monotonic()
+        try:
+            return await handler(event, data)
+        finally:
+            duration_ms = round((time.monotonic() - started) * 1000, 1)
+            self.logger.info("update handled", extra={"duration_ms": duration_ms})
+            log_context.reset(token)
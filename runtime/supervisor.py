@@ -0,0 +1,148 @@
+"""
+Фоновые задачи процесса и корректная остановка бота.
+
+Supervisor владеет всеми долгоживущими задачами (планировщики, метрики):
+задача, завершившаяся исключением, перезапускается с паузой, которая
+удваивается после каждого сбоя подряд (RESTART_DELAY ... RESTART_DELAY_MAX) и
+сбрасывается, если задача проработала дольше RESTART_DELAY_MAX.
+
+UpdateTracker (outer middleware на dp.update) считает обновления, которые
+обрабатываются прямо сейчас, и запоминает время последнего обработанного
+обновления. При остановке (SIGTERM/SIGINT) бот перестаёт получать
+обновления, ждёт завершения начатых обработчиков и фоновых отправок, а
+затем останавливает задачи и закрывает соединения с БД - всё в пределах
+SHUTDOWN_TIMEOUT (см. main.py).
+
+Короткие задачи, которые обработчик запускает и не ждёт (например,
+объявление о новой смене), запускаются через run_in_background: при
+остановке drain_background_tasks даёт им доработать до срока, а
+оставшиеся отменяет.
+"""
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Coroutine, Dict, Optional, Set
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+
+
+logger = logging.getLogger(__name__)
+
+RESTART_DELAY = 1.0
+RESTART_DELAY_MAX = 60.0
+
+# Задачи run_in_background (ссылки хранятся, чтобы задачи не были собраны сборщиком мусора)
+_background_tasks: Set[asyncio.Task] = set()
+
+
+class Supervisor:
+    """Долгоживущие задачи: перезапуск после сбоя и отмена при остановке"""
+
+    def __init__(self):
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self.restarts: Dict[str, int] = {}
+
+    def start(self, name: str, factory: Callable[[], Awaitable[Any]]):
+        """Запуск задачи factory() под именем name"""
+        if name in self._tasks and not self._tasks[name].done():
+            raise RuntimeError(f"Задача {name} уже запущена")
+        self.restarts[name] = 0
+        self._tasks[name] = asyncio.create_task(self._run(name, factory), name=name)
+
+    async def _run(self, name: str, factory: Callable[[], Awaitable[Any]]):
+        delay = RESTART_DELAY
+        while True:
+            started = time.monotonic()
+            try:
+                await factory()
+                logger.info(f"Фоновая задача {name} завершилась")
+                return
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception(f"Сбой фоновой задачи {name}, перезапуск через {delay:.0f} с")
+            if time.monotonic() - started > RESTART_DELAY_MAX:
+                delay = RESTART_DELAY
+            await asyncio.sleep(delay)
+            self.restarts[name] += 1
+            delay = min(delay * 2, RESTART_DELAY_MAX)
+
+    def running(self) -> Dict[str, bool]:
+        """Имя задачи - работает ли она"""
+        return {name: not task.done() for name, task in self._tasks.items()}
+
+    async def stop(self, timeout: float = 5.0):
+        """Отмена всех задач и ожидание их завершения (не дольше timeout)"""
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            await asyncio.wait(tasks, timeout=timeout)
+        self._tasks.clear()
+
+
+class UpdateTracker(BaseMiddleware):
+    """Учёт обновлений в обработке и времени последнего обработанного обновления"""
+
+    def __init__(self):
+        self.in_flight = 0
+        self.last_update_at: Optional[float] = None  # time.monotonic()
+        self._idle = asyncio.Event()
+        self._idle.set()
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        self.in_flight += 1
+        self._idle.clear()
+        try:
+            return await handler(event, data)
+        finally:
+            self.in_flight -= 1
+            self.last_update_at = time.monotonic()
+            if not self.in_flight:
+                self._idle.set()
+
+    async def wait_idle(self, timeout: float) -> bool:
+        """Ожидание завершения начатых обработчиков; False - не успели за timeout"""
+        try:
+            await asyncio.wait_for(self._idle.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+
+class Deadline:
+    """Общий срок для последовательных шагов остановки"""
+
+    def __init__(self, seconds: float):
+        self._until = time.monotonic() + seconds
+
+    def remaining(self) -> float:
+        return max(self._until - time.monotonic(), 0.0)
+
+
+def run_in_background(coro: Coroutine[Any, Any, Any], name: Optional[str] = None) -> asyncio.Task:
+    """Запуск задачи вне обработчика (обработчик не ждёт её завершения, остановка бота - ждёт)"""
+    task = asyncio.create_task(coro, name=name)
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+    return task
+
+
+async def drain_background_tasks(timeout: float):
+    """Ожидание задач run_in_background не дольше timeout; оставшиеся отменяются"""
+    tasks = list(_background_tasks)
+    if not tasks:
+        return
+    logger.info(f"Ожидание фоновых задач: {len(tasks)}")
+    _, pending = await asyncio.wait(tasks, timeout=timeout)
+    for task in pending:
+        logger.warning(f"Фоновая задача {task.get_name()} прервана остановкой бота")
+        task.cancel()
+    if pending:
+        await asyncio.wait(pending, timeout=5)
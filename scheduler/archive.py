@@ -0,0 +1,40 @@
+"""
+Перенос старых смен в архивные таблицы.
+
+Смены, прошедшие больше ARCHIVE_AFTER_DAYS дней назад, вместе с записями
+переносятся из shifts/shift_assignments в shifts_archive/shift_assignments_archive.
+Рабочие таблицы и их индексы остаются маленькими, а выгрузка истории и пересчёт
+статистики читают обе пары таблиц. Перенос идёт небольшими пачками в отдельных
+коротких транзакциях, чтобы не держать блокировку записи SQLite надолго.
+Ежедневный запуск - в scheduler/maintenance.py.
+"""
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Tuple
+
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from config import Config
+from database.crud import archive_shifts_batch
+
+
+logger = logging.getLogger(__name__)
+
+async def archive_old_shifts(session_factory: async_sessionmaker, days: int = Config.ARCHIVE_AFTER_DAYS) -> Tuple[int, int]:
+    """Перенос в архив смен старше days дней. Возвращает (число смен, число записей)"""
+    # Даты смен хранятся в местном времени (как их вводит администратор)
+    older_than = datetime.now() - timedelta(days=days)
+    total_shifts = total_assignments = 0
+    while True:
+        async with session_factory() as db:
+            shifts, assignments = await archive_shifts_batch(db, older_than)
+        if not shifts:
+            break
+        total_shifts += shifts
+        total_assignments += assignments
+        # Между пачками отдаём управление обработчикам обновлений
+        await asyncio.sleep(0)
+    if total_shifts:
+        logger.info(f"В архив перенесено смен: {total_shifts}, записей: {total_assignments}")
+    return total_shifts, total_assignments
@@ -0,0 +1,49 @@
+"""
+Ежедневное обслуживание БД (в MAINTENANCE_HOUR:00, время низкой нагрузки).
+
+По порядку: перенос старых смен в архив (если ARCHIVE_AFTER_DAYS > 0),
+incremental vacuum освободившихся страниц, PRAGMA optimize и резервная копия
+SQLite (если BACKUP_KEEP > 0). Ошибка одного шага не отменяет остальные.
+"""
+import asyncio
+import logging
+from datetime import datetime, timedelta
+
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker
+
+from config import Config
+from database.maintenance import analyze_database, backup_database, incremental_vacuum, sqlite_path
+from scheduler.archive import archive_old_shifts
+
+
+logger = logging.getLogger(__name__)
+
+MAINTENANCE_HOUR = 3
+
+
+async def run_maintenance(engine: AsyncEngine, session_factory: async_sessionmaker):
+    """Один проход обслуживания"""
+    steps = []
+    if Config.ARCHIVE_AFTER_DAYS:
+        steps.append(("перенос в архив", lambda: archive_old_shifts(session_factory)))
+    steps.append(("incremental vacuum", lambda: incremental_vacuum(engine)))
+    steps.append(("PRAGMA optimize", lambda: analyze_database(engine)))
+    if Config.BACKUP_KEEP and sqlite_path(engine):
+        steps.append(("резервная копия", lambda: backup_database(engine)))
+
+    for title, step in steps:
+        try:
+            await step()
+        except Exception as e:
+            logger.error(f"Обслуживание БД, шаг '{title}': {e}")
+
+
+async def schedule_maintenance(engine: AsyncEngine, session_factory: async_sessionmaker):
+    """Планировщик ежедневного обслуживания БД"""
+    while True:
+        now = datetime.now()
+        next_run = now.replace(hour=MAINTENANCE_HOUR, minute=0, second=0, microsecond=0)
+        if next_run <= now:
+            next_run += timedelta(days=1)
+        await asyncio.sleep((next_run - now).total_seconds())
+        await run_maintenance(engine, session_factory)
@@ -0,0 +1,46 @@
+"""
+Создание смен по шаблонам (database/models.py, ShiftTemplate).
+
+При запуске бота и ежедневно в SHIFT_GENERATION_HOUR:00 создаются смены
+всех команд на SHIFT_TEMPLATE_WEEKS недель вперёд - одной транзакцией,
+пачками INSERT ... ON CONFLICT DO NOTHING (см. generate_template_shifts).
+Уже созданные смены пропускаются, поэтому повторный запуск, в том числе
+кнопкой в меню шаблонов, не создаёт дублей. Анонсы по сменам из шаблонов
+не отправляются.
+"""
+import asyncio
+import logging
+from datetime import datetime, timedelta
+
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from config import Config
+from database.crud import generate_template_shifts
+
+
+logger = logging.getLogger(__name__)
+
+SHIFT_GENERATION_HOUR = 4
+
+
+async def generate_shifts(session_factory: async_sessionmaker) -> int:
+    """Смены по шаблонам всех команд; возвращает число созданных"""
+    async with session_factory() as db:
+        created, skipped = await generate_template_shifts(db, Config.SHIFT_TEMPLATE_WEEKS, tenant_id=None)
+    if created:
+        logger.info(f"Создано смен по шаблонам: {created} (уже были: {skipped})")
+    return created
+
+
+async def schedule_shift_generation(session_factory: async_sessionmaker):
+    """Планировщик создания смен по шаблонам: сразу при запуске и ежедневно"""
+    if not Config.SHIFT_TEMPLATE_WEEKS:
+        logger.info("Создание смен по шаблонам выключено (SHIFT_TEMPLATE_WEEKS=0)")
+        return
+    while True:
+        await generate_shifts(session_factory)
+        now = datetime.now()
+        next_run = now.replace(hour=SHIFT_GENERATION_HOUR, minute=0, second=0, microsecond=0)
+        if next_run <= now:
+            next_run += timedelta(days=1)
+        await asyncio.sleep((next_run - now).total_seconds())
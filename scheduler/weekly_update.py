@@ -1,9 +1,15 @@
 import asyncio
+import logging
 from datetime import datetime, timedelta
+from typing import Callable
 from aiogram import Bot
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 from database.database import get_session
 from database.crud import get_all_registered_users_for_broadcast
+from handlers.callbacks import pack
+from messaging.gateway import bulk_lane
+
+logger = logging.getLogger(__name__)
 
 DAYS_OF_WEEK = ["Пн", "Вт", "Ср", "Чт", "Пт", "Сб", "Вс"]
 
@@ -19,25 +25,31 @@ def get_days_keyboard_for_update(selected_days: list = None) -> InlineKeyboardMa
         prefix = "✅" if day in selected_days else ""
         row.append(InlineKeyboardButton(
             text=f"{prefix} {day}",
-            callback_data=f"update_day_{day}"
+            callback_data=pack("update_day", day)
         ))
         if len(row) == 2:
             keyboard.append(row)
             row = []
     if row:
         keyboard.append(row)
-    keyboard.append([InlineKeyboardButton(text="✅ Готово", callback_data="update_days_done")])
+    keyboard.append([InlineKeyboardButton(text="✅ Готово", callback_data=pack("update_days_done"))])
     return InlineKeyboardMarkup(inline_keyboard=keyboard)
 
 
-async def send_weekly_availability_update(bot: Bot):
-    """Отправка еженедельного запроса на обновление доступности"""
+async def send_weekly_availability_update(bot_for_tenant: Callable[[int], Bot]):
+    """Отправка еженедельного запроса на обновление доступности (каждому - ботом его команды)"""
     async with get_session() as db:
         users = await get_all_registered_users_for_broadcast(db)
     
+    # Массовая отправка: ответы пользователям идут вперёд (см. messaging/gateway.py)
+    with bulk_lane():
+        await _send_weekly_requests(bot_for_tenant, users)
+
+
+async def _send_weekly_requests(bot_for_tenant: Callable[[int], Bot], users):
     for user in users:
         try:
-            await bot.send_message(
+            await bot_for_tenant(user.tenant_id).send_message(
                 chat_id=user.telegram_id,
                 text=(
                     "📅 Обновление доступности\n\n"
@@ -49,10 +61,10 @@ async def send_weekly_availability_update(bot: Bot):
                 reply_markup=get_days_keyboard_for_update()
             )
         except Exception as e:
-            print(f"Ошибка отправки запроса пользователю {user.telegram_id}: {e}")
+            logger.warning(f"Ошибка отправки запроса пользователю {user.telegram_id}: {e}")
 
 
-async def schedule_weekly_updates(bot: Bot):
+async def schedule_weekly_updates(bot_for_tenant: Callable[[int], Bot]):
     """Планировщик еженедельных обновлений (каждое воскресенье в 10:00)"""
     while True:
         now = datetime.now()
@@ -69,11 +81,11 @@ async def schedule_weekly_updates(bot: Bot):
         
         wait_seconds = (next_sunday - now).total_seconds()
         
-        print(f"Следующее обновление доступности: {next_sunday}")
+        logger.info(f"Следующее обновление доступности: {next_sunday}")
         await asyncio.sleep(wait_seconds)
         
         # Отправляем обновления
-        await send_weekly_availability_update(bot)
+        await send_weekly_availability_update(bot_for_tenant)
         
         # Ждём неделю перед следующим запуском
         await asyncio.sleep(60 * 60 * 24 * 7)
@@ -0,0 +1,43 @@
+"""
+Перенос смен в архив: поля смены сохраняются в shifts_archive.
+"""
+import asyncio
+from datetime import datetime, time
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+
+from database.crud import archive_shifts_batch, create_shift, create_shift_template, generate_template_shifts
+from database.migrations import upgrade_schema
+from database.models import Shift, ShiftArchive
+
+
+async def _archive(path: str):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+    try:
+        await upgrade_schema(engine)
+        async with AsyncSession(engine) as db:
+            template = await create_shift_template(db, ["Пн", "Ср"], time(9, 0), "Сборка", capacity=5)
+            created, _ = await generate_template_shifts(db, 1, now=datetime(2024, 1, 1))
+            await create_shift(db, datetime(2024, 1, 2, 14, 0), "Разовая")
+            archived = await archive_shifts_batch(db, older_than=datetime(2024, 2, 1))
+            rows = (await db.execute(
+                select(ShiftArchive.date, ShiftArchive.capacity, ShiftArchive.template_id).order_by(ShiftArchive.date)
+            )).all()
+            left = (await db.execute(select(Shift.id))).all()
+        return template.id, created, archived, rows, left
+    finally:
+        await engine.dispose()
+
+
+def test_archive_keeps_capacity_and_template(tmp_path):
+    template_id, created, archived, rows, left = asyncio.run(_archive(str(tmp_path / "archive.db")))
+
+    assert created == 2
+    assert archived == (3, 0)
+    assert not left
+    assert [tuple(row) for row in rows] == [
+        (datetime(2024, 1, 1, 9, 0), 5, template_id),
+        (datetime(2024, 1, 2, 14, 0), None, None),
+        (datetime(2024, 1, 3, 9, 0), 5, template_id),
+    ]
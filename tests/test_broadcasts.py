@@ -0,0 +1,45 @@
+"""
+Журнал рассылки: повторная запись страницы не увеличивает счётчики.
+"""
+import asyncio
+from datetime import datetime
+
+from sqlalchemy import insert, select
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+
+from database.crud import create_broadcast, record_broadcast_page
+from database.migrations import upgrade_schema
+from database.models import Broadcast, User
+
+
+async def _record_twice(path: str):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+    try:
+        await upgrade_schema(engine)
+        now = datetime(2024, 1, 1)
+        async with engine.begin() as conn:
+            await conn.execute(insert(User), [
+                {"telegram_id": 1000 + i, "full_name": f"Сотрудник {i}", "course": 1, "phone": f"+7999000000{i}",
+                 "is_registered": True, "created_at": now, "updated_at": now}
+                for i in range(1, 5)
+            ])
+        async with AsyncSession(engine) as db:
+            broadcast = await create_broadcast(db, created_by=1, from_chat_id=1, message_id=1, total=4)
+            await record_broadcast_page(db, broadcast.id, {1: "sent", 2: "blocked"}, last_user_id=2)
+            # Страница записана повторно вместе с продолжением после сбоя
+            await record_broadcast_page(db, broadcast.id, {1: "sent", 2: "blocked", 3: "sent", 4: "failed"}, last_user_id=4)
+            row = (await db.execute(
+                select(Broadcast.sent, Broadcast.blocked, Broadcast.failed, Broadcast.last_user_id)
+                .where(Broadcast.id == broadcast.id)
+            )).one()
+            blocked = (await db.execute(select(User.id).where(User.is_blocked == True))).scalars().all()
+        return tuple(row), blocked
+    finally:
+        await engine.dispose()
+
+
+def test_retried_page_is_not_counted_twice(tmp_path):
+    counters, blocked = asyncio.run(_record_twice(str(tmp_path / "broadcasts.db")))
+
+    assert counters == (2, 1, 1, 4)
+    assert blocked == [2]
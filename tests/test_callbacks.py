@@ -0,0 +1,85 @@
+"""
+Данные inline-кнопок: pack/unpack и отклонение устаревших нажатий.
+"""
+import asyncio
+
+import pytest
+
+from handlers.callbacks import (
+    CALLBACK_ACTIONS, MAX_CALLBACK_DATA, STALE_CALLBACK_TEXT, CallbackAction, CallbackDataMiddleware, pack, unpack,
+)
+
+
+def _sample_args(specs):
+    return tuple(2 ** 31 if spec is int else spec[-1] for spec in specs)
+
+
+@pytest.mark.parametrize("action", sorted(CALLBACK_ACTIONS))
+def test_pack_unpack_round_trip(action):
+    args = _sample_args(CALLBACK_ACTIONS[action])
+    data = pack(action, *args)
+
+    assert len(data.encode()) <= MAX_CALLBACK_DATA
+    assert unpack(data) == CallbackAction(action, args)
+
+
+@pytest.mark.parametrize("data", [
+    "",
+    "book_shift_42",              # Формат до версий callback_data
+    "book_shift:42",
+    "0:book_shift:42",            # Другая версия
+    "1:unknown_action",
+    "1:book_shift",               # Не хватает аргумента
+    "1:book_shift:42:1",
+    "1:book_shift:abc",
+    "1:day:Понедельник",
+    "1:broadcast:stop:5",
+    "1:admin_user_edit:name:5",
+])
+def test_unpack_rejects_stale_data(data):
+    assert unpack(data) is None
+
+
+def test_pack_rejects_invalid_arguments():
+    with pytest.raises(ValueError):
+        pack("book_shift")
+    with pytest.raises(ValueError):
+        pack("book_shift", "42")
+    with pytest.raises(ValueError):
+        pack("day", "Mon")
+    with pytest.raises(KeyError):
+        pack("unknown_action")
+
+
+class _Callback:
+    def __init__(self, data):
+        self.data = data
+        self.answers = []
+
+    async def answer(self, text=None, show_alert=None):
+        self.answers.append((text, show_alert))
+
+
+async def _through_middleware(data):
+    handled = []
+
+    async def handler(event, handler_data):
+        handled.append(handler_data["callback_action"])
+
+    callback = _Callback(data)
+    await CallbackDataMiddleware()(handler, callback, {})
+    return handled, callback.answers
+
+
+def test_middleware_answers_stale_button_without_calling_handler():
+    handled, answers = asyncio.run(_through_middleware("book_shift_42"))
+
+    assert handled == []
+    assert answers == [(STALE_CALLBACK_TEXT, True)]
+
+
+def test_middleware_passes_parsed_action_to_handler():
+    handled, answers = asyncio.run(_through_middleware(pack("book_shift", 42)))
+
+    assert handled == [CallbackAction("book_shift", (42,))]
+    assert answers == []
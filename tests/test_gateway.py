@@ -0,0 +1,44 @@
+"""
+Очередь исходящих запросов: лимит только на отправку сообщений.
+"""
+import asyncio
+from types import SimpleNamespace
+
+from aiogram.methods import AnswerCallbackQuery, EditMessageText, SendChatAction, SendMessage
+
+from messaging.gateway import OutboundGateway, bulk_lane, is_limited
+
+
+def test_only_message_sending_methods_are_limited():
+    assert is_limited(SendMessage(chat_id=1, text="x"))
+    assert not is_limited(AnswerCallbackQuery(callback_query_id="1"))
+    assert not is_limited(EditMessageText(chat_id=1, message_id=1, text="x"))
+    assert not is_limited(SendChatAction(chat_id=1, action="typing"))
+
+
+async def _answer_during_bulk_send():
+    gateway = OutboundGateway(rate=2)
+    bot = SimpleNamespace(id=1)
+    done = []
+
+    async def make_request(bot, method):
+        done.append(type(method).__name__)
+
+    with bulk_lane():
+        sends = [
+            asyncio.create_task(gateway(make_request, bot, SendMessage(chat_id=chat_id, text="x")))
+            for chat_id in range(4)
+        ]
+    await asyncio.sleep(0.05)
+    await asyncio.wait_for(gateway(make_request, bot, AnswerCallbackQuery(callback_query_id="1")), 0.1)
+    answered_after = done.count("SendMessage")
+    await asyncio.gather(*sends)
+    return answered_after, gateway.queue_depth()
+
+
+def test_callback_answer_does_not_wait_for_bulk_sends():
+    answered_after, depth = asyncio.run(_answer_during_bulk_send())
+
+    # Ответ на нажатие прошёл, пока большая часть отправок ещё ждала слот
+    assert answered_after < 4
+    assert depth == {"interactive": 0, "bulk": 0}
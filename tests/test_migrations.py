@@ -0,0 +1,146 @@
+"""
+Обновление БД, созданной до появления версий схемы, через все миграции.
+"""
+import asyncio
+import sqlite3
+from datetime import datetime
+
+from sqlalchemy import inspect, select
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+
+from database.crud import rebuild_user_stats, search_users
+from database.migrations import MIGRATIONS, latest_version, upgrade_schema
+from database.models import SchemaVersion, UserStats
+
+
+# Схема первой версии бота (Base.metadata.create_all до миграций)
+BASELINE_SCHEMA = """
+CREATE TABLE users (
+    id INTEGER NOT NULL,
+    telegram_id INTEGER NOT NULL,
+    full_name VARCHAR(255) NOT NULL,
+    skills TEXT,
+    experience_shifts INTEGER NOT NULL,
+    course INTEGER NOT NULL,
+    phone VARCHAR(20) NOT NULL,
+    preferred_days JSON,
+    rating INTEGER NOT NULL,
+    is_registered BOOLEAN NOT NULL,
+    created_at DATETIME NOT NULL,
+    updated_at DATETIME NOT NULL,
+    PRIMARY KEY (id)
+);
+CREATE INDEX ix_users_id ON users (id);
+CREATE UNIQUE INDEX ix_users_telegram_id ON users (telegram_id);
+CREATE TABLE shifts (
+    id INTEGER NOT NULL,
+    date DATETIME NOT NULL,
+    description TEXT,
+    completed_info TEXT,
+    is_active BOOLEAN NOT NULL,
+    created_at DATETIME NOT NULL,
+    PRIMARY KEY (id)
+);
+CREATE INDEX ix_shifts_id ON shifts (id);
+CREATE INDEX ix_shifts_date ON shifts (date);
+CREATE TABLE settings (
+    id INTEGER NOT NULL,
+    "key" VARCHAR(100) NOT NULL,
+    value TEXT,
+    updated_at DATETIME NOT NULL,
+    PRIMARY KEY (id)
+);
+CREATE INDEX ix_settings_id ON settings (id);
+CREATE UNIQUE INDEX ix_settings_key ON settings ("key");
+CREATE TABLE shift_assignments (
+    id INTEGER NOT NULL,
+    user_id INTEGER NOT NULL,
+    shift_id INTEGER NOT NULL,
+    created_at DATETIME NOT NULL,
+    is_cancelled BOOLEAN NOT NULL,
+    cancelled_at DATETIME,
+    PRIMARY KEY (id),
+    FOREIGN KEY(user_id) REFERENCES users (id),
+    FOREIGN KEY(shift_id) REFERENCES shifts (id)
+);
+CREATE INDEX ix_shift_assignments_id ON shift_assignments (id);
+"""
+
+BASELINE_DATA = """
+INSERT INTO users VALUES
+    (1, 1001, 'Иван Петров', 'сборка', 0, 2, '8 999 123-45-67', '["Пн", "Ср"]', 3, 1, '2024-01-01 10:00:00', '2024-01-01 10:00:00'),
+    (2, 1002, 'Анна Смирнова', NULL, 3, 4, '+7 (999) 765-43-21', NULL, 5, 1, '2024-01-01 10:00:00', '2024-01-01 10:00:00');
+INSERT INTO shifts VALUES
+    (1, '2024-02-05 09:00:00', 'Сборка', 'Собрано 40 заказов', 1, '2024-01-10 10:00:00'),
+    (2, '2024-02-07 09:00:00', 'Упаковка', NULL, 1, '2024-01-10 10:00:00');
+INSERT INTO settings VALUES (1, 'work_group_id', '-100123', '2024-01-01 10:00:00');
+INSERT INTO shift_assignments VALUES
+    (1, 1, 1, '2024-01-20 10:00:00', 0, NULL),
+    (2, 1, 2, '2024-01-20 10:00:00', 1, '2024-01-21 10:00:00'),
+    (3, 2, 2, '2024-01-20 10:00:00', 0, NULL);
+"""
+
+
+def _stats(rows):
+    return {
+        row.user_id: (row.signups, row.cancellations, row.shifts_worked, row.last_worked_at)
+        for row in rows
+    }
+
+
+async def _upgrade(path: str):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+    try:
+        await upgrade_schema(engine)
+        async with AsyncSession(engine) as db:
+            versions = (await db.execute(select(SchemaVersion.version).order_by(SchemaVersion.version))).scalars().all()
+            migrated_stats = _stats((await db.execute(select(UserStats))).scalars())
+            await rebuild_user_stats(db)
+            rebuilt_stats = _stats((await db.execute(select(UserStats))).scalars())
+            total, rows = await search_users(db, "иван")
+        async with engine.connect() as conn:
+            tables = await conn.run_sync(lambda sync_conn: inspect(sync_conn).get_table_names())
+            archive_columns = await conn.run_sync(
+                lambda sync_conn: [column["name"] for column in inspect(sync_conn).get_columns("shifts_archive")]
+            )
+            users = (await conn.exec_driver_sql("SELECT id, tenant_id, phone_e164 FROM users ORDER BY id")).all()
+        return versions, migrated_stats, rebuilt_stats, total, rows, tables, archive_columns, users
+    finally:
+        await engine.dispose()
+
+
+def test_baseline_database_upgrades_through_all_migrations(tmp_path):
+    path = str(tmp_path / "baseline.db")
+    conn = sqlite3.connect(path)
+    conn.executescript(BASELINE_SCHEMA + BASELINE_DATA)
+    conn.close()
+
+    versions, migrated_stats, rebuilt_stats, total, rows, tables, archive_columns, users = asyncio.run(_upgrade(path))
+
+    assert versions == [item.version for item in MIGRATIONS]
+    assert versions[-1] == latest_version()
+
+    expected = {
+        1: (2, 1, 1, datetime(2024, 2, 5, 9, 0)),
+        2: (1, 0, 0, None),
+    }
+    assert migrated_stats == expected
+    assert rebuilt_stats == expected
+
+    assert total == 1 and rows[0][0].telegram_id == 1001
+    for table in ("shifts_archive", "shift_assignments_archive", "tenants", "shift_templates", "users_fts"):
+        assert table in tables
+    assert {"tenant_id", "capacity", "template_id"} <= set(archive_columns)
+    assert users == [(1, 1, "+79991234567"), (2, 1, "+79997654321")]
+
+
+def test_upgrade_is_noop_on_current_schema(tmp_path):
+    path = str(tmp_path / "baseline.db")
+    conn = sqlite3.connect(path)
+    conn.executescript(BASELINE_SCHEMA + BASELINE_DATA)
+    conn.close()
+
+    asyncio.run(_upgrade(path))
+    versions, *_ = asyncio.run(_upgrade(path))
+
+    assert versions == [item.version for item in MIGRATIONS]
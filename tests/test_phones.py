@@ -0,0 +1,69 @@
+"""
+Телефоны сотрудников: приведение к E.164 и занятые номера при импорте списка.
+"""
+from collections import namedtuple
+
+import pytest
+
+from database.phones import normalize_phone
+from handlers.roster import exclude_taken_phones
+
+
+Owner = namedtuple("Owner", "telegram_id full_name tenant_id")
+
+
+@pytest.mark.parametrize("phone, expected", [
+    ("+79991234567", "+79991234567"),
+    ("89991234567", "+79991234567"),
+    ("79991234567", "+79991234567"),
+    ("9991234567", "+79991234567"),
+    ("8 (999) 123-45-67", "+79991234567"),
+    (" +7 999 123.45.67 ", "+79991234567"),
+    ("+375 29 123-45-67", "+375291234567"),
+    ("+49 30 1234567", "+49301234567"),
+])
+def test_normalize_phone(phone, expected):
+    assert normalize_phone(phone) == expected
+
+
+@pytest.mark.parametrize("phone", [
+    "",
+    "   ",
+    "1234567",
+    "99912345",            # Без кода страны и не 10 цифр
+    "59991234567",         # 11 цифр, но не 7/8
+    "+7999123456",         # Российский номер короче 11 цифр
+    "+1234567",            # Меньше 8 цифр
+    "+1234567890123456",   # Больше 15 цифр
+    "8999123456a",
+    "тел. 89991234567",
+])
+def test_normalize_phone_rejects_invalid(phone):
+    assert normalize_phone(phone) is None
+
+
+def _row(line_no, telegram_id, phone_e164):
+    return {"line_no": line_no, "telegram_id": telegram_id, "phone": phone_e164, "phone_e164": phone_e164}
+
+
+def test_exclude_taken_phones_hides_owner_from_other_team():
+    owners = {
+        "+79990000001": Owner(1001, "Иван Петров", 1),
+        "+79990000002": Owner(2001, "Чужой Сотрудник", 2),
+        "+79990000003": Owner(1003, "Анна Смирнова", 1),
+    }
+    rows = [
+        _row(2, 1002, "+79990000001"),
+        _row(3, 1004, "+79990000002"),
+        _row(4, 1003, "+79990000003"),  # Свой же номер
+        _row(5, 1005, "+79990000005"),
+    ]
+
+    accepted, errors = exclude_taken_phones(rows, owners, tenant_id=1)
+
+    assert [row["line_no"] for row in accepted] == [4, 5]
+    assert errors == [
+        (2, "телефон +79990000001 уже у пользователя Иван Петров (ID 1001)"),
+        (3, "телефон +79990000002 уже используется"),
+    ]
+    assert "2001" not in errors[1][1] and "Чужой" not in errors[1][1]
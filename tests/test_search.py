@@ -0,0 +1,57 @@
+"""
+Поиск сотрудников: результаты и отсутствие записи в сессии (экраны чтения не выполняют COMMIT).
+"""
+import asyncio
+from datetime import datetime
+
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+
+from database.crud import search_users
+from database.database import has_pending_writes
+from database.migrations import upgrade_schema
+from database.models import User
+
+
+USERS = [
+    (1001, "Иван Петров", "сборка, упаковка", "+79991234567"),
+    (1002, "Пётр Иванов", None, "+79997654321"),
+    (1003, "Анна Смирнова", "склад", "+79990000000"),
+]
+
+
+async def _search(path: str, queries):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+    try:
+        await upgrade_schema(engine)
+        now = datetime(2024, 1, 1)
+        async with engine.begin() as conn:
+            await conn.execute(insert(User), [
+                {"telegram_id": telegram_id, "full_name": full_name, "skills": skills, "course": 1,
+                 "phone": phone, "phone_e164": phone, "is_registered": True, "created_at": now, "updated_at": now}
+                for telegram_id, full_name, skills, phone in USERS
+            ])
+        results = {}
+        async with AsyncSession(engine) as db:
+            for query in queries:
+                total, rows = await search_users(db, query)
+                results[query] = (total, [row[0].telegram_id for row in rows])
+            writes = has_pending_writes(db)
+        return results, writes
+    finally:
+        await engine.dispose()
+
+
+def test_search_finds_by_name_prefix_phone_and_skills(tmp_path):
+    results, _ = asyncio.run(_search(str(tmp_path / "search.db"), ["иван петр", "склад", "7999765"]))
+
+    assert results["иван петр"][0] == 2
+    assert sorted(results["иван петр"][1]) == [1001, 1002]
+    assert results["склад"] == (1, [1003])
+    assert results["7999765"] == (1, [1002])
+
+
+def test_search_does_not_mark_session_as_written(tmp_path):
+    _, writes = asyncio.run(_search(str(tmp_path / "search.db"), ["иван", "999"]))
+
+    assert not writes
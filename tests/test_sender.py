@@ -0,0 +1,32 @@
+"""
+Массовая отправка: учёт заблокировавших бота.
+"""
+import asyncio
+
+from aiogram.exceptions import TelegramForbiddenError
+from aiogram.methods import SendMessage
+
+from messaging.sender import BLOCKED, FAILED, SENT, send_to_many
+
+
+async def _send(errors):
+    results = {}
+
+    async def send(chat_id):
+        if chat_id in errors:
+            raise TelegramForbiddenError(SendMessage(chat_id=chat_id, text="x"), errors[chat_id])
+
+    stats = await send_to_many(
+        [1, 2, 3], send, on_result=lambda chat_id, outcome: results.update({chat_id: outcome})
+    )
+    return stats, results
+
+
+def test_user_who_never_started_bot_is_not_marked_blocked():
+    stats, results = asyncio.run(_send({
+        2: "Forbidden: bot was blocked by the user",
+        3: "Forbidden: bot can't initiate conversation with a user",
+    }))
+
+    assert results == {1: SENT, 2: BLOCKED, 3: FAILED}
+    assert (stats.sent, stats.blocked, stats.failed) == (1, 1, 1)
@@ -0,0 +1,116 @@
+"""
+Смены команды: изменение только своих смен, запись с учётом мест.
+"""
+import asyncio
+from datetime import datetime
+
+from sqlalchemy import func, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+
+from database.crud import (
+    archive_shift, assign_user_to_shift, count_shift_signups, create_shift, get_shift_by_id, update_shift,
+)
+from database.migrations import upgrade_schema
+from database.models import Shift, Tenant, User, UserStats
+
+
+async def _update_other_team_shift(path: str):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+    try:
+        await upgrade_schema(engine)
+        async with engine.begin() as conn:
+            await conn.execute(insert(Tenant).values(slug="second", name="Вторая", created_at=datetime(2024, 1, 1)))
+        async with AsyncSession(engine) as db:
+            shift = await create_shift(db, datetime(2030, 1, 1, 9, 0), "Сборка", tenant_id=1)
+            results = {
+                "date": await update_shift(db, shift.id, 2, date=datetime(2030, 1, 2, 9, 0)),
+                "completed_info": await update_shift(db, shift.id, 2, completed_info="Готово"),
+                "archive": await archive_shift(db, shift.id, 2),
+                "get": await get_shift_by_id(db, shift.id, 2),
+            }
+            row = (await db.execute(
+                select(Shift.date, Shift.completed_info, Shift.is_active).where(Shift.id == shift.id)
+            )).one()
+            own = await update_shift(db, shift.id, 1, description="Упаковка")
+        return results, tuple(row), own
+    finally:
+        await engine.dispose()
+
+
+def test_shift_of_other_team_is_not_changed(tmp_path):
+    results, row, own = asyncio.run(_update_other_team_shift(str(tmp_path / "shifts.db")))
+
+    assert results == {"date": None, "completed_info": None, "archive": None, "get": None}
+    assert row == (datetime(2030, 1, 1, 9, 0), None, True)
+    assert own is not None and own.description == "Упаковка"
+
+
+async def _book_full_shift(path: str):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+    try:
+        await upgrade_schema(engine)
+        now = datetime(2024, 1, 1)
+        async with engine.begin() as conn:
+            await conn.execute(insert(Tenant).values(slug="second", name="Вторая", created_at=now))
+            await conn.execute(insert(User), [
+                {"telegram_id": telegram_id, "tenant_id": tenant_id, "full_name": f"Сотрудник {telegram_id}",
+                 "course": 1, "phone": "", "is_registered": True, "created_at": now, "updated_at": now}
+                for telegram_id, tenant_id in ((1001, 1), (1002, 1), (2001, 2))
+            ])
+        async with AsyncSession(engine) as db:
+            shift = await create_shift(db, datetime(2030, 1, 1, 9, 0), "Сборка", tenant_id=1)
+            await update_shift(db, shift.id, 1, capacity=1)
+            first = await assign_user_to_shift(db, 1001, shift.id)
+            booked = {
+                "first": first.user_id if first else None,
+                "again": await assign_user_to_shift(db, 1001, shift.id),
+                "full": await assign_user_to_shift(db, 1002, shift.id),
+                "other_team": await assign_user_to_shift(db, 2001, shift.id),
+            }
+            signups = await count_shift_signups(db, shift.id)
+            stats = dict((await db.execute(select(UserStats.user_id, UserStats.signups))).all())
+        return booked, signups, stats
+    finally:
+        await engine.dispose()
+
+
+def test_booking_respects_capacity_and_bumps_stats_once(tmp_path):
+    booked, signups, stats = asyncio.run(_book_full_shift(str(tmp_path / "book.db")))
+
+    assert booked == {"first": 1, "again": None, "full": None, "other_team": None}
+    assert signups == 1
+    assert stats == {1: 1}
+
+
+async def _book_concurrently(path: str, capacity: int, users: int):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+    try:
+        await upgrade_schema(engine)
+        now = datetime(2024, 1, 1)
+        async with engine.begin() as conn:
+            await conn.execute(insert(User), [
+                {"telegram_id": telegram_id, "full_name": f"Сотрудник {telegram_id}", "course": 1, "phone": "",
+                 "is_registered": True, "created_at": now, "updated_at": now}
+                for telegram_id in range(1, users + 1)
+            ])
+        async with AsyncSession(engine) as db:
+            shift = await create_shift(db, datetime(2030, 1, 1, 9, 0), "Сборка")
+            await update_shift(db, shift.id, capacity=capacity)
+
+        async def book(telegram_id):
+            async with AsyncSession(engine) as db:
+                return await assign_user_to_shift(db, telegram_id, shift.id) is not None
+
+        booked = await asyncio.gather(*(book(telegram_id) for telegram_id in range(1, users + 1)))
+        async with AsyncSession(engine) as db:
+            signups = await count_shift_signups(db, shift.id)
+            stats_total = await db.scalar(select(func.sum(UserStats.signups)))
+        return booked.count(True), signups, stats_total
+    finally:
+        await engine.dispose()
+
+
+def test_concurrent_bookings_do_not_overfill_shift(tmp_path):
+    booked, signups, stats_total = asyncio.run(_book_concurrently(str(tmp_path / "race.db"), capacity=2, users=8))
+
+    assert booked == signups == stats_total == 2
@@ -0,0 +1,73 @@
+"""
+Статистика сотрудников: счётчики, которые меняются вместе с записями на смены,
+совпадают с пересчётом rebuild_user_stats по всей истории.
+"""
+import asyncio
+from datetime import datetime
+
+from sqlalchemy import insert, select
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+
+from database.crud import (
+    archive_shifts_batch, assign_user_to_shift, cancel_shift_assignment, create_shift, rebuild_user_stats, update_shift,
+)
+from database.migrations import upgrade_schema
+from database.models import User, UserStats
+
+
+def _stats(rows):
+    return {
+        row.user_id: (row.signups, row.cancellations, row.shifts_worked, row.last_worked_at)
+        for row in rows
+    }
+
+
+async def _incremental_and_rebuilt(path: str):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+    try:
+        await upgrade_schema(engine)
+        now = datetime(2024, 1, 1)
+        async with engine.begin() as conn:
+            await conn.execute(insert(User), [
+                {"telegram_id": telegram_id, "full_name": f"Сотрудник {telegram_id}", "course": 1, "phone": "",
+                 "is_registered": True, "created_at": now, "updated_at": now}
+                for telegram_id in (1001, 1002, 1003)
+            ])
+        async with AsyncSession(engine, expire_on_commit=False) as db:
+            old = await create_shift(db, datetime(2024, 2, 5, 9, 0), "Сборка")
+            done = await create_shift(db, datetime(2024, 3, 4, 9, 0), "Упаковка")
+            undone = await create_shift(db, datetime(2024, 3, 6, 9, 0), "Склад")
+            future = await create_shift(db, datetime(2030, 1, 1, 9, 0), "Будущая")
+
+            for telegram_id in (1001, 1002):
+                await assign_user_to_shift(db, telegram_id, old.id)
+                await assign_user_to_shift(db, telegram_id, done.id)
+                await assign_user_to_shift(db, telegram_id, undone.id)
+            await update_shift(db, old.id, completed_info="Собрано 40 заказов")
+            await update_shift(db, done.id, completed_info="Упаковано")
+            await update_shift(db, undone.id, completed_info="Ошибочно")
+            await update_shift(db, undone.id, completed_info=None)      # Отметка снята
+            await cancel_shift_assignment(db, 1002, done.id)            # Отмена после отметки
+            await assign_user_to_shift(db, 1003, done.id)               # Запись на отмеченную смену
+            await assign_user_to_shift(db, 1003, future.id)
+            await cancel_shift_assignment(db, 1003, future.id)
+            await assign_user_to_shift(db, 1003, future.id)             # Повторная запись после отмены
+            await archive_shifts_batch(db, older_than=datetime(2024, 3, 1))
+
+            incremental = _stats((await db.execute(select(UserStats))).scalars())
+            await rebuild_user_stats(db)
+            rebuilt = _stats((await db.execute(select(UserStats))).scalars())
+        return incremental, rebuilt
+    finally:
+        await engine.dispose()
+
+
+def test_incremental_stats_match_rebuild(tmp_path):
+    incremental, rebuilt = asyncio.run(_incremental_and_rebuilt(str(tmp_path / "stats.db")))
+
+    assert incremental == rebuilt
+    assert incremental == {
+        1: (3, 0, 2, datetime(2024, 3, 4, 9, 0)),
+        2: (3, 1, 1, datetime(2024, 2, 5, 9, 0)),
+        3: (3, 1, 1, datetime(2024, 3, 4, 9, 0)),
+    }
@@ -0,0 +1,31 @@
+"""
+Остановка бота: фоновые задачи обработчиков дорабатывают до срока, оставшиеся отменяются.
+"""
+import asyncio
+
+from runtime.supervisor import drain_background_tasks, run_in_background
+
+
+async def _drain():
+    finished = []
+
+    async def short():
+        await asyncio.sleep(0.01)
+        finished.append("short")
+
+    async def endless():
+        await asyncio.sleep(3600)
+        finished.append("endless")
+
+    short_task = run_in_background(short(), name="short")
+    endless_task = run_in_background(endless(), name="endless")
+    await drain_background_tasks(0.2)
+    return finished, short_task, endless_task
+
+
+def test_drain_waits_for_short_tasks_and_cancels_the_rest():
+    finished, short_task, endless_task = asyncio.run(_drain())
+
+    assert finished == ["short"]
+    assert short_task.done() and not short_task.cancelled()
+    assert endless_task.cancelled()
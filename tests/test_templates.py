@@ -0,0 +1,37 @@
+"""
+Шаблоны смен: повторная генерация не создаёт дублей.
+"""
+import asyncio
+from datetime import datetime, time
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+
+from database.crud import create_shift_template, generate_template_shifts
+from database.migrations import upgrade_schema
+from database.models import Shift
+
+
+async def _generate_twice(path: str):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+    try:
+        await upgrade_schema(engine)
+        async with AsyncSession(engine) as db:
+            await create_shift_template(db, ["Пн", "Ср"], time(9, 0), "Сборка", capacity=5)
+            await create_shift_template(db, ["Пт"], time(14, 0), "Упаковка")
+            first = await generate_template_shifts(db, 2, now=datetime(2024, 1, 1))
+            again = await generate_template_shifts(db, 2, now=datetime(2024, 1, 1))
+            next_week = await generate_template_shifts(db, 2, now=datetime(2024, 1, 8))
+            dates = (await db.execute(select(Shift.date).order_by(Shift.date))).scalars().all()
+        return first, again, next_week, dates
+    finally:
+        await engine.dispose()
+
+
+def test_generate_template_shifts_is_idempotent(tmp_path):
+    first, again, next_week, dates = asyncio.run(_generate_twice(str(tmp_path / "templates.db")))
+
+    assert first == (6, 0)
+    assert again == (0, 6)
+    assert next_week == (3, 3)  # Пересекающиеся недели: создаются только новые даты
+    assert len(dates) == len(set(dates)) == 9
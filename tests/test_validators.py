@@ -0,0 +1,62 @@
+"""
+Разбор ввода администратора: список смен и шаблон смены.
+"""
+from datetime import datetime, time
+
+from handlers.validators import parse_shift_lines, parse_shift_template
+
+
+NOW = datetime(2024, 12, 1, 12, 0)
+
+
+def test_parse_shift_lines_sorts_and_keeps_descriptions():
+    text = (
+        "27.12.2024 14:30 — Упаковка\n"
+        "\n"
+        "25.12.2024 09:00 - Сборка\n"
+        "26.12.2024 9:00\n"
+    )
+
+    shifts, errors = parse_shift_lines(text, NOW)
+
+    assert errors == []
+    assert shifts == [
+        (datetime(2024, 12, 25, 9, 0), "Сборка"),
+        (datetime(2024, 12, 26, 9, 0), None),
+        (datetime(2024, 12, 27, 14, 30), "Упаковка"),
+    ]
+
+
+def test_parse_shift_lines_reports_bad_lines():
+    text = (
+        "25.12.2024 09:00 — Сборка\n"
+        "завтра в девять\n"
+        "31.02.2024 09:00\n"
+        "01.11.2024 09:00 — Прошедшая\n"
+        "25.12.2024 09:00 — Повтор\n"
+    )
+
+    shifts, errors = parse_shift_lines(text, NOW)
+
+    assert shifts == [(datetime(2024, 12, 25, 9, 0), "Сборка")]
+    assert errors == [
+        "Строка 2: ожидается ДД.ММ.ГГГГ ЧЧ:ММ — описание",
+        "Строка 3: несуществующая дата или время",
+        "Строка 4: дата должна быть в будущем",
+        "Строка 5: 25.12.2024 09:00 уже есть в списке",
+    ]
+
+
+def test_parse_shift_template():
+    assert parse_shift_template("Пт, Пн, Ср 09:00 8 Сборка заказов") == (
+        ["Пн", "Ср", "Пт"], time(9, 0), 8, "Сборка заказов"
+    )
+    assert parse_shift_template("суббота 14:30") == (["Сб"], time(14, 30), None, None)
+    assert parse_shift_template("Вт 10:00 Упаковка") == (["Вт"], time(10, 0), None, "Упаковка")
+
+
+def test_parse_shift_template_rejects_invalid_input():
+    assert parse_shift_template("09:00 Сборка") is None      # Нет дней
+    assert parse_shift_template("Пн Сборка") is None         # Нет времени
+    assert parse_shift_template("Пн 25:00") is None
+    assert parse_shift_template("Пн 09:00 0 Сборка") is None  # Ноль мест